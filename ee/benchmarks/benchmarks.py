@@ -19,6 +19,28 @@ from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.filters.filter import Filter
 from posthog.models.property import PropertyName, TableWithProperties
 from posthog.constants import FunnelCorrelationType
+from posthog.api.capture import parse_kafka_event_data
+from posthog import json_codec
+from posthog.helpers.session_recording import (
+    GZIP_BASE64,
+    GZIP_UTF8_BASE64,
+    ZSTD_UTF8_BASE64,
+    compress_and_chunk_snapshots,
+)
+from ee.kafka_client.client import _KafkaProducer
+from posthog.models import FeatureFlag, Person
+from posthog.models.feature_flag import FeatureFlagMatcher, get_active_feature_flags
+from posthog.client import _strip_sql_comments, strip_sql_comments
+import ee.clickhouse.sql
+from unittest.mock import patch
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import importlib
+import json
+import pkgutil
+import random
+import sqlparse
+import time
 
 MATERIALIZED_PROPERTIES: List[Tuple[TableWithProperties, PropertyName]] = [
     ("events", "$host"),
@@ -655,3 +677,217 @@ class QuerySuite:
             )
             cohort.calculate_people_ch(pending_version=0)
         self.cohort = cohort
+
+
+class CaptureSuite:
+    """
+    Python CPU spent on serializing a single event on `/e/`, with and without orjson.
+    """
+
+    version = "v001"
+    params = ["stdlib", "orjson"]
+    param_names = ["codec"]
+
+    def setup(self, codec):
+        self._orjson = json_codec.orjson
+        if codec == "stdlib":
+            json_codec.orjson = None  # type: ignore
+
+        self.now = now()
+        self.event = {
+            "event": "$autocapture",
+            "properties": {
+                "distinct_id": "some-distinct-id",
+                "$current_url": "https://app.posthog.com/insights?insight=TRENDS",
+                "$browser": "Chrome",
+                "$lib": "web",
+                "$elements": [
+                    {
+                        "tag_name": "a",
+                        "nth_child": index,
+                        "nth_of_type": 2,
+                        "attr__class": "btn btn-sm",
+                        "$el_text": "💻",
+                    }
+                    for index in range(20)
+                ],
+            },
+        }
+
+    def teardown(self, codec):
+        json_codec.orjson = self._orjson
+
+    def time_serialize_event(self, codec):
+        data = parse_kafka_event_data(
+            distinct_id="some-distinct-id",
+            ip="127.0.0.1",
+            site_url="https://app.posthog.com",
+            data=self.event,
+            team_id=2,
+            now=self.now,
+            sent_at=self.now,
+            event_uuid=UUIDT(),
+        )
+        _KafkaProducer.json_serializer(data)
+
+
+class FeatureFlagSuite:
+    """
+    Postgres queries and latency of evaluating all flags of a team for a person, with conditions compiled into
+    in-memory predicates vs. evaluated in postgres.
+    """
+
+    version = "v001"
+    params = ["compiled", "postgres"]
+    param_names = ["matcher"]
+
+    FLAG_COUNT = 60
+    DISTINCT_ID = "benchmark-flags-person"
+
+    def setup(self, matcher):
+        team = Team.objects.filter(id=2).first()
+        if team is None:
+            organization = Organization.objects.create()
+            team = Team.objects.create(id=2, organization=organization, name="The Bakery")
+        self.team = team
+
+        if not Person.objects.filter(team=team, persondistinctid__distinct_id=self.DISTINCT_ID).exists():
+            Person.objects.create(
+                team=team, distinct_ids=[self.DISTINCT_ID], properties={"email": "tim@posthog.com", "plan": "pro"}
+            )
+
+        user = team.organization.members.first()
+        for index in range(self.FLAG_COUNT):
+            FeatureFlag.objects.get_or_create(
+                team=team,
+                key=f"benchmark-flag-{index}",
+                defaults={
+                    "created_by": user,
+                    "filters": {
+                        "groups": [
+                            {
+                                "properties": [
+                                    {"key": "email", "type": "person", "value": "posthog", "operator": "icontains"},
+                                    {"key": "plan", "type": "person", "value": ["pro", "enterprise"]},
+                                ],
+                                "rollout_percentage": 50,
+                            }
+                        ]
+                    },
+                },
+            )
+
+        self.patcher = patch.object(
+            FeatureFlagMatcher,
+            "condition_predicates",
+            property(lambda matcher: [None for _ in matcher.feature_flag.conditions]),
+        )
+        if matcher == "postgres":
+            self.patcher.start()
+
+    def teardown(self, matcher):
+        if matcher == "postgres":
+            self.patcher.stop()
+
+    def track_flags_query_count(self, matcher):
+        with CaptureQueriesContext(connection) as context:
+            get_active_feature_flags(self.team.pk, self.DISTINCT_ID)
+        return len(context.captured_queries)
+
+    def time_flags(self, matcher):
+        get_active_feature_flags(self.team.pk, self.DISTINCT_ID)
+
+
+class SnapshotCompressionSuite:
+    """
+    Size of stored snapshot chunks and CPU time the capture endpoint spends compressing them, per MB of session
+    recording snapshots, by compression format.
+    """
+
+    version = "v001"
+    params = [GZIP_BASE64, GZIP_UTF8_BASE64, ZSTD_UTF8_BASE64]
+    param_names = ["compression"]
+
+    REPETITIONS = 5
+
+    def setup(self, compression):
+        generator = random.Random(0)
+        words = ["insight", "dashboard", "funnel", "cohort", "recording", "feature", "flag", "💻", "ünïcode"]
+
+        def node(id, depth):
+            return {
+                "type": 2,
+                "id": id,
+                "tagName": generator.choice(["div", "span", "a", "button", "li"]),
+                "attributes": {"class": " ".join(generator.choices(words, k=3)), "data-attr": f"element-{id}"},
+                "childNodes": [node(id * 4 + index, depth + 1) for index in range(4)] if depth < 6 else [],
+            }
+
+        timestamp = 1_600_000_000_000
+        snapshot_data = [{"type": 2, "timestamp": timestamp, "data": {"node": node(1, 0)}}]
+        for index in range(2_000):
+            timestamp += generator.randint(10, 2_000)
+            snapshot_data.append(
+                {
+                    "type": 3,
+                    "timestamp": timestamp,
+                    "data": {
+                        "source": generator.choice([0, 1, 2, 3]),
+                        "texts": [{"id": index, "value": " ".join(generator.choices(words, k=8))}],
+                        "positions": [{"x": generator.randint(0, 1920), "y": generator.randint(0, 1080)}],
+                    },
+                }
+            )
+
+        self.events = [
+            {"event": "$snapshot", "properties": {"$session_id": "1", "$window_id": "1", "$snapshot_data": data}}
+            for data in snapshot_data
+        ]
+        self.megabytes = len(json.dumps(snapshot_data)) / 1024 / 1024
+
+    def track_stored_bytes_per_mb(self, compression):
+        chunks = compress_and_chunk_snapshots(self.events, compression=compression)
+        return sum(len(json.dumps(chunk["properties"]["$snapshot_data"])) for chunk in chunks) / self.megabytes
+
+    track_stored_bytes_per_mb.unit = "bytes"  # type: ignore
+
+    def track_cpu_ms_per_mb(self, compression):
+        start = time.process_time()
+        for _ in range(self.REPETITIONS):
+            list(compress_and_chunk_snapshots(self.events, compression=compression))
+        return (time.process_time() - start) * 1000 / self.REPETITIONS / self.megabytes
+
+    track_cpu_ms_per_mb.unit = "ms"  # type: ignore
+
+
+class QueryPreparationSuite:
+    """
+    CPU spent stripping comments from the biggest query templates of `ee/clickhouse/sql` before sending them to
+    clickhouse, with sqlparse vs. `strip_sql_comments`, uncached and cached.
+    """
+
+    version = "v001"
+    params = ["sqlparse", "uncached", "cached"]
+    param_names = ["stripper"]
+
+    TEMPLATE_COUNT = 10
+
+    def setup(self, stripper):
+        templates = [
+            value
+            for module_info in pkgutil.walk_packages(ee.clickhouse.sql.__path__, "ee.clickhouse.sql.")
+            if ".test" not in module_info.name
+            for value in vars(importlib.import_module(module_info.name)).values()
+            if isinstance(value, str)
+        ]
+        self.templates = sorted(templates, key=len, reverse=True)[: self.TEMPLATE_COUNT]
+        if stripper == "sqlparse":
+            self.strip = lambda template: sqlparse.format(template, strip_comments=True)
+        elif stripper == "uncached":
+            self.strip = _strip_sql_comments
+        else:
+            self.strip = strip_sql_comments
+
+    def time_strip_comments(self, stripper):
+        for template in self.templates:
+            self.strip(template)
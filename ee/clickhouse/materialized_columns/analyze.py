@@ -4,18 +4,25 @@ from datetime import timedelta
 from typing import Dict, Generator, List, Optional, Set, Tuple
 
 import structlog
+from django.utils.timezone import now
 
 from ee.clickhouse.materialized_columns.columns import (
-    backfill_materialized_columns,
+    ColumnName,
+    deprecate_materialized_column,
+    drop_deprecated_materialized_columns,
+    get_backfill_partition_ids,
     get_materialized_columns,
     materialize,
 )
 from ee.clickhouse.materialized_columns.util import instance_memoize
 from ee.clickhouse.sql.person import GET_PERSON_PROPERTIES_COUNT
+from ee.models.materialized_column_decision import MaterializedColumnDecision
 from ee.settings import (
     MATERIALIZE_COLUMNS_ANALYSIS_PERIOD_HOURS,
     MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS,
+    MATERIALIZE_COLUMNS_DROP_UNUSED,
     MATERIALIZE_COLUMNS_MAX_AT_ONCE,
+    MATERIALIZE_COLUMNS_MAX_PER_TABLE,
     MATERIALIZE_COLUMNS_MINIMUM_QUERY_TIME,
 )
 from posthog.client import sync_execute
@@ -23,9 +30,15 @@ from posthog.models.filters.mixins.utils import cached_property
 from posthog.models.property import PropertyName, TableWithProperties
 from posthog.models.property_definition import PropertyDefinition
 from posthog.models.team import Team
+from posthog.settings import CLICKHOUSE_CLUSTER
 
 Suggestion = Tuple[TableWithProperties, PropertyName, int]
 
+TABLES: List[TableWithProperties] = ["events", "person"]
+
+# Materializing a property saves reading the whole properties column, so the benefit grows with the bytes read
+BYTES_READ_PER_COST_UNIT = 1024 ** 3
+
 logger = structlog.get_logger(__name__)
 
 
@@ -41,13 +54,22 @@ class TeamManager:
 
 
 class Query:
-    def __init__(self, query_string: str, query_time_ms: float, min_query_time=MATERIALIZE_COLUMNS_MINIMUM_QUERY_TIME):
+    def __init__(
+        self,
+        query_string: str,
+        query_time_ms: float,
+        min_query_time=MATERIALIZE_COLUMNS_MINIMUM_QUERY_TIME,
+        read_bytes: Optional[int] = None,
+    ):
         self.query_string = query_string
         self.query_time_ms = query_time_ms
         self.min_query_time = min_query_time
+        self.read_bytes = read_bytes
 
     @property
     def cost(self) -> int:
+        if self.read_bytes is not None:
+            return int(self.read_bytes / BYTES_READ_PER_COST_UNIT) + 1
         return int((self.query_time_ms - self.min_query_time) / 1000) + 1
 
     @cached_property
@@ -61,7 +83,9 @@ class Query:
 
     @cached_property
     def _all_properties(self) -> List[PropertyName]:
-        return re.findall(r"JSONExtract\w+\(\S+, '([^']+)'\)", self.query_string)
+        # Property names are escaped when substituted into queries, e.g. 'it\'s'
+        matches = re.findall(r"JSONExtract\w+\(\S+, '((?:[^'\\]|\\.)+)'\)", self.query_string)
+        return [re.sub(r"\\(.)", r"\1", match) for match in matches]
 
     def properties(self, team_manager: TeamManager) -> Generator[Tuple[TableWithProperties, PropertyName], None, None]:
         # Reverse-engineer whether a property is an "event" or "person" property by getting their event definitions.
@@ -82,7 +106,8 @@ def get_queries(since_hours_ago: int, min_query_time: int) -> List[Query]:
         f"""
         SELECT
             query,
-            query_duration_ms
+            query_duration_ms,
+            read_bytes
         FROM system.query_log
         WHERE
             query NOT LIKE '%%query_log%%'
@@ -95,7 +120,10 @@ def get_queries(since_hours_ago: int, min_query_time: int) -> List[Query]:
         """,
         {"since": since_hours_ago, "min_query_time": min_query_time},
     )
-    return [Query(query, query_duration_ms, min_query_time) for query, query_duration_ms in raw_queries]
+    return [
+        Query(query, query_duration_ms, min_query_time, read_bytes)
+        for query, query_duration_ms, read_bytes in raw_queries
+    ]
 
 
 def analyze(queries: List[Query]) -> List[Suggestion]:
@@ -120,6 +148,107 @@ def analyze(queries: List[Query]) -> List[Suggestion]:
     ]
 
 
+def get_unused_columns(table: TableWithProperties, since_hours_ago: int) -> List[Tuple[PropertyName, ColumnName]]:
+    "Finds columns materialized by query analysis before cutoff that no query has used since"
+
+    cutoff = now() - timedelta(hours=since_hours_ago)
+    decisions = MaterializedColumnDecision.objects.filter(
+        table=table, action=MaterializedColumnDecision.Action.MATERIALIZE
+    )
+    recently_materialized = set(decisions.filter(created_at__gte=cutoff).values_list("property", flat=True))
+    materialized_columns = get_materialized_columns(table, use_cache=False)
+    columns = {
+        materialized_columns[property_name]: property_name
+        for property_name in decisions.filter(created_at__lt=cutoff, is_automatic=True).values_list(
+            "property", flat=True
+        )
+        if property_name in materialized_columns and property_name not in recently_materialized
+    }
+    if len(columns) == 0:
+        return []
+
+    # Each node only logs the queries it ran, and keeps its log for as long as it's configured to
+    hosts_with_partial_log = sync_execute(
+        """
+        SELECT hostName() AS host
+        FROM clusterAllReplicas(%(cluster)s, system, query_log)
+        GROUP BY host
+        HAVING min(query_start_time) > now() - toIntervalHour(%(since)s)
+        """,
+        {"cluster": CLICKHOUSE_CLUSTER, "since": since_hours_ago},
+    )
+    if len(hosts_with_partial_log) > 0:
+        logger.warning(
+            f"Not looking for unused columns, query log doesn't cover the period. hosts={hosts_with_partial_log}"
+        )
+        return []
+
+    rows = sync_execute(
+        """
+        SELECT DISTINCT column_name
+        FROM clusterAllReplicas(%(cluster)s, system, query_log)
+        ARRAY JOIN %(column_names)s AS column_name
+        WHERE
+            query NOT LIKE '%%query_log%%'
+            AND query NOT LIKE '%%ALTER%%'
+            AND type = 'QueryFinish'
+            AND query_start_time > now() - toIntervalHour(%(since)s)
+            AND position(query, column_name) > 0
+        """,
+        {"cluster": CLICKHOUSE_CLUSTER, "since": since_hours_ago, "column_names": list(columns.keys())},
+    )
+    used_columns = set(column_name for column_name, in rows)
+    return [
+        (property_name, column_name)
+        for column_name, property_name in columns.items()
+        if column_name not in used_columns
+    ]
+
+
+def drop_unused_columns(since_hours_ago: int, dry_run: bool = False) -> None:
+    """
+    Drops columns materialized by query analysis that are no longer used. Columns get deprecated first, and only
+    dropped on the next run, once no process has them cached as materialized anymore.
+    """
+
+    for table in TABLES:
+        if not dry_run:
+            for property_name, column_name in drop_deprecated_materialized_columns(table).items():
+                logger.info(f"Dropped deprecated column. table={table}, property_name={property_name}")
+                _record_decision(table, property_name, column_name, MaterializedColumnDecision.Action.DROP)
+
+        for property_name, column_name in get_unused_columns(table, since_hours_ago):
+            logger.info(f"Deprecating unused column. table={table}, property_name={property_name}")
+            if not dry_run:
+                deprecate_materialized_column(table, property_name)
+                _record_decision(table, property_name, column_name, MaterializedColumnDecision.Action.DEPRECATE, cost=0)
+
+
+def schedule_backfills(
+    table: TableWithProperties, property_names: List[PropertyName], backfill_period: timedelta, is_automatic: bool
+) -> None:
+    "Schedules backfills of new materialized columns, one partition at a time, see `run_scheduled_backfill`"
+
+    if len(property_names) == 0:
+        return
+
+    materialized_columns = get_materialized_columns(table, use_cache=False)
+    MaterializedColumnDecision.objects.bulk_create(
+        [
+            MaterializedColumnDecision(
+                table=table,
+                property=property_name,
+                column_name=materialized_columns[property_name],
+                action=MaterializedColumnDecision.Action.BACKFILL,
+                is_automatic=is_automatic,
+                partition_id=partition_id,
+            )
+            for partition_id in get_backfill_partition_ids(table, backfill_period)
+            for property_name in property_names
+        ]
+    )
+
+
 def materialize_properties_task(
     columns_to_materialize: Optional[List[Suggestion]] = None,
     time_to_analyze_hours: int = MATERIALIZE_COLUMNS_ANALYSIS_PERIOD_HOURS,
@@ -127,12 +256,18 @@ def materialize_properties_task(
     min_query_time: int = MATERIALIZE_COLUMNS_MINIMUM_QUERY_TIME,
     backfill_period_days: int = MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS,
     dry_run: bool = False,
+    maximum_per_table: int = MATERIALIZE_COLUMNS_MAX_PER_TABLE,
+    drop_unused: bool = MATERIALIZE_COLUMNS_DROP_UNUSED,
 ) -> None:
     """
-    Creates materialized columns for event and person properties based off of slow queries
+    Creates materialized columns for event and person properties based off of slow queries, and with `drop_unused`
+    drops the ones created this way that are no longer used. Backfills get scheduled for off-peak hours.
     """
 
+    is_automatic = columns_to_materialize is None
     if columns_to_materialize is None:
+        if drop_unused:
+            drop_unused_columns(time_to_analyze_hours, dry_run)
         columns_to_materialize = analyze(get_queries(time_to_analyze_hours, min_query_time))
     result = []
     for suggestion in columns_to_materialize:
@@ -145,18 +280,49 @@ def materialize_properties_task(
     else:
         logger.info("Found no columns to materialize.")
 
-    properties: Dict[TableWithProperties, List[PropertyName]] = {
-        "events": [],
-        "person": [],
-    }
-    for table, property_name, cost in result[:maximum]:
+    properties: Dict[TableWithProperties, List[PropertyName]] = {table: [] for table in TABLES}
+    column_counts = {table: len(get_materialized_columns(table, use_cache=False)) for table in TABLES}
+    for table, property_name, cost in result:
+        if sum(len(property_names) for property_names in properties.values()) >= maximum:
+            break
+        if column_counts[table] + len(properties[table]) >= maximum_per_table:
+            logger.info(f"Not materializing column, table is over budget. table={table}, property_name={property_name}")
+            continue
+
         logger.info(f"Materializing column. table={table}, property_name={property_name}, cost={cost}")
 
         if not dry_run:
             materialize(table, property_name)
+            _record_decision(
+                table,
+                property_name,
+                get_materialized_columns(table, use_cache=False)[property_name],
+                MaterializedColumnDecision.Action.MATERIALIZE,
+                cost=cost,
+                is_automatic=is_automatic,
+            )
         properties[table].append(property_name)
 
     if backfill_period_days > 0 and not dry_run:
-        logger.info(f"Starting backfill for new materialized columns. period_days={backfill_period_days}")
-        backfill_materialized_columns("events", properties["events"], timedelta(days=backfill_period_days))
-        backfill_materialized_columns("person", properties["person"], timedelta(days=backfill_period_days))
+        logger.info(f"Scheduling backfill for new materialized columns. period_days={backfill_period_days}")
+        for table, property_names in properties.items():
+            schedule_backfills(table, property_names, timedelta(days=backfill_period_days), is_automatic)
+
+
+def _record_decision(
+    table: TableWithProperties,
+    property_name: PropertyName,
+    column_name: ColumnName,
+    action: str,
+    cost: Optional[int] = None,
+    is_automatic: bool = True,
+) -> None:
+    MaterializedColumnDecision.objects.create(
+        table=table,
+        property=property_name,
+        column_name=column_name,
+        action=action,
+        cost=cost,
+        is_automatic=is_automatic,
+        completed_at=now(),
+    )
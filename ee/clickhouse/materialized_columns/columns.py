@@ -1,6 +1,6 @@
 import re
 from datetime import timedelta
-from typing import Dict, List, Literal, Union
+from typing import Dict, List, Literal, Optional, Union
 
 from constance import config
 from django.utils.timezone import now
@@ -19,6 +19,9 @@ TablesWithMaterializedColumns = Union[TableWithProperties, Literal["session_reco
 
 TRIM_AND_EXTRACT_PROPERTY = trim_quotes_expr("JSONExtractRaw(properties, %(property)s)")
 
+# Comment of columns which are no longer used for queries and get dropped later
+DEPRECATED_COMMENT_PREFIX = "column_materializer_deprecated::"
+
 
 @cache_for(timedelta(minutes=15))
 def get_materialized_columns(table: TablesWithMaterializedColumns) -> Dict[PropertyName, ColumnName]:
@@ -85,10 +88,14 @@ def materialize(table: TableWithProperties, property: PropertyName, column_name=
 
 
 def backfill_materialized_columns(
-    table: TableWithProperties, properties: List[PropertyName], backfill_period: timedelta, test_settings=None
+    table: TableWithProperties,
+    properties: List[PropertyName],
+    backfill_period: timedelta,
+    test_settings=None,
+    partition_id: Optional[str] = None,
 ) -> None:
     """
-    Backfills the materialized column after its creation.
+    Backfills the materialized column after its creation, within `backfill_period` or the whole of `partition_id`.
 
     This will require reading and writing a lot of data on clickhouse disk.
     """
@@ -127,13 +134,72 @@ def backfill_materialized_columns(
         ALTER TABLE {updated_table}
         {execute_on_cluster}
         UPDATE {assignments}
-        WHERE {"timestamp > %(cutoff)s" if table == "events" else "1 = 1"}
+        {"IN PARTITION ID %(partition_id)s" if partition_id is not None else ""}
+        WHERE {"timestamp > %(cutoff)s" if table == "events" and partition_id is None else "1 = 1"}
         """,
-        {"cutoff": (now() - backfill_period).strftime("%Y-%m-%d")},
+        {"cutoff": (now() - backfill_period).strftime("%Y-%m-%d"), "partition_id": partition_id},
         settings=test_settings,
     )
 
 
+def get_backfill_partition_ids(table: TableWithProperties, backfill_period: timedelta) -> List[str]:
+    "Returns ids of the partitions backfilling the materialized columns of `table` goes through, latest first"
+
+    updated_table = "sharded_events" if clickhouse_is_replicated() and table == "events" else table
+    rows = sync_execute(
+        f"""
+        SELECT DISTINCT partition_id
+        FROM system.parts
+        WHERE database = %(database)s
+          AND table = %(table)s
+          AND active
+          {"AND partition >= %(cutoff_partition)s" if table == "events" else ""}
+        ORDER BY partition_id DESC
+        """,
+        {
+            "database": CLICKHOUSE_DATABASE,
+            "table": updated_table,
+            "cutoff_partition": (now() - backfill_period).strftime("%Y%m"),
+        },
+    )
+    return [partition_id for partition_id, in rows]
+
+
+def deprecate_materialized_column(table: TableWithProperties, property: PropertyName) -> None:
+    """
+    Stops the materialized column from being used in queries without dropping it yet, as processes keep using
+    cached results of `get_materialized_columns` for a while. See `drop_deprecated_materialized_columns`.
+    """
+
+    column_name = get_materialized_columns(table, use_cache=False)[property]
+    execute_on_cluster = f"ON CLUSTER '{CLICKHOUSE_CLUSTER}'" if table == "events" else ""
+    sync_execute(
+        f"ALTER TABLE {table} {execute_on_cluster} COMMENT COLUMN {column_name} %(comment)s",
+        {"comment": f"{DEPRECATED_COMMENT_PREFIX}{property}"},
+    )
+
+
+def drop_deprecated_materialized_columns(table: TableWithProperties) -> Dict[PropertyName, ColumnName]:
+    "Drops columns deprecated by `deprecate_materialized_column`, returning the dropped ones"
+
+    rows = sync_execute(
+        """
+        SELECT comment, name
+        FROM system.columns
+        WHERE database = %(database)s
+          AND table = %(table)s
+          AND comment LIKE %(comment)s
+    """,
+        {"database": CLICKHOUSE_DATABASE, "table": table, "comment": f"{DEPRECATED_COMMENT_PREFIX}%"},
+    )
+    execute_on_cluster = f"ON CLUSTER '{CLICKHOUSE_CLUSTER}'" if table == "events" else ""
+    for _, column_name in rows:
+        sync_execute(f"ALTER TABLE {table} {execute_on_cluster} DROP COLUMN IF EXISTS {column_name}")
+        if clickhouse_is_replicated() and table == "events":
+            sync_execute(f"ALTER TABLE sharded_{table} {execute_on_cluster} DROP COLUMN IF EXISTS {column_name}")
+    return {extract_property(comment): column_name for comment, column_name in rows}
+
+
 def materialized_column_name(table: TableWithProperties, property: PropertyName) -> str:
     "Returns a sanitized and unique column name to use for materialized column"
 
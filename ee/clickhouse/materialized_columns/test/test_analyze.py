@@ -58,3 +58,14 @@ class TestMaterializedColumnsAnalyze(ClickhouseTestMixin, BaseTest):
             f"SELECT JSONExtractString(properties, '$unknown_prop') FROM events WHERE team_id = {self.team.pk}", 0
         )
         self.assertEqual(list(query_with_unknown_property.properties(TeamManager())), [])
+
+    def test_query_cost_from_read_bytes(self):
+        query = Query(*self.DUMMY_QUERIES[0], read_bytes=5 * 1024 ** 3)
+
+        self.assertEqual(query.cost, 6)
+
+    def test_query_properties_with_escaped_quotes(self):
+        PropertyDefinition.objects.create(team=self.team, name="it's")
+        query = Query(f"SELECT JSONExtractString(properties, 'it\\'s') FROM events WHERE team_id = {self.team.pk}", 0)
+
+        self.assertEqual(list(query.properties(TeamManager())), [("events", "it's")])
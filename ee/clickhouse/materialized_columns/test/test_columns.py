@@ -1,17 +1,22 @@
 import random
 from datetime import timedelta
 from time import sleep
+from unittest.mock import patch
 
 from freezegun import freeze_time
 
+from ee.clickhouse.materialized_columns.analyze import get_unused_columns, materialize_properties_task
 from ee.clickhouse.materialized_columns.columns import (
     backfill_materialized_columns,
+    deprecate_materialized_column,
+    drop_deprecated_materialized_columns,
     get_materialized_columns,
     materialize,
 )
 from ee.clickhouse.sql.events import EVENTS_DATA_TABLE
 from ee.clickhouse.util import ClickhouseTestMixin
-from ee.tasks.materialized_columns import mark_all_materialized
+from ee.models.materialized_column_decision import MaterializedColumnDecision
+from ee.tasks.materialized_columns import is_off_peak, mark_all_materialized, run_scheduled_backfill
 from posthog.client import sync_execute
 from posthog.conftest import create_clickhouse_tables
 from posthog.constants import GROUP_TYPES_LIMIT
@@ -166,6 +171,88 @@ class TestMaterializedColumns(ClickhouseTestMixin, BaseTest):
         mark_all_materialized()
         self.assertEqual(("MATERIALIZED", expr), self._get_column_types("mat_myprop"))
 
+    def test_scheduled_backfill_by_partition(self):
+        _create_event(
+            event="some_event", distinct_id="1", team=self.team, timestamp="2021-04-02 00:00:00", properties={"prop": 1}
+        )
+        _create_event(
+            event="some_event", distinct_id="1", team=self.team, timestamp="2021-05-02 00:00:00", properties={"prop": 2}
+        )
+
+        with freeze_time("2021-05-10T14:00:01Z"):
+            materialize_properties_task([("events", "prop", 0)], backfill_period_days=50)
+
+        backfills = MaterializedColumnDecision.objects.filter(action=MaterializedColumnDecision.Action.BACKFILL)
+        self.assertEqual(list(backfills.order_by("id").values_list("partition_id", flat=True)), ["202105", "202104"])
+
+        # Nothing happens outside of off-peak hours
+        with freeze_time("2021-05-10T14:00:01Z"):
+            run_scheduled_backfill()
+        self.assertEqual(backfills.filter(completed_at__isnull=True).count(), 2)
+
+        with freeze_time("2021-05-11T02:00:01Z"):
+            run_scheduled_backfill()
+        self.assertEqual(
+            list(backfills.filter(completed_at__isnull=True).values_list("partition_id", flat=True)), ["202104"]
+        )
+
+        # Columns keep their default expression until all partitions are backfilled
+        mark_all_materialized()
+        self.assertEqual(self._get_column_types("mat_prop")[0], "DEFAULT")
+
+        with freeze_time("2021-05-11T03:00:01Z"):
+            run_scheduled_backfill()
+        self.assertEqual(backfills.filter(completed_at__isnull=True).count(), 0)
+        self.assertEqual(sync_execute("SELECT mat_prop FROM events ORDER BY timestamp"), [("1",), ("2",)])
+
+        mark_all_materialized()
+        self.assertEqual(self._get_column_types("mat_prop")[0], "MATERIALIZED")
+
+    def test_deprecating_and_dropping_columns(self):
+        materialize("events", "$foo")
+        materialize("person", "$bar")
+
+        deprecate_materialized_column("events", "$foo")
+        deprecate_materialized_column("person", "$bar")
+
+        self.assertNotIn("$foo", get_materialized_columns("events"))
+        self.assertNotIn("$bar", get_materialized_columns("person"))
+        self.assertEqual(len(self._get_column_types("mat_$foo")), 2)
+
+        self.assertEqual(drop_deprecated_materialized_columns("events"), {"$foo": "mat_$foo"})
+        self.assertEqual(drop_deprecated_materialized_columns("person"), {"$bar": "pmat_$bar"})
+        self.assertEqual(
+            sync_execute(
+                "SELECT count() FROM system.columns WHERE database = %(database)s AND name IN ('mat_$foo', 'pmat_$bar')",
+                {"database": CLICKHOUSE_DATABASE},
+            ),
+            [(0,)],
+        )
+
+    def test_unused_columns_only_found_if_query_log_covers_period(self):
+        materialize("events", "$foo")
+        with freeze_time("2021-01-01T00:00:00Z"):
+            MaterializedColumnDecision.objects.create(
+                table="events",
+                property="$foo",
+                column_name="mat_$foo",
+                action=MaterializedColumnDecision.Action.MATERIALIZE,
+                is_automatic=True,
+            )
+
+        with patch("ee.clickhouse.materialized_columns.analyze.sync_execute", side_effect=[[("replica-2",)]]):
+            self.assertEqual(get_unused_columns("events", since_hours_ago=24), [])
+
+        with patch("ee.clickhouse.materialized_columns.analyze.sync_execute", side_effect=[[], []]):
+            self.assertEqual(get_unused_columns("events", since_hours_ago=24), [("$foo", "mat_$foo")])
+
+    def test_is_off_peak(self):
+        self.assertTrue(is_off_peak(0, "0-6"))
+        self.assertFalse(is_off_peak(6, "0-6"))
+        self.assertTrue(is_off_peak(23, "22-6"))
+        self.assertTrue(is_off_peak(3, "22-6"))
+        self.assertFalse(is_off_peak(12, "22-6"))
+
     def _count_materialized_rows(self, column):
         return sync_execute(
             """
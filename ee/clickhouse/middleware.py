@@ -3,7 +3,8 @@ from django.http import HttpRequest, HttpResponse
 from django.urls.base import resolve
 from loginas.utils import is_impersonated_session
 
-from posthog.internal_metrics import incr
+from posthog.internal_metrics import incr, timing
+from posthog.queries.query_build_cache import query_build_cache
 
 
 class CHQueries(object):
@@ -28,11 +29,18 @@ class CHQueries(object):
             "id": route_id,
         }
 
-        response: HttpResponse = self.get_response(request)
+        with query_build_cache() as profile:
+            response: HttpResponse = self.get_response(request)
 
         if "api/" in route_id and "capture" not in route_id:
             incr("http_api_request_response", tags={"id": route_id, "status_code": response.status_code})
 
+            if profile.clickhouse_queries > 0:
+                # How much of the request went into building queries and processing their results, vs ClickHouse
+                timing("http_api_request_python_time", profile.python_time * 1000, tags={"id": route_id})
+                timing("http_api_request_clickhouse_time", profile.clickhouse_time * 1000, tags={"id": route_id})
+                response["Server-Timing"] = profile.server_timing()
+
         client._request_information = None
 
         return response
@@ -0,0 +1,27 @@
+from infi.clickhouse_orm import migrations
+
+from ee.clickhouse.sql.session_recording_events import (
+    BACKFILL_SESSION_RECORDING_METADATA_SQL,
+    DISTRIBUTED_SESSION_RECORDING_METADATA_TABLE_SQL,
+    SESSION_RECORDING_METADATA_MV_SQL,
+    SESSION_RECORDING_METADATA_TABLE_SQL,
+)
+from posthog.client import sync_execute
+from posthog.settings import CLICKHOUSE_REPLICATION
+
+
+def create_and_backfill_session_recording_metadata(database):
+    # Taken from ClickHouse rather than this process, so that it compares against the same clock as `_timestamp`. Goes
+    # back an hour to also cover snapshots that spent a while in kafka before getting inserted.
+    cutoff = sync_execute("SELECT now() - INTERVAL 1 HOUR")[0][0]
+    sync_execute(SESSION_RECORDING_METADATA_MV_SQL())
+    sync_execute(BACKFILL_SESSION_RECORDING_METADATA_SQL(), {"cutoff": cutoff})
+
+
+operations = [
+    migrations.RunSQL(SESSION_RECORDING_METADATA_TABLE_SQL()),
+    migrations.RunPython(create_and_backfill_session_recording_metadata),
+]
+
+if CLICKHOUSE_REPLICATION:
+    operations = [migrations.RunSQL(DISTRIBUTED_SESSION_RECORDING_METADATA_TABLE_SQL())] + operations
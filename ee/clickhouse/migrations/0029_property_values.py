@@ -0,0 +1,39 @@
+from infi.clickhouse_orm import migrations
+
+from ee.clickhouse.sql.property_values import (
+    BACKFILL_EVENT_PROPERTY_VALUES_SQL,
+    DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL,
+    EVENT_PROPERTY_VALUES_MV_SQL,
+    GROUP_PROPERTY_VALUES_MV_SQL,
+    PERSON_PROPERTY_VALUES_MV_SQL,
+    PROPERTY_VALUES_TABLE_SQL,
+    UNINDEXED_PROPERTY_KEYS_TABLE_SQL,
+)
+from ee.tasks.property_values import PROPERTY_VALUES_INSERT_SETTINGS, reindex_person_and_group_property_values
+from posthog.client import sync_execute
+from posthog.settings import CLICKHOUSE_REPLICATION
+
+
+def create_and_backfill_property_values(database):
+    # The views have to exist before the backfill runs, otherwise rows written in between are never indexed. Rows
+    # counted by both get merged by uniqState, so the backfill doesn't need a cutoff.
+    for mv_sql in [EVENT_PROPERTY_VALUES_MV_SQL, PERSON_PROPERTY_VALUES_MV_SQL, GROUP_PROPERTY_VALUES_MV_SQL]:
+        sync_execute(mv_sql())
+
+    # Values of events are only suggested from the last week, backfilled a day at a time
+    for days_ago in range(8):
+        sync_execute(
+            BACKFILL_EVENT_PROPERTY_VALUES_SQL(f"AND toDate(timestamp) = today() - {days_ago}"),
+            settings=PROPERTY_VALUES_INSERT_SETTINGS,
+        )
+    reindex_person_and_group_property_values()
+
+
+operations = [
+    migrations.RunSQL(PROPERTY_VALUES_TABLE_SQL()),
+    migrations.RunSQL(UNINDEXED_PROPERTY_KEYS_TABLE_SQL()),
+    migrations.RunPython(create_and_backfill_property_values),
+]
+
+if CLICKHOUSE_REPLICATION:
+    operations = [migrations.RunSQL(DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL())] + operations
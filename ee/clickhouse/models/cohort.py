@@ -1,6 +1,16 @@
 import uuid
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import structlog
 from dateutil import parser
@@ -8,16 +18,21 @@ from django.conf import settings
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
+from ee.clickhouse.models.cohort_incremental import IncrementalCohortCalculation
 from ee.clickhouse.sql.cohort import (
     CALCULATE_COHORT_PEOPLE_SQL,
     GET_COHORT_SIZE_SQL,
     GET_COHORTS_BY_PERSON_UUID,
+    GET_COHORTS_MEMBERSHIPS_BY_BEHAVIOR_SQL,
+    GET_COHORTS_SIZES_SQL,
     GET_DISTINCT_ID_BY_ENTITY_SQL,
     GET_PERSON_ID_BY_ENTITY_COUNT_SQL,
     GET_PERSON_ID_BY_PRECALCULATED_COHORT_ID,
     GET_STATIC_COHORTPEOPLE_BY_PERSON_UUID,
     INSERT_PEOPLE_MATCHING_COHORT_ID_SQL,
+    INSERT_PEOPLE_MATCHING_COHORTS_SQL,
     REMOVE_PEOPLE_NOT_MATCHING_COHORT_ID_SQL,
+    REMOVE_PEOPLE_NOT_MATCHING_COHORTS_SQL,
 )
 from ee.clickhouse.sql.person import (
     GET_LATEST_PERSON_ID_SQL,
@@ -25,13 +40,16 @@ from ee.clickhouse.sql.person import (
     INSERT_PERSON_STATIC_COHORT,
     PERSON_STATIC_COHORT_TABLE,
 )
-from posthog.client import sync_execute
+from posthog.client import STREAMING_BLOCK_SIZE, sync_execute, sync_execute_iter
 from posthog.constants import PropertyOperatorType
 from posthog.models import Action, Cohort, Filter, Team
 from posthog.models.action.util import format_action_filter
 from posthog.models.property import Property, PropertyGroup
 from posthog.queries.person_distinct_id_query import get_team_distinct_ids_query
 
+if TYPE_CHECKING:  # Avoid circular import
+    from ee.clickhouse.queries.cohort_query import BehaviorQueryParts
+
 # temporary marker to denote when cohortpeople table started being populated
 TEMP_PRECALCULATED_MARKER = parser.parse("2021-06-07T15:00:00+00:00")
 
@@ -303,6 +321,24 @@ def format_cohort_subquery(
 
 
 def get_person_ids_by_cohort_id(team: Team, cohort_id: int, limit: Optional[int] = None, offset: Optional[int] = None):
+    query, params = _person_ids_by_cohort_id_query(team, cohort_id, limit, offset)
+    results = sync_execute(query, params)
+
+    return [str(row[0]) for row in results]
+
+
+def stream_person_ids_by_cohort_id(
+    team: Team, cohort_id: int, block_size: int = STREAMING_BLOCK_SIZE
+) -> Iterator[List[str]]:
+    "Person ids of a cohort in lists of up to `block_size`, without holding all of them in memory"
+    query, params = _person_ids_by_cohort_id_query(team, cohort_id)
+    for rows in sync_execute_iter(query, params, block_size=block_size):
+        yield [str(row[0]) for row in rows]
+
+
+def _person_ids_by_cohort_id_query(
+    team: Team, cohort_id: int, limit: Optional[int] = None, offset: Optional[int] = None
+) -> Tuple[str, Dict[str, Any]]:
     from ee.clickhouse.models.property import parse_prop_grouped_clauses
 
     filters = Filter(data={"properties": [{"key": "id", "value": cohort_id, "type": "cohort"}],})
@@ -310,18 +346,14 @@ def get_person_ids_by_cohort_id(team: Team, cohort_id: int, limit: Optional[int]
         team_id=team.pk, property_group=filters.property_groups, table_name="pdi"
     )
 
-    results = sync_execute(
-        GET_PERSON_IDS_BY_FILTER.format(
-            distinct_query=filter_query,
-            query="",
-            GET_TEAM_PERSON_DISTINCT_IDS=get_team_distinct_ids_query(team.pk),
-            offset="OFFSET %(offset)s" if offset else "",
-            limit="ORDER BY _timestamp ASC LIMIT %(limit)s" if limit else "",
-        ),
-        {**filter_params, "team_id": team.pk, "offset": offset, "limit": limit},
+    query = GET_PERSON_IDS_BY_FILTER.format(
+        distinct_query=filter_query,
+        query="",
+        GET_TEAM_PERSON_DISTINCT_IDS=get_team_distinct_ids_query(team.pk),
+        offset="OFFSET %(offset)s" if offset else "",
+        limit="ORDER BY _timestamp ASC LIMIT %(limit)s" if limit else "",
     )
-
-    return [str(row[0]) for row in results]
+    return query, {**filter_params, "team_id": team.pk, "offset": offset, "limit": limit}
 
 
 def insert_static_cohort(person_uuids: List[Optional[uuid.UUID]], cohort_id: int, team: Team):
@@ -356,7 +388,6 @@ def recalculate_cohortpeople_with_new_query(cohort: Cohort) -> Optional[int]:
 
 
 def recalculate_cohortpeople(cohort: Cohort) -> Optional[int]:
-
     # use the new query if
     # 1: testing
     # 2: behavioral cohort is a new type (even if new querying is disabled for team so that errors don't happen)
@@ -367,28 +398,49 @@ def recalculate_cohortpeople(cohort: Cohort) -> Optional[int]:
     cohort_filter, cohort_params = format_person_query(
         cohort, 0, custom_match_field="id", using_new_query=should_use_new_query
     )
-
-    before_count = sync_execute(GET_COHORT_SIZE_SQL, {"cohort_id": cohort.pk, "team_id": cohort.team_id})
-    logger.info(
-        "Recalculating cohortpeople starting",
-        team_id=cohort.team_id,
-        cohort_id=cohort.pk,
-        size_before=before_count[0][0],
-    )
+    params = {**cohort_params, "cohort_id": cohort.pk, "team_id": cohort.team_id}
+
+    calculated_at = timezone.now()
+    incremental_calculation = IncrementalCohortCalculation.for_cohort(cohort)
+    candidates_filter = ""
+    size_before: Optional[int] = None
+    if incremental_calculation is not None and incremental_calculation.watermark is not None:
+        # Only re-evaluate persons whose membership may have changed since the last calculation
+        candidates_query, candidates_params = incremental_calculation.get_candidates_query(calculated_at)
+        candidates_filter = f"AND id IN ({candidates_query})"
+        params = {**params, **candidates_params}
+        logger.info(
+            "Recalculating cohortpeople incrementally starting",
+            team_id=cohort.team_id,
+            cohort_id=cohort.pk,
+            watermark=incremental_calculation.watermark,
+        )
+    else:
+        size_before = sync_execute(GET_COHORT_SIZE_SQL, {"cohort_id": cohort.pk, "team_id": cohort.team_id})[0][0]
+        logger.info(
+            "Recalculating cohortpeople starting", team_id=cohort.team_id, cohort_id=cohort.pk, size_before=size_before,
+        )
 
     cohort_filter = GET_PERSON_IDS_BY_FILTER.format(
-        distinct_query="AND " + cohort_filter,
+        distinct_query=f"{candidates_filter} AND {cohort_filter}",
         query="",
         offset="",
         limit="",
         GET_TEAM_PERSON_DISTINCT_IDS=get_team_distinct_ids_query(cohort.team_id),
     )
 
-    insert_cohortpeople_sql = INSERT_PEOPLE_MATCHING_COHORT_ID_SQL.format(cohort_filter=cohort_filter)
-    sync_execute(insert_cohortpeople_sql, {**cohort_params, "cohort_id": cohort.pk, "team_id": cohort.team_id})
+    insert_cohortpeople_sql = INSERT_PEOPLE_MATCHING_COHORT_ID_SQL.format(
+        cohort_filter=cohort_filter, candidates_filter=candidates_filter
+    )
+    sync_execute(insert_cohortpeople_sql, params)
 
-    remove_cohortpeople_sql = REMOVE_PEOPLE_NOT_MATCHING_COHORT_ID_SQL.format(cohort_filter=cohort_filter)
-    sync_execute(remove_cohortpeople_sql, {**cohort_params, "cohort_id": cohort.pk, "team_id": cohort.team_id})
+    remove_cohortpeople_sql = REMOVE_PEOPLE_NOT_MATCHING_COHORT_ID_SQL.format(
+        cohort_filter=cohort_filter, candidates_filter=candidates_filter
+    )
+    sync_execute(remove_cohortpeople_sql, params)
+
+    if incremental_calculation is not None:
+        incremental_calculation.store(calculated_at)
 
     count_result = sync_execute(GET_COHORT_SIZE_SQL, {"cohort_id": cohort.pk, "team_id": cohort.team_id})
 
@@ -399,14 +451,102 @@ def recalculate_cohortpeople(cohort: Cohort) -> Optional[int]:
             "Recalculating cohortpeople done",
             team_id=cohort.team_id,
             cohort_id=cohort.pk,
-            size_before=before_count[0][0],
+            size_before=size_before,
             size=count,
+            incremental=bool(candidates_filter),
         )
         return count
 
     return None
 
 
+def get_cohort_behavior_query_parts(cohort: Cohort) -> Optional["BehaviorQueryParts"]:
+    "Returns the query parts of cohorts that can be recalculated together with others by `recalculate_cohortpeople_batch`"
+    from ee.clickhouse.queries.cohort_query import CohortQuery
+
+    if cohort.is_static or not cohort.properties.values:
+        return None
+    if not (settings.TEST or cohort.has_complex_behavioral_filter or cohort.team.behavioral_cohort_querying_enabled):
+        # Recalculated with the old query
+        return None
+    try:
+        return CohortQuery(
+            Filter(data={"properties": cohort.properties}), cohort.team, cohort_pk=cohort.pk
+        ).get_behavior_query_parts()
+    except ValueError:
+        # Invalid cohorts fail when recalculated on their own
+        return None
+
+
+def recalculate_cohortpeople_batch(team_id: int, cohorts: List[Cohort]) -> Dict[int, int]:
+    """
+    Recalculates the people of those cohorts of a team that only filter on events performed, scanning events once for
+    all of them rather than once per cohort. Returns the size of each recalculated cohort, other cohorts are left to
+    `recalculate_cohortpeople`.
+    """
+    from ee.clickhouse.queries.cohort_query import CohortQuery
+
+    calculated_at = timezone.now()
+    fields = [f"{CohortQuery.DISTINCT_ID_TABLE_ALIAS}.person_id AS person_id"]
+    events: List[str] = []
+    cohort_ids: List[int] = []
+    cohort_conditions: List[str] = []
+    date_conditions: List[str] = []
+    is_restricted_by_time = True
+    distinct_id_query = ""
+    params: Dict[str, Any] = {"team_id": team_id}
+    incremental_calculations: List[IncrementalCohortCalculation] = []
+    for cohort in cohorts:
+        parts = get_cohort_behavior_query_parts(cohort)
+        # Params aren't all named per cohort, e.g. `operator_value`, so cohorts disagreeing on one can't share a query
+        if parts is None or any(params.get(key, value) != value for key, value in parts.params.items()):
+            continue
+        incremental_calculation = IncrementalCohortCalculation.for_cohort(cohort)
+        if incremental_calculation is not None:
+            if incremental_calculation.watermark is not None:
+                # Recalculating incrementally on its own reads less than a full recalculation
+                continue
+            incremental_calculations.append(incremental_calculation)
+
+        cohort_ids.append(cohort.pk)
+        fields.extend(parts.fields)
+        events.extend(event for event in parts.events if event not in events)
+        cohort_conditions.append(f"if(1 = 1 {parts.conditions}, {int(cohort.pk)}, 0)")
+        distinct_id_query = parts.distinct_id_query
+        params.update(parts.params)
+        if parts.earliest_time is None:
+            is_restricted_by_time = False
+        else:
+            date_param = f"batch_earliest_time_{cohort.pk}"
+            date_conditions.append(f"timestamp >= now() - INTERVAL %({date_param})s {parts.earliest_time[1]}")
+            params[date_param] = parts.earliest_time[0]
+
+    if not cohort_ids:
+        return {}
+    params["batch_cohort_ids"] = cohort_ids
+    params["batch_event_ids"] = events
+
+    memberships_query = GET_COHORTS_MEMBERSHIPS_BY_BEHAVIOR_SQL.format(
+        cohort_conditions=", ".join(cohort_conditions),
+        fields=", ".join(fields),
+        event_table_alias=CohortQuery.EVENT_TABLE_ALIAS,
+        distinct_id_query=distinct_id_query,
+        date_condition=f"AND timestamp <= now() AND ({' OR '.join(date_conditions)})" if is_restricted_by_time else "",
+    )
+
+    logger.info("Recalculating cohortpeople of cohorts together starting", team_id=team_id, cohort_ids=cohort_ids)
+    sync_execute(INSERT_PEOPLE_MATCHING_COHORTS_SQL.format(memberships_query=memberships_query), params)
+    sync_execute(REMOVE_PEOPLE_NOT_MATCHING_COHORTS_SQL.format(memberships_query=memberships_query), params)
+
+    for incremental_calculation in incremental_calculations:
+        incremental_calculation.store(calculated_at)
+
+    sizes = {cohort_id: 0 for cohort_id in cohort_ids}
+    sizes.update(dict(sync_execute(GET_COHORTS_SIZES_SQL, params)))
+    logger.info("Recalculating cohortpeople of cohorts together done", team_id=team_id, sizes=sizes)
+    return sizes
+
+
 def simplified_cohort_filter_properties(cohort: Cohort, team: Team) -> PropertyGroup:
     """
     'Simplifies' cohort property filters, removing team-specific context from properties.
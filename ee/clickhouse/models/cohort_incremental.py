@@ -0,0 +1,129 @@
+"""
+Incremental recalculation of cohortpeople.
+
+Rebuilding the people of a cohort evaluates its filter for every person of the team, even if only a handful of them
+changed since the last calculation. Instead, only candidates, persons whose membership may have changed since the
+watermark of the last calculation, get re-evaluated:
+
+- Persons whose `person` or `person_distinct_id2` rows were written since the watermark, which covers cohorts that
+  only filter on person properties.
+- For cohorts that also filter on events performed within the last N days, persons with events since the watermark and
+  persons with events sliding out of each window, i.e. from N days before the watermark up to N days before now.
+  These are picked by event `timestamp`, so that only the partitions of these slices get read.
+
+Events ingested late with timestamps before the watermark, and changes to other cohorts this one depends on, aren't
+picked up incrementally. So cohorts are fully rebuilt every `COHORT_FULL_RECALCULATION_INTERVAL_SECONDS`, as well as
+whenever their definition changes. Cohorts with any other kind of filter are always fully rebuilt.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from statshog.defaults.django import statsd
+
+from ee.clickhouse.sql.cohort import GET_PERSON_IDS_CHANGED_SINCE_SQL, GET_PERSON_IDS_WITH_EVENTS_IN_SLICES_SQL
+from posthog.models import Cohort
+from posthog.models.property import BehavioralPropertyType
+from posthog.queries.person_distinct_id_query import get_team_distinct_ids_query
+from posthog.utils import generate_cache_key, get_safe_cache
+
+# Rows written shortly before a calculation may only reach ClickHouse after it, so consecutive calculations overlap
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+INCREMENTAL_BEHAVIORAL_TYPES = [BehavioralPropertyType.PERFORMED_EVENT, BehavioralPropertyType.PERFORMED_EVENT_MULTIPLE]
+
+
+class IncrementalCohortCalculation:
+    """
+    Watermark of the last calculation of a cohort. If `watermark` is set, restrict the persons to re-evaluate to the
+    ones of `get_candidates_query`, otherwise rebuild fully. Either way, call `store` once done.
+    """
+
+    def __init__(self, cohort: Cohort, windows: List[relativedelta]):
+        self._cohort = cohort
+        self._windows = windows
+        self._cache_key = f"cohort_incremental_{cohort.pk}"
+        self._definition = generate_cache_key(f"{cohort.groups}_{cohort.filters}")
+        self.watermark: Optional[datetime] = None
+        self._full_calculated_at: Optional[datetime] = None
+
+        cached: Optional[Dict[str, Any]] = get_safe_cache(self._cache_key)
+        if cached is not None and cached["definition"] == self._definition:
+            self.watermark = cached["watermark"]
+            self._full_calculated_at = cached["full_calculated_at"]
+        statsd.incr("cohort_incremental_calculation", tags={"incremental": self.watermark is not None})
+
+    @classmethod
+    def for_cohort(cls, cohort: Cohort) -> Optional["IncrementalCohortCalculation"]:
+        if not settings.COHORT_INCREMENTAL_RECALCULATION_ENABLED or cohort.is_static:
+            return None
+        windows = get_behavioral_windows(cohort)
+        if windows is None:
+            return None
+        return cls(cohort, windows)
+
+    def get_candidates_query(self, calculated_at: datetime) -> Tuple[str, Dict[str, Any]]:
+        "Query of the ids of persons to re-evaluate for a calculation starting at `calculated_at`"
+        assert self.watermark is not None
+
+        queries = [GET_PERSON_IDS_CHANGED_SINCE_SQL]
+        params = {"watermark": _format_timestamp(self.watermark)}
+        if self._windows:
+            slices = ["timestamp >= %(watermark)s"]
+            for index, window in enumerate(self._windows):
+                slices.append(f"(timestamp >= %(slice_start_{index})s AND timestamp < %(slice_end_{index})s)")
+                params[f"slice_start_{index}"] = _format_timestamp(self.watermark - window)
+                params[f"slice_end_{index}"] = _format_timestamp(calculated_at - window)
+            queries.append(
+                GET_PERSON_IDS_WITH_EVENTS_IN_SLICES_SQL.format(
+                    slices=" OR ".join(slices),
+                    GET_TEAM_PERSON_DISTINCT_IDS=get_team_distinct_ids_query(self._cohort.team_id),
+                )
+            )
+        return "UNION ALL".join(queries), params
+
+    def store(self, calculated_at: datetime) -> None:
+        full_calculated_at = self._full_calculated_at or calculated_at
+        expires_at = full_calculated_at + timedelta(seconds=settings.COHORT_FULL_RECALCULATION_INTERVAL_SECONDS)
+        timeout = int((expires_at - calculated_at).total_seconds())
+        if timeout <= 0:
+            # Due for a full rebuild
+            cache.delete(self._cache_key)
+            return
+        cache.set(
+            self._cache_key,
+            {
+                "definition": self._definition,
+                "watermark": calculated_at - WATERMARK_OVERLAP,
+                "full_calculated_at": full_calculated_at,
+            },
+            timeout,
+        )
+
+
+def get_behavioral_windows(cohort: Cohort) -> Optional[List[relativedelta]]:
+    """
+    Returns the distinct time windows of the performed event filters of the cohort, or None if it has filters that
+    can't be recalculated incrementally.
+    """
+    windows: List[relativedelta] = []
+    for prop in cohort.properties.flat:
+        if prop.type == "person":
+            continue
+        if prop.type != "behavioral" or prop.value not in INCREMENTAL_BEHAVIORAL_TYPES:
+            return None
+        if prop.time_interval not in ("minute", "hour", "day", "week", "month", "year"):
+            return None
+        try:
+            window = relativedelta(**{f"{prop.time_interval}s": int(prop.time_value)})  # type: ignore
+        except (TypeError, ValueError):
+            return None
+        if window not in windows:
+            windows.append(window)
+    return windows
+
+
+def _format_timestamp(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m-%d %H:%M:%S")
@@ -172,11 +172,9 @@ class ClickhouseEventSerializer(serializers.Serializer):
 
         person = self.context["people"][event[5]]
         return {
-            "is_identified": person.is_identified,
-            "distinct_ids": person.distinct_ids[:1],  # only send the first one to avoid a payload bloat
-            "properties": {
-                key: person.properties[key] for key in ["email", "name", "username"] if key in person.properties
-            },
+            "is_identified": person["is_identified"],
+            "distinct_ids": person["distinct_ids"],
+            "properties": person["properties"],
         }
 
     def get_elements(self, event):
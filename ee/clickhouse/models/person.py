@@ -4,6 +4,7 @@ from contextlib import ExitStack
 from typing import Dict, List, Optional, Union
 from uuid import UUID
 
+from django.conf import settings
 from django.db.models.query import QuerySet
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
@@ -21,12 +22,28 @@ from ee.clickhouse.sql.person import (
 )
 from ee.kafka_client.client import ClickhouseProducer
 from ee.kafka_client.topics import KAFKA_PERSON, KAFKA_PERSON_DISTINCT_ID, KAFKA_PERSON_UNIQUE_ID
+from posthog.caching.person_summary_cache import invalidate_person_summaries
 from posthog.client import sync_execute
 from posthog.models.person import Person, PersonDistinctId
 from posthog.models.team import Team
 from posthog.models.utils import UUIDT
 from posthog.settings import TEST
 
+
+@receiver(post_save, sender=Person)
+def person_summary_changed(sender, instance: Person, **kwargs):
+    if settings.PERSON_SUMMARY_CACHE_ENABLED:
+        invalidate_person_summaries(instance.team_id, instance.distinct_ids)
+
+
+@receiver(post_save, sender=PersonDistinctId)
+@receiver(post_delete, sender=PersonDistinctId)
+def person_distinct_id_changed(sender, instance: PersonDistinctId, **kwargs):
+    # Covers distinct ids moving to another person on a split, and persons getting deleted
+    if settings.PERSON_SUMMARY_CACHE_ENABLED:
+        invalidate_person_summaries(instance.team_id, [instance.distinct_id])
+
+
 if TEST:
     # :KLUDGE: Hooks are kept around for tests. All other code goes through plugin-server or the other methods explicitly
 
@@ -91,7 +108,6 @@ def create_person(
     team_id: int,
     uuid: Optional[str] = None,
     properties: Optional[Dict] = {},
-    sync: bool = False,
     is_identified: bool = False,
     timestamp: Optional[datetime.datetime] = None,
 ) -> str:
@@ -111,7 +127,7 @@ def create_person(
         "_timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
     }
     p = ClickhouseProducer()
-    p.produce(topic=KAFKA_PERSON, sql=INSERT_PERSON_SQL, data=data, sync=sync)
+    p.produce(topic=KAFKA_PERSON, sql=INSERT_PERSON_SQL, data=data)
     return uuid
 
 
@@ -39,6 +39,7 @@ from posthog.models.property import (
 )
 from posthog.models.utils import PersonPropertiesMode
 from posthog.queries.person_distinct_id_query import get_team_distinct_ids_query
+from posthog.queries.query_build_cache import memoize, stable_hash
 from posthog.utils import is_valid_regex
 
 # Property Groups Example:
@@ -69,16 +70,59 @@ def parse_prop_grouped_clauses(
     group_properties_joined: bool = True,
     _top_level: bool = True,
 ) -> Tuple[str, Dict]:
-
     if not property_group or len(property_group.values) == 0:
         return "", {}
 
+    # Funnels and actions generate the same clauses over and over, so they're memoized for the current request
+    clause, params = memoize(
+        lambda: (
+            "property_clauses",
+            team_id,
+            stable_hash(property_group),
+            prepend,
+            table_name,
+            allow_denormalized_props,
+            has_person_id_joined,
+            person_properties_mode,
+            person_id_joined_alias,
+            group_properties_joined,
+            _top_level,
+        ),
+        lambda: _parse_prop_grouped_clauses(
+            team_id=team_id,
+            property_group=property_group,
+            prepend=prepend,
+            table_name=table_name,
+            allow_denormalized_props=allow_denormalized_props,
+            has_person_id_joined=has_person_id_joined,
+            person_properties_mode=person_properties_mode,
+            person_id_joined_alias=person_id_joined_alias,
+            group_properties_joined=group_properties_joined,
+            _top_level=_top_level,
+        ),
+    )
+    return clause, dict(params)
+
+
+def _parse_prop_grouped_clauses(
+    team_id: int,
+    property_group: PropertyGroup,
+    prepend: str,
+    table_name: str,
+    allow_denormalized_props: bool,
+    has_person_id_joined: bool,
+    person_properties_mode: PersonPropertiesMode,
+    person_id_joined_alias: str,
+    group_properties_joined: bool,
+    _top_level: bool,
+) -> Tuple[str, Dict]:
+
     if isinstance(property_group.values[0], PropertyGroup):
         group_clauses = []
         final_params = {}
         for idx, group in enumerate(property_group.values):
-            if isinstance(group, PropertyGroup):
-                clause, params = parse_prop_grouped_clauses(
+            if isinstance(group, PropertyGroup) and len(group.values) > 0:
+                clause, params = _parse_prop_grouped_clauses(
                     team_id=team_id,
                     property_group=group,
                     prepend=f"{prepend}_{idx}",
@@ -1,6 +1,9 @@
 from datetime import datetime, timedelta
 from unittest.mock import patch
+from uuid import UUID
 
+from django.core.cache import cache
+from django.test import override_settings
 from django.utils import timezone
 from freezegun import freeze_time
 
@@ -8,10 +11,14 @@ from ee.clickhouse.models.cohort import (
     format_filter_query,
     get_person_ids_by_cohort_id,
     recalculate_cohortpeople,
+    recalculate_cohortpeople_batch,
     recalculate_cohortpeople_with_new_query,
 )
+from ee.clickhouse.models.cohort_incremental import IncrementalCohortCalculation, get_behavioral_windows
 from ee.clickhouse.models.person import create_person, create_person_distinct_id
 from ee.clickhouse.models.property import parse_prop_grouped_clauses
+from ee.clickhouse.sql.cohort import GET_COHORTPEOPLE_BY_COHORT_ID
+from ee.clickhouse.sql.person import BULK_INSERT_PERSON_DISTINCT_ID2, INSERT_PERSON_DISTINCT_ID
 from ee.clickhouse.util import ClickhouseTestMixin
 from posthog.client import sync_execute
 from posthog.models.action import Action
@@ -929,3 +936,166 @@ class TestCohort(ClickhouseTestMixin, BaseTest):
         new_count = recalculate_cohortpeople_with_new_query(cohort2)
 
         self.assertEqual(count, new_count)
+
+    def _cohort_person_ids(self, cohort: Cohort):
+        return [
+            row[0]
+            for row in sync_execute(GET_COHORTPEOPLE_BY_COHORT_ID, {"team_id": self.team.pk, "cohort_id": cohort.pk})
+        ]
+
+    @override_settings(COHORT_INCREMENTAL_RECALCULATION_ENABLED=True)
+    def test_incremental_recalculation_of_person_properties(self):
+        cache.clear()
+        p1 = Person.objects.create(team_id=self.team.pk, distinct_ids=["1"], properties={"foo": "bar"})
+        p2 = Person.objects.create(team_id=self.team.pk, distinct_ids=["2"], properties={"foo": "non"})
+        cohort = Cohort.objects.create(
+            team=self.team, groups=[{"properties": [{"key": "foo", "value": "bar", "type": "person"}]}], name="cohort",
+        )
+
+        with freeze_time("2021-01-01T12:00:00Z"):
+            self.assertEqual(recalculate_cohortpeople(cohort), 1)
+
+        with freeze_time("2021-01-01T12:15:00Z"):
+            p1.properties = {"foo": "non"}
+            p1.save()
+            p2.properties = {"foo": "bar"}
+            p2.save()
+
+            with patch.object(
+                IncrementalCohortCalculation,
+                "get_candidates_query",
+                autospec=True,
+                side_effect=IncrementalCohortCalculation.get_candidates_query,
+            ) as get_candidates_query:
+                self.assertEqual(recalculate_cohortpeople(cohort), 1)
+
+            get_candidates_query.assert_called_once()
+            self.assertEqual(self._cohort_person_ids(cohort), [p2.uuid])
+
+    @override_settings(COHORT_INCREMENTAL_RECALCULATION_ENABLED=True)
+    def test_incremental_recalculation_of_events_sliding_out_of_window(self):
+        cache.clear()
+        cohort = Cohort.objects.create(
+            team=self.team,
+            filters={
+                "properties": {
+                    "type": "OR",
+                    "values": [
+                        {
+                            "key": "$pageview",
+                            "event_type": "events",
+                            "time_value": 1,
+                            "time_interval": "day",
+                            "value": "performed_event",
+                            "type": "behavioral",
+                        }
+                    ],
+                }
+            },
+            name="cohort",
+        )
+        now = timezone.now()
+        # Persons that haven't changed since the last calculation three hours ago
+        written_at = (now - timedelta(days=2)).strftime("%Y-%m-%d %H:%M:%S")
+        person_ids = []
+        for distinct_id in ["1", "2", "3"]:
+            person_id = create_person(team_id=self.team.pk, timestamp=now - timedelta(days=2))
+            sync_execute(
+                INSERT_PERSON_DISTINCT_ID,
+                {"distinct_id": distinct_id, "person_id": person_id, "team_id": self.team.pk, "_sign": 1},
+            )
+            sync_execute(
+                BULK_INSERT_PERSON_DISTINCT_ID2
+                + f"('{distinct_id}', '{person_id}', {self.team.pk}, 0, 0, '{written_at}', 0, 0)"
+            )
+            person_ids.append(UUID(person_id))
+        IncrementalCohortCalculation.for_cohort(cohort).store(now - timedelta(hours=3))  # type: ignore
+
+        # Was in the window three hours ago, isn't anymore
+        _create_event(team=self.team, event="$pageview", distinct_id="1", timestamp=now - timedelta(days=1, hours=1))
+        # Performed the event since
+        _create_event(team=self.team, event="$pageview", distinct_id="2", timestamp=now - timedelta(minutes=30))
+        # Wasn't in the window three hours ago either, so isn't re-evaluated until the next full recalculation
+        _create_event(team=self.team, event="$pageview", distinct_id="3", timestamp=now - timedelta(days=2))
+        sync_execute(
+            f"INSERT INTO cohortpeople (person_id, cohort_id, team_id, sign) VALUES "
+            f"('{person_ids[0]}', {cohort.pk}, {self.team.pk}, 1), ('{person_ids[2]}', {cohort.pk}, {self.team.pk}, 1)"
+        )
+
+        self.assertEqual(recalculate_cohortpeople(cohort), 2)
+        self.assertCountEqual(self._cohort_person_ids(cohort), [person_ids[1], person_ids[2]])
+
+    @override_settings(COHORT_INCREMENTAL_RECALCULATION_ENABLED=True)
+    def test_full_recalculation_when_definition_changes_or_cohort_is_due(self):
+        cache.clear()
+        cohort = Cohort.objects.create(
+            team=self.team, groups=[{"properties": [{"key": "foo", "value": "bar", "type": "person"}]}], name="cohort",
+        )
+
+        with freeze_time("2021-01-01T12:00:00Z"):
+            recalculate_cohortpeople(cohort)
+            self.assertIsNotNone(IncrementalCohortCalculation.for_cohort(cohort).watermark)  # type: ignore
+
+            cohort.groups = [{"properties": [{"key": "foo", "value": "other", "type": "person"}]}]
+            self.assertIsNone(IncrementalCohortCalculation.for_cohort(cohort).watermark)  # type: ignore
+
+        with freeze_time("2021-01-02T12:00:00Z"):
+            # Due for a full recalculation
+            self.assertIsNone(IncrementalCohortCalculation.for_cohort(cohort).watermark)  # type: ignore
+
+    def test_incremental_recalculation_is_not_used_for_other_filters(self):
+        cohort = Cohort.objects.create(
+            team=self.team, groups=[{"properties": [{"key": "id", "type": "cohort", "value": 1}]}], name="cohort",
+        )
+
+        self.assertIsNone(get_behavioral_windows(cohort))
+
+    def test_recalculate_cohortpeople_batch(self):
+        p1 = Person.objects.create(team_id=self.team.pk, distinct_ids=["1"], properties={"foo": "bar"})
+        p2 = Person.objects.create(team_id=self.team.pk, distinct_ids=["2"])
+        Person.objects.create(team_id=self.team.pk, distinct_ids=["3"])
+        now = timezone.now()
+        _create_event(team=self.team, event="$pageview", distinct_id="1", timestamp=now - timedelta(hours=1))
+        _create_event(team=self.team, event="$pageview", distinct_id="2", timestamp=now - timedelta(days=3))
+        _create_event(team=self.team, event="signup", distinct_id="2", timestamp=now - timedelta(days=3))
+        _create_event(team=self.team, event="signup", distinct_id="3", timestamp=now - timedelta(days=30))
+
+        def performed_event_cohort(event: str, days: int) -> Cohort:
+            return Cohort.objects.create(
+                team=self.team,
+                filters={
+                    "properties": {
+                        "type": "OR",
+                        "values": [
+                            {
+                                "key": event,
+                                "event_type": "events",
+                                "time_value": days,
+                                "time_interval": "day",
+                                "value": "performed_event",
+                                "type": "behavioral",
+                            }
+                        ],
+                    }
+                },
+                name=f"performed {event}",
+            )
+
+        pageview_cohort = performed_event_cohort("$pageview", 1)
+        signup_cohort = performed_event_cohort("signup", 7)
+        person_cohort = Cohort.objects.create(
+            team=self.team, groups=[{"properties": [{"key": "foo", "value": "bar", "type": "person"}]}], name="person",
+        )
+        # Left over from a previous calculation
+        sync_execute(
+            f"INSERT INTO cohortpeople (person_id, cohort_id, team_id, sign) VALUES "
+            f"('{p2.uuid}', {pageview_cohort.pk}, {self.team.pk}, 1)"
+        )
+
+        counts = recalculate_cohortpeople_batch(self.team.pk, [pageview_cohort, signup_cohort, person_cohort])
+
+        self.assertEqual(counts, {pageview_cohort.pk: 1, signup_cohort.pk: 1})
+        self.assertEqual(self._cohort_person_ids(pageview_cohort), [p1.uuid])
+        self.assertEqual(self._cohort_person_ids(signup_cohort), [p2.uuid])
+        self.assertEqual(self._cohort_person_ids(person_cohort), [])
+        self.assertEqual(recalculate_cohortpeople(signup_cohort), 1)
@@ -13,6 +13,7 @@ from typing import (
     cast,
 )
 
+from django.db.models import Prefetch
 from django.db.models.query import QuerySet
 
 from posthog.client import sync_execute
@@ -183,7 +184,9 @@ def get_groups(
 
 def get_people(team_id: int, people_ids: List[Any]) -> Tuple[QuerySet[Person], List[SerializedPerson]]:
     """ Get people from raw SQL results in data model and dict formats """
-    persons: QuerySet[Person] = Person.objects.filter(team_id=team_id, uuid__in=people_ids)
+    persons: QuerySet[Person] = Person.objects.filter(team_id=team_id, uuid__in=people_ids).prefetch_related(
+        Prefetch("persondistinctid_set", to_attr="distinct_ids_cache")
+    )
     return persons, serialize_people(persons)
 
 
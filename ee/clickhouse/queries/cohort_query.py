@@ -1,4 +1,13 @@
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from typing import (
+    Any,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from ee.clickhouse.materialized_columns.columns import ColumnName
 from ee.clickhouse.models.cohort import format_filter_query, get_count_operator, get_entity_query
@@ -14,6 +23,17 @@ Relative_Date = Tuple[int, OperatorInterval]
 Event = Tuple[str, Union[str, int]]
 
 
+class BehaviorQueryParts(NamedTuple):
+    "Parts of the query of a cohort that only filters on events performed, see `CohortQuery.get_behavior_query_parts`"
+    fields: List[str]
+    events: List[str]
+    # None if events aren't restricted by time
+    earliest_time: Optional[Relative_Date]
+    distinct_id_query: str
+    conditions: str
+    params: Dict[str, Any]
+
+
 INTERVAL_TO_SECONDS = {
     "minute": 60,
     "hour": 3600,
@@ -199,6 +219,29 @@ class CohortQuery(EnterpriseEventQuery):
 
         return final_query, self.params
 
+    def get_behavior_query_parts(self) -> Optional[BehaviorQueryParts]:
+        """
+        For cohorts whose filters all get evaluated on the behavior subquery, returns its parts, so that the
+        subqueries of several cohorts can be evaluated in one scan over events. Returns None for other cohorts.
+        """
+        if (
+            not self._outer_property_groups
+            or self._should_join_persons
+            or not self._should_join_behavioral_query
+            or self.sequence_filters_to_query
+        ):
+            return None
+
+        conditions, condition_params = self._get_conditions()
+        return BehaviorQueryParts(
+            fields=self._fields,
+            events=self._events,
+            earliest_time=self._earliest_time_for_event_query if self._restrict_event_query_by_time else None,
+            distinct_id_query=self._get_distinct_id_query(),
+            conditions=conditions,
+            params={**self.params, **condition_params},
+        )
+
     def _build_sources(self, subq: List[Tuple[str, str]]) -> Tuple[str, str]:
         q = ""
         filtered_queries = [(q, alias) for (q, alias) in subq if q and len(q)]
@@ -18,6 +18,8 @@ from ee.clickhouse.queries.funnels.funnel_event_query import FunnelEventQuery
 from ee.clickhouse.sql.funnels.funnel import FUNNEL_INNER_EVENT_STEPS_QUERY
 from posthog.client import sync_execute
 from posthog.constants import (
+    FUNNEL_STEP,
+    FUNNEL_STEP_BREAKDOWN,
     FUNNEL_WINDOW_INTERVAL,
     FUNNEL_WINDOW_INTERVAL_UNIT,
     LIMIT,
@@ -165,6 +167,14 @@ class ClickhouseFunnelBase(ABC):
         steps = []
         total_people = 0
 
+        # People URLs of all steps only differ in the funnel step, so build the filter for them just once
+        people_filter_data: Dict[str, Any] = {FUNNEL_STEP: 1}
+        if with_breakdown:
+            # important to not try and modify this value any how - as these
+            # are keys for fetching persons
+            people_filter_data[FUNNEL_STEP_BREAKDOWN] = results[-1]
+        people_params = self._filter.with_data(people_filter_data).to_params()
+
         for step in reversed(self._filter.entities):
 
             if results and len(results) > 0:
@@ -181,26 +191,20 @@ class ClickhouseFunnelBase(ABC):
             else:
                 serialized_result.update({"average_conversion_time": None, "median_conversion_time": None})
 
-            # Construct converted and dropped people URLs
-            funnel_step = step.index + 1
-            converted_people_filter = self._filter.with_data({"funnel_step": funnel_step})
-            dropped_people_filter = self._filter.with_data({"funnel_step": -funnel_step})
-
             if with_breakdown:
                 breakdown = results[-1]
                 serialized_result.update({"breakdown": breakdown, "breakdown_value": breakdown})
-                # important to not try and modify this value any how - as these
-                # are keys for fetching persons
 
-                # Add in the breakdown to people urls as well
-                converted_people_filter = converted_people_filter.with_data({"funnel_step_breakdown": breakdown})
-                dropped_people_filter = dropped_people_filter.with_data({"funnel_step_breakdown": breakdown})
+            # Construct converted and dropped people URLs
+            funnel_step = step.index + 1
+            converted_people_params = {**people_params, FUNNEL_STEP: funnel_step}
+            dropped_people_params = {**people_params, FUNNEL_STEP: -funnel_step}
 
             serialized_result.update(
                 {
-                    "converted_people_url": f"{self._base_uri}api/person/funnel/?{urllib.parse.urlencode(converted_people_filter.to_params())}",
+                    "converted_people_url": f"{self._base_uri}api/person/funnel/?{urllib.parse.urlencode(converted_people_params)}",
                     "dropped_people_url": (
-                        f"{self._base_uri}api/person/funnel/?{urllib.parse.urlencode(dropped_people_filter.to_params())}"
+                        f"{self._base_uri}api/person/funnel/?{urllib.parse.urlencode(dropped_people_params)}"
                         # NOTE: If we are looking at the first step, there is no drop off,
                         # everyone converted, otherwise they would not have been
                         # included in the funnel.
@@ -1,43 +1,89 @@
-from typing import Optional
-
-from django.utils import timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 from ee.clickhouse.models.property import get_property_string_expr
-from ee.clickhouse.sql.events import SELECT_PROP_VALUES_SQL, SELECT_PROP_VALUES_SQL_WITH_FILTER
-from ee.clickhouse.sql.person import SELECT_PERSON_PROP_VALUES_SQL, SELECT_PERSON_PROP_VALUES_SQL_WITH_FILTER
+from ee.clickhouse.sql.property_values import (
+    SELECT_PROPERTY_VALUES_SQL,
+    SELECT_UNINDEXED_EVENT_PROPERTY_VALUES_SQL,
+    SELECT_UNINDEXED_PROPERTY_KEY_SQL,
+    UNINDEXED_EVENT_PROPERTIES,
+)
 from posthog.client import sync_execute
 from posthog.models.team import Team
 from posthog.utils import relative_date_parse
 
 
 def get_property_values_for_key(key: str, team: Team, value: Optional[str] = None):
-    property_field, _ = get_property_string_expr("events", key, "%(key)s", "properties")
-    parsed_date_from = "AND timestamp >= '{}'".format(relative_date_parse("-7d").strftime("%Y-%m-%d 00:00:00"))
-    parsed_date_to = "AND timestamp <= '{}'".format(timezone.now().strftime("%Y-%m-%d 23:59:59"))
-
-    if value:
-        return sync_execute(
-            SELECT_PROP_VALUES_SQL_WITH_FILTER.format(
-                parsed_date_from=parsed_date_from, parsed_date_to=parsed_date_to, property_field=property_field
-            ),
-            {"team_id": team.pk, "key": key, "value": "%{}%".format(value)},
-        )
+    date_from = relative_date_parse("-7d").strftime("%Y-%m-%d")
+    if key in UNINDEXED_EVENT_PROPERTIES or is_unindexed_event_property(team, key):
+        return get_unindexed_event_property_values(team, key, value, date_from=date_from, limit=10)
+    return get_indexed_property_values(team, "event", key, value, date_from=date_from, limit=10)
+
+
+def get_person_property_values_for_key(key: str, team: Team, value: Optional[str] = None):
+    return get_indexed_property_values(team, "person", key, value, limit=20)
+
+
+def get_group_property_values_for_key(key: str, team: Team, group_type_index: int, value: Optional[str] = None):
+    return get_indexed_property_values(team, "group", key, value, group_type_index=group_type_index)
+
+
+def get_indexed_property_values(
+    team: Team,
+    property_type: str,
+    key: str,
+    value: Optional[str] = None,
+    *,
+    group_type_index: int = 0,
+    date_from: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[Tuple[str, int]]:
+    """
+    Most common values of a property, with how many events, persons or groups have them. Values containing `value`
+    are matched case-insensitively, values starting with it ranked first.
+    """
+    conditions, order_by, params = _value_search(value)
+    params.update(
+        {"team_id": team.pk, "property_type": property_type, "group_type_index": group_type_index, "key": key}
+    )
+    if date_from:
+        conditions += " AND day >= %(date_from)s"
+        params["date_from"] = date_from
+
     return sync_execute(
-        SELECT_PROP_VALUES_SQL.format(
-            parsed_date_from=parsed_date_from, parsed_date_to=parsed_date_to, property_field=property_field
+        SELECT_PROPERTY_VALUES_SQL.format(
+            conditions=conditions, order_by=order_by, limit="LIMIT %(limit)s" if limit else ""
         ),
-        {"team_id": team.pk, "key": key},
+        {**params, "limit": limit},
     )
 
 
-def get_person_property_values_for_key(key: str, team: Team, value: Optional[str] = None):
-    property_field, _ = get_property_string_expr("person", key, "%(key)s", "properties")
+def is_unindexed_event_property(team: Team, key: str) -> bool:
+    "Whether values of an event property got left out of the index for being too many"
+    return bool(sync_execute(SELECT_UNINDEXED_PROPERTY_KEY_SQL, {"team_id": team.pk, "key": key}))
 
-    if value:
-        return sync_execute(
-            SELECT_PERSON_PROP_VALUES_SQL_WITH_FILTER.format(property_field=property_field),
-            {"team_id": team.pk, "key": key, "value": "%{}%".format(value)},
-        )
+
+def get_unindexed_event_property_values(
+    team: Team, key: str, value: Optional[str] = None, *, date_from: str, limit: int
+) -> List[Tuple[str, int]]:
+    """
+    Most common values of an event property left out of the index by scanning events, ranked like
+    `get_indexed_property_values`.
+    """
+    property_field, _ = get_property_string_expr("events", key, "%(key)s", "properties")
+    conditions, order_by, params = _value_search(value)
     return sync_execute(
-        SELECT_PERSON_PROP_VALUES_SQL.format(property_field=property_field), {"team_id": team.pk, "key": key},
+        SELECT_UNINDEXED_EVENT_PROPERTY_VALUES_SQL.format(
+            property_field=property_field, conditions=conditions, order_by=order_by
+        ),
+        {**params, "team_id": team.pk, "key": key, "date_from": date_from, "limit": limit},
+    )
+
+
+def _value_search(value: Optional[str]) -> Tuple[str, str, Dict[str, Any]]:
+    if not value:
+        return "", "", {}
+    return (
+        "AND positionCaseInsensitiveUTF8(value, %(value)s) > 0",
+        "positionCaseInsensitiveUTF8(value, %(value)s) = 1 DESC, ",
+        {"value": value},
     )
@@ -1,9 +1,21 @@
 import json
-from typing import List
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 
-from posthog.client import sync_execute
+from posthog.client import sync_execute, sync_execute_iter
+from posthog.helpers.session_recording import (
+    RecordingSegment,
+    RecordingSnapshotsPage,
+    SnapshotDataChunk,
+    WindowId,
+    decompress_snapshot_data_chunks,
+    merge_active_segments,
+)
 from posthog.models import SessionRecordingEvent
-from posthog.queries.session_recordings.session_recording import SessionRecording
+from posthog.queries.session_recordings.session_recording import RecordingMetadata, SessionRecording
+
+# Chunks are up to 512KB each, so only read a few of them off the connection at a time
+SNAPSHOT_CHUNKS_BLOCK_SIZE = 10
 
 
 class ClickhouseSessionRecording(SessionRecording):
@@ -16,6 +28,96 @@ class ClickhouseSessionRecording(SessionRecording):
         ORDER BY timestamp
     """
 
+    _recording_chunk_ids_query = """
+        SELECT JSONExtractString(snapshot_data, 'chunk_id') AS chunk_id
+        FROM session_recording_events
+        WHERE
+            team_id = %(team_id)s
+            AND session_id = %(session_id)s
+            AND chunk_id != ''
+        GROUP BY chunk_id
+        ORDER BY min(timestamp), chunk_id
+        {limit}
+    """
+
+    _recording_chunks_query = """
+        SELECT
+            window_id,
+            JSONExtractString(snapshot_data, 'chunk_id') AS chunk_id,
+            JSONExtractInt(snapshot_data, 'chunk_count'),
+            JSONExtractString(snapshot_data, 'data'),
+            JSONExtractString(snapshot_data, 'compression')
+        FROM session_recording_events
+        WHERE
+            team_id = %(team_id)s
+            AND session_id = %(session_id)s
+            AND chunk_id IN %(chunk_ids)s
+        ORDER BY window_id, indexOf(%(chunk_ids)s, chunk_id), JSONExtractInt(snapshot_data, 'chunk_index')
+    """
+
+    # Recordings from before snapshots got compressed and chunked get paginated by snapshot
+    _recording_unchunked_snapshots_query = """
+        SELECT window_id, snapshot_data
+        FROM session_recording_events
+        WHERE
+            team_id = %(team_id)s
+            AND session_id = %(session_id)s
+            AND JSONExtractString(snapshot_data, 'chunk_id') = ''
+        ORDER BY timestamp
+        {limit}
+    """
+
+    _recording_metadata_query = """
+        SELECT
+            window_id,
+            argMinMerge(first_distinct_id),
+            toUnixTimestamp64Milli(min(first_timestamp)) AS start_time,
+            toUnixTimestamp64Milli(max(last_timestamp)),
+            groupArrayArray(active_segments),
+            sum(unsummarized_chunk_count)
+        FROM session_recording_metadata
+        WHERE
+            team_id = %(team_id)s
+            AND session_id = %(session_id)s
+        GROUP BY window_id
+        ORDER BY start_time
+    """
+
+    def get_metadata(self) -> Optional[RecordingMetadata]:
+        windows = sync_execute(
+            self._recording_metadata_query, {"team_id": self._team.id, "session_id": self._session_recording_id},
+        )
+        if not windows or any(unsummarized_chunk_count for *_, unsummarized_chunk_count in windows):
+            # Snapshots from before they got summarized at ingestion, so all of them need to be decompressed
+            return super().get_metadata()
+
+        start_and_end_times_by_window_id: Dict[WindowId, Dict] = {}
+        all_active_segments: List[RecordingSegment] = []
+        for window_id, _, start_time, end_time, active_segments, _ in windows:
+            start_and_end_times_by_window_id[window_id] = {
+                "start_time": _from_milliseconds(start_time),
+                "end_time": _from_milliseconds(end_time),
+            }
+            all_active_segments.extend(
+                merge_active_segments(
+                    [
+                        RecordingSegment(
+                            start_time=_from_milliseconds(segment_start),
+                            end_time=_from_milliseconds(segment_end),
+                            window_id=window_id,
+                            is_active=True,
+                        )
+                        for segment_start, segment_end in active_segments
+                    ]
+                )
+            )
+
+        return RecordingMetadata(
+            distinct_id=windows[0][1],
+            segments=self._get_recording_segments(all_active_segments, start_and_end_times_by_window_id),
+            start_and_end_times_by_window_id=start_and_end_times_by_window_id,
+        )
+
     def _query_recording_snapshots(self) -> List[SessionRecordingEvent]:
         response = sync_execute(
             self._recording_snapshot_query, {"team_id": self._team.id, "session_id": self._session_recording_id,},
@@ -30,3 +132,45 @@ class ClickhouseSessionRecording(SessionRecording):
             )
             for session_id, window_id, distinct_id, timestamp, snapshot_data in response
         ]
+
+    def get_snapshots_page(self, limit: Optional[int], offset: int) -> Optional[RecordingSnapshotsPage]:
+        params = {
+            "team_id": self._team.id,
+            "session_id": self._session_recording_id,
+            # One extra to know whether there's a next page
+            "limit": limit + 1 if limit else None,
+            "offset": offset,
+        }
+        limit_clause = "LIMIT %(limit)s OFFSET %(offset)s" if limit else ""
+
+        chunk_ids = [row[0] for row in sync_execute(self._recording_chunk_ids_query.format(limit=limit_clause), params)]
+        if not limit:
+            chunk_ids = chunk_ids[offset:]
+        if chunk_ids:
+            blocks = sync_execute_iter(
+                self._recording_chunks_query,
+                {**params, "chunk_ids": chunk_ids[:limit]},
+                block_size=SNAPSHOT_CHUNKS_BLOCK_SIZE,
+            )
+            return RecordingSnapshotsPage(
+                has_next=bool(limit) and len(chunk_ids) > limit,  # type: ignore
+                events_json=decompress_snapshot_data_chunks(
+                    self._team.pk,
+                    self._session_recording_id,
+                    (SnapshotDataChunk(*row) for block in blocks for row in block),
+                ),
+            )
+
+        snapshots = sync_execute(self._recording_unchunked_snapshots_query.format(limit=limit_clause), params)
+        if not limit:
+            snapshots = snapshots[offset:]
+        if not snapshots:
+            return None
+        return RecordingSnapshotsPage(
+            has_next=bool(limit) and len(snapshots) > limit,  # type: ignore
+            events_json=iter(sorted(snapshots[:limit], key=lambda snapshot: snapshot[0])),
+        )
+
+
+def _from_milliseconds(timestamp: int) -> datetime:
+    return datetime.fromtimestamp(timestamp / 1000, timezone.utc)
@@ -67,15 +67,15 @@ class ClickhouseSessionRecordingList(EnterpriseEventQuery):
         SELECT
             session_id,
             any(window_id) as window_id,
-            MIN(timestamp) AS start_time,
-            MAX(timestamp) AS end_time,
-            dateDiff('second', toDateTime(MIN(timestamp)), toDateTime(MAX(timestamp))) as duration,
-            any(distinct_id) as distinct_id,
-            SUM(has_full_snapshot) as full_snapshots
-        FROM session_recording_events
+            MIN(first_timestamp) AS start_time,
+            MAX(last_timestamp) AS end_time,
+            dateDiff('second', toDateTime(MIN(first_timestamp)), toDateTime(MAX(last_timestamp))) as duration,
+            argMinMerge(first_distinct_id) as distinct_id,
+            SUM(full_snapshot_count) as full_snapshots
+        FROM session_recording_metadata
         WHERE
             team_id = %(team_id)s
-            {events_timestamp_clause}
+            {recording_timestamp_clause}
         GROUP BY session_id
         HAVING full_snapshots > 0
         {recording_start_time_clause}
@@ -190,6 +190,15 @@ class ClickhouseSessionRecordingList(EnterpriseEventQuery):
             timestamp_params["event_end_time"] = self._filter.date_to + timedelta(hours=12)
         return timestamp_clause, timestamp_params
 
+    # Uses the params of `_get_events_timestamp_clause`
+    def _get_recording_timestamp_clause(self) -> str:
+        timestamp_clause = ""
+        if self._filter.date_from:
+            timestamp_clause += "\nAND last_timestamp >= %(event_start_time)s"
+        if self._filter.date_to:
+            timestamp_clause += "\nAND first_timestamp <= %(event_end_time)s"
+        return timestamp_clause
+
     def _get_recording_start_time_clause(self) -> Tuple[str, Dict[str, Any]]:
         start_time_clause = ""
         start_time_params = {}
@@ -277,7 +286,7 @@ class ClickhouseSessionRecordingList(EnterpriseEventQuery):
         core_recordings_query = self._core_session_recordings_query.format(
             recording_start_time_clause=recording_start_time_clause,
             duration_clause=duration_clause,
-            events_timestamp_clause=events_timestamp_clause,
+            recording_timestamp_clause=self._get_recording_timestamp_clause(),
         )
 
         if not self._determine_should_join_events():
@@ -1,8 +1,13 @@
 from uuid import uuid4
 
+from dateutil.relativedelta import relativedelta
+from django.utils.timezone import now
+from freezegun import freeze_time
+
 from ee.clickhouse.models.session_recording_event import create_session_recording_event
 from ee.clickhouse.queries.session_recordings.clickhouse_session_recording import ClickhouseSessionRecording
 from ee.clickhouse.util import ClickhouseTestMixin
+from posthog.client import sync_execute
 from posthog.queries.session_recordings.test.test_session_recording import factory_session_recording_test
 
 
@@ -13,4 +18,29 @@ def _create_session_recording_event(**kwargs):
 
 
 class TestClickhouseSessionRecording(ClickhouseTestMixin, factory_session_recording_test(ClickhouseSessionRecording, _create_session_recording_event)):  # type: ignore
-    pass
+    def test_metadata_is_aggregated_as_snapshots_arrive(self):
+        with freeze_time("2020-09-13T12:26:40.000Z"):
+            self.create_chunked_snapshots(2, "u", "1", now(), window_id="1")
+            self.create_chunked_snapshots(2, "u", "1", now() + relativedelta(seconds=5), window_id="1", source=3)
+            self.create_snapshot("u", "2", now())
+
+            metadata = sync_execute(
+                """
+                SELECT
+                    session_id,
+                    toUnixTimestamp64Milli(min(first_timestamp)),
+                    toUnixTimestamp64Milli(max(last_timestamp)),
+                    length(groupArrayArray(active_segments)),
+                    sum(unsummarized_chunk_count)
+                FROM session_recording_metadata
+                WHERE team_id = %(team_id)s
+                GROUP BY session_id
+                ORDER BY session_id
+                """,
+                {"team_id": self.team.pk},
+            )
+
+            self.assertEqual(
+                metadata,
+                [("1", 1_600_000_000_000, 1_600_000_006_000, 1, 0), ("2", 1_600_000_000_000, 1_600_000_000_000, 0, 1)],
+            )
@@ -1223,7 +1223,7 @@ class TestClickhouseTrends(ClickhouseTestMixin, trend_test_factory(ClickhouseTre
         response = ClickhouseTrends().run(filter, self.team)
         self.assertEqual(response[0]["count"], 1)
 
-    @patch("ee.clickhouse.queries.trends.clickhouse_trends.sync_execute")
+    @patch("posthog.queries.query_executor.sync_execute")
     def test_should_throw_exception(self, patch_sync_execute):
         self._create_events()
         patch_sync_execute.side_effect = Exception()
@@ -1,13 +1,15 @@
 import copy
-import threading
+from datetime import datetime
+from functools import partial
 from itertools import accumulate
-from typing import Any, Callable, Dict, List, Tuple, Union, cast
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from django.db.models.query import Prefetch
 from django.utils import timezone
 
 from ee.clickhouse.queries.trends.breakdown import ClickhouseTrendsBreakdown
 from ee.clickhouse.queries.trends.formula import ClickhouseTrendsFormula
+from ee.clickhouse.queries.trends.incremental import IncrementalTrendsCalculation
 from ee.clickhouse.queries.trends.lifecycle import ClickhouseLifecycle
 from ee.clickhouse.queries.trends.total_volume import ClickhouseTrendsTotalVolume
 from posthog.client import sync_execute
@@ -17,7 +19,8 @@ from posthog.models.action_step import ActionStep
 from posthog.models.entity import Entity
 from posthog.models.filters import Filter
 from posthog.models.team import Team
-from posthog.queries.base import handle_compare
+from posthog.queries.base import convert_to_comparison, determine_compared_filter
+from posthog.queries.query_executor import run_queries_in_parallel
 from posthog.utils import relative_date_parse
 
 
@@ -32,67 +35,70 @@ class ClickhouseTrends(ClickhouseTrendsTotalVolume, ClickhouseLifecycle, Clickho
             return Filter(data={**filter._data, **data}, team=team)
         return filter
 
-    def _get_sql_for_entity(self, filter: Filter, entity: Entity, team: Team) -> Tuple[str, Dict, Callable]:
+    def _get_sql_for_entity(
+        self, filter: Filter, entity: Entity, team: Team, incremental_date_from: Optional[datetime] = None
+    ) -> Tuple[str, Dict, Callable]:
         if filter.breakdown:
             sql, params, parse_function = ClickhouseTrendsBreakdown(entity, filter, team).get_query()
         elif filter.shown_as == TRENDS_LIFECYCLE:
             sql, params, parse_function = self._format_lifecycle_query(entity, filter, team)
         else:
-            sql, params, parse_function = self._total_volume_query(entity, filter, team)
+            sql, params, parse_function = self._total_volume_query(
+                entity, filter, team, incremental_date_from=incremental_date_from
+            )
 
         return sql, params, parse_function
 
-    def _run_query(self, filter: Filter, entity: Entity, team: Team) -> List[Dict[str, Any]]:
-        sql, params, parse_function = self._get_sql_for_entity(filter, entity, team)
-
-        result = sync_execute(sql, params)
-
-        result = parse_function(result)
-        serialized_data = self._format_serialized(entity, result)
-
-        if filter.display == TRENDS_CUMULATIVE:
-            serialized_data = self._handle_cumulative(serialized_data)
-        return serialized_data
-
-    def _run_query_for_threading(self, result: List, index: int, sql, params):
-        result[index] = sync_execute(sql, params)
-
-    def _run_parallel(self, filter: Filter, team: Team) -> List[Dict[str, Any]]:
-        result: List[Union[None, List[Dict[str, Any]]]] = [None] * len(filter.entities)
-        parse_functions: List[Union[None, Callable]] = [None] * len(filter.entities)
-        jobs = []
-
-        for entity in filter.entities:
-            sql, params, parse_function = self._get_sql_for_entity(filter, entity, team)
-            parse_functions[entity.index] = parse_function
-            thread = threading.Thread(target=self._run_query_for_threading, args=(result, entity.index, sql, params),)
-            jobs.append(thread)
-
-        # Start the threads (i.e. calculate the random number lists)
-        for j in jobs:
-            j.start()
-
-        # Ensure all of the threads have finished
-        for j in jobs:
-            j.join()
-
-        # Parse results for each thread
-        for entity in filter.entities:
-            serialized_data = cast(List[Callable], parse_functions)[entity.index](result[entity.index])
-            serialized_data = self._format_serialized(entity, serialized_data)
+    def _complete_incremental_result(
+        self, incremental: IncrementalTrendsCalculation, result: List, filter: Filter, entity: Entity, team: Team
+    ) -> List:
+        merged_result = incremental.merge(result)
+        if merged_result is None:
+            # Some of the history wasn't cached after all
+            sql, params, _ = self._get_sql_for_entity(filter, entity, team)
+            merged_result = sync_execute(sql, params)
+        incremental.store(merged_result)
+        return merged_result
+
+    def _get_query_for_entity(
+        self, filter: Filter, entity: Entity, team: Team
+    ) -> Tuple[str, Dict, Callable[[List], List[Dict[str, Any]]]]:
+        "SQL for an entity along with the function serializing its result"
+        incremental = IncrementalTrendsCalculation.for_entity(filter, entity, team)
+        sql, params, parse_function = self._get_sql_for_entity(
+            filter, entity, team, incremental_date_from=incremental.date_from if incremental else None
+        )
+
+        def serialize(result: List) -> List[Dict[str, Any]]:
+            if incremental is not None:
+                result = self._complete_incremental_result(incremental, result, filter, entity, team)
+            serialized_data = self._format_serialized(entity, parse_function(result))
 
             if filter.display == TRENDS_CUMULATIVE:
                 serialized_data = self._handle_cumulative(serialized_data)
-            result[entity.index] = serialized_data
+            return serialized_data
 
-        # flatten results
-        flat_results: List[Dict[str, Any]] = []
-        for item in result:
-            for flat in cast(List[Dict[str, Any]], item):
-                flat_results.append(flat)
+        return sql, params, serialize
 
+    def _run_parallel(self, queries: List[Tuple[str, Dict, Callable]], team: Team) -> List[Dict[str, Any]]:
+        # SQL gets built up front, as only the queries themselves run on the executor's threads
+        results = run_queries_in_parallel(team.pk, [(sql, params) for sql, params, _ in queries])
+
+        flat_results: List[Dict[str, Any]] = []
+        for (_, _, serialize), result in zip(queries, results):
+            flat_results.extend(serialize(result))
         return flat_results
 
+    def _get_compared_filters(self, filter: Filter) -> List[Tuple[Filter, Optional[str]]]:
+        if not filter.compare:
+            return [(filter, None)]
+        return [(filter, "current"), (determine_compared_filter(filter), "previous")]
+
+    def _label_comparison(self, serialize: Callable, filter: Filter, compare_label: Optional[str]) -> Callable:
+        if compare_label is None:
+            return serialize
+        return lambda result: convert_to_comparison(serialize(result), filter, compare_label)
+
     def run(self, filter: Filter, team: Team, *args, **kwargs) -> List[Dict[str, Any]]:
         actions = Action.objects.filter(team_id=team.pk).order_by("-id")
         if len(filter.actions) > 0:
@@ -100,9 +106,15 @@ class ClickhouseTrends(ClickhouseTrendsTotalVolume, ClickhouseLifecycle, Clickho
         actions = actions.prefetch_related(Prefetch("steps", queryset=ActionStep.objects.order_by("id")))
 
         filter = self._set_default_dates(filter, team)
+        compared_filters = self._get_compared_filters(filter)
+        queries: List[Tuple[str, Dict, Callable]] = []
 
         if filter.formula:
-            return handle_compare(filter, self._run_formula_query, team)
+            for compared_filter, compare_label in compared_filters:
+                sql, params = self._get_formula_query(compared_filter, team)
+                serialize = partial(self._parse_formula_results, filter=compared_filter)
+                queries.append((sql, params, self._label_comparison(serialize, compared_filter, compare_label)))
+            return self._run_parallel(queries, team)
 
         for entity in filter.entities:
             if entity.type == TREND_FILTER_TYPE_ACTIONS:
@@ -111,14 +123,11 @@ class ClickhouseTrends(ClickhouseTrendsTotalVolume, ClickhouseLifecycle, Clickho
                 except Action.DoesNotExist:
                     return []
 
-        if len(filter.entities) == 1 or filter.compare:
-            result = []
-            for entity in filter.entities:
-                result.extend(handle_compare(filter, self._run_query, team, entity=entity))
-        else:
-            result = self._run_parallel(filter, team)
-
-        return result
+        for entity in filter.entities:
+            for compared_filter, compare_label in compared_filters:
+                sql, params, serialize = self._get_query_for_entity(compared_filter, entity, team)
+                queries.append((sql, params, self._label_comparison(serialize, compared_filter, compare_label)))
+        return self._run_parallel(queries, team)
 
     def _format_serialized(self, entity: Entity, result: List[Dict[str, Any]]):
         serialized_data = []
@@ -1,18 +1,17 @@
 import math
 from itertools import accumulate
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 from ee.clickhouse.queries.breakdown_props import get_breakdown_cohort_name
 from ee.clickhouse.queries.trends.util import parse_response
 from ee.clickhouse.sql.clickhouse import trim_quotes_expr
-from posthog.client import sync_execute
 from posthog.constants import NON_TIME_SERIES_DISPLAY_TYPES, TRENDS_CUMULATIVE
 from posthog.models.filters.filter import Filter
 from posthog.models.team import Team
 
 
 class ClickhouseTrendsFormula:
-    def _run_formula_query(self, filter: Filter, team: Team):
+    def _get_formula_query(self, filter: Filter, team: Team) -> Tuple[str, Dict[str, Any]]:
         letters = [chr(65 + i) for i in range(0, len(filter.entities))]
         queries = []
         params: Dict[str, Any] = {}
@@ -66,7 +65,10 @@ class ClickhouseTrendsFormula:
                 [" CROSS JOIN ({}) as sub_{}".format(query, letters[i + 1]) for i, query in enumerate(queries[1:])]
             ),
         )
-        result = sync_execute(sql, params)
+        return sql, params
+
+    def _parse_formula_results(self, result: List, filter: Filter) -> List[Dict[str, Any]]:
+        is_aggregate = filter.display in NON_TIME_SERIES_DISPLAY_TYPES
         response = []
         for item in result:
             additional_values: Dict[str, Any] = {
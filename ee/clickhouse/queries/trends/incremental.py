@@ -0,0 +1,174 @@
+"""
+Incremental calculation of total volume trends.
+
+Most of a trend's history doesn't change between refreshes, so instead of recounting the whole date range every time,
+the values of settled buckets (ones that ended at least `TRENDS_INCREMENTAL_SETTLED_AFTER_SECONDS` ago) are cached and
+only events from the first unsettled bucket onwards get counted. The query still zero-fills every bucket of the range,
+so the buckets returned are exactly the ones a full calculation returns.
+
+Only trends whose buckets are independent of each other qualify. Rolling windows (weekly/monthly active users,
+smoothing), first-seen users (cumulative DAU) and single-value displays are always fully recalculated, as are
+breakdowns, whose breakdown values are picked over the whole range. Unique users per bucket can still change
+retroactively when persons get merged, so the cached values are thrown away after
+`TRENDS_INCREMENTAL_FULL_RECALCULATION_SECONDS`.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pytz
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from statshog.defaults.django import statsd
+
+from posthog.constants import (
+    MONTHLY_ACTIVE,
+    NON_TIME_SERIES_DISPLAY_TYPES,
+    TRENDS_CUMULATIVE,
+    TRENDS_LIFECYCLE,
+    WEEKLY_ACTIVE,
+)
+from posthog.models.entity import Entity
+from posthog.models.filters import Filter
+from posthog.models.team import Team
+from posthog.queries.util import format_ch_timestamp, get_time_diff
+from posthog.utils import generate_cache_key, get_safe_cache
+
+INTERVAL_DELTAS = {
+    "hour": relativedelta(hours=1),
+    "day": relativedelta(days=1),
+    "week": relativedelta(weeks=1),
+    "month": relativedelta(months=1),
+}
+
+
+class IncrementalTrendsCalculation:
+    """
+    Settled bucket values cached for one entity of a trends filter. Query with `date_from` as the lower bound for
+    events, then pass the result through `merge` and `store`.
+    """
+
+    def __init__(self, filter: Filter, entity: Entity, team: Team):
+        self._filter = filter
+        self._team = team
+        self._timezone = pytz.timezone(team.timezone_for_charts)
+        filter_data = {key: value for key, value in filter.to_dict().items() if key not in ("date_from", "date_to")}
+        self._cache_key = generate_cache_key(
+            f"trends_incremental_{filter_data}_{entity.to_dict()}_{team.pk}_{team.timezone_for_charts}"
+            f"_{team.aggregate_users_by_distinct_id}"
+        )
+        self._cached: Optional[Dict[str, Any]] = get_safe_cache(self._cache_key)
+
+        if self._cached is not None and (
+            # Don't bother if the range now starts before what's cached
+            self._local_date_from() < self._cached["first_bucket"]
+            or timezone.now() - self._cached["calculated_at"]
+            > timedelta(seconds=settings.TRENDS_INCREMENTAL_FULL_RECALCULATION_SECONDS)
+        ):
+            self._cached = None
+        statsd.incr("trends_incremental_calculation", tags={"cached": self._cached is not None})
+
+    @classmethod
+    def for_entity(cls, filter: Filter, entity: Entity, team: Team) -> Optional["IncrementalTrendsCalculation"]:
+        if not settings.TRENDS_INCREMENTAL_ENABLED or not is_incremental_calculation_supported(filter, entity, team):
+            return None
+        return cls(filter, entity, team)
+
+    @property
+    def date_from(self) -> Optional[datetime]:
+        "Start of the first bucket that needs to be counted (in UTC), or None if everything does"
+        if self._cached is None:
+            return None
+        return self._timezone.localize(self._cached["settled_until"]).astimezone(pytz.UTC)
+
+    def merge(self, result: List) -> Optional[List]:
+        "Fills in the buckets before `date_from` from the cache, or returns None if any of them isn't cached"
+        if self._cached is None:
+            return result
+        if len(result) != 1:
+            return None
+
+        dates, counts = result[0]
+        merged_counts = []
+        for bucket, count in zip(dates, counts):
+            bucket_start = self._to_local(bucket)
+            if bucket_start < self._cached["settled_until"]:
+                if bucket_start not in self._cached["values"]:
+                    # The complete result will have to be stored from scratch
+                    self._cached = None
+                    return None
+                count = self._cached["values"][bucket_start]
+            merged_counts.append(count)
+        return [(dates, merged_counts)]
+
+    def store(self, result: List) -> None:
+        "Caches the values of the settled buckets at the start of a complete result"
+        if len(result) != 1 or not result[0][0]:
+            return
+
+        dates, counts = result[0]
+        bucket_starts = [self._to_local(bucket) for bucket in dates]
+        interval_delta = INTERVAL_DELTAS[self._filter.interval]
+        # Buckets cut short by date_to never settle, as the next query might have a later date_to
+        date_to = datetime.strptime(
+            format_ch_timestamp(self._filter.date_to, self._filter, " 23:59:59"), "%Y-%m-%d %H:%M:%S"
+        )
+        watermark = min(
+            self._to_local(timezone.now() - timedelta(seconds=settings.TRENDS_INCREMENTAL_SETTLED_AFTER_SECONDS)),
+            date_to + timedelta(seconds=1),
+        )
+
+        values: Dict[datetime, Any] = {}
+        settled_until = None
+        for index, bucket_start in enumerate(bucket_starts):
+            bucket_end = bucket_starts[index + 1] if index + 1 < len(bucket_starts) else bucket_start + interval_delta
+            if bucket_end > watermark:
+                break
+            values[bucket_start] = counts[index]
+            settled_until = bucket_end
+
+        if settled_until is None:
+            return
+
+        cache.set(
+            self._cache_key,
+            {
+                "values": values,
+                "settled_until": settled_until,
+                "first_bucket": bucket_starts[0],
+                "calculated_at": self._cached["calculated_at"] if self._cached is not None else timezone.now(),
+            },
+            settings.TRENDS_INCREMENTAL_FULL_RECALCULATION_SECONDS,
+        )
+
+    def _local_date_from(self) -> datetime:
+        "Start of the range in the team's timezone, converted the same way the query converts it"
+        date_from = format_ch_timestamp(
+            self._filter.date_from, self._filter, timezone=self._team.timezone_for_charts  # type: ignore
+        )
+        return self._to_local(pytz.UTC.localize(datetime.strptime(date_from, "%Y-%m-%d %H:%M:%S")))
+
+    def _to_local(self, value: date) -> datetime:
+        "Buckets as naive datetimes in the team's timezone, the way ClickHouse truncates them"
+        if isinstance(value, datetime):
+            return value.astimezone(self._timezone).replace(tzinfo=None) if value.tzinfo else value
+        return datetime(value.year, value.month, value.day)
+
+
+def is_incremental_calculation_supported(filter: Filter, entity: Entity, team: Team) -> bool:
+    if (
+        filter.breakdown
+        or filter.shown_as == TRENDS_LIFECYCLE
+        or filter.display in NON_TIME_SERIES_DISPLAY_TYPES
+        or (filter.display == TRENDS_CUMULATIVE and entity.math == "dau")
+        or entity.math in [WEEKLY_ACTIVE, MONTHLY_ACTIVE]
+        or filter.smoothing_intervals > 1
+        or filter.interval not in INTERVAL_DELTAS
+        or filter.date_from is None
+    ):
+        return False
+
+    # Ranges shorter than two intervals count events from date_from rather than from the start of its bucket
+    _, _, round_interval = get_time_diff(filter.interval, filter.date_from, filter.date_to, team_id=team.pk)
+    return round_interval
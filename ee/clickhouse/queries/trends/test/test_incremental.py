@@ -0,0 +1,122 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import override_settings
+from freezegun.api import freeze_time
+
+from ee.clickhouse.queries.trends.clickhouse_trends import ClickhouseTrends
+from posthog.constants import TRENDS_CUMULATIVE, TRENDS_TABLE
+from posthog.models import Person, Team
+from posthog.models.filters.filter import Filter
+from posthog.test.base import APIBaseTest, _create_event
+
+
+@override_settings(TRENDS_INCREMENTAL_ENABLED=True, TRENDS_INCREMENTAL_SETTLED_AFTER_SECONDS=24 * 60 * 60)
+class TestIncrementalTrends(APIBaseTest):
+    CLASS_DATA_LEVEL_SETUP = False
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        Person.objects.create(team_id=self.team.pk, distinct_ids=["blabla"])
+        Person.objects.create(team_id=self.team.pk, distinct_ids=["other"])
+        for timestamp in ["2020-01-03T13:01:01Z", "2020-01-04T13:01:01Z", "2020-01-09T13:01:01Z"]:
+            _create_event(team=self.team, event="$pageview", distinct_id="blabla", timestamp=timestamp)
+
+    def _run(self, **kwargs):
+        filter = Filter(
+            data={"date_from": "-7d", "interval": "day", "events": [{"id": "$pageview", **kwargs}]}, team=self.team
+        )
+        return ClickhouseTrends().run(filter, self.team)
+
+    def test_only_counts_unsettled_buckets_again(self):
+        with freeze_time("2020-01-10T12:00:00Z"):
+            self.assertEqual(self._run()[0]["data"], [1, 1, 0, 0, 0, 0, 1, 0])
+
+            # Arriving after the buckets of these days settled, so only the latter gets counted
+            _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-04T15:00:00Z")
+            _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-09T15:00:00Z")
+            _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-10T11:00:00Z")
+
+            result = self._run()
+            self.assertEqual(result[0]["data"], [1, 1, 0, 0, 0, 0, 2, 1])
+            self.assertEqual(result[0]["count"], 5)
+            self.assertEqual(
+                result[0]["days"],
+                [
+                    "2020-01-03",
+                    "2020-01-04",
+                    "2020-01-05",
+                    "2020-01-06",
+                    "2020-01-07",
+                    "2020-01-08",
+                    "2020-01-09",
+                    "2020-01-10",
+                ],
+            )
+
+            self.assertEqual(self._run(math="dau")[0]["data"], [1, 2, 0, 0, 0, 0, 2, 1])
+
+    @patch.object(Team, "_timezone_feature_flag_enabled", True)
+    def test_reuses_cached_history_in_team_timezone(self):
+        self.team.timezone = "US/Pacific"
+        self.team.save()
+
+        with freeze_time("2020-01-10T20:00:00Z"):
+            self.assertEqual(self._run()[0]["data"], [1, 1, 0, 0, 0, 0, 1, 0])
+
+            # 2020-01-04 has settled in US/Pacific, while 2020-01-10 is still going on there
+            _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-04T20:00:00Z")
+            _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-10T19:00:00Z")
+
+            self.assertEqual(self._run()[0]["data"], [1, 1, 0, 0, 0, 0, 1, 1])
+
+    def test_cached_history_reused_as_the_range_moves_forward(self):
+        with freeze_time("2020-01-10T12:00:00Z"):
+            self._run()
+
+        _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-05T15:00:00Z")
+        _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-10T15:00:00Z")
+
+        with freeze_time("2020-01-11T12:00:00Z"):
+            result = self._run()
+        self.assertEqual(result[0]["data"], [1, 0, 0, 0, 0, 1, 1, 0])
+        self.assertEqual(result[0]["days"][0], "2020-01-04")
+
+    def test_recounts_everything_when_range_starts_before_cached_history(self):
+        with freeze_time("2020-01-10T12:00:00Z"):
+            self._run()
+            _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-02T15:00:00Z")
+            _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-04T15:00:00Z")
+
+            filter = Filter(
+                data={"date_from": "-14d", "interval": "day", "events": [{"id": "$pageview"}]}, team=self.team
+            )
+            result = ClickhouseTrends().run(filter, self.team)
+
+        self.assertEqual(result[0]["data"][-9:], [1, 1, 2, 0, 0, 0, 0, 1, 0])
+
+    def test_unsupported_trends_are_always_fully_recounted(self):
+        with freeze_time("2020-01-10T12:00:00Z"):
+            self._run(math="weekly_active")
+            filter = Filter(
+                data={
+                    "date_from": "-7d",
+                    "display": TRENDS_TABLE,
+                    "events": [{"id": "$pageview", "math": "dau"}],
+                    "breakdown": "$browser",
+                },
+                team=self.team,
+            )
+            ClickhouseTrends().run(filter, self.team)
+            ClickhouseTrends().run(filter.with_data({"display": TRENDS_CUMULATIVE, "breakdown": None}), self.team)
+
+            _create_event(team=self.team, event="$pageview", distinct_id="other", timestamp="2020-01-04T15:00:00Z")
+
+            self.assertEqual(self._run(math="weekly_active")[0]["data"][1], 2)
+            self.assertEqual(
+                ClickhouseTrends().run(filter.with_data({"display": TRENDS_CUMULATIVE, "breakdown": None}), self.team)[
+                    0
+                ]["data"],
+                [1, 2, 2, 2, 2, 2, 2, 2],
+            )
@@ -1,5 +1,6 @@
 import urllib.parse
-from typing import Any, Callable, Dict, List, Tuple
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from ee.clickhouse.queries.trends.trend_event_query import TrendsEventQuery
 from ee.clickhouse.queries.trends.util import enumerate_time_range, parse_response, process_math
@@ -20,7 +21,9 @@ from posthog.utils import encode_get_request_params
 
 
 class ClickhouseTrendsTotalVolume:
-    def _total_volume_query(self, entity: Entity, filter: Filter, team: Team) -> Tuple[str, Dict, Callable]:
+    def _total_volume_query(
+        self, entity: Entity, filter: Filter, team: Team, incremental_date_from: Optional[datetime] = None
+    ) -> Tuple[str, Dict, Callable]:
         trunc_func = get_trunc_func_ch(filter.interval)
         interval_func = get_interval_func_ch(filter.interval)
         aggregate_operation, join_condition, math_params = process_math(entity, team, person_id_alias="person_id")
@@ -33,6 +36,7 @@ class ClickhouseTrendsTotalVolume:
             if join_condition != ""
             or (entity.math in [WEEKLY_ACTIVE, MONTHLY_ACTIVE] and not team.aggregate_users_by_distinct_id)
             else False,
+            incremental_date_from=incremental_date_from,
         )
         event_query, event_query_params = trend_event_query.get_query()
 
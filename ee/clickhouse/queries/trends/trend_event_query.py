@@ -1,4 +1,5 @@
-from typing import Any, Dict, Tuple
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 
 from ee.clickhouse.models.entity import get_entity_filtering_params
 from ee.clickhouse.models.property import get_property_string_expr
@@ -16,8 +17,10 @@ class TrendsEventQuery(EnterpriseEventQuery):
     _entity: Entity
     _filter: Filter
 
-    def __init__(self, entity: Entity, *args, **kwargs):
+    def __init__(self, entity: Entity, *args, incremental_date_from: Optional[datetime] = None, **kwargs):
         self._entity = entity
+        # Events before this have already been counted (see `IncrementalTrendsCalculation`)
+        self._incremental_date_from = incremental_date_from
         super().__init__(*args, **kwargs)
 
     def get_query(self) -> Tuple[str, Dict[str, Any]]:
@@ -111,6 +114,10 @@ class TrendsEventQuery(EnterpriseEventQuery):
                 parsed_date_from=parsed_date_from, parsed_date_to=parsed_date_to
             )
 
+        if self._incremental_date_from is not None:
+            date_filter += " AND timestamp >= toDateTime(%(incremental_date_from)s, 'UTC')"
+            date_params["incremental_date_from"] = self._incremental_date_from.strftime("%Y-%m-%d %H:%M:%S")
+
         return date_filter, date_params
 
     def _get_entity_query(self) -> Tuple[str, Dict]:
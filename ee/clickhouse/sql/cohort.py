@@ -29,7 +29,7 @@ INSERT INTO cohortpeople
 SELECT person_id, cohort_id, %(team_id)s as team_id,  -1 as _sign
 FROM cohortpeople
 JOIN (
-    SELECT id, argMax(properties, person._timestamp) as properties, sum(is_deleted) as is_deleted FROM person WHERE team_id = %(team_id)s GROUP BY id
+    SELECT id, argMax(properties, person._timestamp) as properties, sum(is_deleted) as is_deleted FROM person WHERE team_id = %(team_id)s {candidates_filter} GROUP BY id
 ) as person ON (person.id = cohortpeople.person_id)
 WHERE cohort_id = %(cohort_id)s
 AND
@@ -53,7 +53,7 @@ INSERT_PEOPLE_MATCHING_COHORT_ID_SQL = """
 INSERT INTO cohortpeople
     SELECT id, %(cohort_id)s as cohort_id, %(team_id)s as team_id, 1 as _sign
     FROM (
-        SELECT id, argMax(properties, person._timestamp) as properties, sum(is_deleted) as is_deleted FROM person WHERE team_id = %(team_id)s GROUP BY id
+        SELECT id, argMax(properties, person._timestamp) as properties, sum(is_deleted) as is_deleted FROM person WHERE team_id = %(team_id)s {candidates_filter} GROUP BY id
     ) as person
     LEFT JOIN (
         SELECT person_id, sum(sign) AS sign FROM cohortpeople WHERE cohort_id = %(cohort_id)s AND team_id = %(team_id)s GROUP BY person_id
@@ -63,6 +63,72 @@ INSERT INTO cohortpeople
     AND id IN ({cohort_filter})
 """
 
+# Persons whose membership in a cohort may have changed since the last calculation, see ee/clickhouse/models/cohort_incremental.py
+GET_PERSON_IDS_CHANGED_SINCE_SQL = """
+SELECT id FROM person WHERE team_id = %(team_id)s AND _timestamp > %(watermark)s
+UNION ALL
+SELECT person_id FROM person_distinct_id2 WHERE team_id = %(team_id)s AND _timestamp > %(watermark)s
+"""
+
+GET_PERSON_IDS_WITH_EVENTS_IN_SLICES_SQL = """
+SELECT DISTINCT pdi.person_id FROM events
+INNER JOIN ({GET_TEAM_PERSON_DISTINCT_IDS}) AS pdi ON events.distinct_id = pdi.distinct_id
+WHERE team_id = %(team_id)s AND ({slices})
+"""
+
+# Memberships of several cohorts that only filter on events performed, evaluated in one scan over events
+GET_COHORTS_MEMBERSHIPS_BY_BEHAVIOR_SQL = """
+SELECT person_id, CAST(arrayFilter(cohort_id -> cohort_id != 0, [{cohort_conditions}]), 'Array(Int64)') AS cohort_ids
+FROM (
+    SELECT {fields} FROM events {event_table_alias}
+    {distinct_id_query}
+    WHERE team_id = %(team_id)s
+    AND event IN %(batch_event_ids)s
+    {date_condition}
+    GROUP BY person_id
+) AS behavior_query
+WHERE notEmpty(cohort_ids)
+AND person_id IN (SELECT id FROM person WHERE team_id = %(team_id)s GROUP BY id HAVING max(is_deleted) = 0)
+"""
+
+INSERT_PEOPLE_MATCHING_COHORTS_SQL = """
+INSERT INTO cohortpeople
+SELECT person_id, cohort_id, %(team_id)s AS team_id, 1 AS _sign
+FROM ({memberships_query}) ARRAY JOIN cohort_ids AS cohort_id
+WHERE (person_id, cohort_id) NOT IN (
+    SELECT person_id, cohort_id FROM cohortpeople
+    WHERE team_id = %(team_id)s AND cohort_id IN %(batch_cohort_ids)s
+    GROUP BY person_id, cohort_id
+    HAVING sum(sign) > 0
+)
+"""
+
+REMOVE_PEOPLE_NOT_MATCHING_COHORTS_SQL = """
+INSERT INTO cohortpeople
+SELECT person_id, cohort_id, %(team_id)s AS team_id, -1 AS _sign
+FROM (
+    SELECT person_id, cohort_id FROM cohortpeople
+    WHERE team_id = %(team_id)s AND cohort_id IN %(batch_cohort_ids)s
+    GROUP BY person_id, cohort_id
+    HAVING sum(sign) > 0
+)
+WHERE (person_id, cohort_id) NOT IN (
+    SELECT person_id, cohort_id FROM ({memberships_query}) ARRAY JOIN cohort_ids AS cohort_id
+)
+"""
+
+GET_COHORTS_SIZES_SQL = """
+SELECT cohort_id, count(*)
+FROM (
+    SELECT cohort_id
+    FROM cohortpeople
+    WHERE team_id = %(team_id)s AND cohort_id IN %(batch_cohort_ids)s
+    GROUP BY person_id, cohort_id
+    HAVING sum(sign) > 0
+)
+GROUP BY cohort_id
+"""
+
 GET_DISTINCT_ID_BY_ENTITY_SQL = """
 SELECT distinct_id FROM events WHERE team_id = %(team_id)s {date_query} AND {entity_query}
 """
@@ -210,32 +210,6 @@ SELECT
 FROM events WHERE team_id = %(team_id)s
 """
 
-SELECT_PROP_VALUES_SQL = """
-SELECT
-    DISTINCT {property_field}
-FROM
-    events
-WHERE
-    team_id = %(team_id)s AND
-    JSONHas(properties, %(key)s)
-    {parsed_date_from}
-    {parsed_date_to}
-LIMIT 10
-"""
-
-SELECT_PROP_VALUES_SQL_WITH_FILTER = """
-SELECT
-    DISTINCT {property_field}
-FROM
-    events
-WHERE
-    team_id = %(team_id)s AND
-    {property_field} ILIKE %(value)s
-    {parsed_date_from}
-    {parsed_date_to}
-LIMIT 10
-"""
-
 SELECT_EVENT_BY_TEAM_AND_CONDITIONS_SQL = """
 SELECT
     uuid,
@@ -250,7 +224,7 @@ FROM
     events
 where team_id = %(team_id)s
 {conditions}
-ORDER BY toDate(timestamp) {order}, timestamp {order} {limit}
+ORDER BY toDate(timestamp) {order}, timestamp {order}, uuid {order} {limit}
 """
 
 SELECT_EVENT_BY_TEAM_AND_CONDITIONS_FILTERS_SQL = """
@@ -268,7 +242,7 @@ WHERE
 team_id = %(team_id)s
 {conditions}
 {filters}
-ORDER BY toDate(timestamp) {order}, timestamp {order} {limit}
+ORDER BY toDate(timestamp) {order}, timestamp {order}, uuid {order} {limit}
 """
 
 SELECT_ONE_EVENT_SQL = """
@@ -0,0 +1,257 @@
+from django.conf import settings
+
+from ee.clickhouse.sql.clickhouse import trim_quotes_expr
+from ee.clickhouse.sql.events import EVENTS_DATA_TABLE
+from ee.clickhouse.sql.table_engines import AggregatingMergeTree, Distributed, ReplacingMergeTree, ReplicationScheme
+
+# Values of event, person and group properties along with how many events, persons or groups have them, so that
+# suggesting values doesn't need to scan events or persons. Fed at ingestion by materialized views on the events,
+# person and groups tables. Rows are kept per day for a few weeks. As the views index every version of a person or
+# group, values they no longer have would be suggested until then, so current values of persons and groups get
+# re-indexed weekly, and older rows age out.
+PROPERTY_VALUES_DATA_TABLE = lambda: "sharded_property_values" if settings.CLICKHOUSE_REPLICATION else "property_values"
+
+PROPERTY_VALUES_TABLE_BASE_SQL = """
+CREATE TABLE IF NOT EXISTS {table_name} ON CLUSTER '{cluster}'
+(
+    team_id Int64,
+    property_type Enum8('event' = 1, 'person' = 2, 'group' = 3),
+    group_type_index UInt8,
+    key VARCHAR,
+    value VARCHAR,
+    day Date,
+    count_state AggregateFunction(uniq, VARCHAR)
+) ENGINE = {engine}
+"""
+
+PROPERTY_VALUES_TABLE_SQL = lambda: (
+    PROPERTY_VALUES_TABLE_BASE_SQL
+    + """PARTITION BY toYYYYMM(day)
+ORDER BY (team_id, property_type, group_type_index, key, value, day)
+{ttl_period}
+"""
+).format(
+    table_name=PROPERTY_VALUES_DATA_TABLE(),
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    engine=AggregatingMergeTree("property_values", replication_scheme=ReplicationScheme.SHARDED),
+    ttl_period="" if settings.TEST else "TTL day + INTERVAL 4 WEEK",
+)
+
+# This table is responsible for reading from property_values on a cluster setting
+DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL = lambda: PROPERTY_VALUES_TABLE_BASE_SQL.format(
+    table_name="property_values",
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    engine=Distributed(data_table=PROPERTY_VALUES_DATA_TABLE(), sharding_key="sipHash64(key)"),
+)
+
+# Event properties that are close to unique per event, which would add a row per event and day to the index. Values
+# of these are suggested by scanning recent events instead.
+UNINDEXED_EVENT_PROPERTIES = [
+    "$insert_id",
+    "$session_id",
+    "$window_id",
+    "$time",
+    "$sent_at",
+    "$current_url",
+    "$pathname",
+    "$referrer",
+    "$anon_distinct_id",
+    "$device_id",
+    "$user_id",
+    "$ip",
+    "token",
+]
+
+# Longer values are rarely picked from suggestions, but take up most of the space of the index
+PROPERTY_VALUES_MAX_LENGTH = 200
+
+# Event properties of a team with more values than this in a day get left out of the index from then on, like
+# UNINDEXED_EVENT_PROPERTIES, as they're about as unique as these. Found daily by `FIND_UNINDEXED_PROPERTY_KEYS_SQL`.
+PROPERTY_VALUES_MAX_VALUES_PER_KEY = 10000
+
+# Replicated to every node rather than sharded, as the view on each shard of events reads it
+UNINDEXED_PROPERTY_KEYS_TABLE_SQL = lambda: """
+CREATE TABLE IF NOT EXISTS unindexed_property_keys ON CLUSTER '{cluster}'
+(
+    team_id Int64,
+    key VARCHAR,
+    _timestamp DateTime
+) ENGINE = {engine}
+ORDER BY (team_id, key)
+""".format(
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    engine=ReplacingMergeTree("unindexed_property_keys", ver="_timestamp"),
+)
+
+FIND_UNINDEXED_PROPERTY_KEYS_SQL = lambda: """
+INSERT INTO {database}.unindexed_property_keys
+SELECT team_id, key, now()
+FROM {database}.property_values
+WHERE property_type = 'event' AND day >= yesterday()
+GROUP BY team_id, key
+HAVING uniq(value) > %(max_values)s
+""".format(database=settings.CLICKHOUSE_DATABASE)
+
+SELECT_UNINDEXED_PROPERTY_KEY_SQL = """
+SELECT 1 FROM unindexed_property_keys WHERE team_id = %(team_id)s AND key = %(key)s LIMIT 1
+"""
+
+PROPERTY_VALUES_SELECT_SQL = """
+SELECT
+    team_id,
+    '{property_type}' AS property_type,
+    {group_type_index} AS group_type_index,
+    tupleElement(key_and_value, 1) AS key,
+    {value} AS value,
+    toDate({timestamp}) AS day,
+    uniqState(toString({counted})) AS count_state
+FROM {source}
+ARRAY JOIN JSONExtractKeysAndValuesRaw({properties}) AS key_and_value
+WHERE value NOT IN ('', 'null')
+    AND lengthUTF8(value) <= {max_length}
+{conditions}
+GROUP BY team_id, group_type_index, key, value, day
+"""
+
+# Events are counted by uuid, persons by id and groups by key, as persons and groups get written once per update
+PROPERTY_VALUES_SOURCES = {
+    "event": {
+        "group_type_index": "toUInt8(0)",
+        "timestamp": "timestamp",
+        "counted": "uuid",
+        "properties": "properties",
+        "conditions": """AND key NOT IN ({})
+    AND (team_id, key) NOT IN (SELECT team_id, key FROM {{database}}.unindexed_property_keys)""".format(
+            ", ".join(f"'{key}'" for key in UNINDEXED_EVENT_PROPERTIES)
+        ),
+    },
+    "person": {
+        "group_type_index": "toUInt8(0)",
+        "timestamp": "_timestamp",
+        "counted": "id",
+        "properties": "properties",
+        "conditions": "AND is_deleted = 0",
+        "latest_versions": """
+            SELECT
+                team_id,
+                id,
+                argMax(properties, _timestamp) AS properties,
+                argMax(is_deleted, _timestamp) AS is_deleted
+            FROM {database}.person
+            WHERE modulo(cityHash64(id), %(slices)s) = %(slice)s
+            GROUP BY team_id, id
+        """,
+    },
+    "group": {
+        "group_type_index": "group_type_index",
+        "timestamp": "_timestamp",
+        "counted": "group_key",
+        "properties": "group_properties",
+        "conditions": "",
+        "latest_versions": """
+            SELECT team_id, group_type_index, group_key, argMax(group_properties, _timestamp) AS group_properties
+            FROM {database}.groups
+            WHERE modulo(cityHash64(group_key), %(slices)s) = %(slice)s
+            GROUP BY team_id, group_type_index, group_key
+        """,
+    },
+}
+
+
+def _property_values_select_sql(
+    property_type: str, source_table: str, conditions: str = "", latest_versions: bool = False
+) -> str:
+    """
+    Selects the rows of `property_values` for the values in `source_table`. With `latest_versions`, only the current
+    version of each person or group is indexed, as of today, for the slice `%(slice)s` out of `%(slices)s`.
+    """
+    source = PROPERTY_VALUES_SOURCES[property_type]
+    if latest_versions:
+        from_sql = "({})".format(source["latest_versions"].format(database=settings.CLICKHOUSE_DATABASE))
+    else:
+        from_sql = f"{settings.CLICKHOUSE_DATABASE}.{source_table}"
+    return PROPERTY_VALUES_SELECT_SQL.format(
+        property_type=property_type,
+        group_type_index=source["group_type_index"],
+        value=trim_quotes_expr("tupleElement(key_and_value, 2)"),
+        timestamp="now()" if latest_versions else source["timestamp"],
+        counted=source["counted"],
+        source=from_sql,
+        properties=source["properties"],
+        max_length=PROPERTY_VALUES_MAX_LENGTH,
+        conditions="{} {}".format(source["conditions"].format(database=settings.CLICKHOUSE_DATABASE), conditions),
+    )
+
+
+# Tables written to at ingestion, which trigger the materialized views
+PROPERTY_VALUES_SOURCE_TABLES = {"event": EVENTS_DATA_TABLE, "person": lambda: "person", "group": lambda: "groups"}
+
+PROPERTY_VALUES_MV_SQL = lambda property_type: """
+CREATE MATERIALIZED VIEW property_values_{property_type}_mv ON CLUSTER '{cluster}'
+TO {database}.{target_table}
+AS {select_sql}
+""".format(
+    property_type=property_type,
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    database=settings.CLICKHOUSE_DATABASE,
+    target_table=PROPERTY_VALUES_DATA_TABLE(),
+    select_sql=_property_values_select_sql(property_type, PROPERTY_VALUES_SOURCE_TABLES[property_type]()),
+)
+
+EVENT_PROPERTY_VALUES_MV_SQL = lambda: PROPERTY_VALUES_MV_SQL("event")
+PERSON_PROPERTY_VALUES_MV_SQL = lambda: PROPERTY_VALUES_MV_SQL("person")
+GROUP_PROPERTY_VALUES_MV_SQL = lambda: PROPERTY_VALUES_MV_SQL("group")
+
+# Fills in values of events that were written before the materialized views existed
+BACKFILL_EVENT_PROPERTY_VALUES_SQL = lambda conditions: """
+INSERT INTO {database}.property_values
+{select_sql}
+""".format(
+    database=settings.CLICKHOUSE_DATABASE, select_sql=_property_values_select_sql("event", "events", conditions),
+)
+
+# Indexes the current values of persons or groups as of today. Run when creating the index and then weekly, so that
+# values are still suggested after the rows written when they were set have aged out. Finding the current versions
+# groups every person or group, so it's run one slice of them at a time.
+REINDEX_PROPERTY_VALUES_SQL = lambda property_type: """
+INSERT INTO {database}.property_values
+{select_sql}
+""".format(
+    database=settings.CLICKHOUSE_DATABASE,
+    select_sql=_property_values_select_sql(
+        property_type, PROPERTY_VALUES_SOURCE_TABLES[property_type](), latest_versions=True
+    ),
+)
+
+SELECT_PROPERTY_VALUES_SQL = """
+SELECT value, uniqMerge(count_state) AS count
+FROM property_values
+WHERE team_id = %(team_id)s
+    AND property_type = %(property_type)s
+    AND group_type_index = %(group_type_index)s
+    AND key = %(key)s
+    {conditions}
+GROUP BY value
+ORDER BY {order_by}count DESC, value
+{limit}
+"""
+
+SELECT_UNINDEXED_EVENT_PROPERTY_VALUES_SQL = """
+SELECT {property_field} AS value, count() AS count
+FROM events
+WHERE team_id = %(team_id)s
+    AND JSONHas(properties, %(key)s)
+    AND timestamp >= %(date_from)s
+    {conditions}
+GROUP BY value
+ORDER BY {order_by}count DESC, value
+LIMIT %(limit)s
+"""
+
+TRUNCATE_PROPERTY_VALUES_TABLE_SQL = (
+    lambda: f"TRUNCATE TABLE IF EXISTS {PROPERTY_VALUES_DATA_TABLE()} ON CLUSTER '{settings.CLICKHOUSE_CLUSTER}'"
+)
+
+TRUNCATE_UNINDEXED_PROPERTY_KEYS_TABLE_SQL = (
+    lambda: f"TRUNCATE TABLE IF EXISTS unindexed_property_keys ON CLUSTER '{settings.CLICKHOUSE_CLUSTER}'"
+)
@@ -7,6 +7,7 @@ from ee.clickhouse.sql.events import *
 from ee.clickhouse.sql.groups import *
 from ee.clickhouse.sql.person import *
 from ee.clickhouse.sql.plugin_log_entries import *
+from ee.clickhouse.sql.property_values import *
 from ee.clickhouse.sql.session_recording_events import *
 
 CREATE_TABLE_QUERIES = [
@@ -36,10 +37,19 @@ CREATE_TABLE_QUERIES = [
     SESSION_RECORDING_EVENTS_TABLE_SQL,
     KAFKA_SESSION_RECORDING_EVENTS_TABLE_SQL,
     SESSION_RECORDING_EVENTS_TABLE_MV_SQL,
+    SESSION_RECORDING_METADATA_TABLE_SQL,
+    SESSION_RECORDING_METADATA_MV_SQL,
+    PROPERTY_VALUES_TABLE_SQL,
+    UNINDEXED_PROPERTY_KEYS_TABLE_SQL,
+    EVENT_PROPERTY_VALUES_MV_SQL,
+    PERSON_PROPERTY_VALUES_MV_SQL,
+    GROUP_PROPERTY_VALUES_MV_SQL,
     WRITABLE_EVENTS_TABLE_SQL,
     DISTRIBUTED_EVENTS_TABLE_SQL,
     WRITABLE_SESSION_RECORDING_EVENTS_TABLE_SQL,
     DISTRIBUTED_SESSION_RECORDING_EVENTS_TABLE_SQL,
+    DISTRIBUTED_SESSION_RECORDING_METADATA_TABLE_SQL,
+    DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL,
 ]
 
 build_query = lambda query: query if isinstance(query, str) else query()
@@ -1,7 +1,7 @@
 from django.conf import settings
 
 from ee.clickhouse.sql.clickhouse import KAFKA_COLUMNS, kafka_engine, ttl_period
-from ee.clickhouse.sql.table_engines import Distributed, ReplacingMergeTree, ReplicationScheme
+from ee.clickhouse.sql.table_engines import AggregatingMergeTree, Distributed, ReplacingMergeTree, ReplicationScheme
 from ee.kafka_client.topics import KAFKA_SESSION_RECORDING_EVENTS
 
 SESSION_RECORDING_EVENTS_DATA_TABLE = (
@@ -114,6 +114,118 @@ DISTRIBUTED_SESSION_RECORDING_EVENTS_TABLE_SQL = lambda: SESSION_RECORDING_EVENT
 )
 
 
+# Per session and window metadata, aggregated from the `events_summary` the capture endpoint adds to the first part
+# of every chunk. Snapshots without a summary (e.g. from before summaries existed) only contribute their timestamp
+# and get counted in `unsummarized_chunk_count`, in which case metadata has to be calculated from the snapshots.
+SESSION_RECORDING_METADATA_DATA_TABLE = (
+    lambda: "sharded_session_recording_metadata" if settings.CLICKHOUSE_REPLICATION else "session_recording_metadata"
+)
+
+SESSION_RECORDING_METADATA_TABLE_BASE_SQL = """
+CREATE TABLE IF NOT EXISTS {table_name} ON CLUSTER '{cluster}'
+(
+    team_id Int64,
+    session_id VARCHAR,
+    window_id VARCHAR,
+    first_distinct_id AggregateFunction(argMin, VARCHAR, DateTime64(6, 'UTC')),
+    first_timestamp SimpleAggregateFunction(min, DateTime64(6, 'UTC')),
+    last_timestamp SimpleAggregateFunction(max, DateTime64(6, 'UTC')),
+    active_segments SimpleAggregateFunction(groupArrayArray, Array(Tuple(Int64, Int64))),
+    click_count SimpleAggregateFunction(sum, Int64),
+    keypress_count SimpleAggregateFunction(sum, Int64),
+    full_snapshot_count SimpleAggregateFunction(sum, Int64),
+    unsummarized_chunk_count SimpleAggregateFunction(sum, Int64)
+) ENGINE = {engine}
+"""
+
+SESSION_RECORDING_METADATA_TABLE_SQL = lambda: (
+    SESSION_RECORDING_METADATA_TABLE_BASE_SQL
+    + """ORDER BY (team_id, session_id, window_id)
+{ttl_period}
+"""
+).format(
+    table_name=SESSION_RECORDING_METADATA_DATA_TABLE(),
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    engine=AggregatingMergeTree("session_recording_metadata", replication_scheme=ReplicationScheme.SHARDED),
+    ttl_period=ttl_period("last_timestamp"),
+)
+
+# This table is responsible for reading from session_recording_metadata on a cluster setting
+DISTRIBUTED_SESSION_RECORDING_METADATA_TABLE_SQL = lambda: SESSION_RECORDING_METADATA_TABLE_BASE_SQL.format(
+    table_name="session_recording_metadata",
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    engine=Distributed(data_table=SESSION_RECORDING_METADATA_DATA_TABLE(), sharding_key="sipHash64(session_id)"),
+)
+
+# Only the first part of a chunk has a summary, snapshots from before chunking have a chunk_index of 0 as well
+SESSION_RECORDING_METADATA_SELECT_SQL = """
+WITH JSONHas(snapshot_data, 'events_summary') AS has_summary
+SELECT
+    team_id,
+    session_id,
+    window_id,
+    argMinState(distinct_id, timestamp) AS first_distinct_id,
+    min(if(has_summary, toDateTime64(JSONExtractInt(snapshot_data, 'events_summary', 'start_time') / 1000, 6, 'UTC'), timestamp)) AS first_timestamp,
+    max(if(has_summary, toDateTime64(JSONExtractInt(snapshot_data, 'events_summary', 'end_time') / 1000, 6, 'UTC'), timestamp)) AS last_timestamp,
+    groupArrayArray(JSONExtract(snapshot_data, 'events_summary', 'active_segments', 'Array(Tuple(Int64, Int64))')) AS active_segments,
+    sum(JSONExtractInt(snapshot_data, 'events_summary', 'click_count')) AS click_count,
+    sum(JSONExtractInt(snapshot_data, 'events_summary', 'keypress_count')) AS keypress_count,
+    sum(JSONExtractBool(snapshot_data, 'has_full_snapshot')) AS full_snapshot_count,
+    countIf(NOT has_summary) AS unsummarized_chunk_count{extra_columns}
+FROM {database}.{source_table}
+WHERE JSONExtractInt(snapshot_data, 'chunk_index') = 0
+GROUP BY team_id, session_id, window_id
+"""
+
+SESSION_RECORDING_METADATA_MV_SQL = lambda: """
+CREATE MATERIALIZED VIEW session_recording_metadata_mv ON CLUSTER '{cluster}'
+TO {database}.{target_table}
+AS {select_sql}
+""".format(
+    cluster=settings.CLICKHOUSE_CLUSTER,
+    database=settings.CLICKHOUSE_DATABASE,
+    target_table=SESSION_RECORDING_METADATA_DATA_TABLE(),
+    select_sql=SESSION_RECORDING_METADATA_SELECT_SQL.format(
+        database=settings.CLICKHOUSE_DATABASE, source_table=SESSION_RECORDING_EVENTS_DATA_TABLE(), extra_columns="",
+    ),
+)
+
+# Fills in metadata from snapshots written before session_recording_metadata_mv existed, run after creating the view.
+# Sessions that were being recorded during the migration have snapshots both before and after the view, which can't
+# be told apart reliably. These are the windows the view has already seen, plus any with a snapshot since `cutoff`
+# (taken before creating the view) for ones it's about to see. Their min/max/argMin columns don't mind being counted
+# twice, but the rest would, so they're marked unsummarized instead and get calculated from their snapshots.
+BACKFILL_SESSION_RECORDING_METADATA_SQL = lambda: """
+INSERT INTO {database}.session_recording_metadata
+SELECT
+    team_id,
+    session_id,
+    window_id,
+    first_distinct_id,
+    first_timestamp,
+    last_timestamp,
+    if(straddles_migration, [], active_segments),
+    if(straddles_migration, 0, click_count),
+    if(straddles_migration, 0, keypress_count),
+    full_snapshot_count,
+    unsummarized_chunk_count + straddles_migration
+FROM ({select_sql})
+""".format(
+    database=settings.CLICKHOUSE_DATABASE,
+    select_sql=SESSION_RECORDING_METADATA_SELECT_SQL.format(
+        database=settings.CLICKHOUSE_DATABASE,
+        source_table="session_recording_events",
+        extra_columns=""",
+    max(_timestamp) >= %(cutoff)s
+        OR (team_id, session_id, window_id) GLOBAL IN (
+            SELECT team_id, session_id, window_id FROM {database}.session_recording_metadata
+        ) AS straddles_migration""".format(
+            database=settings.CLICKHOUSE_DATABASE
+        ),
+    ),
+)
+
+
 INSERT_SESSION_RECORDING_EVENT_SQL = (
     lambda: f"""
 INSERT INTO {SESSION_RECORDING_EVENTS_DATA_TABLE()} (uuid, timestamp, team_id, distinct_id, session_id, window_id, snapshot_data, created_at, _timestamp, _offset)
@@ -126,6 +238,10 @@ TRUNCATE_SESSION_RECORDING_EVENTS_TABLE_SQL = lambda: (
     f"TRUNCATE TABLE IF EXISTS {SESSION_RECORDING_EVENTS_DATA_TABLE()} ON CLUSTER '{settings.CLICKHOUSE_CLUSTER}'"
 )
 
+TRUNCATE_SESSION_RECORDING_METADATA_TABLE_SQL = lambda: (
+    f"TRUNCATE TABLE IF EXISTS {SESSION_RECORDING_METADATA_DATA_TABLE()} ON CLUSTER '{settings.CLICKHOUSE_CLUSTER}'"
+)
+
 DROP_SESSION_RECORDING_EVENTS_TABLE_SQL = lambda: (
     f"DROP TABLE IF EXISTS {SESSION_RECORDING_EVENTS_DATA_TABLE()} ON CLUSTER '{settings.CLICKHOUSE_CLUSTER}'"
 )
@@ -133,3 +249,7 @@ DROP_SESSION_RECORDING_EVENTS_TABLE_SQL = lambda: (
 UPDATE_RECORDINGS_TABLE_TTL_SQL = lambda: (
     f"ALTER TABLE {SESSION_RECORDING_EVENTS_DATA_TABLE()} MODIFY TTL toDate(created_at) + toIntervalWeek(%(weeks)s)"
 )
+
+UPDATE_RECORDINGS_METADATA_TABLE_TTL_SQL = lambda: (
+    f"ALTER TABLE {SESSION_RECORDING_METADATA_DATA_TABLE()} MODIFY TTL toDate(last_timestamp) + toIntervalWeek(%(weeks)s)"
+)
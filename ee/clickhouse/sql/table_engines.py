@@ -65,6 +65,11 @@ class CollapsingMergeTree(MergeTreeEngine):
     REPLICATED_ENGINE = "ReplicatedCollapsingMergeTree('{zk_path}', '{replica_key}', {ver})"
 
 
+class AggregatingMergeTree(MergeTreeEngine):
+    ENGINE = "AggregatingMergeTree()"
+    REPLICATED_ENGINE = "ReplicatedAggregatingMergeTree('{zk_path}', '{replica_key}')"
+
+
 class Distributed:
     def __init__(self, data_table: str, sharding_key: str):
         self.data_table = data_table
@@ -1,14 +1,27 @@
 import datetime
+import importlib
+import pkgutil
 from unittest.mock import patch
 
 import fakeredis
+import sqlparse
 from clickhouse_driver.errors import ServerException
 from django.test import TestCase
 from freezegun import freeze_time
 
+import ee.clickhouse.sql
 from ee.clickhouse.util import ClickhouseTestMixin
 from posthog import client
-from posthog.client import CACHE_TTL, _deserialize, _key_hash, cache_sync_execute, sync_execute
+from posthog.client import (
+    CACHE_TTL,
+    _deserialize,
+    _key_hash,
+    _strip_sql_comments_cached,
+    cache_sync_execute,
+    strip_sql_comments,
+    sync_execute,
+    sync_execute_iter,
+)
 
 
 class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
@@ -160,3 +173,55 @@ class ClickhouseClientTestCase(TestCase, ClickhouseTestMixin):
             # Make sure it still includes the "annotation" comment that includes
             # request routing information for debugging purposes
             self.assertIn("/* request:1 */", first_query)
+
+    def test_client_leaves_comment_markers_in_values_alone(self):
+        result = sync_execute(
+            "SELECT %(value)s, '/* literal */' -- comment\n, `--column` FROM (SELECT 1 AS `--column`)",
+            {"value": "-- value"},
+        )
+
+        self.assertEqual(result, [("-- value", "/* literal */", 1)])
+
+    def test_strip_sql_comments_matches_sqlparse(self):
+        templates = [
+            value
+            for module_info in pkgutil.walk_packages(ee.clickhouse.sql.__path__, "ee.clickhouse.sql.")
+            if ".test" not in module_info.name
+            for value in vars(importlib.import_module(module_info.name)).values()
+            if isinstance(value, str)
+        ]
+
+        for template in templates:
+            self.assertEqual(
+                strip_sql_comments(template).split(), sqlparse.format(template, strip_comments=True).split()
+            )
+
+    @patch("posthog.client.STRIPPED_QUERY_CACHE_MAX_LENGTH", 50)
+    def test_strip_sql_comments_caches_short_queries_only(self):
+        _strip_sql_comments_cached.cache_clear()
+
+        self.assertEqual(strip_sql_comments("SELECT 1 -- short"), "SELECT 1")
+        self.assertEqual(strip_sql_comments("SELECT 1 -- short"), "SELECT 1")
+        long_query = "SELECT 1 WHERE id IN ({}) -- long".format(", ".join(map(str, range(20))))
+        self.assertEqual(strip_sql_comments(long_query), long_query[: -len(" -- long")])
+
+        self.assertEqual(_strip_sql_comments_cached.cache_info().hits, 1)
+        self.assertEqual(_strip_sql_comments_cached.cache_info().currsize, 1)
+
+    def test_sync_execute_iter_yields_blocks(self):
+        blocks = list(sync_execute_iter("SELECT number FROM numbers(%(count)s)", {"count": 25}, block_size=10))
+
+        self.assertEqual([len(block) for block in blocks], [10, 10, 5])
+        self.assertEqual([row[0] for block in blocks for row in block], list(range(25)))
+
+    def test_sync_execute_iter_can_be_abandoned(self):
+        blocks = sync_execute_iter("SELECT number FROM numbers(100000)", block_size=10)
+        self.assertEqual(len(next(blocks)), 10)
+        blocks.close()
+
+        # The connection gets reset rather than returned to the pool with the rest of the result unread
+        self.assertEqual(sync_execute("SELECT 1"), [(1,)])
+
+    def test_sync_execute_iter_raises_query_errors(self):
+        with self.assertRaises(ServerException):
+            list(sync_execute_iter("SELECT WOW SUCH DATA FROM NOWHERE THIS WILL CERTAINLY WORK"))
@@ -7,8 +7,8 @@ from rest_framework.exceptions import NotFound
 from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 
+from ee.clickhouse.queries.property_values import get_group_property_values_for_key
 from ee.clickhouse.queries.related_actors_query import RelatedActorsQuery
-from ee.clickhouse.sql.clickhouse import trim_quotes_expr
 from posthog.api.routing import StructuredViewSetMixin
 from posthog.client import sync_execute
 from posthog.models.group import Group
@@ -110,16 +110,8 @@ class ClickhouseGroupsView(StructuredViewSetMixin, mixins.ListModelMixin, viewse
 
     @action(methods=["GET"], detail=False)
     def property_values(self, request: request.Request, **kw):
-        rows = sync_execute(
-            f"""
-            SELECT {trim_quotes_expr("tupleElement(keysAndValues, 2)")} as value
-            FROM groups
-            ARRAY JOIN JSONExtractKeysAndValuesRaw(group_properties) as keysAndValues
-            WHERE team_id = %(team_id)s AND group_type_index = %(group_type_index)s AND tupleElement(keysAndValues, 1) = %(key)s
-            GROUP BY tupleElement(keysAndValues, 2)
-            ORDER BY value ASC
-        """,
-            {"team_id": self.team.pk, "group_type_index": request.GET["group_type_index"], "key": request.GET["key"]},
+        rows = get_group_property_values_for_key(
+            request.GET["key"], self.team, int(request.GET["group_type_index"]), request.GET.get("value")
         )
 
-        return response.Response([{"name": name[0]} for name in rows])
+        return response.Response([{"name": name} for name, _ in rows])
@@ -200,6 +200,17 @@ class ClickhouseTestGroupsApi(ClickhouseTestMixin, APIBaseTest):
         self.assertEqual(len(response), 2)
         self.assertEqual(response, [{"name": "finance"}, {"name": "technology"}])
 
+    def test_property_values_search(self):
+        create_group(team_id=self.team.pk, group_type_index=0, group_key="org:5", properties={"industry": "fintech"})
+        create_group(team_id=self.team.pk, group_type_index=0, group_key="org:6", properties={"industry": "defi"})
+        create_group(team_id=self.team.pk, group_type_index=0, group_key="org:7", properties={"industry": "defi"})
+        create_group(team_id=self.team.pk, group_type_index=0, group_key="org:8", properties={"industry": "retail"})
+        response = self.client.get(
+            f"/api/projects/{self.team.id}/groups/property_values/?key=industry&group_type_index=0&value=FI"
+        ).json()
+        # Values starting with the search term come first, even if less common
+        self.assertEqual(response, [{"name": "fintech"}, {"name": "defi"}])
+
     def test_empty_property_values(self):
         create_group(team_id=self.team.pk, group_type_index=0, group_key="org:5", properties={"industry": "finance"})
         create_group(team_id=self.team.pk, group_type_index=0, group_key="org:6", properties={"industry": "technology"})
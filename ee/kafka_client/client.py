@@ -5,14 +5,18 @@ from typing import Any, Callable, Dict, Optional
 import kafka.errors
 from kafka import KafkaConsumer as KC
 from kafka import KafkaProducer as KP
+from statshog.defaults.django import statsd
 from structlog import get_logger
 
 from ee.kafka_client import helper
 from ee.settings import KAFKA_ENABLED
-from posthog.client import async_execute, sync_execute
+from posthog import json_codec
+from posthog.client import sync_execute
 from posthog.settings import (
     KAFKA_BASE64_KEYS,
     KAFKA_HOSTS,
+    KAFKA_PRODUCER_BATCH_SIZE,
+    KAFKA_PRODUCER_LINGER_MS,
     KAFKA_SASL_MECHANISM,
     KAFKA_SASL_PASSWORD,
     KAFKA_SASL_USER,
@@ -33,7 +37,7 @@ class TestKafkaProducer:
     def send(self, topic: str, value: Any, key: Any = None):
         return
 
-    def flush(self):
+    def flush(self, timeout: Optional[float] = None):
         return
 
 
@@ -85,10 +89,17 @@ class _KafkaProducer:
         if test:
             self.producer = TestKafkaProducer()
         elif KAFKA_BASE64_KEYS:
-            self.producer = helper.get_kafka_producer(retries=KAFKA_PRODUCER_RETRIES, value_serializer=lambda d: d)
+            self.producer = helper.get_kafka_producer(
+                retries=KAFKA_PRODUCER_RETRIES,
+                value_serializer=lambda d: d,
+                linger_ms=KAFKA_PRODUCER_LINGER_MS,
+                batch_size=KAFKA_PRODUCER_BATCH_SIZE,
+            )
         else:
             self.producer = KP(
                 retries=KAFKA_PRODUCER_RETRIES,
+                linger_ms=KAFKA_PRODUCER_LINGER_MS,
+                batch_size=KAFKA_PRODUCER_BATCH_SIZE,
                 bootstrap_servers=KAFKA_HOSTS,
                 security_protocol=KAFKA_SECURITY_PROTOCOL or _KafkaSecurityProtocol.PLAINTEXT,
                 **_sasl_params(),
@@ -96,16 +107,34 @@ class _KafkaProducer:
 
     @staticmethod
     def json_serializer(d):
-        b = json.dumps(d).encode("utf-8")
-        return b
+        return json_codec.dumps_bytes(d)
+
+    @staticmethod
+    def on_send_success(record_metadata, topic: str):
+        statsd.incr("posthog_cloud_kafka_send_success", tags={"topic": topic})
+
+    @staticmethod
+    def on_send_failure(exc, topic: str):
+        statsd.incr("posthog_cloud_kafka_send_failure", tags={"topic": topic, "error": exc.__class__.__name__})
 
     def produce(self, topic: str, data: Any, key: Any = None, value_serializer: Optional[Callable[[Any], Any]] = None):
+        """
+        Enqueues the message and returns immediately. Messages are sent in batches by the producer's I/O thread,
+        governed by `KAFKA_PRODUCER_LINGER_MS` and `KAFKA_PRODUCER_BATCH_SIZE`, and delivery reports are counted in
+        statsd. The returned future (None in tests) can be waited on for a synchronous ack.
+        """
         if not value_serializer:
             value_serializer = self.json_serializer
         b = value_serializer(data)
         if key is not None:
             key = key.encode("utf-8")
-        self.producer.send(topic, value=b, key=key)
+        future = self.producer.send(topic, value=b, key=key)
+        if future is not None:
+            future.add_callback(self.on_send_success, topic=topic).add_errback(self.on_send_failure, topic=topic)
+        return future
+
+    def flush(self, timeout: Optional[float] = None):
+        self.producer.flush(timeout=timeout)
 
     def close(self):
         self.producer.flush()
@@ -178,11 +207,8 @@ class ClickhouseProducer:
         else:
             self.send_to_kafka = False
 
-    def produce(self, sql: str, topic: str, data: Dict[str, Any], sync: bool = True):
+    def produce(self, sql: str, topic: str, data: Dict[str, Any]):
         if self.send_to_kafka:
             self.producer.produce(topic=topic, data=data)
         else:
-            if sync:
-                sync_execute(sql, data)
-            else:
-                async_execute(sql, data)
+            sync_execute(sql, data)
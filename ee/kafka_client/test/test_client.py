@@ -1,4 +1,4 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import kafka
 from django.test import TestCase
@@ -20,6 +20,25 @@ class KafkaClientTestCase(TestCase):
         msg = next(consumer)
         self.assertEqual(msg, "message 1 from test_topic topic")
 
+    @patch("ee.kafka_client.client.statsd")
+    def test_kafka_produce_reports_delivery(self, mock_statsd):
+        producer = _KafkaProducer(test=True)
+        future = MagicMock()
+        future.add_callback.return_value = future
+        producer.producer = MagicMock(send=MagicMock(return_value=future))
+
+        self.assertEqual(producer.produce(topic=self.topic, data=self.payload), future)
+
+        future.add_callback.assert_called_once_with(producer.on_send_success, topic=self.topic)
+        future.add_errback.assert_called_once_with(producer.on_send_failure, topic=self.topic)
+
+        producer.on_send_success(None, topic=self.topic)
+        producer.on_send_failure(TimeoutError(), topic=self.topic)
+        mock_statsd.incr.assert_any_call("posthog_cloud_kafka_send_success", tags={"topic": self.topic})
+        mock_statsd.incr.assert_any_call(
+            "posthog_cloud_kafka_send_failure", tags={"topic": self.topic, "error": "TimeoutError"}
+        )
+
     def test_kafka_produce(self):
         producer = _KafkaProducer(test=False)
         producer.produce(topic=self.topic, data=self.payload)
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.12 on 2022-05-04 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ee", "0012_migrate_tags_v2"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MaterializedColumnDecision",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("table", models.CharField(max_length=50)),
+                ("property", models.CharField(max_length=400)),
+                ("column_name", models.CharField(max_length=400)),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("materialize", "materialize"),
+                            ("backfill", "backfill"),
+                            ("deprecate", "deprecate"),
+                            ("drop", "drop"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("is_automatic", models.BooleanField(default=True)),
+                ("cost", models.BigIntegerField(blank=True, null=True)),
+                ("partition_id", models.CharField(blank=True, max_length=100, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
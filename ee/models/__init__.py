@@ -3,6 +3,7 @@ from .event_definition import EnterpriseEventDefinition
 from .explicit_team_membership import ExplicitTeamMembership
 from .hook import Hook
 from .license import License
+from .materialized_column_decision import MaterializedColumnDecision
 from .property_definition import EnterprisePropertyDefinition
 
 __all__ = [
@@ -11,5 +12,6 @@ __all__ = [
     "DashboardPrivilege",
     "Hook",
     "License",
+    "MaterializedColumnDecision",
     "EnterprisePropertyDefinition",
 ]
@@ -0,0 +1,31 @@
+from django.db import models
+
+from posthog.models.utils import sane_repr
+
+
+class MaterializedColumnDecision(models.Model):
+    """
+    Audit log of the materialized columns created, backfilled, deprecated and dropped by
+    `ee.clickhouse.materialized_columns.analyze`. Backfills are scheduled one partition per row and are pending until
+    `completed_at` is set.
+    """
+
+    class Action(models.TextChoices):
+        MATERIALIZE = "materialize", "materialize"
+        BACKFILL = "backfill", "backfill"
+        DEPRECATE = "deprecate", "deprecate"
+        DROP = "drop", "drop"
+
+    table: models.CharField = models.CharField(max_length=50)
+    property: models.CharField = models.CharField(max_length=400)
+    column_name: models.CharField = models.CharField(max_length=400)
+    action: models.CharField = models.CharField(max_length=20, choices=Action.choices)
+    # Whether the decision was made by query analysis, rather than requested through `materialize_columns --property`
+    is_automatic: models.BooleanField = models.BooleanField(default=True)
+    # Estimated benefit of materializing, or number of queries using the column when deprecating
+    cost: models.BigIntegerField = models.BigIntegerField(null=True, blank=True)
+    partition_id: models.CharField = models.CharField(max_length=100, null=True, blank=True)
+    created_at: models.DateTimeField = models.DateTimeField(auto_now_add=True)
+    completed_at: models.DateTimeField = models.DateTimeField(null=True, blank=True)
+
+    __repr__ = sane_repr("table", "property", "action", "partition_id")
@@ -5,7 +5,7 @@ import os
 from typing import Dict, List
 
 from ee.kafka_client.topics import KAFKA_EVENTS_PLUGIN_INGESTION as DEFAULT_KAFKA_EVENTS_PLUGIN_INGESTION
-from posthog.settings import AUTHENTICATION_BACKENDS, SITE_URL, TEST, get_from_env
+from posthog.settings import AUTHENTICATION_BACKENDS, SITE_URL, TEST, get_from_env, str_to_bool
 
 # Zapier REST hooks
 HOOK_EVENTS: Dict[str, str] = {
@@ -60,6 +60,13 @@ MATERIALIZE_COLUMNS_ANALYSIS_PERIOD_HOURS = get_from_env(
 MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS = get_from_env("MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS", 90, type_cast=int)
 # Maximum number of columns to materialize at once. Avoids running into resource bottlenecks (storage + ingest + backfilling).
 MATERIALIZE_COLUMNS_MAX_AT_ONCE = get_from_env("MATERIALIZE_COLUMNS_MAX_AT_ONCE", 10, type_cast=int)
+# Maximum number of materialized columns per table. Keeps storage and ingestion costs of materialized columns bounded.
+MATERIALIZE_COLUMNS_MAX_PER_TABLE = get_from_env("MATERIALIZE_COLUMNS_MAX_PER_TABLE", 100, type_cast=int)
+# Whether to drop automatically materialized columns that no query used within the analysis period. Needs the query log
+# of every node to cover the period.
+MATERIALIZE_COLUMNS_DROP_UNUSED = get_from_env("MATERIALIZE_COLUMNS_DROP_UNUSED", False, type_cast=str_to_bool)
+# Hours of the day (UTC) during which backfills run, one partition at a time. Formatted as start-end, e.g. 22-6.
+MATERIALIZE_COLUMNS_BACKFILL_HOURS = get_from_env("MATERIALIZE_COLUMNS_BACKFILL_HOURS", "0-6")
 
 # Topic to write events to between clickhouse
 KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC: str = os.getenv(
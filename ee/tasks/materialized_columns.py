@@ -1,7 +1,17 @@
+from datetime import timedelta
+
 from celery.utils.log import get_task_logger
+from django.utils.timezone import now
 
-from ee.clickhouse.materialized_columns.columns import TRIM_AND_EXTRACT_PROPERTY, ColumnName, get_materialized_columns
+from ee.clickhouse.materialized_columns.columns import (
+    TRIM_AND_EXTRACT_PROPERTY,
+    ColumnName,
+    backfill_materialized_columns,
+    get_materialized_columns,
+)
 from ee.clickhouse.replication.utils import clickhouse_is_replicated
+from ee.models.materialized_column_decision import MaterializedColumnDecision
+from ee.settings import MATERIALIZE_COLUMNS_BACKFILL_HOURS, MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS
 from posthog.client import sync_execute
 from posthog.settings import CLICKHOUSE_CLUSTER, CLICKHOUSE_DATABASE
 
@@ -13,7 +23,12 @@ def mark_all_materialized() -> None:
         logger.info("There are running mutations, skipping marking as materialized")
         return
 
+    # Columns need to keep their default expression until all of their partitions are backfilled
+    pending_backfills = set(_pending_backfills().values_list("table", "property"))
     for table, property_name, column_name in get_materialized_columns_with_default_expression():
+        if (table, property_name) in pending_backfills:
+            continue
+
         updated_table = "sharded_events" if clickhouse_is_replicated() and table == "events" else table
 
         # :TRICKY: On cloud, we ON CLUSTER updates to events/sharded_events but not to persons. Why? ¯\_(ツ)_/¯
@@ -30,6 +45,49 @@ def mark_all_materialized() -> None:
         )
 
 
+def run_scheduled_backfill() -> None:
+    "Backfills the next partition scheduled by `materialize_properties_task`, during off-peak hours only"
+    if not is_off_peak(now().hour, MATERIALIZE_COLUMNS_BACKFILL_HOURS):
+        return
+    if any_ongoing_mutations():
+        logger.info("There are running mutations, skipping backfilling")
+        return
+
+    next_backfill = _pending_backfills().order_by("id").first()
+    if next_backfill is None:
+        return
+
+    backfills = _pending_backfills().filter(table=next_backfill.table, partition_id=next_backfill.partition_id)
+    materialized_columns = get_materialized_columns(next_backfill.table, use_cache=False)
+    # Columns may have been dropped in the meantime
+    properties = [backfill.property for backfill in backfills if backfill.property in materialized_columns]
+
+    logger.info(
+        f"Backfilling materialized columns. table={next_backfill.table}, partition_id={next_backfill.partition_id}, properties={properties}"
+    )
+    backfill_materialized_columns(
+        next_backfill.table,
+        properties,
+        timedelta(days=MATERIALIZE_COLUMNS_BACKFILL_PERIOD_DAYS),
+        partition_id=next_backfill.partition_id,
+    )
+    backfills.update(completed_at=now())
+
+
+def is_off_peak(hour: int, hours: str) -> bool:
+    "Whether `hour` is within `hours` formatted as start-end, which may wrap around midnight, e.g. 22-6"
+    start, end = (int(value) for value in hours.split("-"))
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def _pending_backfills():
+    return MaterializedColumnDecision.objects.filter(
+        action=MaterializedColumnDecision.Action.BACKFILL, completed_at__isnull=True
+    )
+
+
 def get_materialized_columns_with_default_expression():
     for table in ["events", "person"]:
         materialized_columns = get_materialized_columns(table, use_cache=False)
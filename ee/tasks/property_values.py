@@ -0,0 +1,31 @@
+from celery.utils.log import get_task_logger
+
+from ee.clickhouse.sql.property_values import (
+    FIND_UNINDEXED_PROPERTY_KEYS_SQL,
+    PROPERTY_VALUES_MAX_VALUES_PER_KEY,
+    REINDEX_PROPERTY_VALUES_SQL,
+)
+from posthog.client import sync_execute
+
+logger = get_task_logger(__name__)
+
+# Persons or groups are reindexed in this many slices, so that finding their current versions stays within memory
+REINDEX_PROPERTY_VALUES_SLICES = 16
+# Spill to disk instead of failing when a slice doesn't fit either
+PROPERTY_VALUES_INSERT_SETTINGS = {"max_bytes_before_external_group_by": 10 * 1024 ** 3}
+
+
+def reindex_person_and_group_property_values() -> None:
+    for property_type in ["person", "group"]:
+        for index in range(REINDEX_PROPERTY_VALUES_SLICES):
+            logger.info(f"Reindexing current {property_type} property values, slice {index + 1}")
+            sync_execute(
+                REINDEX_PROPERTY_VALUES_SQL(property_type),
+                {"slices": REINDEX_PROPERTY_VALUES_SLICES, "slice": index},
+                settings=PROPERTY_VALUES_INSERT_SETTINGS,
+            )
+
+
+def find_unindexed_property_keys() -> None:
+    logger.info("Finding event properties with too many values to index")
+    sync_execute(FIND_UNINDEXED_PROPERTY_KEYS_SQL(), {"max_values": PROPERTY_VALUES_MAX_VALUES_PER_KEY})
@@ -0,0 +1,68 @@
+from datetime import datetime
+from unittest.mock import patch
+
+from ee.clickhouse.models.person import create_person
+from ee.clickhouse.queries.property_values import (
+    get_person_property_values_for_key,
+    get_property_values_for_key,
+    is_unindexed_event_property,
+)
+from ee.clickhouse.sql.property_values import TRUNCATE_PROPERTY_VALUES_TABLE_SQL
+from ee.clickhouse.util import ClickhouseTestMixin
+from ee.tasks.property_values import find_unindexed_property_keys, reindex_person_and_group_property_values
+from posthog.client import sync_execute
+from posthog.test.base import BaseTest, _create_event
+
+
+class TestReindexPropertyValues(ClickhouseTestMixin, BaseTest):
+    def test_reindexes_current_values_only(self):
+        person_id = create_person(
+            team_id=self.team.pk, properties={"plan": "free"}, timestamp=datetime(2021, 1, 1, 12, 0, 0)
+        )
+        create_person(
+            team_id=self.team.pk,
+            uuid=person_id,
+            properties={"plan": "paid"},
+            timestamp=datetime(2021, 1, 2, 12, 0, 0),
+        )
+        create_person(team_id=self.team.pk, properties={"plan": "paid"})
+        # Rows written by the view at ingestion would have aged out by the time of a reindex
+        sync_execute(TRUNCATE_PROPERTY_VALUES_TABLE_SQL())
+
+        reindex_person_and_group_property_values()
+
+        self.assertEqual(get_person_property_values_for_key("plan", self.team), [("paid", 2)])
+
+    @patch("ee.tasks.property_values.REINDEX_PROPERTY_VALUES_SLICES", 3)
+    def test_reindexes_every_slice(self):
+        for index in range(10):
+            create_person(team_id=self.team.pk, properties={"plan": f"plan-{index}"})
+        sync_execute(TRUNCATE_PROPERTY_VALUES_TABLE_SQL())
+
+        reindex_person_and_group_property_values()
+
+        self.assertEqual(len(get_person_property_values_for_key("plan", self.team)), 10)
+
+
+class TestFindUnindexedPropertyKeys(ClickhouseTestMixin, BaseTest):
+    @patch("ee.tasks.property_values.PROPERTY_VALUES_MAX_VALUES_PER_KEY", 2)
+    def test_stops_indexing_keys_with_too_many_values(self):
+        for index in range(3):
+            _create_event(
+                team=self.team, event="$pageview", distinct_id="user", properties={"search": f"query-{index}"}
+            )
+            _create_event(team=self.team, event="$pageview", distinct_id="user", properties={"$browser": "Chrome"})
+
+        find_unindexed_property_keys()
+
+        self.assertTrue(is_unindexed_event_property(self.team, "search"))
+        self.assertFalse(is_unindexed_event_property(self.team, "$browser"))
+
+        _create_event(team=self.team, event="$pageview", distinct_id="user", properties={"search": "query-new"})
+        indexed_values = sync_execute(
+            "SELECT value FROM property_values WHERE team_id = %(team_id)s AND key = %(key)s",
+            {"team_id": self.team.pk, "key": "search"},
+        )
+        self.assertNotIn(("query-new",), indexed_values)
+        # Values are then suggested from events
+        self.assertIn(("query-new", 1), get_property_values_for_key("search", self.team))
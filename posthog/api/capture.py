@@ -1,14 +1,15 @@
 import hashlib
-import json
 import re
+import time
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from dateutil import parser
 from django.conf import settings
 from django.http import JsonResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
+from kafka.producer.future import FutureRecordMetadata
 from rest_framework import status
 from sentry_sdk import configure_scope
 from sentry_sdk.api import capture_exception
@@ -17,6 +18,7 @@ from statshog.defaults.django import statsd
 from ee.kafka_client.client import KafkaProducer
 from ee.kafka_client.topics import KAFKA_DEAD_LETTER_QUEUE
 from ee.settings import KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC
+from posthog import json_codec
 from posthog.api.utils import (
     EventIngestionContext,
     get_data,
@@ -46,21 +48,22 @@ def parse_kafka_event_data(
         "distinct_id": safe_clickhouse_string(distinct_id),
         "ip": safe_clickhouse_string(ip) if ip else ip,
         "site_url": safe_clickhouse_string(site_url),
-        "data": json.dumps(data),
+        "data": json_codec.dumps(data),
         "team_id": team_id,
         "now": now.isoformat(),
         "sent_at": sent_at.isoformat() if sent_at else "",
     }
 
 
-def log_event(data: Dict, event_name: str, partition_key: str) -> None:
+def log_event(data: Dict, event_name: str, partition_key: str) -> Optional[FutureRecordMetadata]:
     if settings.DEBUG:
         print(f"Logging event {event_name} to Kafka topic {KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC}")
 
     # TODO: Handle Kafka being unavailable with exponential backoff retries
     try:
-        KafkaProducer().produce(topic=KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC, data=data, key=partition_key)
+        future = KafkaProducer().produce(topic=KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC, data=data, key=partition_key)
         statsd.incr("posthog_cloud_plugin_server_ingestion")
+        return future
     except Exception as e:
         statsd.incr("capture_endpoint_log_event_error")
         print(f"Failed to produce event to Kafka topic {KAFKA_EVENTS_PLUGIN_INGESTION_TOPIC} with error:", e)
@@ -83,7 +86,7 @@ def log_event_to_dead_letter_queue(
     data["elements_chain"] = ""
     data["id"] = str(UUIDT())
     data["event"] = safe_clickhouse_string(event_name)
-    data["raw_payload"] = json.dumps(raw_payload)
+    data["raw_payload"] = json_codec.dumps(raw_payload)
     data["now"] = datetime.fromisoformat(data["now"]).replace(tzinfo=None).isoformat() if data["now"] else None
     data["tags"] = ["django_server"]
     data["event_uuid"] = event["uuid"]
@@ -100,6 +103,33 @@ def log_event_to_dead_letter_queue(
             print("Failed to produce to events dead letter queue with error:", e)
 
 
+def _wait_for_acks(futures: List[Optional[FutureRecordMetadata]]) -> None:
+    """
+    Events of a request are enqueued without waiting and sent to Kafka together by the producer. In synchronous-ack
+    mode we then wait once for the whole request, instead of once per event, and the timeout applies to the request.
+    """
+    timer = statsd.timer("posthog_cloud_capture_wait_for_acks").start()
+    deadline = time.monotonic() + settings.CAPTURE_SYNCHRONOUS_ACKS_TIMEOUT_SECONDS
+    for future in futures:
+        if future is not None:
+            # Raises once the deadline has passed, unless the event happens to be acked already
+            future.get(timeout=max(0, deadline - time.monotonic()))
+    timer.stop()
+
+
+def _unable_to_store_event_response(request):
+    return cors_response(
+        request,
+        generate_exception_response(
+            "capture",
+            "Unable to store event. Please try again. If you are the owner of this app you can check the logs for further details.",
+            code="server_error",
+            type="server_error",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        ),
+    )
+
+
 def _datetime_from_seconds_or_millis(timestamp: str) -> datetime:
     if len(timestamp) > 11:  # assuming milliseconds / update "11" to "12" if year > 5138 (set a reminder!)
         timestamp_number = float(timestamp) / 1000
@@ -207,6 +237,7 @@ def get_event(request):
     site_url = request.build_absolute_uri("/")[:-1]
 
     ip = None if not ingestion_context or ingestion_context.anonymize_ips else get_ip_address(request)
+    futures: List[Optional[FutureRecordMetadata]] = []
     for event in events:
         event_uuid = UUIDT()
         distinct_id = get_distinct_id(event)
@@ -246,23 +277,27 @@ def get_event(request):
             continue
 
         try:
-            capture_internal(event, distinct_id, ip, site_url, now, sent_at, ingestion_context.team_id, event_uuid)  # type: ignore
+            futures.append(
+                capture_internal(event, distinct_id, ip, site_url, now, sent_at, ingestion_context.team_id, event_uuid)  # type: ignore
+            )
         except Exception as e:
             timer.stop()
             capture_exception(e, {"data": data})
             statsd.incr(
                 "posthog_cloud_raw_endpoint_failure", tags={"endpoint": "capture",},
             )
-            return cors_response(
-                request,
-                generate_exception_response(
-                    "capture",
-                    "Unable to store event. Please try again. If you are the owner of this app you can check the logs for further details.",
-                    code="server_error",
-                    type="server_error",
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                ),
+            return _unable_to_store_event_response(request)
+
+    if settings.CAPTURE_SYNCHRONOUS_ACKS:
+        try:
+            _wait_for_acks(futures)
+        except Exception as e:
+            timer.stop()
+            capture_exception(e, {"data": data})
+            statsd.incr(
+                "posthog_cloud_raw_endpoint_failure", tags={"endpoint": "capture",},
             )
+            return _unable_to_store_event_response(request)
 
     timer.stop()
     statsd.incr(
@@ -302,7 +337,9 @@ def get_distinct_id(event):
     return distinct_id
 
 
-def capture_internal(event, distinct_id, ip, site_url, now, sent_at, team_id, event_uuid=UUIDT()) -> None:
+def capture_internal(
+    event, distinct_id, ip, site_url, now, sent_at, team_id, event_uuid=UUIDT()
+) -> Optional[FutureRecordMetadata]:
     parsed_event = parse_kafka_event_data(
         distinct_id=distinct_id,
         ip=ip,
@@ -314,4 +351,4 @@ def capture_internal(event, distinct_id, ip, site_url, now, sent_at, team_id, ev
         event_uuid=event_uuid,
     )
     partition_key = hashlib.sha256(f"{team_id}:{distinct_id}".encode()).hexdigest()
-    log_event(parsed_event, event["event"], partition_key=partition_key)
+    return log_event(parsed_event, event["event"], partition_key=partition_key)
@@ -1,4 +1,3 @@
-import csv
 from datetime import datetime
 from typing import Any, Dict
 
@@ -26,7 +25,7 @@ from posthog.api.person import get_funnel_actor_class, should_paginate
 from posthog.api.routing import StructuredViewSetMixin
 from posthog.api.shared import UserBasicSerializer
 from posthog.api.utils import get_target_entity
-from posthog.client import sync_execute
+from posthog.client import sync_execute, sync_execute_iter
 from posthog.constants import (
     CSV_EXPORT_LIMIT,
     INSIGHT_FUNNELS,
@@ -49,7 +48,7 @@ from posthog.queries.person_query import PersonQuery
 from posthog.queries.util import get_earliest_timestamp
 from posthog.tasks.calculate_cohort import (
     calculate_cohort_ch,
-    calculate_cohort_from_list,
+    import_static_cohort_from_csv,
     insert_cohort_from_insight_filter,
 )
 from posthog.utils import format_query_params_absolute_url
@@ -96,12 +95,6 @@ class CohortSerializer(serializers.ModelSerializer):
             if filter_data:
                 insert_cohort_from_insight_filter.delay(cohort.pk, filter_data)
 
-    def _handle_csv(self, file, cohort: Cohort) -> None:
-        decoded_file = file.read().decode("utf-8").splitlines()
-        reader = csv.reader(decoded_file)
-        distinct_ids_and_emails = [row[0] for row in reader if len(row) > 0 and row]
-        calculate_cohort_from_list.delay(cohort.pk, distinct_ids_and_emails)
-
     def get_filters(self, cohort: Cohort) -> Dict:
         if cohort.filters:
             return cohort.filters
@@ -136,10 +129,8 @@ class CohortSerializer(serializers.ModelSerializer):
         return cohort
 
     def _calculate_static_by_csv(self, file, cohort: Cohort) -> None:
-        decoded_file = file.read().decode("utf-8").splitlines()
-        reader = csv.reader(decoded_file)
-        distinct_ids_and_emails = [row[0] for row in reader if len(row) > 0 and row]
-        calculate_cohort_from_list.delay(cohort.pk, distinct_ids_and_emails)
+        # Uploads can have millions of rows, these get read in chunks by workers
+        import_static_cohort_from_csv(cohort.pk, file)
 
     def update(self, cohort: Cohort, validated_data: Dict, *args: Any, **kwargs: Any) -> Cohort:  # type: ignore
         request = self.context["request"]
@@ -258,13 +249,13 @@ def will_create_loops(cohort: Cohort, new_properties: PropertyGroup) -> bool:
 
 
 def insert_cohort_people_into_pg(cohort: Cohort):
-    ids = sync_execute(
+    blocks = sync_execute_iter(
         "SELECT person_id FROM {} where team_id = %(team_id)s AND cohort_id = %(cohort_id)s".format(
             PERSON_STATIC_COHORT_TABLE
         ),
         {"cohort_id": cohort.pk, "team_id": cohort.team.pk},
     )
-    cohort.insert_users_list_by_uuid(items=[str(id[0]) for id in ids])
+    cohort.insert_users_list_by_uuid(items=(str(row[0]) for rows in blocks for row in rows))
 
 
 def insert_cohort_actors_into_ch(cohort: Cohort, filter_data: Dict):
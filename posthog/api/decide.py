@@ -1,23 +1,29 @@
 import re
 import secrets
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 from django.conf import settings
-from django.http import HttpRequest, JsonResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from sentry_sdk import capture_exception
 from statshog.defaults.django import statsd
 
+from posthog import json_codec
 from posthog.api.utils import get_token
 from posthog.exceptions import RequestParsingError, generate_exception_response
 from posthog.models import Team, User
-from posthog.models.feature_flag import get_overridden_feature_flags
+from posthog.models.feature_flag import get_active_feature_flags_for_distinct_ids, get_overridden_feature_flags
+from posthog.models.property import GroupTypeName
 from posthog.utils import cors_response, load_data_from_request
 
 from .utils import get_project_id
 
+BULK_DECIDE_MAX_DISTINCT_IDS = 10_000
+# Number of persons whose properties are loaded from postgres at once
+BULK_DECIDE_BATCH_SIZE = 500
+
 
 def on_permitted_domain(team: Team, request: HttpRequest) -> bool:
     origin = parse_domain(request.headers.get("Origin"))
@@ -72,6 +78,43 @@ def parse_domain(url: Any) -> Optional[str]:
     return urlparse(url).hostname
 
 
+def get_team_from_request(
+    data: Dict[str, Any], request: HttpRequest, endpoint: str
+) -> Tuple[Optional[Team], Optional[HttpResponse]]:
+    "Resolves the team from a project API key, or from a personal API key and project_id"
+    token = get_token(data, request)
+    team = Team.objects.get_team_from_token(token)
+    if team is None and token:
+        project_id = get_project_id(data, request)
+
+        if not project_id:
+            return (
+                None,
+                generate_exception_response(
+                    endpoint,
+                    "Project API key invalid. You can find your project API key in PostHog project settings.",
+                    code="invalid_api_key",
+                    type="authentication_error",
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                ),
+            )
+
+        user = User.objects.get_from_personal_api_key(token)
+        if user is None:
+            return (
+                None,
+                generate_exception_response(
+                    endpoint,
+                    "Invalid Personal API key.",
+                    code="invalid_personal_key",
+                    type="authentication_error",
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                ),
+            )
+        team = user.teams.get(id=project_id)
+    return team, None
+
+
 @csrf_exempt
 def get_decide(request: HttpRequest):
     response = {
@@ -115,36 +158,9 @@ def get_decide(request: HttpRequest):
                 generate_exception_response("decide", f"Malformed request data: {error}", code="malformed_data"),
             )
 
-        token = get_token(data, request)
-        team = Team.objects.get_team_from_token(token)
-        if team is None and token:
-            project_id = get_project_id(data, request)
-
-            if not project_id:
-                return cors_response(
-                    request,
-                    generate_exception_response(
-                        "decide",
-                        "Project API key invalid. You can find your project API key in PostHog project settings.",
-                        code="invalid_api_key",
-                        type="authentication_error",
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                    ),
-                )
-
-            user = User.objects.get_from_personal_api_key(token)
-            if user is None:
-                return cors_response(
-                    request,
-                    generate_exception_response(
-                        "decide",
-                        "Invalid Personal API key.",
-                        code="invalid_personal_key",
-                        type="authentication_error",
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                    ),
-                )
-            team = user.teams.get(id=project_id)
+        team, error_response = get_team_from_request(data, request, "decide")
+        if error_response is not None:
+            return cors_response(request, error_response)
 
         if team:
             feature_flags = get_overridden_feature_flags(team.pk, data["distinct_id"], data.get("groups", {}))
@@ -156,3 +172,137 @@ def get_decide(request: HttpRequest):
         f"posthog_cloud_raw_endpoint_success", tags={"endpoint": "decide",},
     )
     return cors_response(request, JsonResponse(response))
+
+
+@csrf_exempt
+def get_bulk_decide(request: HttpRequest):
+    """
+    Evaluates all active feature flags of a project for many distinct_ids at once, for server-side SDKs and jobs.
+
+    Takes `{"api_key": <personal API key>, "project_id": ..., "distinct_ids": [...], "groups": {...}}`, and streams back
+    `{"featureFlags": {"<distinct_id>": {"<flag key>": true or "<variant>"}}}` while evaluating persons in batches.
+    If a batch after the first one fails, the stream ends with an `"error"` key next to `"featureFlags"` instead, and
+    the flags already sent are incomplete. Per-user overrides set in the PostHog app aren't applied.
+    """
+    if request.method != "POST":
+        return cors_response(
+            request,
+            generate_exception_response(
+                "decide_bulk",
+                "Only POST requests are supported.",
+                code="method_not_allowed",
+                status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
+            ),
+        )
+
+    try:
+        data = load_data_from_request(request)
+    except RequestParsingError as error:
+        capture_exception(error)
+        return cors_response(
+            request,
+            generate_exception_response("decide_bulk", f"Malformed request data: {error}", code="malformed_data"),
+        )
+
+    distinct_ids = data.get("distinct_ids") if isinstance(data, dict) else None
+    if (
+        not isinstance(distinct_ids, list)
+        or not distinct_ids
+        or not all(isinstance(distinct_id, str) for distinct_id in distinct_ids)
+    ):
+        return cors_response(
+            request,
+            generate_exception_response(
+                "decide_bulk", "distinct_ids must be a non-empty list of strings.", attr="distinct_ids"
+            ),
+        )
+    if len(distinct_ids) > BULK_DECIDE_MAX_DISTINCT_IDS:
+        return cors_response(
+            request,
+            generate_exception_response(
+                "decide_bulk",
+                f"At most {BULK_DECIDE_MAX_DISTINCT_IDS} distinct_ids can be evaluated per request.",
+                attr="distinct_ids",
+            ),
+        )
+
+    groups = data.get("groups") or {}
+    if not isinstance(groups, dict) or not all(
+        isinstance(key, str) and isinstance(value, str) for key, value in groups.items()
+    ):
+        return cors_response(
+            request,
+            generate_exception_response(
+                "decide_bulk", "groups must be an object mapping group types to group keys.", attr="groups"
+            ),
+        )
+
+    team = _get_team_from_personal_api_key(data, request)
+    if team is None:
+        # Project API keys are public, as every browser SDK ships them, so they can't look up flags of other users
+        return cors_response(
+            request,
+            generate_exception_response(
+                "decide_bulk",
+                "A personal API key and a project_id you have access to are required.",
+                code="invalid_personal_key",
+                type="authentication_error",
+                status_code=status.HTTP_401_UNAUTHORIZED,
+            ),
+        )
+
+    statsd.incr(
+        f"posthog_cloud_raw_endpoint_success", tags={"endpoint": "decide_bulk",},
+    )
+    # Duplicate distinct_ids would otherwise end up as duplicate keys in the streamed object
+    unique_distinct_ids = list(dict.fromkeys(distinct_ids))
+    # Evaluated before the response starts, so that errors of the first batch still get an error status
+    first_batch = get_active_feature_flags_for_distinct_ids(
+        team.pk, unique_distinct_ids[:BULK_DECIDE_BATCH_SIZE], groups
+    )
+    return cors_response(
+        request,
+        StreamingHttpResponse(
+            _stream_bulk_feature_flags(team.pk, unique_distinct_ids, groups, first_batch),
+            content_type="application/json",
+        ),
+    )
+
+
+def _get_team_from_personal_api_key(data: Dict[str, Any], request: HttpRequest) -> Optional[Team]:
+    token = get_token(data, request)
+    project_id = get_project_id(data, request)
+    if not token or not project_id:
+        return None
+    user = User.objects.get_from_personal_api_key(token)
+    if user is None:
+        return None
+    return user.teams.filter(id=project_id).first()
+
+
+def _stream_bulk_feature_flags(
+    team_id: int,
+    distinct_ids: List[str],
+    groups: Dict[GroupTypeName, str],
+    first_batch: Dict[str, Dict[str, Union[bool, str, None]]],
+) -> Iterator[str]:
+    yield '{"featureFlags":{'
+    separator = ""
+    for start in range(0, len(distinct_ids), BULK_DECIDE_BATCH_SIZE):
+        if start == 0:
+            feature_flags = first_batch
+        else:
+            try:
+                feature_flags = get_active_feature_flags_for_distinct_ids(
+                    team_id, distinct_ids[start : start + BULK_DECIDE_BATCH_SIZE], groups
+                )
+            except Exception as error:
+                # The status has been sent already, so the error can only go at the end of the body
+                capture_exception(error)
+                yield '},"error":"Failed to evaluate feature flags for all distinct_ids."}'
+                return
+        if feature_flags:
+            # Strip the braces so that batches get spliced into a single object
+            yield separator + json_codec.dumps(feature_flags)[1:-1]
+            separator = ","
+    yield "}}"
@@ -1,22 +1,22 @@
 import json
 import urllib
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from django.db.models.query import Prefetch
+import pytz
+from dateutil.parser import isoparse
 from django.utils.timezone import now
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter
 from rest_framework import mixins, request, response, serializers, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.settings import api_settings
 from rest_framework_csv import renderers as csvrenderers
 
 from ee.clickhouse.models.event import ClickhouseEventSerializer, determine_event_conditions
-from ee.clickhouse.models.person import get_persons_by_distinct_ids
 from ee.clickhouse.models.property import parse_prop_grouped_clauses
 from ee.clickhouse.queries.property_values import get_property_values_for_key
 from ee.clickhouse.sql.events import (
@@ -27,8 +27,9 @@ from ee.clickhouse.sql.events import (
 )
 from posthog.api.documentation import PropertiesSerializer, extend_schema
 from posthog.api.routing import StructuredViewSetMixin
+from posthog.caching.person_summary_cache import get_person_summaries
 from posthog.client import sync_execute
-from posthog.models import Element, Filter, Person
+from posthog.models import Element, Filter
 from posthog.models.action import Action
 from posthog.models.action.util import format_action_filter
 from posthog.models.team import Team
@@ -36,6 +37,17 @@ from posthog.models.utils import UUIDT
 from posthog.permissions import ProjectMembershipNecessaryPermissions, TeamMemberAccessPermission
 from posthog.utils import convert_property_value, flatten
 
+# The events list looks for the latest events in windows going back from `before` that grow until enough events were
+# found, so that frequent events are read from the last hour only while rare ones are still found. The last is unbounded
+EVENTS_LIST_WINDOWS: List[Optional[timedelta]] = [
+    timedelta(hours=1),
+    timedelta(hours=6),
+    timedelta(days=1),
+    timedelta(days=7),
+    timedelta(days=30),
+    None,
+]
+
 
 class ElementSerializer(serializers.ModelSerializer):
     event = serializers.CharField()
@@ -66,14 +78,18 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
     CSV_EXPORT_DEFAULT_LIMIT = 3_500
     CSV_EXPORT_MAXIMUM_LIMIT = 100_000
 
-    def _build_next_url(self, request: request.Request, last_event_timestamp: datetime) -> str:
+    def _build_next_url(self, request: request.Request, last_event: List, next_event: List) -> str:
         params = request.GET.dict()
-        reverse = request.GET.get("orderBy", "-timestamp") != "-timestamp"
-        timestamp = last_event_timestamp.astimezone().isoformat()
+        reverse = self._parse_order_by(request)[0] != "-timestamp"
+        timestamp = last_event[3].astimezone().isoformat()
         if reverse:
             params["after"] = timestamp
         else:
             params["before"] = timestamp
+            # Resume from (timestamp, uuid) when events at the last timestamp continue on the next page
+            params.pop("before_uuid", None)
+            if next_event[3] == last_event[3]:
+                params["before_uuid"] = str(last_event[0])
         return request.build_absolute_uri(f"{request.path}?{urllib.parse.urlencode(params)}")
 
     def _parse_order_by(self, request: request.Request) -> List[str]:
@@ -108,11 +124,14 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
         team = self.team
         filter = Filter(request=request, team=self.team)
 
-        query_result = self._query_events_list(filter, team, request, limit=limit)
+        if self._parse_order_by(request)[0] == "-timestamp":
+            query_result = self._query_latest_events_list(filter, team, request, limit=limit)
+        else:
+            query_result = self._query_events_list(filter, team, request, limit=limit)
 
-        # Retry the query without the 1 day optimization
-        if len(query_result) < limit and not request.GET.get("after"):
-            query_result = self._query_events_list(filter, team, request, long_date_from=True, limit=limit)
+            # Retry the query without the 1 day optimization
+            if len(query_result) < limit and not request.GET.get("after"):
+                query_result = self._query_events_list(filter, team, request, long_date_from=True, limit=limit)
 
         result = ClickhouseEventSerializer(
             query_result[0:limit], many=True, context={"people": self._get_people(query_result, team),},
@@ -120,25 +139,16 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
 
         next_url: Optional[str] = None
         if not is_csv_request and len(query_result) > limit:
-            next_url = self._build_next_url(request, query_result[limit - 1][3])
+            next_url = self._build_next_url(request, query_result[limit - 1], query_result[limit])
 
         return response.Response({"next": next_url, "results": result})
 
     def _get_people(self, query_result: List[Dict], team: Team) -> Dict[str, Any]:
-        distinct_ids = [event[5] for event in query_result]
-        persons = get_persons_by_distinct_ids(team.pk, distinct_ids)
-        persons = persons.prefetch_related(Prefetch("persondistinctid_set", to_attr="distinct_ids_cache"))
-        distinct_to_person: Dict[str, Person] = {}
-        for person in persons:
-            for distinct_id in person.distinct_ids:
-                distinct_to_person[distinct_id] = person
-        return distinct_to_person
+        return get_person_summaries(team.pk, [event[5] for event in query_result])
 
     def _query_events_list(
         self, filter: Filter, team: Team, request: request.Request, long_date_from: bool = False, limit: int = 100
     ) -> List:
-        limit += 1
-        limit_sql = "LIMIT %(limit)s"
         order = "DESC" if self._parse_order_by(self.request)[0] == "-timestamp" else "ASC"
 
         conditions, condition_params = determine_event_conditions(
@@ -150,6 +160,74 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
             },
             long_date_from,
         )
+        filters = self._get_event_filters(filter, team, request)
+        if filters is None:
+            return []
+        return self._execute_events_query(team, conditions, condition_params, *filters, limit=limit + 1, order=order)
+
+    def _query_latest_events_list(self, filter: Filter, team: Team, request: request.Request, limit: int = 100) -> List:
+        """
+        Returns up to `limit + 1` of the latest events before the `before` (and `before_uuid`) cursor, querying
+        `EVENTS_LIST_WINDOWS` one after the other until enough events were found or `after` was reached.
+        """
+        params = request.GET.dict()
+        before = isoparse(params.pop("before")) if "before" in params else now() + timedelta(seconds=5)
+        after = isoparse(params.pop("after")) if "after" in params else None
+        before_uuid = params.pop("before_uuid", None)
+        if before_uuid is not None and not UUIDT.is_valid_uuid(before_uuid):
+            raise ValidationError({"before_uuid": "Invalid UUID"})
+
+        conditions, condition_params = determine_event_conditions(team, params, long_date_from=True)
+        filters = self._get_event_filters(filter, team, request)
+        if filters is None:
+            return []
+
+        if before_uuid is not None:
+            # Keeps a plain range on timestamp so that it can still be used for skipping granules
+            cursor_conditions = (
+                " AND timestamp <= %(before)s AND (timestamp < %(before)s OR uuid < toUUID(%(before_uuid)s))"
+            )
+        else:
+            cursor_conditions = " AND timestamp < %(before)s"
+        condition_params = {**condition_params, "before": _format_timestamp(before), "before_uuid": before_uuid}
+
+        query_result: List = []
+        window_end = before
+        for window in EVENTS_LIST_WINDOWS:
+            window_start = window_end - window if window is not None else after
+            is_last_window = window_start is None or (after is not None and window_start <= after)
+            window_conditions = cursor_conditions
+            if is_last_window:
+                if after is not None:
+                    window_conditions += " AND timestamp > %(after)s"
+            else:
+                window_conditions += " AND timestamp >= %(window_start)s"
+            if window_end != before:
+                window_conditions += " AND timestamp < %(window_end)s"
+
+            query_result.extend(
+                self._execute_events_query(
+                    team,
+                    conditions + window_conditions,
+                    {
+                        **condition_params,
+                        "after": _format_timestamp(after) if after is not None else None,
+                        "window_start": _format_timestamp(window_start) if window_start is not None else None,
+                        "window_end": _format_timestamp(window_end),
+                    },
+                    *filters,
+                    limit=limit + 1 - len(query_result),
+                    order="DESC",
+                )
+            )
+            if len(query_result) > limit or is_last_window or window_start is None:
+                break
+            window_end = window_start
+
+        return query_result
+
+    def _get_event_filters(self, filter: Filter, team: Team, request: request.Request) -> Optional[Tuple[str, Dict]]:
+        "Returns the property and action filters of the request, or None if they can't match any event"
         prop_filters, prop_filter_params = parse_prop_grouped_clauses(
             team_id=team.pk, property_group=filter.property_groups, has_person_id_joined=False
         )
@@ -158,13 +236,26 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
             try:
                 action = Action.objects.get(pk=request.GET["action_id"], team_id=team.pk)
             except Action.DoesNotExist:
-                return []
+                return None
             if action.steps.count() == 0:
-                return []
+                return None
             action_query, params = format_action_filter(team_id=team.pk, action=action)
             prop_filters += " AND {}".format(action_query)
             prop_filter_params = {**prop_filter_params, **params}
 
+        return prop_filters, prop_filter_params
+
+    def _execute_events_query(
+        self,
+        team: Team,
+        conditions: str,
+        condition_params: Dict,
+        prop_filters: str,
+        prop_filter_params: Dict,
+        limit: int,
+        order: str,
+    ) -> List:
+        limit_sql = "LIMIT %(limit)s"
         if prop_filters != "":
             return sync_execute(
                 SELECT_EVENT_BY_TEAM_AND_CONDITIONS_FILTERS_SQL.format(
@@ -217,3 +308,9 @@ class EventViewSet(StructuredViewSetMixin, mixins.RetrieveModelMixin, mixins.Lis
 
 class LegacyEventViewSet(EventViewSet):
     legacy_team_compatibility = True
+
+
+def _format_timestamp(timestamp: datetime) -> str:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(pytz.utc)
+    return timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")
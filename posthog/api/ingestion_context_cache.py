@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Set, Tuple
+
+from django.conf import settings
+from sentry_sdk import capture_exception
+from statshog.defaults.django import statsd
+
+from posthog.redis import get_client
+
+if TYPE_CHECKING:
+    from posthog.api.utils import EventIngestionContext
+
+# Seconds the listener waits before subscribing again after failing, doubled on every failure in a row
+LISTENER_MIN_RETRY_DELAY = 1
+LISTENER_MAX_RETRY_DELAY = 60
+
+
+class IngestionContextCache:
+    """
+    Bounded, TTL'd in-process cache of token -> `EventIngestionContext` for the
+    capture endpoint.
+
+    Unknown tokens are cached as `None` with a shorter TTL (negative cache).
+    Team saves and deletes publish on `TEAM_TOKEN_CACHE_PUBSUB_CHANNEL`, and a
+    listener thread in every process drops the affected entries. If the
+    loader fails (e.g. Postgres is down), an expired positive entry is served
+    instead of raising, so events keep flowing to Kafka rather than to the
+    dead letter queue.
+    """
+
+    def __init__(self, max_size: int, ttl: int, negative_ttl: int, channel: str):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.channel = channel
+        # token -> (expires_at, context)
+        self._entries: "OrderedDict[str, Tuple[float, Optional[EventIngestionContext]]]" = OrderedDict()
+        self._tokens_by_team_id: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+
+    def get(
+        self, token: str, loader: Callable[[str], Optional["EventIngestionContext"]]
+    ) -> Optional["EventIngestionContext"]:
+        self._ensure_listener()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                self._entries.move_to_end(token)
+
+        if entry is not None and entry[0] > now:
+            statsd.incr("ingestion_context_cache_hit")
+            return entry[1]
+
+        statsd.incr("ingestion_context_cache_miss")
+        try:
+            ingestion_context = loader(token)
+        except Exception as e:
+            if entry is not None and entry[1] is not None:
+                capture_exception(e)
+                statsd.incr("ingestion_context_cache_stale_hit")
+                return entry[1]
+            raise
+
+        self.set(token, ingestion_context)
+        return ingestion_context
+
+    def set(self, token: str, ingestion_context: Optional["EventIngestionContext"]) -> None:
+        ttl = self.ttl if ingestion_context is not None else self.negative_ttl
+        with self._lock:
+            self._pop(token)
+            self._entries[token] = (time.monotonic() + ttl, ingestion_context)
+            if ingestion_context is not None:
+                self._tokens_by_team_id.setdefault(ingestion_context.team_id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, team_id: Optional[int] = None, token: Optional[str] = None) -> None:
+        with self._lock:
+            if token is not None:
+                self._pop(token)
+            if team_id is not None:
+                for team_token in list(self._tokens_by_team_id.get(team_id, ())):
+                    self._pop(team_token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_team_id.clear()
+
+    def _pop(self, token: str) -> None:
+        # Caller must hold the lock
+        entry = self._entries.pop(token, None)
+        if entry is not None and entry[1] is not None:
+            team_tokens = self._tokens_by_team_id.get(entry[1].team_id)
+            if team_tokens is not None:
+                team_tokens.discard(token)
+                if not team_tokens:
+                    del self._tokens_by_team_id[entry[1].team_id]
+
+    def _handle_message(self, message: Dict) -> None:
+        if message.get("type") != "message":
+            return
+        try:
+            payload = json.loads(message["data"])
+        except (TypeError, ValueError):
+            self.clear()
+            return
+        self.invalidate(team_id=payload.get("teamId"), token=payload.get("apiToken"))
+
+    def _ensure_listener(self) -> None:
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name="ingestion-context-cache", daemon=True)
+            self._listener.start()
+
+    def _listen(self) -> None:
+        retry_delay = LISTENER_MIN_RETRY_DELAY
+        while True:
+            try:
+                pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Invalidations may have been missed while we were not subscribed. Until then entries still expire.
+                self.clear()
+                retry_delay = LISTENER_MIN_RETRY_DELAY
+                for message in pubsub.listen():
+                    self._handle_message(message)
+            except Exception as e:
+                capture_exception(e)
+                statsd.incr("ingestion_context_cache_listener_error")
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, LISTENER_MAX_RETRY_DELAY)
+
+
+ingestion_context_cache = IngestionContextCache(
+    max_size=settings.INGESTION_CONTEXT_CACHE_MAX_SIZE,
+    ttl=settings.INGESTION_CONTEXT_CACHE_TTL_SECONDS,
+    negative_ttl=settings.INGESTION_CONTEXT_CACHE_NEGATIVE_TTL_SECONDS,
+    channel=settings.TEAM_TOKEN_CACHE_PUBSUB_CHANNEL,
+)
@@ -35,6 +35,7 @@ from posthog.api.routing import StructuredViewSetMixin
 from posthog.api.shared import UserBasicSerializer
 from posthog.api.tagged_item import TaggedItemSerializerMixin, TaggedItemViewSetMixin
 from posthog.api.utils import format_paginated_url
+from posthog.caching.insight_cache import schedule_refresh_if_old
 from posthog.constants import (
     BREAKDOWN_VALUES_LIMIT,
     INSIGHT,
@@ -64,7 +65,7 @@ from posthog.models.insight import InsightViewed, generate_insight_cache_key
 from posthog.permissions import ProjectMembershipNecessaryPermissions, TeamMemberAccessPermission
 from posthog.queries.util import get_earliest_timestamp
 from posthog.settings import SITE_URL
-from posthog.tasks.update_cache import update_insight_cache
+from posthog.tasks.update_cache import schedule_insight_cache_refresh, update_insight_cache
 from posthog.utils import (
     format_query_params_absolute_url,
     get_safe_cache,
@@ -293,6 +294,7 @@ class InsightSerializer(TaggedItemSerializerMixin, InsightBasicSerializer):
         result = get_safe_cache(cache_key)
         if not result or result.get("task_id", None):
             return None
+        schedule_refresh_if_old(cache_key, result, lambda: schedule_insight_cache_refresh(insight, dashboard))
         # Data might not be defined if there is still cached results from before moving from 'results' to 'data'
         return result.get("result")
 
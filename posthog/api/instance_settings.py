@@ -80,10 +80,14 @@ class InstanceSettingsSerializer(serializers.Serializer):
                 raise serializers.ValidationError("This setting cannot be updated on MULTI_TENANCY.")
 
             # TODO: Move to top-level imports once CH is moved out of `ee`
-            from ee.clickhouse.sql.session_recording_events import UPDATE_RECORDINGS_TABLE_TTL_SQL
+            from ee.clickhouse.sql.session_recording_events import (
+                UPDATE_RECORDINGS_METADATA_TABLE_TTL_SQL,
+                UPDATE_RECORDINGS_TABLE_TTL_SQL,
+            )
             from posthog.client import sync_execute
 
             sync_execute(UPDATE_RECORDINGS_TABLE_TTL_SQL(), {"weeks": new_value_parsed})
+            sync_execute(UPDATE_RECORDINGS_METADATA_TABLE_TTL_SQL(), {"weeks": new_value_parsed})
 
         setattr(config, instance.key, new_value_parsed)
         instance.value = new_value_parsed
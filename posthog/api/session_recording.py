@@ -1,6 +1,7 @@
 import dataclasses
-from typing import Any, Union
+from typing import Any, Iterator, Optional, Union
 
+from django.http import StreamingHttpResponse
 from rest_framework import exceptions, request, response, serializers, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
@@ -8,8 +9,10 @@ from rest_framework.response import Response
 
 from ee.clickhouse.queries.session_recordings.clickhouse_session_recording import ClickhouseSessionRecording
 from ee.clickhouse.queries.session_recordings.clickhouse_session_recording_list import ClickhouseSessionRecordingList
+from posthog import json_codec
 from posthog.api.person import PersonSerializer
 from posthog.api.routing import StructuredViewSetMixin
+from posthog.helpers.session_recording import RecordingSnapshotsPage, stream_snapshot_data_by_window_id
 from posthog.models import Filter, PersonDistinctId
 from posthog.models.filters.session_recordings_filter import SessionRecordingsFilter
 from posthog.models.person import Person
@@ -55,7 +58,7 @@ class SessionRecordingViewSet(StructuredViewSetMixin, viewsets.GenericViewSet):
     def _get_session_recording_snapshots(self, request, session_recording_id, limit, offset):
         return ClickhouseSessionRecording(
             request=request, team=self.team, session_recording_id=session_recording_id
-        ).get_snapshots(limit, offset)
+        ).get_snapshots_page(limit, offset)
 
     def _get_session_recording_meta_data(self, request, session_recording_id):
         return ClickhouseSessionRecording(
@@ -159,23 +162,19 @@ class SessionRecordingViewSet(StructuredViewSetMixin, viewsets.GenericViewSet):
         limit = filter.limit if filter.limit else DEFAULT_RECORDING_CHUNK_LIMIT
         offset = filter.offset if filter.offset else 0
 
-        session_recording_snapshot_data = self._get_session_recording_snapshots(
-            request, session_recording_id, limit, offset
-        )
+        snapshots_page = self._get_session_recording_snapshots(request, session_recording_id, limit, offset)
 
-        if session_recording_snapshot_data.snapshot_data_by_window_id == {}:
+        if snapshots_page is None:
             raise exceptions.NotFound("Snapshots not found")
-        next_url = (
-            format_query_params_absolute_url(request, offset + limit, limit)
-            if session_recording_snapshot_data.has_next
-            else None
-        )
+        next_url = format_query_params_absolute_url(request, offset + limit, limit) if snapshots_page.has_next else None
 
-        return response.Response(
-            {
-                "result": {
-                    "next": next_url,
-                    "snapshot_data_by_window_id": session_recording_snapshot_data.snapshot_data_by_window_id,
-                }
-            }
+        # Chunks are decompressed and written out one at a time, rather than building the whole page in memory
+        return StreamingHttpResponse(
+            _stream_snapshots_response(next_url, snapshots_page), content_type="application/json"
         )
+
+
+def _stream_snapshots_response(next_url: Optional[str], snapshots_page: RecordingSnapshotsPage) -> Iterator[str]:
+    yield '{"result":{"next":' + json_codec.dumps(next_url) + ',"snapshot_data_by_window_id":'
+    yield from stream_snapshot_data_by_window_id(snapshots_page.events_json)
+    yield "}}"
@@ -13,6 +13,7 @@ from django.utils import timezone
 from freezegun import freeze_time
 from rest_framework import status
 
+from posthog.api.capture import _wait_for_acks
 from posthog.api.test.mock_sentry import mock_sentry_context_for_tagging
 from posthog.models import Person, PersonalAPIKey
 from posthog.models.feature_flag import FeatureFlag, FeatureFlagOverride
@@ -396,6 +397,45 @@ class TestCapture(BaseTest):
         events_processed = [json.loads(call.kwargs["data"]["data"])["event"] for call in kafka_produce.call_args_list]
         self.assertEqual(events_processed, ["event1", "event3", "event4", "event5"])  # event2 not processed
 
+    @patch("ee.kafka_client.client._KafkaProducer.produce")
+    def test_batch_with_synchronous_acks(self, kafka_produce):
+        data = [{"type": "capture", "event": f"event{i}", "distinct_id": "2"} for i in range(3)]
+
+        with self.settings(CAPTURE_SYNCHRONOUS_ACKS=True):
+            response = self.client.post(
+                "/batch/", data={"api_key": self.team.api_token, "batch": data}, content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(kafka_produce.call_count, 3)
+        self.assertEqual(kafka_produce.return_value.get.call_count, 3)
+
+    @patch("ee.kafka_client.client._KafkaProducer.produce")
+    def test_batch_with_synchronous_acks_failure(self, kafka_produce):
+        kafka_produce.return_value.get.side_effect = Exception("Kafka timed out")
+        data = [{"type": "capture", "event": f"event{i}", "distinct_id": "2"} for i in range(3)]
+
+        with self.settings(CAPTURE_SYNCHRONOUS_ACKS=True):
+            response = self.client.post(
+                "/batch/", data={"api_key": self.team.api_token, "batch": data}, content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        # All events are enqueued before we wait for acks
+        self.assertEqual(kafka_produce.call_count, 3)
+
+    @patch("posthog.api.capture.time")
+    def test_synchronous_acks_timeout_applies_to_whole_request(self, patch_time):
+        clock = [0]
+        patch_time.monotonic.side_effect = lambda: clock[0]
+        future = MagicMock()
+        future.get.side_effect = lambda timeout: clock.__setitem__(0, clock[0] + 4)
+
+        with self.settings(CAPTURE_SYNCHRONOUS_ACKS_TIMEOUT_SECONDS=10):
+            _wait_for_acks([future, None, future, future])
+
+        self.assertEqual([call.kwargs["timeout"] for call in future.get.call_args_list], [10, 6, 2])
+
     @patch("ee.kafka_client.client._KafkaProducer.produce")
     def test_batch_gzip_header(self, kafka_produce):
         data = {
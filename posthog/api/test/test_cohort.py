@@ -4,12 +4,14 @@ from typing import Any, Dict, List
 from unittest.mock import patch
 
 from constance.test import override_config
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test.client import Client
 from rest_framework.test import APIClient
 
 from posthog.models import Person
 from posthog.models.cohort import Cohort
+from posthog.tasks.calculate_cohort import import_static_cohort_csv_chunk
 from posthog.test.base import APIBaseTest, _create_event, _create_person, flush_persons_and_events
 
 
@@ -76,8 +78,8 @@ class TestCohort(APIBaseTest):
             },
         )
 
-    @patch("posthog.tasks.calculate_cohort.calculate_cohort_from_list.delay")
-    def test_static_cohort_csv_upload(self, patch_calculate_cohort_from_list):
+    @patch("posthog.tasks.calculate_cohort.import_static_cohort_csv_chunk.delay")
+    def test_static_cohort_csv_upload(self, patch_import_static_cohort_csv_chunk):
         self.team.app_urls = ["http://somewebsite.com"]
         self.team.save()
         Person.objects.create(team=self.team, properties={"email": "email@example.org"})
@@ -102,8 +104,10 @@ email@example.org,
             format="multipart",
         )
         self.assertEqual(response.status_code, 201)
-        self.assertEqual(patch_calculate_cohort_from_list.call_count, 1)
+        self.assertEqual(patch_import_static_cohort_csv_chunk.call_count, 1)
         self.assertFalse(response.json()["is_calculating"], False)
+        self.assertTrue(Cohort.objects.get(pk=response.json()["id"]).is_calculating)
+        import_static_cohort_csv_chunk(*patch_import_static_cohort_csv_chunk.call_args.args)
         self.assertFalse(Cohort.objects.get(pk=response.json()["id"]).is_calculating)
 
         csv = SimpleUploadedFile(
@@ -127,8 +131,10 @@ User ID,
             format="multipart",
         )
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(patch_calculate_cohort_from_list.call_count, 2)
+        self.assertEqual(patch_import_static_cohort_csv_chunk.call_count, 2)
         self.assertFalse(response.json()["is_calculating"], False)
+        self.assertTrue(Cohort.objects.get(pk=response.json()["id"]).is_calculating)
+        import_static_cohort_csv_chunk(*patch_import_static_cohort_csv_chunk.call_args.args)
         self.assertFalse(Cohort.objects.get(pk=response.json()["id"]).is_calculating)
 
         # Only change name without updating CSV
@@ -137,14 +143,50 @@ User ID,
         )
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(patch_calculate_cohort_from_list.call_count, 2)
+        self.assertEqual(patch_import_static_cohort_csv_chunk.call_count, 2)
         self.assertFalse(response.json()["is_calculating"], False)
         self.assertFalse(Cohort.objects.get(pk=response.json()["id"]).is_calculating)
         self.assertEqual(Cohort.objects.get(pk=response.json()["id"]).name, "test2")
 
-    @patch("posthog.tasks.calculate_cohort.calculate_cohort_from_list.delay")
+    @patch("posthog.tasks.calculate_cohort.STATIC_COHORT_IMPORT_CHUNK_SIZE", 2)
+    @patch("posthog.tasks.calculate_cohort.import_static_cohort_csv_chunk.delay")
+    def test_static_cohort_csv_upload_in_chunks(self, patch_import_static_cohort_csv_chunk):
+        Person.objects.create(team=self.team, distinct_ids=["1"])
+        Person.objects.create(team=self.team, distinct_ids=["3"])
+        content = "User ID,\r\n1\r\n\r\n2,other\r\n3\r\n"
+        csv = SimpleUploadedFile("example.csv", str.encode(content), content_type="application/csv")
+
+        response = self.client.post(
+            f"/api/projects/{self.team.id}/cohorts/",
+            {"name": "test", "csv": csv, "is_static": True},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        cohort_id = response.json()["id"]
+        patch_import_static_cohort_csv_chunk.assert_called_once()
+        path = patch_import_static_cohort_csv_chunk.call_args.args[1]
+        self.assertTrue(default_storage.exists(path))
+
+        # Each chunk queues the next one once it's done, the cohort is only done calculating after the last one
+        offsets = []
+        while patch_import_static_cohort_csv_chunk.call_count > len(offsets):
+            self.assertTrue(Cohort.objects.get(pk=cohort_id).is_calculating)
+            args = patch_import_static_cohort_csv_chunk.call_args.args
+            offsets.append(args[2] if len(args) > 2 else 0)
+            import_static_cohort_csv_chunk(*args)
+
+        self.assertEqual(offsets, [0, len("User ID,\r\n1\r\n"), len(content)])
+        cohort = Cohort.objects.get(pk=cohort_id)
+        self.assertFalse(cohort.is_calculating)
+        self.assertEqual(cohort.errors_calculating, 0)
+        self.assertIsNotNone(cohort.last_calculation)
+        self.assertEqual(cohort.count, 2)
+        self.assertFalse(default_storage.exists(path))
+
+    @patch("posthog.tasks.calculate_cohort.import_static_cohort_csv_chunk.delay")
     @patch("posthog.tasks.calculate_cohort.calculate_cohort_ch.delay")
-    def test_static_cohort_to_dynamic_cohort(self, patch_calculate_cohort, patch_calculate_cohort_from_list):
+    def test_static_cohort_to_dynamic_cohort(self, patch_calculate_cohort, patch_import_static_cohort_csv_chunk):
         self.team.app_urls = ["http://somewebsite.com"]
         self.team.save()
         person = Person.objects.create(team=self.team, properties={"email": "email@example.org"})
@@ -169,8 +211,9 @@ email@example.org,
             format="multipart",
         )
         self.assertEqual(response.status_code, 201)
-        self.assertEqual(patch_calculate_cohort_from_list.call_count, 1)
+        self.assertEqual(patch_import_static_cohort_csv_chunk.call_count, 1)
         self.assertFalse(response.json()["is_calculating"], False)
+        import_static_cohort_csv_chunk(*patch_import_static_cohort_csv_chunk.call_args.args)
         self.assertFalse(Cohort.objects.get(pk=response.json()["id"]).is_calculating)
 
         response = self.client.patch(
@@ -1,10 +1,20 @@
 import base64
 import json
+from unittest.mock import patch
 
 from django.test.client import Client
 from rest_framework import status
 
-from posthog.models import FeatureFlag, GroupTypeMapping, Person, PersonalAPIKey
+from posthog.models import (
+    Cohort,
+    CohortPeople,
+    FeatureFlag,
+    GroupTypeMapping,
+    Organization,
+    Person,
+    PersonalAPIKey,
+    Team,
+)
 from posthog.models.feature_flag import FeatureFlagOverride
 from posthog.test.base import BaseTest
 
@@ -176,14 +186,14 @@ class TestDecide(BaseTest):
             created_by=self.user,
         )
 
-        with self.assertNumQueries(5):
+        with self.assertNumQueries(4):
             response = self._post_decide()
             self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("default-flag", response.json()["featureFlags"])
         self.assertIn("beta-feature", response.json()["featureFlags"])
         self.assertIn("filer-by-property-2", response.json()["featureFlags"])
 
-        with self.assertNumQueries(5):
+        with self.assertNumQueries(4):
             response = self._post_decide({"token": self.team.api_token, "distinct_id": "another_id"})
             self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()["featureFlags"], ["default-flag"])
@@ -543,3 +553,178 @@ class TestDecide(BaseTest):
             response.json(), {"type": "validation_error", "code": "malformed_data", "attr": None},
         )
         self.assertIn("Malformed request data:", detail)
+
+
+class TestBulkDecide(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        key = PersonalAPIKey.objects.create(label="X", user=self.user)
+        self.credentials = {"api_key": key.value, "project_id": self.team.pk}
+        Person.objects.create(
+            team=self.team, distinct_ids=["example_id", "example_id_alias"], properties={"email": "tim@posthog.com"}
+        )
+        Person.objects.create(team=self.team, distinct_ids=["other_id"], properties={"email": "tim@example.com"})
+        FeatureFlag.objects.create(
+            team=self.team, rollout_percentage=100, name="Test", key="test", created_by=self.user,
+        )
+        FeatureFlag.objects.create(
+            team=self.team,
+            filters={
+                "groups": [
+                    {
+                        "properties": [
+                            {"key": "email", "type": "person", "value": "posthog.com", "operator": "icontains"}
+                        ]
+                    }
+                ]
+            },
+            name="PostHog",
+            key="posthog",
+            created_by=self.user,
+        )
+
+    def _post_bulk_decide(self, data):
+        response = self.client.post("/decide/bulk/", json.dumps(data), content_type="application/json")
+        if response.streaming:
+            return response.status_code, json.loads(b"".join(response.streaming_content))
+        return response.status_code, response.json()
+
+    def test_evaluates_flags_for_all_distinct_ids(self):
+        # personal API key, its last_used_at, permissioning check, team, flags, persons
+        with self.assertNumQueries(6):
+            status_code, response = self._post_bulk_decide(
+                {
+                    **self.credentials,
+                    "distinct_ids": ["example_id", "example_id_alias", "other_id", "unknown_id", "other_id"],
+                }
+            )
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response,
+            {
+                "featureFlags": {
+                    "example_id": {"test": True, "posthog": True},
+                    "example_id_alias": {"test": True, "posthog": True},
+                    "other_id": {"test": True},
+                    "unknown_id": {"test": True},
+                }
+            },
+        )
+
+    def test_evaluates_cohort_flags_once_per_batch(self):
+        cohort = Cohort.objects.create(team=self.team, name="Cohort", is_static=True)
+        CohortPeople.objects.create(cohort=cohort, person=Person.objects.get(persondistinctid__distinct_id="other_id"))
+        FeatureFlag.objects.create(
+            team=self.team,
+            filters={"groups": [{"properties": [{"key": "id", "type": "cohort", "value": cohort.pk}]}]},
+            name="Cohort flag",
+            key="cohort-flag",
+            created_by=self.user,
+        )
+
+        # personal API key, its last_used_at, permissioning check, team, flags, persons, cohort, persons in cohort
+        with self.assertNumQueries(8):
+            status_code, response = self._post_bulk_decide(
+                {
+                    **self.credentials,
+                    "distinct_ids": ["example_id", "example_id_alias", "other_id", "unknown_id"],
+                }
+            )
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response,
+            {
+                "featureFlags": {
+                    "example_id": {"test": True, "posthog": True},
+                    "example_id_alias": {"test": True, "posthog": True},
+                    "other_id": {"test": True, "cohort-flag": True},
+                    "unknown_id": {"test": True},
+                }
+            },
+        )
+
+    @patch("posthog.api.decide.BULK_DECIDE_BATCH_SIZE", 2)
+    def test_evaluates_distinct_ids_in_batches(self):
+        status_code, response = self._post_bulk_decide(
+            {**self.credentials, "distinct_ids": ["example_id", "other_id", "unknown_id"]}
+        )
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response,
+            {
+                "featureFlags": {
+                    "example_id": {"test": True, "posthog": True},
+                    "other_id": {"test": True},
+                    "unknown_id": {"test": True},
+                }
+            },
+        )
+
+    @patch("posthog.api.decide.capture_exception")
+    @patch("posthog.api.decide.BULK_DECIDE_BATCH_SIZE", 2)
+    def test_failing_batch_ends_stream_with_error(self, patch_capture_exception):
+        with patch(
+            "posthog.api.decide.get_active_feature_flags_for_distinct_ids",
+            side_effect=[{"example_id": {"test": True}, "other_id": {"test": True}}, Exception("postgres down")],
+        ):
+            status_code, response = self._post_bulk_decide(
+                {**self.credentials, "distinct_ids": ["example_id", "other_id", "unknown_id"]}
+            )
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response,
+            {
+                "featureFlags": {"example_id": {"test": True}, "other_id": {"test": True}},
+                "error": "Failed to evaluate feature flags for all distinct_ids.",
+            },
+        )
+        patch_capture_exception.assert_called_once()
+
+    def test_rejects_project_api_key(self):
+        status_code, response = self._post_bulk_decide({"token": self.team.api_token, "distinct_ids": ["other_id"]})
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+
+        status_code, response = self._post_bulk_decide(
+            {"api_key": self.team.api_token, "project_id": self.team.pk, "distinct_ids": ["other_id"]}
+        )
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rejects_project_of_other_organization(self):
+        other_team = Team.objects.create(organization=Organization.objects.create(name="Other"))
+
+        status_code, response = self._post_bulk_decide(
+            {**self.credentials, "project_id": other_team.pk, "distinct_ids": ["other_id"]}
+        )
+
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_requests(self):
+        status_code, response = self._post_bulk_decide({"distinct_ids": ["example_id"]})
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response["code"], "invalid_personal_key")
+
+        status_code, response = self._post_bulk_decide({**self.credentials, "distinct_ids": []})
+        self.assertEqual(status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response["attr"], "distinct_ids")
+
+        with patch("posthog.api.decide.BULK_DECIDE_MAX_DISTINCT_IDS", 1):
+            status_code, response = self._post_bulk_decide(
+                {**self.credentials, "distinct_ids": ["example_id", "other_id"]}
+            )
+        self.assertEqual(status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response["attr"], "distinct_ids")
+
+        for groups in [["organization"], {"organization": 5}]:
+            status_code, response = self._post_bulk_decide(
+                {**self.credentials, "distinct_ids": ["example_id"], "groups": groups}
+            )
+            self.assertEqual(status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response["attr"], "groups")
+
+        response = self.client.get("/decide/bulk/")
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -248,6 +248,19 @@ class TestEvents(ClickhouseTestMixin, APIBaseTest):
             response = self.client.get(f"/api/projects/{self.team.id}/events/values/?key=random_prop&value=6").json()
             self.assertEqual(response[0]["name"], "565")
 
+    def test_unindexed_event_property_values(self):
+        with freeze_time("2020-01-20 20:00:00"):
+            for url in ["https://posthog.com/docs", "https://posthog.com/docs", "https://posthog.com/pricing"]:
+                _create_event(distinct_id="bla", event="$pageview", team=self.team, properties={"$current_url": url})
+
+            response = self.client.get(f"/api/projects/{self.team.id}/events/values/?key=$current_url").json()
+            self.assertEqual(
+                [resp["name"] for resp in response], ["https://posthog.com/docs", "https://posthog.com/pricing"]
+            )
+
+            response = self.client.get(f"/api/projects/{self.team.id}/events/values/?key=$current_url&value=PRI").json()
+            self.assertEqual([resp["name"] for resp in response], ["https://posthog.com/pricing"])
+
     def test_before_and_after(self):
         user = self._create_user("tim")
         self.client.force_login(user)
@@ -573,16 +586,50 @@ class TestEvents(ClickhouseTestMixin, APIBaseTest):
 
     @patch("posthog.api.event.sync_execute")
     def test_optimize_query(self, patch_sync_execute):
-        #  For ClickHouse we normally only query the last day,
-        # but if a user doesn't have many events we still want to return events that are older
-        patch_sync_execute.return_value = [("event", "d", "{}", timezone.now(), "d", "d", "d")]
+        # For ClickHouse we first only query the last hour, then increasingly long windows before it,
+        # so that if a user doesn't have many events we still return events that are older
+        patch_sync_execute.side_effect = [[], [], [("event", "d", "{}", timezone.now(), "d", "d", "d")], [], [], []]
         response = self.client.get(f"/api/projects/{self.team.id}/events/").json()
         self.assertEqual(len(response["results"]), 1)
-        self.assertEqual(patch_sync_execute.call_count, 2)
+        self.assertEqual(patch_sync_execute.call_count, 6)
 
-        patch_sync_execute.return_value = [("event", "d", "{}", timezone.now(), "d", "d", "d") for _ in range(0, 100)]
+        patch_sync_execute.side_effect = [[("event", "d", "{}", timezone.now(), "d", "d", "d") for _ in range(0, 101)]]
         response = self.client.get(f"/api/projects/{self.team.id}/events/").json()
-        self.assertEqual(patch_sync_execute.call_count, 3)
+        self.assertEqual(len(response["results"]), 100)
+        self.assertEqual(patch_sync_execute.call_count, 7)
+
+    @patch("posthog.api.event.sync_execute")
+    def test_optimize_query_stops_at_after(self, patch_sync_execute):
+        patch_sync_execute.return_value = []
+        after = (timezone.now() - relativedelta(hours=3)).isoformat()
+        response = self.client.get(f"/api/projects/{self.team.id}/events/?{urlencode({'after': after})}").json()
+        self.assertEqual(response["results"], [])
+        self.assertEqual(patch_sync_execute.call_count, 2)
+
+    def test_pagination_with_events_at_the_same_timestamp(self):
+        with freeze_time("2021-10-10T12:03:03.829294Z"):
+            _create_person(team=self.team, distinct_ids=["1"])
+            for _ in range(5):
+                _create_event(team=self.team, event="some event", distinct_id="1", timestamp=timezone.now())
+            _create_event(
+                team=self.team, event="some event", distinct_id="1", timestamp=timezone.now() - relativedelta(days=90)
+            )
+
+            page1 = self.client.get(f"/api/projects/{self.team.id}/events/?distinct_id=1&limit=2").json()
+            self.assertEqual(len(page1["results"]), 2)
+            self.assertIn("before_uuid=", page1["next"])
+
+            page2 = self.client.get(page1["next"]).json()
+            self.assertEqual(len(page2["results"]), 2)
+            page3 = self.client.get(page2["next"]).json()
+            self.assertEqual(len(page3["results"]), 2)
+            self.assertIsNone(page3["next"])
+
+            event_ids = [event["id"] for page in (page1, page2, page3) for event in page["results"]]
+            self.assertEqual(len(set(event_ids)), 6)
+
+            response = self.client.get(f"/api/projects/{self.team.id}/events/?before_uuid=invalid")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_filter_events_by_being_after_properties_with_date_type(self):
         journeys_for(
@@ -0,0 +1,138 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import redis.exceptions
+
+from django.test import override_settings
+from freezegun import freeze_time
+
+from posthog.api.ingestion_context_cache import IngestionContextCache
+from posthog.api.utils import EventIngestionContext, get_event_ingestion_context
+from posthog.test.base import BaseTest
+
+
+@patch.object(IngestionContextCache, "_ensure_listener", MagicMock())
+class TestIngestionContextCache(BaseTest):
+    def _cache(self, **kwargs) -> IngestionContextCache:
+        options = {"max_size": 100, "ttl": 60, "negative_ttl": 10, "channel": "invalidate-team-token"}
+        options.update(kwargs)
+        return IngestionContextCache(**options)
+
+    def test_caches_known_and_unknown_tokens(self):
+        cache = self._cache()
+        context = EventIngestionContext(team_id=self.team.pk, anonymize_ips=False)
+        loader = MagicMock(side_effect=lambda token: context if token == "known" else None)
+
+        self.assertEqual(cache.get("known", loader), context)
+        self.assertEqual(cache.get("known", loader), context)
+        self.assertEqual(cache.get("unknown", loader), None)
+        self.assertEqual(cache.get("unknown", loader), None)
+
+        self.assertEqual(loader.call_count, 2)
+
+    def test_entries_expire(self):
+        cache = self._cache()
+        loader = MagicMock(return_value=None)
+
+        with freeze_time("2021-01-01T00:00:00Z") as frozen_time:
+            cache.get("unknown", loader)
+            frozen_time.tick(11)
+            cache.get("unknown", loader)
+
+        self.assertEqual(loader.call_count, 2)
+
+    def test_serves_stale_entry_when_loader_fails(self):
+        cache = self._cache(ttl=0)
+        context = EventIngestionContext(team_id=self.team.pk, anonymize_ips=True)
+
+        cache.get("known", MagicMock(return_value=context))
+        self.assertEqual(cache.get("known", MagicMock(side_effect=Exception("db down"))), context)
+
+        with self.assertRaises(Exception):
+            cache.get("other", MagicMock(side_effect=Exception("db down")))
+
+    def test_pubsub_message_invalidates_all_tokens_of_team(self):
+        cache = self._cache()
+        context = EventIngestionContext(team_id=self.team.pk, anonymize_ips=False)
+        loader = MagicMock(return_value=context)
+
+        cache.get("old_token", loader)
+        cache._handle_message(
+            {"type": "message", "data": json.dumps({"teamId": self.team.pk, "apiToken": "new_token"})}
+        )
+        cache.get("old_token", loader)
+
+        self.assertEqual(loader.call_count, 2)
+
+    def test_evicts_least_recently_used(self):
+        cache = self._cache(max_size=2)
+        loader = MagicMock(return_value=None)
+
+        cache.get("a", loader)
+        cache.get("b", loader)
+        cache.get("a", loader)
+        cache.get("c", loader)
+        cache.get("a", loader)
+        cache.get("b", loader)
+
+        self.assertEqual([call.args[0] for call in loader.call_args_list], ["a", "b", "c", "b"])
+
+    @patch("posthog.api.ingestion_context_cache.time.sleep")
+    @patch("posthog.api.ingestion_context_cache.capture_exception")
+    @patch("posthog.api.ingestion_context_cache.get_client")
+    def test_listener_clears_once_subscribed_and_backs_off(self, mock_get_client, _capture_exception, mock_sleep):
+        class StopListening(BaseException):
+            pass
+
+        subscribed_client = MagicMock()
+        subscribed_client.pubsub.return_value.listen.return_value = iter([])
+        mock_get_client.side_effect = [
+            redis.exceptions.ConnectionError(),
+            redis.exceptions.ConnectionError(),
+            redis.exceptions.ConnectionError(),
+            subscribed_client,
+            redis.exceptions.ConnectionError(),
+            StopListening(),
+        ]
+        cache = self._cache()
+        cache.set("known", EventIngestionContext(team_id=self.team.pk, anonymize_ips=False))
+
+        with patch.object(cache, "clear", wraps=cache.clear) as clear, self.assertRaises(StopListening):
+            cache._listen()
+
+        clear.assert_called_once()
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [1, 2, 4, 1])
+
+    @patch("posthog.models.team.get_client")
+    def test_team_save_publishes_invalidation_on_commit(self, mock_get_client):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.anonymize_ips = True
+            self.team.save()
+            mock_get_client.return_value.publish.assert_not_called()
+
+        mock_get_client.return_value.publish.assert_called_with(
+            "invalidate-team-token", json.dumps({"teamId": self.team.pk, "apiToken": self.team.api_token})
+        )
+
+    @patch("posthog.models.team.capture_exception")
+    @patch("posthog.models.team.get_client")
+    def test_team_save_succeeds_when_publish_fails(self, mock_get_client, mock_capture_exception):
+        mock_get_client.return_value.publish.side_effect = redis.exceptions.ConnectionError()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.anonymize_ips = True
+            self.team.save()
+
+        mock_capture_exception.assert_called_once()
+        self.team.refresh_from_db()
+        self.assertTrue(self.team.anonymize_ips)
+
+    @override_settings(INGESTION_CONTEXT_CACHE_ENABLED=True)
+    @patch("posthog.api.utils.ingestion_context_cache", new_callable=lambda: IngestionContextCache(100, 60, 10, "c"))
+    def test_get_event_ingestion_context_uses_cache(self, _cache):
+        ingestion_context, db_error, error_response = get_event_ingestion_context(None, {}, self.team.api_token)
+        self.assertEqual(ingestion_context, EventIngestionContext(team_id=self.team.pk, anonymize_ips=False))
+
+        with patch("posthog.api.utils.get_event_ingestion_context_for_token") as loader:
+            get_event_ingestion_context(None, {}, self.team.api_token)
+            loader.assert_not_called()
@@ -1,3 +1,4 @@
+import json
 from datetime import timedelta, timezone
 
 from dateutil.parser import parse
@@ -249,7 +250,7 @@ def factory_test_session_recordings_api(session_recording_event_factory):
                 self.create_snapshot("user", "1", base_time)
 
             response = self.client.get(f"/api/projects/{self.team.id}/session_recordings/1/snapshots")
-            response_data = response.json()
+            response_data = json.loads(b"".join(response.streaming_content))
             self.assertEqual(
                 len(response_data["result"]["snapshot_data_by_window_id"][""]), DEFAULT_RECORDING_CHUNK_LIMIT
             )
@@ -275,7 +276,7 @@ def factory_test_session_recordings_api(session_recording_event_factory):
 
                 for i in range(expected_num_requests):
                     response = self.client.get(next_url)
-                    response_data = response.json()
+                    response_data = json.loads(b"".join(response.streaming_content))
 
                     self.assertEqual(
                         len(response_data["result"]["snapshot_data_by_window_id"]["1"]),
@@ -4,10 +4,12 @@ from dataclasses import dataclass
 from enum import Enum, auto
 from typing import Any, List, Optional, Tuple, Union, cast
 
+from django.conf import settings
 from rest_framework import request, status
 from sentry_sdk import capture_exception
 from statshog.defaults.django import statsd
 
+from posthog.api.ingestion_context_cache import ingestion_context_cache
 from posthog.exceptions import RequestParsingError, generate_exception_response
 from posthog.models import Entity
 from posthog.models.entity import MATH_TYPE
@@ -184,7 +186,10 @@ def get_event_ingestion_context(
     error_response = None
 
     try:
-        ingestion_context = get_event_ingestion_context_for_token(token)
+        if settings.INGESTION_CONTEXT_CACHE_ENABLED:
+            ingestion_context = ingestion_context_cache.get(token, get_event_ingestion_context_for_token)
+        else:
+            ingestion_context = get_event_ingestion_context_for_token(token)
     except Exception as e:
         capture_exception(e)
         statsd.incr("capture_endpoint_fetch_team_fail")
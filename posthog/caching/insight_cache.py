@@ -0,0 +1,120 @@
+"""
+Single-flight calculation and refresh-ahead of cached insight results.
+
+When many requests ask for the same insight at once, e.g. every open tab of a dashboard right after its cache
+expired, only the one holding a redis lock for the cache key calculates the result. The others get the previously
+cached result marked `is_stale` if there is one, or wait for the lock holder to cache its result.
+"""
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
+
+from django.conf import settings
+from django.utils import timezone
+from sentry_sdk import capture_exception
+from statshog.defaults.django import statsd
+
+from posthog.redis import get_client
+from posthog.utils import get_safe_cache
+
+LOCK_KEY = "insight_cache_lock/{cache_key}"
+REFRESH_SCHEDULED_KEY = "insight_cache_refresh_scheduled/{cache_key}"
+WAIT_POLL_INTERVAL_SECONDS = 0.2
+
+ResultPackage = Dict[str, Any]
+T = TypeVar("T")
+
+
+class CalculationLock:
+    """
+    Redis lock held while calculating the result for a cache key. Expires on its own after
+    `INSIGHT_CACHE_LOCK_TIMEOUT_SECONDS` in case the holder dies.
+    """
+
+    def __init__(self, cache_key: str):
+        self.name = LOCK_KEY.format(cache_key=cache_key)
+        self.token = secrets.token_hex(16)
+
+    def acquire(self) -> bool:
+        return bool(get_client().set(self.name, self.token, nx=True, ex=settings.INSIGHT_CACHE_LOCK_TIMEOUT_SECONDS))
+
+    def release(self) -> None:
+        # Don't release a lock that expired and got acquired by someone else in the meantime
+        redis_client = get_client()
+        if redis_client.get(self.name) == self.token.encode("utf-8"):
+            redis_client.delete(self.name)
+
+    def locked(self) -> bool:
+        return bool(get_client().exists(self.name))
+
+
+def calculate_with_single_flight(cache_key: str, calculate: Callable[[], T]) -> Union[T, ResultPackage]:
+    """
+    Calls `calculate`, which must cache and return a fresh result package for `cache_key`, unless another worker is
+    already calculating it. In that case the cached package is returned marked `is_stale`, or, if nothing is cached
+    yet, the other worker's package once it's there.
+    """
+    lock = CalculationLock(cache_key)
+    try:
+        acquired = lock.acquire()
+    except Exception as e:
+        # Redis being down shouldn't break insights, it only costs us the deduplication
+        capture_exception(e)
+        return calculate()
+
+    if acquired:
+        try:
+            return calculate()
+        finally:
+            lock.release()
+
+    statsd.incr("insight_cache_single_flight_deduplicated")
+    cached_package = get_safe_cache(cache_key)
+    if _has_result(cached_package):
+        return {**cached_package, "is_cached": True, "is_stale": True}
+
+    deadline = time.monotonic() + settings.INSIGHT_CACHE_LOCK_WAIT_SECONDS
+    while time.monotonic() < deadline and lock.locked():
+        time.sleep(WAIT_POLL_INTERVAL_SECONDS)
+
+    cached_package = get_safe_cache(cache_key)
+    if _has_result(cached_package):
+        return {**cached_package, "is_cached": True}
+
+    # The other calculation failed or is taking too long, so calculate it ourselves rather than failing the request
+    statsd.incr("insight_cache_single_flight_wait_timeout")
+    return calculate()
+
+
+def schedule_refresh_if_old(
+    cache_key: str, cached_package: Optional[ResultPackage], refresh: Callable[[], Any]
+) -> None:
+    """
+    Calls `refresh` (which should enqueue a task recalculating `cache_key`) once a cached package is older than
+    `INSIGHT_CACHE_REFRESH_AHEAD_AFTER_SECONDS`, so that results that are still being looked at get recalculated in the
+    background rather than shown out of date. At most one refresh is scheduled per cache key and lock timeout.
+    """
+    if not cached_package or not isinstance(cached_package.get("last_refresh"), datetime):
+        return
+
+    age = timezone.now() - cached_package["last_refresh"]
+    if age < timedelta(seconds=settings.INSIGHT_CACHE_REFRESH_AHEAD_AFTER_SECONDS):
+        return
+
+    try:
+        scheduled = get_client().set(
+            REFRESH_SCHEDULED_KEY.format(cache_key=cache_key),
+            1,
+            nx=True,
+            ex=settings.INSIGHT_CACHE_LOCK_TIMEOUT_SECONDS,
+        )
+        if scheduled:
+            statsd.incr("insight_cache_refresh_ahead_scheduled")
+            refresh()
+    except Exception as e:
+        capture_exception(e)
+
+
+def _has_result(cached_package: Optional[ResultPackage]) -> bool:
+    return bool(cached_package) and cached_package.get("result") is not None  # type: ignore
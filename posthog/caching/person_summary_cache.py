@@ -0,0 +1,98 @@
+"""
+Short-lived cache of the person summaries shown next to events, keyed by team and distinct_id.
+
+Paging through events mostly shows the same active persons again and again, so their summaries are read from the
+cache in one round trip and only the missing ones are loaded from Postgres. Entries are dropped when a person or
+distinct_id changes through Django. Changes made by the plugin server, e.g. merges and property updates, show up once
+entries expire after `PERSON_SUMMARY_CACHE_TTL_SECONDS`.
+"""
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from sentry_sdk import capture_exception
+from statshog.defaults.django import statsd
+
+from posthog.models.person import Person
+
+PERSON_SUMMARY_KEY = "person_summary/{team_id}/{distinct_id}"
+# Properties shown next to events, others are left out to keep entries small
+DISPLAY_PROPERTIES = ["email", "name", "username"]
+
+PersonSummary = Dict
+
+
+def get_person_summaries(team_id: int, distinct_ids: Iterable[str]) -> Dict[str, PersonSummary]:
+    "Returns summaries of the persons of `distinct_ids`, keyed by distinct_id. Distinct ids without a person are left out"
+    distinct_ids = list(set(distinct_ids))
+    summaries: Dict[str, PersonSummary] = {}
+    if settings.PERSON_SUMMARY_CACHE_ENABLED:
+        summaries = _get_cached_summaries(team_id, distinct_ids)
+        statsd.incr("person_summary_cache_hit", len(summaries))
+
+    missing_distinct_ids = [distinct_id for distinct_id in distinct_ids if distinct_id not in summaries]
+    if missing_distinct_ids:
+        loaded_summaries = _load_summaries(team_id, missing_distinct_ids)
+        summaries.update(loaded_summaries)
+        if settings.PERSON_SUMMARY_CACHE_ENABLED:
+            statsd.incr("person_summary_cache_miss", len(missing_distinct_ids))
+            _set_cached_summaries(team_id, loaded_summaries)
+
+    return summaries
+
+
+def invalidate_person_summaries(team_id: int, distinct_ids: Iterable[str]) -> None:
+    try:
+        cache.delete_many([_cache_key(team_id, distinct_id) for distinct_id in distinct_ids])
+    except Exception as e:
+        capture_exception(e)
+
+
+def _load_summaries(team_id: int, distinct_ids: List[str]) -> Dict[str, PersonSummary]:
+    from posthog.api.person import get_person_name
+
+    persons = Person.objects.filter(
+        team_id=team_id, persondistinctid__team_id=team_id, persondistinctid__distinct_id__in=distinct_ids
+    ).prefetch_related(Prefetch("persondistinctid_set", to_attr="distinct_ids_cache"))
+
+    summaries: Dict[str, PersonSummary] = {}
+    for person in persons:
+        distinct_ids_of_person = person.distinct_ids
+        summary = {
+            "uuid": str(person.uuid),
+            "name": str(get_person_name(person)),
+            "is_identified": person.is_identified,
+            # Only the first one, as some persons have thousands
+            "distinct_ids": distinct_ids_of_person[:1],
+            "properties": {key: person.properties[key] for key in DISPLAY_PROPERTIES if key in person.properties},
+        }
+        # Every distinct_id of the person gets cached, as the next page likely shows events of the others
+        for distinct_id in distinct_ids_of_person:
+            summaries[distinct_id] = summary
+    return summaries
+
+
+def _get_cached_summaries(team_id: int, distinct_ids: List[str]) -> Dict[str, PersonSummary]:
+    keys = {_cache_key(team_id, distinct_id): distinct_id for distinct_id in distinct_ids}
+    try:
+        cached = cache.get_many(list(keys))
+    except Exception as e:
+        # The cache being down only costs us the Postgres queries
+        capture_exception(e)
+        return {}
+    return {keys[key]: summary for key, summary in cached.items()}
+
+
+def _set_cached_summaries(team_id: int, summaries: Dict[str, PersonSummary]) -> None:
+    try:
+        cache.set_many(
+            {_cache_key(team_id, distinct_id): summary for distinct_id, summary in summaries.items()},
+            timeout=settings.PERSON_SUMMARY_CACHE_TTL_SECONDS,
+        )
+    except Exception as e:
+        capture_exception(e)
+
+
+def _cache_key(team_id: int, distinct_id: str) -> str:
+    return PERSON_SUMMARY_KEY.format(team_id=team_id, distinct_id=distinct_id)
@@ -0,0 +1,90 @@
+"""
+Compressed, versioned format for values cached in redis: insight results in Django's cache (through
+`CompressedPickleSerializer`) and query results of `posthog.client.cache_sync_execute`.
+
+Values are wrapped in an envelope of `MAGIC`, a format version and the codec of the payload. Payloads of at least
+`CACHE_COMPRESSION_THRESHOLD_BYTES` get compressed with zstd, or zlib if zstandard isn't installed. Values without the
+envelope were written before it existed, and are read as they are.
+"""
+import zlib
+from time import perf_counter
+from typing import Optional
+
+from django.conf import settings
+from django_redis.serializers.pickle import PickleSerializer
+from statshog.defaults.django import statsd
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore
+
+MAGIC = b"PHC"
+VERSION = 1
+ZSTD_LEVEL = 3
+
+CODEC_NONE = 0
+CODEC_ZSTD = 1
+CODEC_ZLIB = 2
+
+
+def compress(data: bytes, kind: str, started_at: Optional[float] = None) -> bytes:
+    """
+    Wraps serialized `data` in the envelope, compressing it if large enough. `started_at` is when serializing started,
+    for timing it along with compression.
+    """
+    if len(data) < settings.CACHE_COMPRESSION_THRESHOLD_BYTES:
+        return _envelope(CODEC_NONE) + data
+
+    if zstandard is not None:
+        codec, payload = CODEC_ZSTD, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        codec, payload = CODEC_ZLIB, zlib.compress(data)
+
+    tags = {"kind": kind}
+    statsd.incr("cache_serialized_bytes", len(data), tags=tags)
+    statsd.incr("cache_compressed_bytes", len(payload), tags=tags)
+    statsd.gauge("cache_compression_ratio", len(data) / max(len(payload), 1), tags=tags)
+    if started_at is not None:
+        statsd.timing("cache_serialization_time", (perf_counter() - started_at) * 1000, tags=tags)
+    return _envelope(codec) + payload
+
+
+def decompress(value: bytes, kind: str) -> bytes:
+    if not value.startswith(MAGIC):
+        return value
+
+    version, codec = value[len(MAGIC)], value[len(MAGIC) + 1]
+    if version != VERSION:
+        raise ValueError(f"Unknown cache format version {version}")
+    payload = value[len(MAGIC) + 2 :]
+
+    if codec == CODEC_NONE:
+        return payload
+
+    started_at = perf_counter()
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Cached value is compressed with zstd, but zstandard isn't installed")
+        data = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec == CODEC_ZLIB:
+        data = zlib.decompress(payload)
+    else:
+        raise ValueError(f"Unknown cache compression codec {codec}")
+    statsd.timing("cache_decompression_time", (perf_counter() - started_at) * 1000, tags={"kind": kind})
+    return data
+
+
+class CompressedPickleSerializer(PickleSerializer):
+    "Serializer for django-redis, pickling values like its default one does before compressing them"
+
+    def dumps(self, value) -> bytes:
+        started_at = perf_counter()
+        return compress(super().dumps(value), "cache", started_at)
+
+    def loads(self, value: bytes):
+        return super().loads(decompress(value, "cache"))
+
+
+def _envelope(codec: int) -> bytes:
+    return MAGIC + bytes((VERSION, codec))
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from posthog.caching.insight_cache import CalculationLock, calculate_with_single_flight, schedule_refresh_if_old
+from posthog.redis import get_client
+from posthog.test.base import BaseTest
+
+
+class TestInsightCache(BaseTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        get_client().flushall()
+
+    def _calculate(self, result):
+        def calculate():
+            package = {"result": result, "last_refresh": timezone.now()}
+            cache.set("cache_key", package)
+            return package
+
+        return MagicMock(side_effect=calculate)
+
+    def test_calculates_and_releases_lock(self):
+        calculate = self._calculate([1])
+
+        self.assertEqual(calculate_with_single_flight("cache_key", calculate)["result"], [1])
+        self.assertFalse(CalculationLock("cache_key").locked())
+        calculate.assert_called_once()
+
+    def test_releases_lock_when_calculation_fails(self):
+        with self.assertRaises(ValueError):
+            calculate_with_single_flight("cache_key", MagicMock(side_effect=ValueError()))
+
+        self.assertFalse(CalculationLock("cache_key").locked())
+
+    def test_serves_stale_result_while_another_worker_calculates(self):
+        cache.set("cache_key", {"result": [1], "is_cached": False})
+        CalculationLock("cache_key").acquire()
+        calculate = self._calculate([2])
+
+        result_package = calculate_with_single_flight("cache_key", calculate)
+
+        self.assertEqual(result_package, {"result": [1], "is_cached": True, "is_stale": True})
+        calculate.assert_not_called()
+
+    @patch("posthog.caching.insight_cache.time.sleep")
+    def test_waits_for_result_of_another_worker(self, sleep):
+        lock = CalculationLock("cache_key")
+        lock.acquire()
+
+        def other_worker_finishes(_):
+            cache.set("cache_key", {"result": [3]})
+            lock.release()
+
+        sleep.side_effect = other_worker_finishes
+        calculate = self._calculate([2])
+
+        self.assertEqual(calculate_with_single_flight("cache_key", calculate), {"result": [3], "is_cached": True})
+        calculate.assert_not_called()
+
+    @override_settings(INSIGHT_CACHE_LOCK_WAIT_SECONDS=0)
+    def test_calculates_itself_when_waiting_times_out(self):
+        CalculationLock("cache_key").acquire()
+        calculate = self._calculate([2])
+
+        self.assertEqual(calculate_with_single_flight("cache_key", calculate)["result"], [2])
+        calculate.assert_called_once()
+
+    def test_calculates_when_redis_is_down(self):
+        calculate = self._calculate([2])
+
+        with patch("posthog.caching.insight_cache.get_client", side_effect=Exception("redis down")):
+            self.assertEqual(calculate_with_single_flight("cache_key", calculate)["result"], [2])
+
+    @override_settings(INSIGHT_CACHE_REFRESH_AHEAD_AFTER_SECONDS=50)
+    def test_schedules_refresh_once_when_old(self):
+        refresh = MagicMock()
+
+        with freeze_time("2021-01-01T00:00:00Z") as frozen_time:
+            package = {"result": [1], "last_refresh": timezone.now()}
+
+            schedule_refresh_if_old("cache_key", package, refresh)
+            refresh.assert_not_called()
+
+            frozen_time.tick(timedelta(seconds=51))
+            schedule_refresh_if_old("cache_key", package, refresh)
+            schedule_refresh_if_old("cache_key", package, refresh)
+            refresh.assert_called_once()
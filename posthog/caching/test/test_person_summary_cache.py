@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import override_settings
+
+from posthog.caching.person_summary_cache import get_person_summaries
+from posthog.models import Person
+from posthog.models.person import PersonDistinctId
+from posthog.test.base import BaseTest
+
+
+@override_settings(PERSON_SUMMARY_CACHE_ENABLED=True)
+class TestPersonSummaryCache(BaseTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.person = Person.objects.create(
+            team=self.team,
+            distinct_ids=["1", "2"],
+            properties={"email": "tim@posthog.com", "$browser": "Chrome"},
+            is_identified=True,
+        )
+
+    def test_summaries_are_cached_for_all_distinct_ids_of_a_person(self):
+        summaries = get_person_summaries(self.team.pk, ["1", "unknown"])
+
+        self.assertEqual(
+            summaries["1"],
+            {
+                "uuid": str(self.person.uuid),
+                "name": "tim@posthog.com",
+                "is_identified": True,
+                "distinct_ids": ["1"],
+                "properties": {"email": "tim@posthog.com"},
+            },
+        )
+        self.assertNotIn("unknown", summaries)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_person_summaries(self.team.pk, ["1", "2"])["2"], summaries["1"])
+
+    def test_summaries_are_invalidated_when_person_changes(self):
+        get_person_summaries(self.team.pk, ["1"])
+
+        self.person.properties = {"email": "other@posthog.com"}
+        self.person.save()
+
+        self.assertEqual(get_person_summaries(self.team.pk, ["2"])["2"]["properties"], {"email": "other@posthog.com"})
+
+    def test_summaries_are_invalidated_when_distinct_id_moves_to_another_person(self):
+        get_person_summaries(self.team.pk, ["2"])
+        other_person = Person.objects.create(team=self.team, distinct_ids=["3"])
+
+        person_distinct_id = PersonDistinctId.objects.get(team=self.team, distinct_id="2")
+        person_distinct_id.person = other_person
+        person_distinct_id.save()
+
+        self.assertEqual(get_person_summaries(self.team.pk, ["2"])["2"]["uuid"], str(other_person.uuid))
+
+    def test_summaries_are_scoped_by_team(self):
+        get_person_summaries(self.team.pk, ["1"])
+
+        self.assertEqual(get_person_summaries(self.team.pk + 1, ["1"]), {})
@@ -0,0 +1,69 @@
+import pickle
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from posthog import json_codec
+from posthog.caching import serialization
+from posthog.caching.serialization import (
+    CODEC_NONE,
+    CODEC_ZLIB,
+    CODEC_ZSTD,
+    MAGIC,
+    CompressedPickleSerializer,
+    compress,
+    decompress,
+)
+from posthog.client import _deserialize, _serialize
+
+LARGE_RESULT = {"result": [{"label": f"$pageview - {i}", "data": [i] * 100} for i in range(100)]}
+
+
+@override_settings(CACHE_COMPRESSION_THRESHOLD_BYTES=1024)
+class TestCacheSerialization(SimpleTestCase):
+    def setUp(self):
+        self.serializer = CompressedPickleSerializer({})
+
+    def test_small_values_are_not_compressed(self):
+        value = compress(b"[[1]]", "test")
+
+        self.assertEqual(value, MAGIC + bytes((1, CODEC_NONE)) + b"[[1]]")
+        self.assertEqual(decompress(value, "test"), b"[[1]]")
+
+    def test_large_values_are_compressed(self):
+        data = pickle.dumps(LARGE_RESULT)
+        value = compress(data, "test")
+
+        self.assertIn(value[len(MAGIC) + 1], (CODEC_ZSTD, CODEC_ZLIB))
+        self.assertLess(len(value), len(data) / 10)
+        self.assertEqual(decompress(value, "test"), data)
+
+    @patch.object(serialization, "zstandard", None)
+    def test_falls_back_to_zlib(self):
+        value = compress(pickle.dumps(LARGE_RESULT), "test")
+
+        self.assertEqual(value[len(MAGIC) + 1], CODEC_ZLIB)
+        self.assertEqual(pickle.loads(decompress(value, "test")), LARGE_RESULT)
+
+    def test_values_from_before_the_envelope_are_read_as_is(self):
+        self.assertEqual(self.serializer.loads(pickle.dumps(LARGE_RESULT, -1)), LARGE_RESULT)
+        self.assertEqual(_deserialize(json_codec.dumps_bytes([[1, "a"]])), [(1, "a")])
+
+    def test_unknown_versions_are_rejected(self):
+        with self.assertRaises(ValueError):
+            decompress(MAGIC + bytes((2, CODEC_NONE)) + b"[[1]]", "test")
+
+    def test_round_trips(self):
+        self.assertEqual(self.serializer.loads(self.serializer.dumps(LARGE_RESULT)), LARGE_RESULT)
+        self.assertEqual(self.serializer.loads(self.serializer.dumps({"result": []})), {"result": []})
+        rows = [(i, f"value {i}") for i in range(1000)]
+        self.assertEqual(_deserialize(_serialize(rows)), rows)
+
+    @patch("posthog.caching.serialization.statsd")
+    def test_reports_compression_metrics(self, statsd):
+        self.serializer.dumps(LARGE_RESULT)
+
+        statsd.gauge.assert_called_once()
+        self.assertEqual(statsd.gauge.call_args[0][0], "cache_compression_ratio")
+        self.assertGreater(statsd.gauge.call_args[0][1], 10)
+        self.assertEqual(statsd.timing.call_args[0][0], "cache_serialization_time")
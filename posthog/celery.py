@@ -118,12 +118,29 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
             clickhouse_mark_all_materialized.s(),
             name="clickhouse mark all columns as materialized",
         )
+
+        sender.add_periodic_task(
+            crontab(minute=0),
+            clickhouse_backfill_materialized_columns.s(),
+            name="clickhouse backfill materialized columns",
+        )
     except Exception as err:
         capture_exception(err)
         print(f"Scheduling materialized column task failed: {err}")
 
     sender.add_periodic_task(120, calculate_cohort.s(), name="recalculate cohorts")
 
+    sender.add_periodic_task(
+        crontab(day_of_week="sun", hour=2, minute=0),
+        clickhouse_reindex_property_values.s(),
+        name="clickhouse reindex person and group property values",
+    )
+    sender.add_periodic_task(
+        crontab(hour=1, minute=0),
+        clickhouse_find_unindexed_property_keys.s(),
+        name="clickhouse find event properties with too many values to index",
+    )
+
     if settings.ASYNC_EVENT_PROPERTY_USAGE:
         sender.add_periodic_task(
             EVENT_PROPERTY_USAGE_INTERVAL_SECONDS,
@@ -268,6 +285,28 @@ def clickhouse_mark_all_materialized():
         mark_all_materialized()
 
 
+@app.task(ignore_result=True)
+def clickhouse_backfill_materialized_columns():
+    if recompute_materialized_columns_enabled():
+        from ee.tasks.materialized_columns import run_scheduled_backfill
+
+        run_scheduled_backfill()
+
+
+@app.task(ignore_result=True)
+def clickhouse_reindex_property_values():
+    from ee.tasks.property_values import reindex_person_and_group_property_values
+
+    reindex_person_and_group_property_values()
+
+
+@app.task(ignore_result=True)
+def clickhouse_find_unindexed_property_keys():
+    from ee.tasks.property_values import find_unindexed_property_keys
+
+    find_unindexed_property_keys()
+
+
 @app.task(ignore_result=True)
 def clickhouse_send_license_usage():
     if not settings.MULTI_TENANCY:
@@ -1,30 +1,41 @@
-import asyncio
 import hashlib
 import json
+import re
 import time
 import types
 from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
 from time import perf_counter
-from typing import Any, Dict, List, Optional, Tuple, Union, cast
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
 import sqlparse
-from aioch import Client
-from asgiref.sync import async_to_sync
 from celery.task.control import revoke
 from clickhouse_driver import Client as SyncClient
 from clickhouse_pool import ChPool
-from dataclasses_json import dataclass_json
+from dataclasses_json import DataClassJsonMixin
+from dataclasses_json.core import _ExtendedEncoder
 from django.conf import settings as app_settings
 from django.core.cache import cache
 from django.utils.timezone import now
 from sentry_sdk.api import capture_exception
 
-from posthog import redis
+from posthog import json_codec, redis
+from posthog.caching.serialization import compress, decompress
 from posthog.celery import enqueue_clickhouse_execute_with_progress
 from posthog.errors import wrap_query_error
 from posthog.internal_metrics import incr, timing
+from posthog.queries.query_build_cache import timed_clickhouse_query
 from posthog.settings import (
-    CLICKHOUSE_ASYNC,
     CLICKHOUSE_CA,
     CLICKHOUSE_CONN_POOL_MAX,
     CLICKHOUSE_CONN_POOL_MIN,
@@ -44,7 +55,13 @@ NonInsertParams = Dict[str, Any]
 QueryArgs = Optional[Union[InsertParams, NonInsertParams]]
 
 CACHE_TTL = 60  # seconds
+STREAMING_BLOCK_SIZE = 10000  # rows
 SLOW_QUERY_THRESHOLD_MS = 15000
+# Distinct query templates whose comment-stripped version is kept in memory
+STRIPPED_QUERY_CACHE_SIZE = 1024
+# Longer queries aren't cached. These are rarely templates but queries with values inlined, e.g. lists of ids, which
+# would pin a lot of memory while hardly ever being sent again.
+STRIPPED_QUERY_CACHE_MAX_LENGTH = 64 * 1024
 QUERY_TIMEOUT_THREAD = get_timer_thread("posthog.client", SLOW_QUERY_THRESHOLD_MS)
 
 _request_information: Optional[Dict] = None
@@ -83,43 +100,18 @@ def make_ch_pool(**overrides) -> ChPool:
     return ChPool(**kwargs)
 
 
-if not TEST and CLICKHOUSE_ASYNC:
-    ch_client = Client(
-        host=CLICKHOUSE_HOST,
-        database=CLICKHOUSE_DATABASE,
-        secure=CLICKHOUSE_SECURE,
-        user=CLICKHOUSE_USER,
-        password=CLICKHOUSE_PASSWORD,
-        ca_certs=CLICKHOUSE_CA,
-        verify=CLICKHOUSE_VERIFY,
-    )
-
-    ch_pool = make_ch_pool()
-
-    @async_to_sync
-    async def async_execute(query, args=None, settings=None, with_column_types=False):
-        loop = asyncio.get_event_loop()
-        task = loop.create_task(ch_client.execute(query, args, settings=settings, with_column_types=with_column_types))
-        return task
-
-
-else:
-    # if this is a test use the sync client
-    ch_client = SyncClient(
-        host=CLICKHOUSE_HOST,
-        database=CLICKHOUSE_DATABASE,
-        secure=CLICKHOUSE_SECURE,
-        user=CLICKHOUSE_USER,
-        password=CLICKHOUSE_PASSWORD,
-        ca_certs=CLICKHOUSE_CA,
-        verify=CLICKHOUSE_VERIFY,
-        settings={"mutations_sync": "1"} if TEST else {},
-    )
-
-    ch_pool = make_ch_pool()
+ch_client = SyncClient(
+    host=CLICKHOUSE_HOST,
+    database=CLICKHOUSE_DATABASE,
+    secure=CLICKHOUSE_SECURE,
+    user=CLICKHOUSE_USER,
+    password=CLICKHOUSE_PASSWORD,
+    ca_certs=CLICKHOUSE_CA,
+    verify=CLICKHOUSE_VERIFY,
+    settings={"mutations_sync": "1"} if TEST else {},
+)
 
-    def async_execute(query, args=None, settings=None, with_column_types=False):  # type: ignore
-        return sync_execute(query, args, settings=settings, with_column_types=with_column_types)
+ch_pool = make_ch_pool()
 
 
 def cache_sync_execute(query, args=None, redis_client=None, ttl=CACHE_TTL, settings=None, with_column_types=False):
@@ -135,7 +127,7 @@ def cache_sync_execute(query, args=None, redis_client=None, ttl=CACHE_TTL, setti
         return result
 
 
-def sync_execute(query, args=None, settings=None, with_column_types=False, flush=True):
+def sync_execute(query, args=None, settings=None, with_column_types=False, flush=True, query_id=None):
     if TEST and flush:
         try:
             from posthog.test.base import flush_persons_and_events
@@ -152,9 +144,14 @@ def sync_execute(query, args=None, settings=None, with_column_types=False, flush
         timeout_task = QUERY_TIMEOUT_THREAD.schedule(_notify_of_slow_query_failure, tags)
 
         try:
-            result = client.execute(
-                prepared_sql, params=prepared_args, settings=settings, with_column_types=with_column_types
-            )
+            with timed_clickhouse_query():
+                result = client.execute(
+                    prepared_sql,
+                    params=prepared_args,
+                    settings=settings,
+                    with_column_types=with_column_types,
+                    query_id=query_id,
+                )
         except Exception as err:
             err = wrap_query_error(err)
             tags["failed"] = True
@@ -175,12 +172,64 @@ def sync_execute(query, args=None, settings=None, with_column_types=False, flush
     return result
 
 
+def sync_execute_iter(query, args=None, settings=None, block_size=STREAMING_BLOCK_SIZE, flush=True) -> Iterator[List]:
+    """
+    Like `sync_execute`, but yields the result in lists of up to `block_size` rows as they arrive from ClickHouse, so
+    that results larger than memory can be processed. Rows are only read off the connection as fast as blocks are
+    consumed, and the connection stays checked out of the pool until the iterator is exhausted or closed.
+    """
+    if TEST and flush:
+        try:
+            from posthog.test.base import flush_persons_and_events
+
+            flush_persons_and_events()
+        except ModuleNotFoundError:  # when we run plugin server tests it tries to run above, ignore
+            pass
+
+    with ch_pool.get_client() as client:
+        start_time = perf_counter()
+
+        prepared_sql, prepared_args, tags = _prepare_query(client=client, query=query, args=args)
+
+        timeout_task = QUERY_TIMEOUT_THREAD.schedule(_notify_of_slow_query_failure, tags)
+
+        exhausted = False
+        try:
+            rows = client.execute_iter(prepared_sql, params=prepared_args, settings=settings)
+            while True:
+                block = list(islice(rows, block_size))
+                if not block:
+                    break
+                yield block
+            exhausted = True
+        except Exception as err:
+            err = wrap_query_error(err)
+            tags["failed"] = True
+            tags["reason"] = type(err).__name__
+            incr("clickhouse_sync_execution_failure", tags=tags)
+
+            raise err
+        finally:
+            if not exhausted:
+                # Whatever is left of the result would otherwise be read as the response to the next query
+                client.disconnect()
+
+            execution_time = perf_counter() - start_time
+
+            QUERY_TIMEOUT_THREAD.cancel(timeout_task)
+            timing("clickhouse_sync_execution_time", execution_time * 1000.0, tags=tags)
+
+            if app_settings.SHELL_PLUS_PRINT_SQL:
+                print("Execution time: %.6fs" % (execution_time,))
+            if _request_information is not None and _request_information.get("save", False):
+                save_query(prepared_sql, execution_time)
+
+
 REDIS_STATUS_TTL = 600  # 10 minutes
 
 
-@dataclass_json
 @dataclass
-class QueryStatus:
+class QueryStatus(DataClassJsonMixin):
     team_id: int
     num_rows: float = 0
     total_rows: float = 0
@@ -192,6 +241,14 @@ class QueryStatus:
     end_time: Optional[float] = None
     task_id: Optional[str] = None
 
+    def to_json(self, *args, **kwargs) -> str:  # type: ignore
+        # Same output as `DataClassJsonMixin.to_json`, which goes through the stdlib encoder
+        return json_codec.dumps(self.to_dict(encode_json=False), default=_ExtendedEncoder().default)
+
+    @classmethod
+    def from_json(cls, s, *args, **kwargs) -> "QueryStatus":  # type: ignore
+        return cls.from_dict(json_codec.loads(s))
+
 
 def generate_redis_results_key(query_id):
     REDIS_KEY_PREFIX_ASYNC_RESULTS = "query_with_progress"
@@ -402,24 +459,30 @@ def _prepare_query(client: SyncClient, query: str, args: QueryArgs):
     below predicate.
     """
     prepared_args: Any = QueryArgs
+    if app_settings.SHELL_PLUS_PRINT_SQL:
+        # sqlparse is too slow for every query, but handy to double check `strip_sql_comments` when debugging
+        query = sqlparse.format(query, strip_comments=True)
+    else:
+        # Comments get stripped from the template, so that this only happens once per template
+        query = strip_sql_comments(query)
+
     if isinstance(args, (list, tuple, types.GeneratorType)):
         # If we get one of these it means we have an insert, let the clickhouse
         # client handle substitution here.
-        rendered_sql = query
+        formatted_sql = query
         prepared_args = args
     elif not args:
         # If `args` is not truthy then make prepared_args `None`, which the
         # clickhouse client uses to signal no substitution is desired. Expected
         # args balue are `None` or `{}` for instance
-        rendered_sql = query
+        formatted_sql = query
         prepared_args = None
     else:
         # Else perform the substitution so we can perform operations on the raw
         # non-templated SQL
-        rendered_sql = client.substitute_params(query, args)
+        formatted_sql = client.substitute_params(query, args)
         prepared_args = None
 
-    formatted_sql = sqlparse.format(rendered_sql, strip_comments=True)
     annotated_sql, tags = _annotate_tagged_query(formatted_sql, args)
 
     if app_settings.SHELL_PLUS_PRINT_SQL:
@@ -429,15 +492,36 @@ def _prepare_query(client: SyncClient, query: str, args: QueryArgs):
     return annotated_sql, prepared_args, tags
 
 
+# String literals and quoted identifiers are matched too, so that comment markers within them are left alone
+SQL_COMMENTS_REGEX = re.compile(
+    r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`(?:[^`\\]|\\.)*`)|(?:--|(?<!\#)\# )[^\n]*|/\*.*?\*/""", re.DOTALL
+)
+
+
+def strip_sql_comments(query: str) -> str:
+    "Removes `--`, `# ` and `/* */` comments from a query, like `sqlparse.format(query, strip_comments=True)` does"
+    if len(query) > STRIPPED_QUERY_CACHE_MAX_LENGTH:
+        return _strip_sql_comments(query)
+    return _strip_sql_comments_cached(query)
+
+
+def _strip_sql_comments(query: str) -> str:
+    return SQL_COMMENTS_REGEX.sub(lambda match: match.group(1) or " ", query).strip()
+
+
+_strip_sql_comments_cached = lru_cache(maxsize=STRIPPED_QUERY_CACHE_SIZE)(_strip_sql_comments)
+
+
 def _deserialize(result_bytes: bytes) -> List[Tuple]:
     results = []
-    for x in json.loads(result_bytes):
+    for x in json_codec.loads(decompress(result_bytes, "query")):
         results.append(tuple(x))
     return results
 
 
 def _serialize(result: Any) -> bytes:
-    return json.dumps(result).encode("utf-8")
+    started_at = perf_counter()
+    return compress(json_codec.dumps_bytes(result), "query", started_at)
 
 
 def _query_hash(query: str, team_id: int, args: Any) -> str:
@@ -43,9 +43,20 @@ def create_clickhouse_tables(num_tables: int):
         PERSONS_TABLE_SQL,
     )
     from ee.clickhouse.sql.plugin_log_entries import PLUGIN_LOG_ENTRIES_TABLE_SQL
+    from ee.clickhouse.sql.property_values import (
+        DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL,
+        EVENT_PROPERTY_VALUES_MV_SQL,
+        GROUP_PROPERTY_VALUES_MV_SQL,
+        PERSON_PROPERTY_VALUES_MV_SQL,
+        PROPERTY_VALUES_TABLE_SQL,
+        UNINDEXED_PROPERTY_KEYS_TABLE_SQL,
+    )
     from ee.clickhouse.sql.session_recording_events import (
         DISTRIBUTED_SESSION_RECORDING_EVENTS_TABLE_SQL,
+        DISTRIBUTED_SESSION_RECORDING_METADATA_TABLE_SQL,
         SESSION_RECORDING_EVENTS_TABLE_SQL,
+        SESSION_RECORDING_METADATA_MV_SQL,
+        SESSION_RECORDING_METADATA_TABLE_SQL,
         WRITABLE_SESSION_RECORDING_EVENTS_TABLE_SQL,
     )
 
@@ -57,6 +68,9 @@ def create_clickhouse_tables(num_tables: int):
         PERSON_DISTINCT_ID2_TABLE_SQL(),
         PERSON_STATIC_COHORT_TABLE_SQL(),
         SESSION_RECORDING_EVENTS_TABLE_SQL(),
+        SESSION_RECORDING_METADATA_TABLE_SQL(),
+        PROPERTY_VALUES_TABLE_SQL(),
+        UNINDEXED_PROPERTY_KEYS_TABLE_SQL(),
         PLUGIN_LOG_ENTRIES_TABLE_SQL(),
         CREATE_COHORTPEOPLE_TABLE_SQL(),
         KAFKA_DEAD_LETTER_QUEUE_TABLE_SQL(),
@@ -71,13 +85,21 @@ def create_clickhouse_tables(num_tables: int):
                 WRITABLE_EVENTS_TABLE_SQL(),
                 DISTRIBUTED_SESSION_RECORDING_EVENTS_TABLE_SQL(),
                 WRITABLE_SESSION_RECORDING_EVENTS_TABLE_SQL(),
+                DISTRIBUTED_SESSION_RECORDING_METADATA_TABLE_SQL(),
+                DISTRIBUTED_PROPERTY_VALUES_TABLE_SQL(),
             ]
         )
 
     # Because the tables are created in parallel, any tables that depend on another
     # table should be created in a second batch - to ensure the first table already
     # exists. Tables for this second batch of table creation are defined here:
-    SECOND_BATCH_OF_TABLES_TO_CREATE_DROP = [DEAD_LETTER_QUEUE_TABLE_MV_SQL]
+    SECOND_BATCH_OF_TABLES_TO_CREATE_DROP = [
+        DEAD_LETTER_QUEUE_TABLE_MV_SQL,
+        SESSION_RECORDING_METADATA_MV_SQL(),
+        EVENT_PROPERTY_VALUES_MV_SQL(),
+        PERSON_PROPERTY_VALUES_MV_SQL(),
+        GROUP_PROPERTY_VALUES_MV_SQL(),
+    ]
 
     # Check if all the tables have already been created
     if num_tables == len(FIRST_BATCH_OF_TABLES_TO_CREATE_DROP + SECOND_BATCH_OF_TABLES_TO_CREATE_DROP):
@@ -101,7 +123,14 @@ def reset_clickhouse_tables():
         TRUNCATE_PERSON_TABLE_SQL,
     )
     from ee.clickhouse.sql.plugin_log_entries import TRUNCATE_PLUGIN_LOG_ENTRIES_TABLE_SQL
-    from ee.clickhouse.sql.session_recording_events import TRUNCATE_SESSION_RECORDING_EVENTS_TABLE_SQL
+    from ee.clickhouse.sql.property_values import (
+        TRUNCATE_PROPERTY_VALUES_TABLE_SQL,
+        TRUNCATE_UNINDEXED_PROPERTY_KEYS_TABLE_SQL,
+    )
+    from ee.clickhouse.sql.session_recording_events import (
+        TRUNCATE_SESSION_RECORDING_EVENTS_TABLE_SQL,
+        TRUNCATE_SESSION_RECORDING_METADATA_TABLE_SQL,
+    )
 
     # REMEMBER TO ADD ANY NEW CLICKHOUSE TABLES TO THIS ARRAY!
     TABLES_TO_CREATE_DROP = [
@@ -111,6 +140,9 @@ def reset_clickhouse_tables():
         TRUNCATE_PERSON_DISTINCT_ID2_TABLE_SQL,
         TRUNCATE_PERSON_STATIC_COHORT_TABLE_SQL,
         TRUNCATE_SESSION_RECORDING_EVENTS_TABLE_SQL(),
+        TRUNCATE_SESSION_RECORDING_METADATA_TABLE_SQL(),
+        TRUNCATE_PROPERTY_VALUES_TABLE_SQL(),
+        TRUNCATE_UNINDEXED_PROPERTY_KEYS_TABLE_SQL(),
         TRUNCATE_PLUGIN_LOG_ENTRIES_TABLE_SQL,
         TRUNCATE_COHORTPEOPLE_TABLE_SQL,
         TRUNCATE_DEAD_LETTER_QUEUE_TABLE_SQL,
@@ -8,6 +8,7 @@ from django.utils.timezone import now
 from rest_framework.request import Request
 from rest_framework.viewsets import GenericViewSet
 
+from posthog.caching.insight_cache import calculate_with_single_flight
 from posthog.models import User
 from posthog.models.filters.utils import get_filter
 from posthog.models.insight import Insight
@@ -48,20 +49,24 @@ def cached_function(f: Callable[[U, Request], T]) -> Callable[[U, Request], T]:
                 cached_result_package["is_cached"] = True
                 return cached_result_package
 
-        # call function being wrapped
-        fresh_result_package = cast(T, f(self, request))
-        # cache new data
-        if isinstance(fresh_result_package, dict):
-            result = fresh_result_package.get("result")
-            if not isinstance(result, dict) or not result.get("loading"):
-                fresh_result_package["last_refresh"] = now()
-                fresh_result_package["is_cached"] = False
-                cache.set(
-                    cache_key, fresh_result_package, settings.TEMP_CACHE_RESULTS_TTL,
-                )
-                if filter:
-                    insights = Insight.objects.filter(team_id=team.pk, filters_hash=cache_key)
-                    insights.update(last_refresh=now())
-        return fresh_result_package
+        def calculate() -> T:
+            # call function being wrapped
+            fresh_result_package = cast(T, f(self, request))
+            # cache new data
+            if isinstance(fresh_result_package, dict):
+                result = fresh_result_package.get("result")
+                if not isinstance(result, dict) or not result.get("loading"):
+                    fresh_result_package["last_refresh"] = now()
+                    fresh_result_package["is_cached"] = False
+                    cache.set(
+                        cache_key, fresh_result_package, settings.TEMP_CACHE_RESULTS_TTL,
+                    )
+                    if filter:
+                        insights = Insight.objects.filter(team_id=team.pk, filters_hash=cache_key)
+                        insights.update(last_refresh=now())
+            return fresh_result_package
+
+        # only one worker calculates the same result at a time, the others get the stale result or wait for it
+        return cast(T, calculate_with_single_flight(cache_key, calculate))
 
     return wrapper
@@ -3,15 +3,39 @@ import dataclasses
 import gzip
 import json
 from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import DefaultDict, Dict, Generator, List, Optional
-
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from typing import (
+    DefaultDict,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from django.conf import settings
 from sentry_sdk.api import capture_exception, capture_message
 
+from posthog import json_codec
 from posthog.models import utils
 
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore
+
 FULL_SNAPSHOT = 2
 
+# Formats of compressed snapshot chunks, stored in their `compression` field. Chunks keep the format they were written
+# with, so decompression has to support all of them.
+GZIP_BASE64 = "gzip-base64"  # UTF-16 encoded, which doubles the size of the input of gzip
+GZIP_UTF8_BASE64 = "gzip-utf8-base64"
+ZSTD_UTF8_BASE64 = "zstd-utf8-base64"
+
 Event = Dict
 SnapshotData = Dict
 WindowId = Optional[str]
@@ -43,6 +67,22 @@ class DecompressedRecordingData:
     snapshot_data_by_window_id: Dict[WindowId, List[SnapshotData]]
 
 
+@dataclasses.dataclass
+class SnapshotDataChunk:
+    window_id: WindowId
+    chunk_id: str
+    chunk_count: int
+    data: str
+    compression: str = GZIP_BASE64
+
+
+@dataclasses.dataclass
+class RecordingSnapshotsPage:
+    has_next: bool
+    # Snapshot events as JSON, one string of comma separated events per chunk, with the chunks of a window adjacent
+    events_json: Iterator[Tuple[WindowId, str]]
+
+
 def preprocess_session_recording_events(events: List[Event]) -> List[Event]:
     result = []
     snapshots_by_session_and_window_id = defaultdict(list)
@@ -54,23 +94,62 @@ def preprocess_session_recording_events(events: List[Event]) -> List[Event]:
         else:
             result.append(event)
 
-    for _, snapshots in snapshots_by_session_and_window_id.items():
-        result.extend(list(compress_and_chunk_snapshots(snapshots)))
+    snapshot_groups = list(snapshots_by_session_and_window_id.values())
+    executor = _get_compression_executor()
+    if executor is not None and len(snapshot_groups) > 1:
+        # gzip and zstd release the GIL while compressing, so windows get compressed in parallel
+        for chunks in executor.map(_compress_and_chunk_snapshots_list, snapshot_groups):
+            result.extend(chunks)
+    else:
+        for snapshots in snapshot_groups:
+            result.extend(_compress_and_chunk_snapshots_list(snapshots))
 
     return result
 
 
-def compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) -> Generator[Event, None, None]:
+_compression_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_compression_executor() -> Optional[ThreadPoolExecutor]:
+    global _compression_executor
+    if settings.SESSION_RECORDING_COMPRESSION_WORKERS <= 0:
+        return None
+    if _compression_executor is None:
+        _compression_executor = ThreadPoolExecutor(
+            max_workers=settings.SESSION_RECORDING_COMPRESSION_WORKERS, thread_name_prefix="snapshot-compression"
+        )
+    return _compression_executor
+
+
+def _compress_and_chunk_snapshots_list(events: List[Event]) -> List[Event]:
+    return list(compress_and_chunk_snapshots(events))
+
+
+def get_snapshot_compression() -> str:
+    "The configured format for compressing snapshots, falling back to gzip if zstandard isn't installed"
+    compression = settings.SESSION_RECORDING_COMPRESSION
+    if compression == ZSTD_UTF8_BASE64 and zstandard is None:
+        return GZIP_UTF8_BASE64
+    return compression
+
+
+def compress_and_chunk_snapshots(
+    events: List[Event], chunk_size=512 * 1024, compression: Optional[str] = None
+) -> Generator[Event, None, None]:
     data_list = [event["properties"]["$snapshot_data"] for event in events]
     session_id = events[0]["properties"]["$session_id"]
     has_full_snapshot = any(snapshot_data["type"] == FULL_SNAPSHOT for snapshot_data in data_list)
     window_id = events[0]["properties"].get("$window_id")
 
-    compressed_data = compress_to_string(json.dumps(data_list))
+    compression = compression or get_snapshot_compression()
+    compressed_data = compress_to_string(json.dumps(data_list), compression)
+    events_summary = get_events_summary(data_list)
 
     id = str(utils.UUIDT())
     chunks = chunk_string(compressed_data, chunk_size)
     for index, chunk in enumerate(chunks):
+        # Only the first part of a chunk carries the summary, to keep it from being counted more than once
+        summary = {"events_summary": events_summary} if index == 0 and events_summary else {}
         yield {
             **events[0],
             "properties": {
@@ -82,13 +161,48 @@ def compress_and_chunk_snapshots(events: List[Event], chunk_size=512 * 1024) ->
                     "chunk_index": index,
                     "chunk_count": len(chunks),
                     "data": chunk,
-                    "compression": "gzip-base64",
+                    "compression": compression,
                     "has_full_snapshot": has_full_snapshot,
+                    **summary,
                 },
             },
         }
 
 
+def get_events_summary(events: List[SnapshotData]) -> Optional[Dict]:
+    """
+    Summarizes the snapshot events of a chunk, which are all from the same window, for the session recording metadata
+    table. Timestamps are in milliseconds. Returns None if the events don't have timestamps.
+    """
+    timestamped_events = sorted(
+        (event for event in events if isinstance(event.get("timestamp"), (int, float))),
+        key=lambda event: event["timestamp"],
+    )
+    if not timestamped_events:
+        return None
+
+    active_segments = get_active_segments_from_event_list(
+        [
+            EventActivityData(
+                timestamp=datetime.fromtimestamp(event["timestamp"] / 1000, timezone.utc),
+                is_active=is_active_event(event),
+            )
+            for event in timestamped_events
+        ],
+        window_id=None,
+    )
+    return {
+        "start_time": int(timestamped_events[0]["timestamp"]),
+        "end_time": int(timestamped_events[-1]["timestamp"]),
+        "active_segments": [
+            [round(segment.start_time.timestamp() * 1000), round(segment.end_time.timestamp() * 1000)]
+            for segment in active_segments
+        ],
+        "click_count": sum(1 for event in timestamped_events if is_click_event(event)),
+        "keypress_count": sum(1 for event in timestamped_events if is_keypress_event(event)),
+    }
+
+
 def chunk_string(string: str, chunk_length: int) -> List[str]:
     """Split a string into chunk_length-sized elements. Reversal operation: `''.join()`."""
     return [string[0 + offset : chunk_length + offset] for offset in range(0, len(string), chunk_length)]
@@ -106,14 +220,29 @@ def is_unchunked_snapshot(event: Dict) -> bool:
         raise ValueError('$snapshot events must contain property "$snapshot_data"!')
 
 
-def compress_to_string(json_string: str) -> str:
-    compressed_data = gzip.compress(json_string.encode("utf-16", "surrogatepass"))
+def compress_to_string(json_string: str, compression: str = GZIP_BASE64) -> str:
+    if compression == ZSTD_UTF8_BASE64:
+        # Compressors aren't thread safe, but cheap to create
+        compressed_data = zstandard.ZstdCompressor(level=3).compress(json_string.encode("utf-8", "surrogatepass"))
+    elif compression == GZIP_UTF8_BASE64:
+        compressed_data = gzip.compress(json_string.encode("utf-8", "surrogatepass"), compresslevel=6)
+    elif compression == GZIP_BASE64:
+        compressed_data = gzip.compress(json_string.encode("utf-16", "surrogatepass"))
+    else:
+        raise ValueError(f"Unknown snapshot compression {compression}")
     return base64.b64encode(compressed_data).decode("utf-8")
 
 
-def decompress(base64data: str) -> str:
+def decompress(base64data: str, compression: str = GZIP_BASE64) -> str:
     compressed_bytes = base64.b64decode(base64data)
-    return gzip.decompress(compressed_bytes).decode("utf-16", "surrogatepass")
+    if compression == ZSTD_UTF8_BASE64:
+        return zstandard.ZstdDecompressor().decompress(compressed_bytes).decode("utf-8", "surrogatepass")
+    elif compression == GZIP_UTF8_BASE64:
+        return gzip.decompress(compressed_bytes).decode("utf-8", "surrogatepass")
+    elif compression == GZIP_BASE64:
+        return gzip.decompress(compressed_bytes).decode("utf-16", "surrogatepass")
+    else:
+        raise ValueError(f"Unknown snapshot compression {compression}")
 
 
 def decompress_chunked_snapshot_data(
@@ -178,7 +307,9 @@ def decompress_chunked_snapshot_data(
         b64_compressed_data = "".join(
             chunk.snapshot_data["data"] for chunk in sorted(chunks, key=lambda c: c.snapshot_data["chunk_index"])
         )
-        decompressed_data = json.loads(decompress(b64_compressed_data))
+        decompressed_data = json.loads(
+            decompress(b64_compressed_data, chunks[0].snapshot_data.get("compression", GZIP_BASE64))
+        )
 
         # Decompressed data can be large, and in metadata calculations, we only care if the event is "active"
         # This pares down the data returned, so we're not passing around a massive object
@@ -194,6 +325,47 @@ def decompress_chunked_snapshot_data(
     return DecompressedRecordingData(has_next=has_next, snapshot_data_by_window_id=snapshot_data_by_window_id)
 
 
+def decompress_snapshot_data_chunks(
+    team_id: int, session_recording_id: str, chunks: Iterable[SnapshotDataChunk]
+) -> Iterator[Tuple[WindowId, str]]:
+    """
+    Lazily decompresses chunks sorted by chunk and chunk index, yielding the JSON of the events of each chunk for
+    `RecordingSnapshotsPage`. Only one chunk is held in memory at a time and the events don't get parsed.
+    """
+    for chunk_id, chunk_parts in groupby(chunks, key=lambda chunk: chunk.chunk_id):
+        parts = list(chunk_parts)
+        if len(parts) != parts[0].chunk_count:
+            capture_message(
+                "Did not find all session recording chunks! Team: {}, Session: {}, Chunk-id: {}. Found {} of {} expected chunks".format(
+                    team_id, session_recording_id, chunk_id, len(parts), parts[0].chunk_count,
+                )
+            )
+            continue
+
+        # Each chunk holds a JSON array, whose brackets get stripped so that events of chunks can be spliced together
+        events_json = decompress("".join(part.data for part in parts), parts[0].compression).strip()[1:-1].strip()
+        if events_json:
+            yield parts[0].window_id, events_json
+
+
+def load_snapshot_data_by_window_id(events_json: Iterable[Tuple[WindowId, str]]) -> Dict[WindowId, List[SnapshotData]]:
+    snapshot_data_by_window_id: DefaultDict[WindowId, List[SnapshotData]] = defaultdict(list)
+    for window_id, chunk_events_json in events_json:
+        snapshot_data_by_window_id[window_id].extend(json_codec.loads(f"[{chunk_events_json}]"))
+    return dict(snapshot_data_by_window_id)
+
+
+def stream_snapshot_data_by_window_id(events_json: Iterable[Tuple[WindowId, str]]) -> Iterator[str]:
+    "Writes the same JSON object as `load_snapshot_data_by_window_id` returns, one chunk at a time"
+    yield "{"
+    for window_index, (window_id, window_events_json) in enumerate(groupby(events_json, key=lambda item: item[0])):
+        yield ("," if window_index > 0 else "") + json_codec.dumps(window_id) + ":["
+        for chunk_index, (_, chunk_events_json) in enumerate(window_events_json):
+            yield ("," if chunk_index > 0 else "") + chunk_events_json
+        yield "]"
+    yield "}"
+
+
 def is_active_event(event: SnapshotData) -> bool:
     """
     Determines which rr-web events are "active" - meaning user generated
@@ -211,6 +383,16 @@ def is_active_event(event: SnapshotData) -> bool:
     return event.get("type") == 3 and event.get("data", {}).get("source") in active_rr_web_sources
 
 
+def is_click_event(event: SnapshotData) -> bool:
+    # "MouseInteraction" of type "Click"
+    return event.get("type") == 3 and event.get("data", {}).get("source") == 2 and event["data"].get("type") == 2
+
+
+def is_keypress_event(event: SnapshotData) -> bool:
+    # "Input", rr-web doesn't record keypresses that don't change an input
+    return event.get("type") == 3 and event.get("data", {}).get("source") == 5
+
+
 ACTIVITY_THRESHOLD_SECONDS = 60
 
 
@@ -250,6 +432,24 @@ def get_active_segments_from_event_list(
     return active_recording_segments
 
 
+def merge_active_segments(
+    segments: List[RecordingSegment], activity_threshold_seconds=ACTIVITY_THRESHOLD_SECONDS
+) -> List[RecordingSegment]:
+    """
+    Merges active segments of a window that were calculated separately, e.g. per chunk, into the segments
+    `get_active_segments_from_event_list` would have returned for all of their events at once
+    """
+    merged_segments: List[RecordingSegment] = []
+    for segment in sorted(segments, key=lambda segment: segment.start_time):
+        if merged_segments and (segment.start_time - merged_segments[-1].end_time) <= timedelta(
+            seconds=activity_threshold_seconds
+        ):
+            merged_segments[-1].end_time = max(merged_segments[-1].end_time, segment.end_time)
+        else:
+            merged_segments.append(dataclasses.replace(segment))
+    return merged_segments
+
+
 def generate_inactive_segments_for_range(
     range_start_time: datetime,
     range_end_time: datetime,
@@ -1,20 +1,32 @@
+import json
 from datetime import datetime, timedelta, timezone
 
 import pytest
 from pytest_mock import MockerFixture
 
 from posthog.helpers.session_recording import (
+    GZIP_BASE64,
+    GZIP_UTF8_BASE64,
+    ZSTD_UTF8_BASE64,
     EventActivityData,
     PaginatedList,
     RecordingSegment,
+    SnapshotDataChunk,
     SnapshotDataTaggedWithWindowId,
     compress_and_chunk_snapshots,
+    compress_to_string,
+    decompress,
     decompress_chunked_snapshot_data,
+    decompress_snapshot_data_chunks,
     generate_inactive_segments_for_range,
     get_active_segments_from_event_list,
+    get_events_summary,
     is_active_event,
+    load_snapshot_data_by_window_id,
+    merge_active_segments,
     paginate_list,
     preprocess_session_recording_events,
+    stream_snapshot_data_by_window_id,
 )
 
 
@@ -74,7 +86,7 @@ def test_compression_and_chunking(raw_snapshot_events, mocker: MockerFixture):
     mocker.patch("posthog.models.utils.UUIDT", return_value="0178495e-8521-0000-8e1c-2652fa57099b")
     mocker.patch("time.time", return_value=0)
 
-    assert list(compress_and_chunk_snapshots(raw_snapshot_events)) == [
+    assert list(compress_and_chunk_snapshots(raw_snapshot_events, compression=GZIP_BASE64)) == [
         {
             "event": "$snapshot",
             "properties": {
@@ -94,19 +106,80 @@ def test_compression_and_chunking(raw_snapshot_events, mocker: MockerFixture):
     ]
 
 
+def test_first_chunk_part_has_events_summary():
+    events = [
+        {
+            "event": "$snapshot",
+            "properties": {
+                "$session_id": "1234",
+                "$window_id": "1",
+                "$snapshot_data": {"type": 2, "timestamp": 1_600_000_000_000},
+                "distinct_id": "abc123",
+            },
+        },
+        {
+            "event": "$snapshot",
+            "properties": {
+                "$session_id": "1234",
+                "$window_id": "1",
+                "$snapshot_data": {"type": 3, "timestamp": 1_600_000_001_000, "data": {"source": 2, "type": 2}},
+                "distinct_id": "abc123",
+            },
+        },
+    ]
+
+    chunks = [event["properties"]["$snapshot_data"] for event in compress_and_chunk_snapshots(events, 50)]
+
+    assert len(chunks) > 1
+    assert chunks[0]["events_summary"] == {
+        "start_time": 1_600_000_000_000,
+        "end_time": 1_600_000_001_000,
+        "active_segments": [[1_600_000_001_000, 1_600_000_001_000]],
+        "click_count": 1,
+        "keypress_count": 0,
+    }
+    assert all("events_summary" not in chunk for chunk in chunks[1:])
+
+
 def test_decompression_results_in_same_data(raw_snapshot_events):
     assert len(list(compress_and_chunk_snapshots(raw_snapshot_events, 1000))) == 1
     assert compress_decompress_and_extract(raw_snapshot_events, 1000) == [
         raw_snapshot_events[0]["properties"]["$snapshot_data"],
         raw_snapshot_events[1]["properties"]["$snapshot_data"],
     ]
-    assert len(list(compress_and_chunk_snapshots(raw_snapshot_events, 100))) == 2
-    assert compress_decompress_and_extract(raw_snapshot_events, 100) == [
+    assert len(list(compress_and_chunk_snapshots(raw_snapshot_events, 20))) > 1
+    assert compress_decompress_and_extract(raw_snapshot_events, 20) == [
         raw_snapshot_events[0]["properties"]["$snapshot_data"],
         raw_snapshot_events[1]["properties"]["$snapshot_data"],
     ]
 
 
+@pytest.mark.parametrize("compression", [GZIP_BASE64, GZIP_UTF8_BASE64, ZSTD_UTF8_BASE64])
+def test_compression_formats_round_trip(raw_snapshot_events, compression):
+    raw_snapshot_events[1]["properties"]["$snapshot_data"]["text"] = "💻 \ud83d ünïcode"
+
+    snapshot_data_list = [
+        event["properties"]["$snapshot_data"]
+        for event in compress_and_chunk_snapshots(raw_snapshot_events, 20, compression=compression)
+    ]
+
+    assert all(snapshot_data["compression"] == compression for snapshot_data in snapshot_data_list)
+    assert decompress_chunked_snapshot_data(
+        2,
+        "someid",
+        [
+            SnapshotDataTaggedWithWindowId(window_id="1", snapshot_data=snapshot_data)
+            for snapshot_data in snapshot_data_list
+        ],
+    ).snapshot_data_by_window_id["1"] == [event["properties"]["$snapshot_data"] for event in raw_snapshot_events]
+
+
+@pytest.mark.parametrize("compression", ["", "snappy-base64"])
+def test_decompress_rejects_unknown_compression(compression):
+    with pytest.raises(ValueError):
+        decompress(compress_to_string("[]", GZIP_BASE64), compression)
+
+
 def test_has_full_snapshot_property(raw_snapshot_events):
     compressed = list(compress_and_chunk_snapshots(raw_snapshot_events))
     assert len(compressed) == 1
@@ -297,6 +370,43 @@ def test_get_active_segments_from_no_active_events():
     assert active_segments == []
 
 
+def test_get_events_summary():
+    events = [
+        {"timestamp": 1_000, "type": 3, "data": {"source": 5}},
+        {"timestamp": 62_000, "type": 3, "data": {"source": 2, "type": 2}},
+        {"timestamp": 500, "type": 2, "data": {}},
+        {"timestamp": 90_000, "type": 3, "data": {"source": 1}},
+        {"timestamp": 200_000, "type": 4},
+    ]
+
+    assert get_events_summary(events) == {
+        "start_time": 500,
+        "end_time": 200_000,
+        "active_segments": [[1_000, 1_000], [62_000, 90_000]],
+        "click_count": 1,
+        "keypress_count": 1,
+    }
+    assert get_events_summary([{"type": 2, "foo": "bar"}]) is None
+
+
+def test_merge_active_segments():
+    def segment(start_seconds, end_seconds):
+        return RecordingSegment(
+            start_time=datetime(2022, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=start_seconds),
+            end_time=datetime(2022, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=end_seconds),
+            window_id="1",
+            is_active=True,
+        )
+
+    assert merge_active_segments([segment(110, 130), segment(0, 10), segment(20, 40), segment(200, 200)]) == [
+        segment(0, 40),
+        segment(110, 130),
+        segment(200, 200),
+    ]
+    assert merge_active_segments([segment(0, 100), segment(10, 20)]) == [segment(0, 100)]
+    assert merge_active_segments([]) == []
+
+
 def test_generate_inactive_segments_for_range():
     base_time = datetime(2019, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
     generated_segments = generate_inactive_segments_for_range(
@@ -390,6 +500,38 @@ def test_paginate_list():
     assert paginate_list(list, 4, 5) == PaginatedList(has_next=True, paginated_list=list[5:9])
 
 
+def test_decompress_snapshot_data_chunks_lazily(raw_snapshot_events):
+    raw_snapshot_data = [event["properties"]["$snapshot_data"] for event in raw_snapshot_events]
+    chunks = [
+        SnapshotDataChunk(
+            window_id="1",
+            chunk_id=event["properties"]["$snapshot_data"]["chunk_id"],
+            chunk_count=event["properties"]["$snapshot_data"]["chunk_count"],
+            data=event["properties"]["$snapshot_data"]["data"],
+            compression=event["properties"]["$snapshot_data"]["compression"],
+        )
+        for event in compress_and_chunk_snapshots(raw_snapshot_events, 100)
+    ]
+    incomplete_chunk = SnapshotDataChunk(window_id="2", chunk_id="unique_id", chunk_count=2, data="")
+
+    events_json = decompress_snapshot_data_chunks(2, "someid", iter(chunks + [incomplete_chunk]))
+
+    window_id, chunk_events_json = next(events_json)
+    assert window_id == "1"
+    assert json.loads(f"[{chunk_events_json}]") == raw_snapshot_data
+    assert list(events_json) == []
+
+
+def test_stream_snapshot_data_by_window_id():
+    events_json = [("1", '{"type": 2}'), ("1", '{"type": 3}, {"type": 3}'), ("2", '{"type": 4}')]
+
+    streamed = "".join(stream_snapshot_data_by_window_id(iter(events_json)))
+
+    assert json.loads(streamed) == load_snapshot_data_by_window_id(events_json)
+    assert json.loads(streamed) == {"1": [{"type": 2}, {"type": 3}, {"type": 3}], "2": [{"type": 4}]}
+    assert "".join(stream_snapshot_data_by_window_id(iter([]))) == "{}"
+
+
 @pytest.fixture
 def raw_snapshot_events():
     return [
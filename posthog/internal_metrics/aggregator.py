@@ -0,0 +1,160 @@
+import atexit
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from sentry_sdk.api import capture_exception
+from statshog.client.base import Tags
+
+from posthog import utils
+from posthog.models.utils import UUIDT
+
+PERCENTILES = (50, 90, 95, 99)
+OVERFLOW_TAGS = {"overflow": True}
+
+
+class _Metric:
+    def __init__(self, kind: str, tags: Tags):
+        self.kind = kind
+        self.tags = tags
+        self.count = 0
+        self.sum: float = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.last: float = 0
+        # Reservoir of observed values, for percentiles
+        self.samples: List[float] = []
+
+    def observe(self, value: float, max_samples: int) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+        if self.kind == "timing":
+            if len(self.samples) < max_samples:
+                self.samples.append(value)
+            else:
+                index = random.randrange(self.count)
+                if index < max_samples:
+                    self.samples[index] = value
+
+    def properties(self, scale: float) -> Dict[str, Any]:
+        if self.kind == "incr":
+            return {"value": self.sum * scale, "count": round(self.count * scale)}
+        if self.kind == "gauge":
+            return {"value": self.last, "count": self.count, "min": self.min, "max": self.max}
+
+        properties = {
+            "value": self.sum / self.count,
+            "count": round(self.count * scale),
+            "sum": self.sum * scale,
+            "min": self.min,
+            "max": self.max,
+        }
+        samples = sorted(self.samples)
+        for percentile in PERCENTILES:
+            properties[f"p{percentile}"] = samples[min(len(samples) - 1, len(samples) * percentile // 100)]
+        return properties
+
+
+class MetricsAggregator:
+    """
+    Accumulates internal metrics in memory per (metric, tags), so that recording one is cheap enough for hot paths
+    like `sync_execute`. A background thread in every process flushes them every `flush_interval` seconds as one
+    `$$<metric>` event per (metric, tags), with the number of observations and their value: the total for counters,
+    the last one for gauges, and the mean along with sum, min, max and percentiles for timings.
+
+    Counters and timings are sampled at `sample_rate`, with counts scaled back up when flushed. Tags beyond the first
+    `max_tag_sets` distinct ones of a metric within a flush interval get folded under `OVERFLOW_TAGS`.
+    """
+
+    def __init__(self, flush_interval: float, sample_rate: float, max_tag_sets: int, max_samples: int = 1000):
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.max_tag_sets = max_tag_sets
+        self.max_samples = max_samples
+        self._reset()
+
+    def record(self, kind: str, metric_name: str, value: float, tags: Tags, team_id: int) -> None:
+        if kind != "gauge" and self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+
+        if self._pid != os.getpid():
+            # Forked, e.g. by gunicorn or celery. Neither the lock nor the flusher thread carry over
+            self._reset()
+        self._ensure_flusher()
+
+        tags_key = tuple(sorted(tags.items())) if tags else ()
+        with self._lock:
+            self._team_id = team_id
+            metric = self._metrics.get((metric_name, tags_key))
+            if metric is None:
+                if self._tag_sets.get(metric_name, 0) >= self.max_tag_sets:
+                    tags, tags_key = OVERFLOW_TAGS, tuple(OVERFLOW_TAGS.items())
+                    metric = self._metrics.get((metric_name, tags_key))
+                else:
+                    self._tag_sets[metric_name] = self._tag_sets.get(metric_name, 0) + 1
+            if metric is None:
+                metric = self._metrics[(metric_name, tags_key)] = _Metric(kind, tags)
+            metric.observe(value, self.max_samples)
+
+    def flush(self) -> None:
+        from posthog.api.capture import capture_internal
+
+        with self._lock:
+            metrics, self._metrics, self._tag_sets = self._metrics, {}, {}
+            team_id = self._team_id
+        if len(metrics) == 0 or team_id is None:
+            return
+
+        now = timezone.now()
+        distinct_id = utils.get_machine_id()
+        scale = 1 / self.sample_rate
+        for (metric_name, _), metric in metrics.items():
+            try:
+                event = {
+                    "event": f"$${metric_name}",
+                    "properties": {**metric.properties(scale), **(metric.tags or {})},
+                }
+                capture_internal(event, distinct_id, None, None, now, now, team_id, event_uuid=UUIDT())
+            except Exception as err:
+                # Ignore errors, this is not important enough to fail on
+                capture_exception(err)
+
+    def _reset(self) -> None:
+        self._metrics: Dict[Tuple[str, Tuple], _Metric] = {}
+        self._tag_sets: Dict[str, int] = {}
+        self._team_id: Optional[int] = None
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_periodically, name="internal-metrics", daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def _flush_periodically(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as err:
+                capture_exception(err)
+
+
+metrics_aggregator = MetricsAggregator(
+    flush_interval=settings.INTERNAL_METRICS_FLUSH_INTERVAL_SECONDS,
+    sample_rate=settings.INTERNAL_METRICS_SAMPLE_RATE,
+    max_tag_sets=settings.INTERNAL_METRICS_MAX_TAG_SETS,
+)
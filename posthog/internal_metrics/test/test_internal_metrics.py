@@ -5,6 +5,7 @@ from django.conf import settings
 from pytest_mock.plugin import MockerFixture
 
 from posthog.internal_metrics import gauge, incr, timing
+from posthog.internal_metrics.aggregator import OVERFLOW_TAGS, MetricsAggregator, metrics_aggregator
 from posthog.internal_metrics.team import (
     CLICKHOUSE_DASHBOARD,
     NAME,
@@ -20,7 +21,11 @@ def mock_capture_internal(mocker: MockerFixture):
     get_internal_metrics_team_id.cache_clear()
     mocker.patch.object(settings, "CAPTURE_INTERNAL_METRICS", True)
     mocker.patch("posthog.utils.get_machine_id", return_value="machine_id")
-    yield mocker.patch("posthog.api.capture.capture_internal")
+    mock_capture_internal = mocker.patch("posthog.api.capture.capture_internal")
+    # Drop metrics left over by other tests
+    metrics_aggregator.flush()
+    mock_capture_internal.reset_mock()
+    yield mock_capture_internal
 
     mocker.patch.object(settings, "CAPTURE_INTERNAL_METRICS", False)
     get_internal_metrics_team_id.cache_clear()
@@ -28,37 +33,60 @@ def mock_capture_internal(mocker: MockerFixture):
 
 def test_methods_capture_enabled(db, mock_capture_internal):
     timing("foo_metric", 100, tags={"team_id": 15})
+    timing("foo_metric", 200, tags={"team_id": 15})
     gauge("bar_metric", 20, tags={"team_id": 15})
     incr("zeta_metric")
+    incr("zeta_metric", 2)
 
+    mock_capture_internal.assert_not_called()
+    metrics_aggregator.flush()
+
+    assert mock_capture_internal.call_count == 3
     mock_capture_internal.assert_any_call(
-        {"event": "$$foo_metric", "properties": {"value": 100, "team_id": 15}},
+        {
+            "event": "$$foo_metric",
+            "properties": {
+                "value": 150,
+                "count": 2,
+                "sum": 300,
+                "min": 100,
+                "max": 200,
+                "p50": 200,
+                "p90": 200,
+                "p95": 200,
+                "p99": 200,
+                "team_id": 15,
+            },
+        },
         "machine_id",
         None,
         None,
         mock.ANY,
         mock.ANY,
         get_internal_metrics_team_id(),
+        event_uuid=mock.ANY,
     )
 
     mock_capture_internal.assert_any_call(
-        {"event": "$$bar_metric", "properties": {"value": 20, "team_id": 15}},
+        {"event": "$$bar_metric", "properties": {"value": 20, "count": 1, "min": 20, "max": 20, "team_id": 15}},
         "machine_id",
         None,
         None,
         mock.ANY,
         mock.ANY,
         get_internal_metrics_team_id(),
+        event_uuid=mock.ANY,
     )
 
     mock_capture_internal.assert_any_call(
-        {"event": "$$zeta_metric", "properties": {"value": 1}},
+        {"event": "$$zeta_metric", "properties": {"value": 3, "count": 2}},
         "machine_id",
         None,
         None,
         mock.ANY,
         mock.ANY,
         get_internal_metrics_team_id(),
+        event_uuid=mock.ANY,
     )
 
 
@@ -68,10 +96,34 @@ def test_methods_capture_disabled(db, mock_capture_internal, mocker: MockerFixtu
     timing("foo_metric", 100, tags={"team_id": 15})
     gauge("bar_metric", 20, tags={"team_id": 15})
     incr("zeta_metric")
+    metrics_aggregator.flush()
 
     mock_capture_internal.assert_not_called()
 
 
+def test_aggregator_caps_tag_sets(mock_capture_internal):
+    aggregator = MetricsAggregator(flush_interval=60, sample_rate=1, max_tag_sets=2)
+    for table in ["events", "person", "groups", "cohortpeople"]:
+        aggregator.record("incr", "foo_metric", 1, {"table": table}, 2)
+    aggregator.flush()
+
+    assert [call[0][0]["properties"] for call in mock_capture_internal.call_args_list] == [
+        {"value": 1, "count": 1, "table": "events"},
+        {"value": 1, "count": 1, "table": "person"},
+        {"value": 2, "count": 2, **OVERFLOW_TAGS},
+    ]
+
+
+def test_aggregator_scales_sampled_counts(mock_capture_internal, mocker: MockerFixture):
+    aggregator = MetricsAggregator(flush_interval=60, sample_rate=0.5, max_tag_sets=100)
+    mocker.patch("random.random", side_effect=[0.1, 0.9, 0.2, 0.7])
+    for _ in range(4):
+        aggregator.record("incr", "foo_metric", 1, None, 2)
+    aggregator.flush()
+
+    assert mock_capture_internal.call_args[0][0]["properties"] == {"value": 4, "count": 4}
+
+
 def test_get_internal_metrics_team_id_with_capture_disabled(db, django_assert_num_queries, mocker: MockerFixture):
     mocker.patch.object(settings, "CAPTURE_INTERNAL_METRICS", False)
 
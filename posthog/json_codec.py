@@ -0,0 +1,39 @@
+"""
+JSON encoding and decoding for hot paths (event ingestion, ClickHouse result caching).
+
+Uses orjson when it is installed and falls back to the stdlib `json` module otherwise, as well as for any value
+orjson refuses to handle (lone surrogates, integers wider than 64 bits, NaN literals when decoding), so the output
+is always something the stdlib would have accepted too.
+"""
+import json
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+# Datetimes are passed to `default` like the stdlib does, instead of being silently turned into ISO strings
+_ORJSON_OPTIONS = 0 if orjson is None else orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps_bytes(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, default=default).encode("utf-8")
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    return dumps_bytes(obj, default=default).decode("utf-8")
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
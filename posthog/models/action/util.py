@@ -8,6 +8,7 @@ from posthog.models.action import Action
 from posthog.models.action_step import ActionStep
 from posthog.models.property import Property, PropertyIdentifier
 from posthog.models.utils import PersonPropertiesMode
+from posthog.queries.query_build_cache import memoize
 
 
 def format_action_filter(
@@ -18,6 +19,40 @@ def format_action_filter(
     filter_by_team=True,
     table_name: str = "",
     person_properties_mode: PersonPropertiesMode = PersonPropertiesMode.USING_SUBQUERY,
+) -> Tuple[str, Dict]:
+    if action.pk is None:
+        return _format_action_filter(
+            team_id, action, prepend, use_loop, filter_by_team, table_name, person_properties_mode
+        )
+
+    # Memoized for the current request, which also saves fetching the steps again
+    query, params = memoize(
+        lambda: (
+            "action_filter",
+            team_id,
+            action.pk,
+            action.updated_at,
+            prepend,
+            use_loop,
+            filter_by_team,
+            table_name,
+            person_properties_mode,
+        ),
+        lambda: _format_action_filter(
+            team_id, action, prepend, use_loop, filter_by_team, table_name, person_properties_mode
+        ),
+    )
+    return query, dict(params)
+
+
+def _format_action_filter(
+    team_id: int,
+    action: Action,
+    prepend: str,
+    use_loop: bool,
+    filter_by_team: bool,
+    table_name: str,
+    person_properties_mode: PersonPropertiesMode,
 ) -> Tuple[str, Dict]:
     # get action steps
     params = {"team_id": action.team.pk} if filter_by_team else {}
@@ -1,12 +1,23 @@
 import time
 from datetime import datetime
-from typing import Any, Dict, List, Literal, Optional, cast
+from itertools import islice
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    cast,
+)
 
 import structlog
 from django.conf import settings
 from django.db import connection, models
 from django.db.models import Case, Q, When
 from django.db.models.expressions import F
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from sentry_sdk import capture_exception
 
@@ -181,12 +192,11 @@ class Cohort(models.Model):
             return
         try:
 
-            # Paginate fetch batch_size from clickhouse and paginate insert pg_batch_size into postgres
-            cursor = 0
-            persons = self._clickhouse_persons_query(batch_size=batch_size, offset=cursor)
-            while persons:
+            # Stream batch_size person ids at a time from clickhouse and paginate insert pg_batch_size into postgres
+            for uuids in self._clickhouse_persons_stream(batch_size=batch_size):
                 # TODO: Insert from a subquery instead of pulling retrieving
                 # then sending large lists of data backwards and forwards.
+                persons = Person.objects.filter(uuid__in=uuids, team=self.team)
                 to_insert = [
                     CohortPeople(person_id=person_id, cohort_id=self.pk, version=new_version)
                     #  Just pull out the person id as we don't need anything
@@ -195,18 +205,17 @@ class Cohort(models.Model):
                 ]
                 #  TODO: make sure this bulk_create doesn't actually return anything
                 CohortPeople.objects.bulk_create(to_insert, batch_size=pg_batch_size)
-
-                cursor += batch_size
-                persons = self._clickhouse_persons_query(batch_size=batch_size, offset=cursor)
-                time.sleep(5)
-
         except Exception as err:
             # Clear the pending version people if there's an error
             batch_delete_cohort_people(self.pk, new_version)
 
             raise err
 
-    def calculate_people_ch(self, pending_version):
+    def calculate_people_ch(self, pending_version, recalculated_count: Optional[int] = None):
+        """
+        Recalculates the cohort's people in ClickHouse, unless they have already been recalculated together with other
+        cohorts, resulting in `recalculated_count` people.
+        """
         from ee.clickhouse.models.cohort import recalculate_cohortpeople
         from posthog.tasks.cohorts_in_feature_flag import get_cohort_ids_in_feature_flags
 
@@ -214,7 +223,7 @@ class Cohort(models.Model):
         start_time = time.monotonic()
 
         try:
-            count = recalculate_cohortpeople(self)
+            count = recalculate_cohortpeople(self) if recalculated_count is None else recalculated_count
 
             # only precalculate if used in feature flag
             ids = get_cohort_ids_in_feature_flags()
@@ -252,10 +261,13 @@ class Cohort(models.Model):
             duration=(time.monotonic() - start_time),
         )
 
-    def insert_users_by_list(self, items: List[str]) -> None:
+    def insert_users_by_list(self, items: Iterable[str], *, finish_calculation: bool = True) -> None:
         """
         Items can be distinct_id or email
         Important! Does not insert into clickhouse
+        `count` gets increased after each batch, so that progress of large imports shows up
+        Chunks of an import pass `finish_calculation=False`, the import is then finished by
+        `posthog.tasks.calculate_cohort` once its last chunk is done
         """
         batchsize = 1000
         from ee.clickhouse.models.cohort import insert_static_cohort
@@ -268,8 +280,11 @@ class Cohort(models.Model):
 
         try:
             cursor = connection.cursor()
-            for i in range(0, len(items), batchsize):
-                batch = items[i : i + batchsize]
+            items = iter(items)
+            while True:
+                batch = list(islice(items, batchsize))
+                if not batch:
+                    break
                 persons_query = (
                     Person.objects.filter(team_id=self.team_id)
                     .filter(Q(persondistinctid__team_id=self.team_id, persondistinctid__distinct_id__in=batch))
@@ -284,24 +299,34 @@ class Cohort(models.Model):
                     ),
                 )
                 cursor.execute(query, params)
-            self.is_calculating = False
-            self.last_calculation = timezone.now()
-            self.errors_calculating = 0
-            self.save()
+                if cursor.rowcount > 0:
+                    # Doesn't overwrite the count with the one from when the cohort got loaded
+                    Cohort.objects.filter(pk=self.pk).update(count=Coalesce("count", 0) + cursor.rowcount)
+            if finish_calculation:
+                self.is_calculating = False
+                self.last_calculation = timezone.now()
+                self.errors_calculating = 0
+                self.save(update_fields=["is_calculating", "last_calculation", "errors_calculating"])
         except Exception as err:
             if settings.DEBUG:
                 raise err
-            self.is_calculating = False
-            self.errors_calculating = F("errors_calculating") + 1
-            self.save()
+            if finish_calculation:
+                self.is_calculating = False
+                self.errors_calculating = F("errors_calculating") + 1
+                self.save(update_fields=["is_calculating", "errors_calculating"])
+            else:
+                Cohort.objects.filter(pk=self.pk).update(errors_calculating=F("errors_calculating") + 1)
             capture_exception(err)
 
-    def insert_users_list_by_uuid(self, items: List[str]) -> None:
+    def insert_users_list_by_uuid(self, items: Iterable[str]) -> None:
         batchsize = 1000
         try:
             cursor = connection.cursor()
-            for i in range(0, len(items), batchsize):
-                batch = items[i : i + batchsize]
+            items = iter(items)
+            while True:
+                batch = list(islice(items, batchsize))
+                if not batch:
+                    break
                 persons_query = (
                     Person.objects.filter(team_id=self.team_id).filter(uuid__in=batch).exclude(cohort__id=self.id)
                 )
@@ -329,11 +354,10 @@ class Cohort(models.Model):
     def __str__(self):
         return self.name
 
-    def _clickhouse_persons_query(self, batch_size=10000, offset=0):
-        from ee.clickhouse.models.cohort import get_person_ids_by_cohort_id
+    def _clickhouse_persons_stream(self, batch_size=10000) -> Iterator[List[str]]:
+        from ee.clickhouse.models.cohort import stream_person_ids_by_cohort_id
 
-        uuids = get_person_ids_by_cohort_id(team=self.team, cohort_id=self.pk, limit=batch_size, offset=offset)
-        return Person.objects.filter(uuid__in=uuids, team=self.team)
+        return stream_person_ids_by_cohort_id(team=self.team, cohort_id=self.pk, block_size=batch_size)
 
     __repr__ = sane_repr("id", "name", "last_calculation")
 
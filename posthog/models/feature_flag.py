@@ -1,17 +1,34 @@
+import copy
 import hashlib
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Union
-
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import redis.exceptions
+from django.conf import settings
 from django.core.cache import cache
-from django.db import models
+from django.db import models, transaction
 from django.db.models.expressions import ExpressionWrapper, RawSQL, Subquery
 from django.db.models.fields import BooleanField
 from django.db.models.query import QuerySet
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
 from django.dispatch.dispatcher import receiver
 from django.utils import timezone
 from sentry_sdk.api import capture_exception
+from statshog.defaults.django import statsd
 
+from posthog import json_codec
 from posthog.models.cohort import Cohort
 from posthog.models.experiment import Experiment
 from posthog.models.filters.mixins.utils import cached_property
@@ -20,12 +37,16 @@ from posthog.models.group_type_mapping import GroupTypeMapping
 from posthog.models.property import GroupTypeIndex, GroupTypeName
 from posthog.models.user import User
 from posthog.queries.base import properties_to_Q
+from posthog.redis import get_client
 
 from .filters import Filter
 from .person import Person, PersonDistinctId
 
 __LONG_SCALE__ = float(0xFFFFFFFFFFFFFFF)
 
+FEATURE_FLAG_DEFINITIONS_VERSION_KEY = "feature_flag_definitions_version/{team_id}"
+FEATURE_FLAG_DEFINITIONS_KEY = "feature_flag_definitions/{team_id}"
+
 
 @dataclass(frozen=True)
 class FeatureFlagMatch:
@@ -125,6 +146,8 @@ class FeatureFlag(models.Model):
 @receiver(pre_delete, sender=Experiment)
 def delete_experiment_flags(sender, instance, **kwargs):
     FeatureFlag.objects.filter(experiment=instance).update(deleted=True)
+    # `update` doesn't send post_save
+    feature_flag_definitions_changed(sender, instance)
 
 
 class FeatureFlagOverride(models.Model):
@@ -147,11 +170,23 @@ class FeatureFlagOverride(models.Model):
 
 
 class FlagsMatcherCache:
-    def __init__(self, team_id: int):
+    """
+    Per-request cache shared by all matchers evaluating flags of a team, so that group type mappings, the
+    properties of the person and groups being matched and the conditions evaluated in postgres are loaded at most once.
+    """
+
+    def __init__(self, team_id: int, group_types_to_indexes: Optional[Dict[GroupTypeName, GroupTypeIndex]] = None):
         self.team_id = team_id
+        self._group_types_to_indexes = group_types_to_indexes
+        self._person_properties: Dict[str, Optional[Dict]] = {}
+        self._group_properties: Dict[Tuple[GroupTypeIndex, str], Optional[Dict]] = {}
+        # (flag key, distinct_id or group key) -> `FeatureFlagMatcher.query_conditions`
+        self.query_conditions: Dict[Tuple[str, Optional[str]], List] = {}
 
     @cached_property
     def group_types_to_indexes(self) -> Dict[GroupTypeName, GroupTypeIndex]:
+        if self._group_types_to_indexes is not None:
+            return self._group_types_to_indexes
         group_type_mapping_rows = GroupTypeMapping.objects.filter(team_id=self.team_id)
         return {row.group_type: row.group_type_index for row in group_type_mapping_rows}
 
@@ -159,6 +194,50 @@ class FlagsMatcherCache:
     def group_type_index_to_name(self) -> Dict[GroupTypeIndex, GroupTypeName]:
         return {value: key for key, value in self.group_types_to_indexes.items()}
 
+    def person_properties(self, distinct_id: str) -> Optional[Dict]:
+        if distinct_id not in self._person_properties:
+            rows = Person.objects.filter(
+                team_id=self.team_id, persondistinctid__distinct_id=distinct_id, persondistinctid__team_id=self.team_id,
+            ).values_list("properties", flat=True)[:1]
+            self._person_properties[distinct_id] = rows[0] if rows else None
+        return self._person_properties[distinct_id]
+
+    def preload_person_properties(self, distinct_ids: List[str]) -> None:
+        "Loads the properties of all persons behind `distinct_ids` with a single query"
+        distinct_ids = [distinct_id for distinct_id in distinct_ids if distinct_id not in self._person_properties]
+        if not distinct_ids:
+            return
+        rows = PersonDistinctId.objects.filter(team_id=self.team_id, distinct_id__in=distinct_ids).values_list(
+            "distinct_id", "person__properties"
+        )
+        self._person_properties.update({distinct_id: None for distinct_id in distinct_ids})
+        self._person_properties.update(rows)
+
+    def preload_query_conditions(self, feature_flag: "FeatureFlag", distinct_ids: List[str]) -> None:
+        "Evaluates the conditions of a flag aggregated by persons for all persons behind `distinct_ids` in one query"
+        distinct_ids = [
+            distinct_id for distinct_id in distinct_ids if (feature_flag.key, distinct_id) not in self.query_conditions
+        ]
+        if not distinct_ids:
+            return
+        query = Person.objects.filter(
+            team_id=self.team_id,
+            persondistinctid__distinct_id__in=distinct_ids,
+            persondistinctid__team_id=self.team_id,
+        )
+        query, fields = annotate_condition_matches(query, feature_flag)
+        self.query_conditions.update({(feature_flag.key, distinct_id): [] for distinct_id in distinct_ids})
+        for distinct_id, *condition_matches in query.values_list("persondistinctid__distinct_id", *fields):
+            self.query_conditions[(feature_flag.key, distinct_id)] = [condition_matches]
+
+    def group_properties(self, group_type_index: GroupTypeIndex, group_key: str) -> Optional[Dict]:
+        if (group_type_index, group_key) not in self._group_properties:
+            rows = Group.objects.filter(
+                team_id=self.team_id, group_type_index=group_type_index, group_key=group_key,
+            ).values_list("group_properties", flat=True)[:1]
+            self._group_properties[(group_type_index, group_key)] = rows[0] if rows else None
+        return self._group_properties[(group_type_index, group_key)]
+
 
 class FeatureFlagMatcher:
     def __init__(
@@ -206,7 +285,49 @@ class FeatureFlagMatcher:
         return True
 
     def _condition_matches(self, condition_index: int) -> bool:
-        return len(self.query_conditions) > 0 and self.query_conditions[0][condition_index]
+        properties = self.properties
+        if properties is None:
+            return False
+
+        predicate = self.condition_predicates[condition_index]
+        if predicate is None:
+            return len(self.query_conditions) > 0 and self.query_conditions[0][condition_index]
+        return predicate(properties)
+
+    @property
+    def properties(self) -> Optional[Dict]:
+        "Properties of the person or group being matched, None if it doesn't exist"
+        if self.feature_flag.aggregation_group_type_index is None:
+            return self.cache.person_properties(self.distinct_id)
+        return self.cache.group_properties(
+            self.feature_flag.aggregation_group_type_index, self.hashed_identifier  # type: ignore
+        )
+
+    @cached_property
+    def condition_predicates(self) -> List[Optional[Callable[[Dict], bool]]]:
+        """
+        Conditions compiled into in-memory predicates over `properties`. Conditions that can't be compiled
+        (e.g. ones referencing cohorts) are None and get evaluated in postgres via `query_conditions` instead.
+        """
+        return [self._compile_condition(condition) for condition in self.feature_flag.conditions]
+
+    def _compile_condition(self, condition: Dict) -> Optional[Callable[[Dict], bool]]:
+        try:
+            properties = Filter(data=condition).property_groups.flat
+        except Exception:
+            # Let `query_conditions` raise the same error as before
+            return None
+
+        property_type_is_group = self.feature_flag.aggregation_group_type_index is not None
+        predicates = []
+        for property in properties:
+            predicate = property.property_to_predicate()
+            # Anything filtering on a column the aggregated model doesn't have is left for postgres to reject
+            if predicate is None or (property.type == "group") != property_type_is_group:
+                return None
+            predicates.append(predicate)
+
+        return lambda properties: all(predicate(properties) for predicate in predicates)
 
     # Define contiguous sub-domains within [0, 1].
     # By looking up a random hash value, you can find the associated variant key.
@@ -222,8 +343,21 @@ class FeatureFlagMatcher:
             value_min = value_max
         return lookup_table
 
+    @property
+    def has_query_conditions(self) -> bool:
+        "Whether any condition needs `query_conditions` to be evaluated"
+        return any(
+            predicate is None and len(condition.get("properties", [])) > 0
+            for predicate, condition in zip(self.condition_predicates, self.feature_flag.conditions)
+        )
+
     @cached_property
     def query_conditions(self) -> List[List[bool]]:
+        # Matchers of other distinct_ids may have evaluated the same person or group already
+        cache_key = (self.feature_flag.key, self.hashed_identifier)
+        if cache_key in self.cache.query_conditions:
+            return self.cache.query_conditions[cache_key]
+
         if self.feature_flag.aggregation_group_type_index is None:
             query: QuerySet = Person.objects.filter(
                 team_id=self.feature_flag.team_id,
@@ -237,22 +371,9 @@ class FeatureFlagMatcher:
                 group_key=self.hashed_identifier,
             )
 
-        fields = []
-        for index, condition in enumerate(self.feature_flag.conditions):
-            key = f"condition_{index}"
-
-            if len(condition.get("properties", {})) > 0:
-                # Feature Flags don't support OR filtering yet
-                expr: Any = properties_to_Q(
-                    Filter(data=condition).property_groups.flat, team_id=self.feature_flag.team_id, is_direct_query=True
-                )
-            else:
-                expr = RawSQL("true", [])
-
-            query = query.annotate(**{key: ExpressionWrapper(expr, output_field=BooleanField())})
-            fields.append(key)
-
-        return list(query.values_list(*fields))
+        query, fields = annotate_condition_matches(query, self.feature_flag)
+        self.cache.query_conditions[cache_key] = list(query.values_list(*fields))
+        return self.cache.query_conditions[cache_key]
 
     @property
     def hashed_identifier(self) -> Optional[str]:
@@ -289,16 +410,206 @@ class FeatureFlagMatcher:
         return self.get_hash(salt="variant")
 
 
-# Return a Dict with all active flags and their values
-def get_active_feature_flags(
-    team_id: int, distinct_id: str, groups: Dict[GroupTypeName, str] = {},
-) -> Dict[str, Union[bool, str, None]]:
-    cache = FlagsMatcherCache(team_id)
-    flags_enabled: Dict[str, Union[bool, str, None]] = {}
+def annotate_condition_matches(query: QuerySet, feature_flag: FeatureFlag) -> Tuple[QuerySet, List[str]]:
+    "Annotates whether each condition of `feature_flag` matches, returning the names of these fields"
+    fields = []
+    for index, condition in enumerate(feature_flag.conditions):
+        key = f"condition_{index}"
+
+        if len(condition.get("properties", {})) > 0:
+            # Feature Flags don't support OR filtering yet
+            expr: Any = properties_to_Q(
+                Filter(data=condition).property_groups.flat, team_id=feature_flag.team_id, is_direct_query=True
+            )
+        else:
+            expr = RawSQL("true", [])
+
+        query = query.annotate(**{key: ExpressionWrapper(expr, output_field=BooleanField())})
+        fields.append(key)
+    return query, fields
+
+
+@dataclass(frozen=True)
+class FeatureFlagDefinitions:
+    "Everything needed to evaluate the flags of a team, as of `version` of its definitions"
+    version: Optional[int]
+    feature_flags: List[FeatureFlag]
+    group_types_to_indexes: Dict[GroupTypeName, GroupTypeIndex]
+
+
+class FeatureFlagDefinitionsCache:
+    """
+    Per-team snapshot of active feature flag definitions and group type mappings, held in redis and in process memory.
+
+    Saving or deleting a team's feature flags, cohorts or group type mappings bumps the team's version counter in
+    redis. Readers check their in-memory snapshot against that counter with a single redis GET, and only go to the
+    redis snapshot, and then to postgres, once the version moved on or the snapshot is older than `ttl` seconds.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        # team_id -> (expires_at, definitions)
+        self._entries: "OrderedDict[int, Tuple[float, FeatureFlagDefinitions]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, team_id: int) -> FeatureFlagDefinitions:
+        try:
+            redis_client = get_client()
+            version = get_feature_flag_definitions_version(team_id)
+        except Exception as e:
+            # Redis being down shouldn't take /decide with it
+            capture_exception(e)
+            return self._load_from_postgres(team_id, version=None)
+
+        with self._lock:
+            entry = self._entries.get(team_id)
+            if entry is not None:
+                self._entries.move_to_end(team_id)
+
+        if entry is not None and entry[0] > time.monotonic() and entry[1].version == version:
+            statsd.incr("feature_flag_definitions_cache_hit", tags={"layer": "memory"})
+            return entry[1]
+
+        key = FEATURE_FLAG_DEFINITIONS_KEY.format(team_id=team_id)
+        try:
+            snapshot = redis_client.get(key)
+        except Exception as e:
+            capture_exception(e)
+            snapshot = None
+        definitions = self._from_snapshot(team_id, json_codec.loads(snapshot)) if snapshot else None
+        if definitions is not None and definitions.version == version:
+            statsd.incr("feature_flag_definitions_cache_hit", tags={"layer": "redis"})
+        else:
+            statsd.incr("feature_flag_definitions_cache_miss")
+            definitions = self._load_from_postgres(team_id, version)
+            try:
+                redis_client.set(key, json_codec.dumps_bytes(self._to_snapshot(definitions)), ex=self.ttl)
+            except Exception as e:
+                # The definitions loaded from postgres are still good to use
+                capture_exception(e)
+
+        self.set(team_id, definitions)
+        return definitions
+
+    def set(self, team_id: int, definitions: FeatureFlagDefinitions) -> None:
+        with self._lock:
+            self._entries.pop(team_id, None)
+            self._entries[team_id] = (time.monotonic() + self.ttl, definitions)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _load_from_postgres(self, team_id: int, version: Optional[int]) -> FeatureFlagDefinitions:
+        feature_flags = FeatureFlag.objects.filter(team_id=team_id, active=True, deleted=False).only(
+            "id", "team_id", "filters", "key", "rollout_percentage",
+        )
+        group_type_mapping_rows = GroupTypeMapping.objects.filter(team_id=team_id)
+        return FeatureFlagDefinitions(
+            version=version,
+            feature_flags=list(feature_flags),
+            group_types_to_indexes={row.group_type: row.group_type_index for row in group_type_mapping_rows},
+        )
+
+    def _to_snapshot(self, definitions: FeatureFlagDefinitions) -> Dict:
+        return {
+            "version": definitions.version,
+            "feature_flags": [
+                {
+                    "id": feature_flag.pk,
+                    "key": feature_flag.key,
+                    "filters": feature_flag.filters,
+                    "rollout_percentage": feature_flag.rollout_percentage,
+                }
+                for feature_flag in definitions.feature_flags
+            ],
+            "group_types_to_indexes": definitions.group_types_to_indexes,
+        }
+
+    def _from_snapshot(self, team_id: int, snapshot: Dict) -> FeatureFlagDefinitions:
+        return FeatureFlagDefinitions(
+            version=snapshot["version"],
+            feature_flags=[FeatureFlag(team_id=team_id, **feature_flag) for feature_flag in snapshot["feature_flags"]],
+            group_types_to_indexes=snapshot["group_types_to_indexes"],
+        )
+
+
+feature_flag_definitions_cache = FeatureFlagDefinitionsCache(
+    max_size=settings.FEATURE_FLAG_DEFINITIONS_CACHE_MAX_SIZE, ttl=settings.FEATURE_FLAG_DEFINITIONS_CACHE_TTL_SECONDS,
+)
+
+
+def get_feature_flag_definitions_version(team_id: int) -> int:
+    redis_client = get_client()
+    key = FEATURE_FLAG_DEFINITIONS_VERSION_KEY.format(team_id=team_id)
+    version = redis_client.get(key)
+    if version is None:
+        # Start from the clock rather than from 0, so that snapshots cached before the counter got lost never match
+        redis_client.set(key, int(time.time() * 1000), nx=True)
+        version = redis_client.get(key)
+    return int(version)
+
+
+def bump_feature_flag_definitions_version(team_id: int) -> None:
+    try:
+        get_client().incr(FEATURE_FLAG_DEFINITIONS_VERSION_KEY.format(team_id=team_id))
+    except redis.exceptions.RedisError as err:
+        # Snapshots then get reloaded after their TTL, which shouldn't stop the change from being saved
+        capture_exception(err)
+
+
+# Fields of a cohort that flag evaluation depends on. Cohorts get saved on every recalculation too, which shouldn't
+# invalidate the snapshots of its team
+COHORT_FLAG_DEFINITION_FIELDS = ("filters", "groups", "deleted", "is_static")
+
+
+def _cohort_flag_definition(cohort: Cohort) -> Tuple:
+    return tuple(copy.deepcopy(getattr(cohort, field)) for field in COHORT_FLAG_DEFINITION_FIELDS)
+
+
+@receiver(post_init, sender=Cohort)
+def remember_cohort_flag_definition(sender, instance: Cohort, **kwargs):
+    instance._flag_definition_when_loaded = _cohort_flag_definition(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=FeatureFlag)
+@receiver(post_delete, sender=FeatureFlag)
+@receiver(post_save, sender=Cohort)
+@receiver(post_delete, sender=Cohort)
+@receiver(post_save, sender=GroupTypeMapping)
+@receiver(post_delete, sender=GroupTypeMapping)
+def feature_flag_definitions_changed(sender, instance, **kwargs):
+    if sender == Cohort and kwargs.get("signal") == post_save and not kwargs.get("created"):
+        definition = _cohort_flag_definition(instance)
+        if definition == getattr(instance, "_flag_definition_when_loaded", None):
+            return
+        instance._flag_definition_when_loaded = definition
+
+    team_id = instance.team_id
+    bump_feature_flag_definitions_version(team_id)
+    # Bump again once the change is visible to other connections, so a snapshot loaded in between doesn't stick
+    transaction.on_commit(lambda: bump_feature_flag_definitions_version(team_id))
+
+
+def _get_feature_flags_and_cache(team_id: int) -> Tuple[Iterable[FeatureFlag], FlagsMatcherCache]:
+    if settings.FEATURE_FLAG_DEFINITIONS_CACHE_ENABLED:
+        definitions = feature_flag_definitions_cache.get(team_id)
+        cache = FlagsMatcherCache(team_id, group_types_to_indexes=definitions.group_types_to_indexes)
+        return definitions.feature_flags, cache
+
     feature_flags = FeatureFlag.objects.filter(team_id=team_id, active=True, deleted=False).only(
         "id", "team_id", "filters", "key", "rollout_percentage",
     )
+    return feature_flags, FlagsMatcherCache(team_id)
 
+
+def _match_feature_flags(
+    feature_flags: Iterable[FeatureFlag], distinct_id: str, groups: Dict[GroupTypeName, str], cache: FlagsMatcherCache,
+) -> Dict[str, Union[bool, str, None]]:
+    flags_enabled: Dict[str, Union[bool, str, None]] = {}
     for feature_flag in feature_flags:
         try:
             match = feature_flag.matches(distinct_id, groups, cache)
@@ -309,6 +620,36 @@ def get_active_feature_flags(
     return flags_enabled
 
 
+# Return a Dict with all active flags and their values
+def get_active_feature_flags(
+    team_id: int, distinct_id: str, groups: Dict[GroupTypeName, str] = {},
+) -> Dict[str, Union[bool, str, None]]:
+    feature_flags, cache = _get_feature_flags_and_cache(team_id)
+    return _match_feature_flags(feature_flags, distinct_id, groups, cache)
+
+
+# Return a Dict of distinct_id -> all active flags and their values, loading the properties of all persons at once
+def get_active_feature_flags_for_distinct_ids(
+    team_id: int, distinct_ids: List[str], groups: Dict[GroupTypeName, str] = {},
+) -> Dict[str, Dict[str, Union[bool, str, None]]]:
+    feature_flags, cache = _get_feature_flags_and_cache(team_id)
+    feature_flags = list(feature_flags)
+    cache.preload_person_properties(distinct_ids)
+    for feature_flag in feature_flags:
+        # Conditions that can't be evaluated in memory, e.g. on cohorts, get evaluated for all persons at once
+        if feature_flag.aggregation_group_type_index is None and distinct_ids:
+            try:
+                if FeatureFlagMatcher(feature_flag, distinct_ids[0], groups, cache).has_query_conditions:
+                    cache.preload_query_conditions(feature_flag, distinct_ids)
+            except Exception as err:
+                # The flag is off for all of them, as if each of their queries had failed
+                capture_exception(err)
+                cache.query_conditions.update({(feature_flag.key, distinct_id): [] for distinct_id in distinct_ids})
+    return {
+        distinct_id: _match_feature_flags(feature_flags, distinct_id, groups, cache) for distinct_id in distinct_ids
+    }
+
+
 # Return feature flags with per-user overrides
 def get_overridden_feature_flags(
     team_id: int, distinct_id: str, groups: Dict[GroupTypeName, str] = {},
@@ -1,11 +1,12 @@
 import inspect
 import json
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from rest_framework import request
 
 from posthog.models.filters.mixins.common import BaseParamMixin
 from posthog.models.utils import sane_repr
+from posthog.queries.query_build_cache import memoize, stable_hash
 from posthog.utils import encode_get_request_params
 
 
@@ -40,13 +41,25 @@ class BaseFilter(BaseParamMixin):
         return ret
 
     def to_params(self) -> Dict[str, str]:
-        return encode_get_request_params(data=self.to_dict())
+        params = memoize(
+            lambda: ("filter_params", type(self), stable_hash(self._data)),
+            lambda: encode_get_request_params(data=self.to_dict()),
+        )
+        return dict(params)
 
     def toJSON(self):
         return json.dumps(self.to_dict(), default=lambda o: o.__dict__, sort_keys=True, indent=4)
 
     def with_data(self, overrides: Dict[str, Any]):
         "Allow making copy of filter whilst preserving the class"
-        return type(self)(data={**self._data, **overrides}, **self.kwargs)
+        data = {**self._data, **overrides}
+        return memoize(
+            lambda: ("filter", type(self), stable_hash(data), self._kwargs_key()),
+            lambda: type(self)(data=data, **self.kwargs),
+        )
+
+    def _kwargs_key(self) -> Tuple:
+        # Kwargs like `team` are compared by identity. Cached filters keep them alive, so ids can't get reused
+        return tuple(sorted((key, id(value)) for key, value in self.kwargs.items()))
 
     __repr__ = sane_repr("_data", "kwargs", include_id=False)
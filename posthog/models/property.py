@@ -1,7 +1,9 @@
 import json
+import operator as py_operator
 from enum import Enum
 from typing import (
     Any,
+    Callable,
     Dict,
     List,
     Literal,
@@ -277,6 +279,118 @@ class Property:
             assert not isinstance(value, list)
             return Q(**{f"{column}__{self.key}__{self.operator}": value})
 
+    def property_to_predicate(self) -> Optional[Callable[[Dict[str, Any]], bool]]:
+        """
+        In-memory equivalent of `property_to_Q` for direct Person/Group queries, evaluated against the `properties`
+        (or `group_properties`) dict of a single row.
+
+        Mirrors the postgres JSONB semantics of the generated lookups. Returns None when the property can't be
+        evaluated without a query (cohorts, nested or index-like keys, unsupported operators, collation-dependent
+        comparisons), in which case callers should fall back to `property_to_Q`.
+        """
+        if self.type == "cohort" or self.type in CLICKHOUSE_ONLY_PROPERTY_TYPES:
+            return None
+        # Django turns `__` into nested key lookups and integer-like keys into array indexes
+        if "__" in self.key or _is_int(self.key):
+            return None
+
+        key = self.key
+        value = self._parse_value(self.value)
+
+        if self.operator == "is_not":
+            return lambda properties: key not in properties or not _jsonb_in(properties[key], value)
+        if self.operator == "is_set":
+            return lambda properties: key in properties
+        if self.operator == "is_not_set":
+            return lambda properties: key not in properties
+        if self.operator in ("regex", "not_regex") and not is_valid_regex(value):
+            return lambda properties: False
+        if isinstance(self.operator, str) and self.operator.startswith("not_"):
+            matches = _lookup_predicate(key, self.operator[4:], value)
+            if matches is None:
+                return None
+            return lambda properties: key not in properties or properties[key] is None or not matches(properties)
+        if self.operator == "exact" or self.operator is None:
+            return lambda properties: key in properties and _jsonb_in(properties[key], value)
+        return _lookup_predicate(key, self.operator, value)
+
+
+def _is_int(key: str) -> bool:
+    try:
+        int(key)
+        return True
+    except ValueError:
+        return False
+
+
+# Order of JSONB values of different types in postgres: Object > Array > Boolean > Number > String > Null
+def _jsonb_type_rank(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return 1
+    if isinstance(value, bool):
+        return 3
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, list):
+        return 4
+    return 5
+
+
+def _jsonb_equals(left: Any, right: Any) -> bool:
+    if _jsonb_type_rank(left) != _jsonb_type_rank(right):
+        return False
+    if isinstance(left, list):
+        return len(left) == len(right) and all(_jsonb_equals(a, b) for a, b in zip(left, right))
+    if isinstance(left, dict):
+        return left.keys() == right.keys() and all(_jsonb_equals(left[k], right[k]) for k in left)
+    return left == right
+
+
+def _jsonb_in(left: Any, value: Any) -> bool:
+    if isinstance(value, list):
+        return any(_jsonb_equals(left, v) for v in value)
+    return _jsonb_equals(left, value)
+
+
+def _jsonb_text(value: Any) -> Optional[str]:
+    "Equivalent of the `->>` operator"
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+_COMPARISON_OPERATORS = {"gt": py_operator.gt, "gte": py_operator.ge, "lt": py_operator.lt, "lte": py_operator.le}
+
+
+def _lookup_predicate(key: str, operator: str, value: Any) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    if operator == "icontains":
+        needle = str(value).upper()
+
+        def icontains(properties: Dict[str, Any]) -> bool:
+            text = _jsonb_text(properties.get(key))
+            return text is not None and needle in text.upper()
+
+        return icontains
+
+    # Strings compare using the database collation and regexes use POSIX syntax, leave those to postgres
+    if operator in _COMPARISON_OPERATORS and not isinstance(value, (str, list, dict)):
+        compare = _COMPARISON_OPERATORS[operator]
+        value_rank = _jsonb_type_rank(value)
+
+        def comparison(properties: Dict[str, Any]) -> bool:
+            if key not in properties:
+                return False
+            property_rank = _jsonb_type_rank(properties[key])
+            if property_rank != value_rank or value is None:
+                return compare(property_rank, value_rank)
+            return compare(properties[key], value)
+
+        return comparison
+
+    return None
+
 
 def lookup_q(key: str, value: Any) -> Q:
     # exact and is_not operators can pass lists as arguments. Handle those lookups!
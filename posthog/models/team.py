@@ -1,16 +1,23 @@
+import json
 import re
 from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 import posthoganalytics
 import pytz
+import redis.exceptions
 from constance import config
+from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MinLengthValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch.dispatcher import receiver
+from sentry_sdk import capture_exception
 
 from posthog.constants import AvailableFeature
 from posthog.helpers.dashboard_templates import create_dashboard_from_template
 from posthog.models.filters.mixins.utils import cached_property
+from posthog.redis import get_client
 from posthog.settings.utils import get_list
 from posthog.utils import GenericEmails
 
@@ -213,3 +220,19 @@ class Team(UUIDClassicModel):
         return str(self.pk)
 
     __repr__ = sane_repr("uuid", "name", "api_token")
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+def team_token_cache_invalidation(sender, instance: Team, **kwargs):
+    message = json.dumps({"teamId": instance.pk, "apiToken": instance.api_token})
+
+    def publish():
+        try:
+            get_client().publish(settings.TEAM_TOKEN_CACHE_PUBSUB_CHANNEL, message)
+        except redis.exceptions.RedisError as err:
+            # Caches then expire the team after their TTL, which shouldn't stop it from being saved
+            capture_exception(err)
+
+    # Publish once the change is visible to other connections, so that they don't reload and cache the old row
+    transaction.on_commit(publish)
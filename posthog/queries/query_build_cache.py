@@ -0,0 +1,105 @@
+"""
+Per-request memoization for building insight queries, along with a profile of where the request spends its time.
+
+Building SQL for one insight re-derives the same pieces over and over, e.g. funnels call `Filter.with_data` and
+generate property and action clauses once per step and again for every people URL. Within `query_build_cache()`,
+which `ee.clickhouse.middleware.CHQueries` enters for every request, these are computed once and looked up by a stable
+hash of their inputs. Outside of it nothing is cached.
+
+The cache lives in a context variable, so it's neither shared between concurrent requests nor with the worker threads
+of `posthog.queries.query_executor`, which only execute queries.
+"""
+import hashlib
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class QueryBuildProfile:
+    def __init__(self):
+        self.start_time = perf_counter()
+        self.clickhouse_time = 0.0
+        self.clickhouse_queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache: Dict[Tuple, Any] = {}
+
+    @property
+    def total_time(self) -> float:
+        return perf_counter() - self.start_time
+
+    @property
+    def python_time(self) -> float:
+        "Time spent outside of ClickHouse, i.e. building queries and processing their results"
+        return max(self.total_time - self.clickhouse_time, 0.0)
+
+    def server_timing(self) -> str:
+        "Value of a `Server-Timing` header, to see the breakdown in the browser's network panel"
+        return ", ".join(
+            [
+                f'python;dur={self.python_time * 1000:.1f};desc="Python"',
+                f'clickhouse;dur={self.clickhouse_time * 1000:.1f};desc="ClickHouse ({self.clickhouse_queries} queries)"',
+            ]
+        )
+
+
+_profile: ContextVar[Optional[QueryBuildProfile]] = ContextVar("query_build_profile", default=None)
+
+
+@contextmanager
+def query_build_cache() -> Iterator[QueryBuildProfile]:
+    profile = QueryBuildProfile()
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+def get_profile() -> Optional[QueryBuildProfile]:
+    return _profile.get()
+
+
+def stable_hash(value: Any) -> str:
+    "Hash of JSON-like data that doesn't depend on the order of keys. Objects are hashed by their `to_dict()`"
+    serialized = json.dumps(value, sort_keys=True, default=_to_json, separators=(",", ":"))
+    return hashlib.md5(serialized.encode("utf-8")).hexdigest()
+
+
+def memoize(get_key: Callable[[], Tuple], compute: Callable[[], T]) -> T:
+    """
+    Returns the result of `compute()` from earlier in the request if one was stored under the same key. The key is
+    only computed when caching is active. Results are shared, so they must not be mutated by callers.
+    """
+    profile = _profile.get()
+    if profile is None:
+        return compute()
+    key = get_key()
+    if key in profile._cache:
+        profile.cache_hits += 1
+        return profile._cache[key]
+    profile.cache_misses += 1
+    result = profile._cache[key] = compute()
+    return result
+
+
+@contextmanager
+def timed_clickhouse_query(queries: int = 1) -> Iterator[None]:
+    profile = _profile.get()
+    start_time = perf_counter()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.clickhouse_time += perf_counter() - start_time
+            profile.clickhouse_queries += queries
+
+
+def _to_json(value: Any) -> Any:
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    return str(value)
@@ -0,0 +1,163 @@
+"""
+Shared thread pool for running the independent ClickHouse queries of one insight side by side, e.g. one query per
+series of a trend or one per period when comparing.
+
+Concurrency is capped globally (`QUERY_EXECUTOR_MAX_WORKERS`) so that a burst of large insights can't drain the
+ClickHouse connection pool, and per team (`QUERY_EXECUTOR_MAX_WORKERS_PER_TEAM`) so that one team can't take up all
+workers. Jobs should only execute queries: build SQL beforehand in the calling thread, as worker threads don't share
+its database connection.
+
+`run_queries_in_parallel` runs ClickHouse queries this way. Jobs that haven't started get cancelled when a sibling
+fails or time runs out, but queries already running on ClickHouse would carry on regardless, so these get killed.
+"""
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from django.conf import settings
+from sentry_sdk import capture_exception
+from statshog.defaults.django import statsd
+
+from posthog.client import sync_execute
+from posthog.queries.query_build_cache import timed_clickhouse_query
+
+T = TypeVar("T")
+
+
+class QueryExecutor:
+    def __init__(self, max_workers: int, max_workers_per_team: int):
+        self.max_workers = max_workers
+        self.max_workers_per_team = max_workers_per_team
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query-executor")
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._in_flight_by_team: Dict[int, int] = {}
+        self._local = threading.local()
+
+    def run(self, team_id: int, jobs: Sequence[Callable[[], T]], timeout: float) -> List[T]:
+        """
+        Runs `jobs` in parallel and returns their results in order. If a job fails, jobs that haven't started yet are
+        cancelled and its exception is raised. Raises `TimeoutError` if the jobs don't finish within `timeout` seconds.
+        """
+        if len(jobs) <= 1 or getattr(self._local, "in_worker", False):
+            # Waiting for workers from within a worker could deadlock the pool
+            return [job() for job in jobs]
+
+        # Jobs run outside of the request's context, so their queries don't show up in its profile. Count the time
+        # spent waiting on them as ClickHouse time instead
+        with timed_clickhouse_query(queries=len(jobs)):
+            return self._run_in_parallel(team_id, jobs, timeout)
+
+    def _run_in_parallel(self, team_id: int, jobs: Sequence[Callable[[], T]], timeout: float) -> List[T]:
+        deadline = time.monotonic() + timeout
+        failed = threading.Event()
+        futures: List[Future] = []
+        try:
+            for job in jobs:
+                if not self._acquire(team_id, failed, deadline):
+                    break
+                try:
+                    future = self._executor.submit(self._run_job, job, failed)
+                except BaseException:
+                    self._release(team_id)
+                    raise
+                future.add_done_callback(lambda _: self._release(team_id))
+                futures.append(future)
+
+            _, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_EXCEPTION)
+            for future in futures:
+                if future.done() and not future.cancelled() and future.exception() is not None:
+                    raise future.exception()  # type: ignore
+            if not_done or len(futures) < len(jobs):
+                statsd.incr("query_executor_timeout")
+                raise TimeoutError(f"Queries didn't finish within {timeout} seconds")
+            return [future.result() for future in futures]
+        finally:
+            failed.set()
+            for future in futures:
+                future.cancel()
+
+    def _run_job(self, job: Callable[[], T], failed: threading.Event) -> T:
+        self._local.in_worker = True
+        try:
+            return job()
+        except BaseException:
+            failed.set()
+            with self._condition:
+                self._condition.notify_all()
+            raise
+        finally:
+            self._local.in_worker = False
+
+    def _acquire(self, team_id: int, failed: threading.Event, deadline: float) -> bool:
+        "Waits for a free slot of the team, returning False if a sibling job failed or time ran out"
+        with self._condition:
+            if self._in_flight_by_team.get(team_id, 0) >= self.max_workers_per_team:
+                statsd.incr("query_executor_team_limit_reached")
+            available = self._condition.wait_for(
+                lambda: failed.is_set() or self._in_flight_by_team.get(team_id, 0) < self.max_workers_per_team,
+                timeout=max(deadline - time.monotonic(), 0),
+            )
+            if not available or failed.is_set():
+                return False
+            self._in_flight += 1
+            self._in_flight_by_team[team_id] = self._in_flight_by_team.get(team_id, 0) + 1
+            self._report_saturation()
+            return True
+
+    def _release(self, team_id: int) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._in_flight_by_team[team_id] -= 1
+            if self._in_flight_by_team[team_id] == 0:
+                del self._in_flight_by_team[team_id]
+            self._report_saturation()
+            self._condition.notify_all()
+
+    def _report_saturation(self) -> None:
+        # Above 1 means jobs are queueing for a worker
+        statsd.gauge("query_executor_saturation", self._in_flight / self.max_workers)
+
+
+query_executor = QueryExecutor(settings.QUERY_EXECUTOR_MAX_WORKERS, settings.QUERY_EXECUTOR_MAX_WORKERS_PER_TEAM)
+
+
+KILL_QUERIES_SQL = "KILL QUERY WHERE query_id IN %(query_ids)s ASYNC"
+
+
+def run_queries_in_parallel(team_id: int, queries: Sequence[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+    """
+    Executes `(sql, params)` queries on `query_executor` and returns their results in order. ClickHouse stops each
+    query at the deadline of the whole batch, and when there is more than one, queries still running when a sibling
+    fails or time runs out get killed. A single query runs in the calling thread.
+    """
+    timeout = settings.QUERY_EXECUTOR_TIMEOUT_SECONDS
+    deadline = time.monotonic() + timeout
+
+    def execute(sql: str, params: Dict[str, Any], query_id: Optional[str] = None) -> Any:
+        # Measured once the job is off the executor's queue, so ClickHouse only gets the time that is actually left
+        max_execution_time = max(math.ceil(deadline - time.monotonic()), 1)
+        return sync_execute(sql, params, settings={"max_execution_time": max_execution_time}, query_id=query_id)
+
+    if len(queries) <= 1:
+        return [execute(sql, params) for sql, params in queries]
+
+    query_ids = [str(uuid.uuid4()) for _ in queries]
+    jobs = [partial(execute, sql, params, query_id) for (sql, params), query_id in zip(queries, query_ids)]
+    try:
+        return query_executor.run(team_id, jobs, timeout=timeout)
+    except BaseException:
+        _kill_queries(query_ids)
+        raise
+
+
+def _kill_queries(query_ids: List[str]) -> None:
+    try:
+        sync_execute(KILL_QUERIES_SQL, {"query_ids": query_ids}, flush=False)
+    except Exception as err:
+        # The error of the failed query matters more
+        capture_exception(err)
@@ -8,11 +8,13 @@ from posthog.helpers.session_recording import (
     DecompressedRecordingData,
     EventActivityData,
     RecordingSegment,
+    RecordingSnapshotsPage,
     SnapshotDataTaggedWithWindowId,
     WindowId,
     decompress_chunked_snapshot_data,
     generate_inactive_segments_for_range,
     get_active_segments_from_event_list,
+    load_snapshot_data_by_window_id,
 )
 from posthog.models import SessionRecordingEvent, Team
 
@@ -37,14 +39,20 @@ class SessionRecording:
     def _query_recording_snapshots(self) -> List[SessionRecordingEvent]:
         raise NotImplementedError()
 
+    def get_snapshots_page(self, limit: Optional[int], offset: int) -> Optional[RecordingSnapshotsPage]:
+        """
+        Snapshots of `limit` chunks starting at `offset`, decompressed lazily as they're read, or None if there are
+        none. Use this over `get_snapshots` to stream snapshots without holding them all in memory.
+        """
+        raise NotImplementedError()
+
     def get_snapshots(self, limit, offset) -> DecompressedRecordingData:
-        all_snapshots = [
-            SnapshotDataTaggedWithWindowId(
-                window_id=recording_snapshot.window_id, snapshot_data=recording_snapshot.snapshot_data
-            )
-            for recording_snapshot in self._query_recording_snapshots()
-        ]
-        return decompress_chunked_snapshot_data(self._team.pk, self._session_recording_id, all_snapshots, limit, offset)
+        page = self.get_snapshots_page(limit, offset)
+        if page is None:
+            return DecompressedRecordingData(has_next=False, snapshot_data_by_window_id={})
+        return DecompressedRecordingData(
+            has_next=page.has_next, snapshot_data_by_window_id=load_snapshot_data_by_window_id(page.events_json)
+        )
 
     def get_metadata(self) -> Optional[RecordingMetadata]:
         all_snapshots: List[SnapshotDataTaggedWithWindowId] = []
@@ -126,6 +134,16 @@ class SessionRecording:
                 "end_time": events_with_processed_timestamps[-1].timestamp,
             }
 
+        return (
+            self._get_recording_segments(all_active_segments, start_and_end_times_by_window_id),
+            start_and_end_times_by_window_id,
+        )
+
+    def _get_recording_segments(
+        self, all_active_segments: List[RecordingSegment], start_and_end_times_by_window_id: Dict[WindowId, Dict]
+    ) -> List[RecordingSegment]:
+        "Fills the gaps between the active segments of all windows, see `_process_snapshots_for_metadata`"
+
         # Sort the active segments by start time. This will interleave active segments
         # from different windows
         all_active_segments.sort(key=lambda segment: segment.start_time)
@@ -170,4 +188,4 @@ class SessionRecording:
                 )
             )
 
-        return all_segments, start_and_end_times_by_window_id
+        return all_segments
@@ -0,0 +1,63 @@
+import time
+
+from posthog.models.filters import Filter
+from posthog.queries.query_build_cache import memoize, query_build_cache, stable_hash, timed_clickhouse_query
+from posthog.queries.query_executor import QueryExecutor
+from posthog.test.base import BaseTest
+
+
+class TestQueryBuildCache(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.calls = 0
+
+    def _compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_memoizes_within_cache(self):
+        with query_build_cache() as profile:
+            self.assertEqual(memoize(lambda: ("key", 1), self._compute), 1)
+            self.assertEqual(memoize(lambda: ("key", 1), self._compute), 1)
+            self.assertEqual(memoize(lambda: ("key", 2), self._compute), 2)
+
+        self.assertEqual((profile.cache_hits, profile.cache_misses), (1, 2))
+
+    def test_does_not_memoize_outside_of_cache(self):
+        with query_build_cache():
+            memoize(lambda: ("key",), self._compute)
+
+        self.assertEqual(memoize(lambda: ("key",), self._compute), 2)
+        self.assertEqual(memoize(lambda: ("key",), self._compute), 3)
+
+    def test_stable_hash_ignores_key_order(self):
+        self.assertEqual(
+            stable_hash({"events": [{"id": "$pageview"}], "interval": "day"}),
+            stable_hash({"interval": "day", "events": [{"id": "$pageview"}]}),
+        )
+        self.assertNotEqual(stable_hash({"funnel_step": 1}), stable_hash({"funnel_step": -1}))
+
+    def test_filter_with_data_is_memoized(self):
+        filter = Filter(data={"events": [{"id": "$pageview"}, {"id": "$leave"}]}, team=self.team)
+
+        with query_build_cache():
+            converted = filter.with_data({"funnel_step": 2})
+            self.assertIs(filter.with_data({"funnel_step": 2}), converted)
+            self.assertIsNot(filter.with_data({"funnel_step": -2}), converted)
+            self.assertEqual(converted.to_params(), converted.to_params())
+
+        self.assertIsNot(filter.with_data({"funnel_step": 2}), converted)
+        self.assertEqual(filter.with_data({"funnel_step": 2}).to_params(), converted.to_params())
+
+    def test_profile_splits_python_and_clickhouse_time(self):
+        with query_build_cache() as profile:
+            with timed_clickhouse_query():
+                time.sleep(0.05)
+            QueryExecutor(max_workers=2, max_workers_per_team=2).run(
+                self.team.pk, [lambda: time.sleep(0.05), lambda: time.sleep(0.05)], timeout=5
+            )
+
+        self.assertEqual(profile.clickhouse_queries, 3)
+        self.assertGreaterEqual(profile.clickhouse_time, 0.1)
+        self.assertLess(profile.clickhouse_time, profile.total_time)
+        self.assertIn("clickhouse;dur=", profile.server_timing())
@@ -0,0 +1,111 @@
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.test import override_settings
+
+from posthog.queries.query_executor import KILL_QUERIES_SQL, QueryExecutor, run_queries_in_parallel
+
+
+class TestQueryExecutor(TestCase):
+    def setUp(self):
+        self.executor = QueryExecutor(max_workers=4, max_workers_per_team=2)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def _job(self, value, duration=0.05):
+        def job():
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            time.sleep(duration)
+            with self.lock:
+                self.running -= 1
+            return value
+
+        return job
+
+    def test_returns_results_in_order(self):
+        self.assertEqual(
+            self.executor.run(1, [self._job(i, 0.05 - i * 0.01) for i in range(5)], timeout=5), list(range(5))
+        )
+
+    def test_limits_concurrency_per_team(self):
+        self.executor.run(1, [self._job(i) for i in range(6)], timeout=5)
+
+        self.assertEqual(self.max_running, 2)
+
+    def test_teams_share_global_limit(self):
+        threads = [
+            threading.Thread(target=self.executor.run, args=(team_id, [self._job(i) for i in range(4)], 5))
+            for team_id in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.max_running, 4)
+
+    def test_failure_cancels_jobs_that_have_not_started(self):
+        started = []
+
+        def failing_job():
+            raise ValueError("query failed")
+
+        def job(value):
+            def run():
+                started.append(value)
+                time.sleep(0.05)
+
+            return run
+
+        with self.assertRaises(ValueError):
+            self.executor.run(1, [failing_job, job(1), job(2), job(3), job(4)], timeout=5)
+
+        self.assertLess(len(started), 4)
+
+    def test_times_out(self):
+        with self.assertRaises(TimeoutError):
+            self.executor.run(1, [self._job(1, 0.5), self._job(2, 0.5)], timeout=0.1)
+
+    def test_runs_nested_jobs_inline(self):
+        result = self.executor.run(
+            1, [lambda: self.executor.run(1, [self._job(1), self._job(2)], timeout=5), self._job(3)], timeout=5
+        )
+
+        self.assertEqual(result, [[1, 2], 3])
+
+    @patch("posthog.queries.query_executor.sync_execute")
+    def test_failure_kills_running_queries(self, patch_sync_execute):
+        def execute(sql, params, settings=None, query_id=None, flush=True):
+            if sql == "failing":
+                raise ValueError("query failed")
+            time.sleep(0.05)
+            return []
+
+        patch_sync_execute.side_effect = execute
+
+        with self.assertRaises(ValueError):
+            run_queries_in_parallel(1, [("failing", {}), ("slow", {})])
+
+        query_calls = [call for call in patch_sync_execute.call_args_list if call.args[0] != KILL_QUERIES_SQL]
+        kill_calls = [call for call in patch_sync_execute.call_args_list if call.args[0] == KILL_QUERIES_SQL]
+        self.assertEqual(len(kill_calls), 1)
+        self.assertEqual(len(kill_calls[0].args[1]["query_ids"]), 2)
+        for call in query_calls:
+            self.assertIn(call.kwargs["query_id"], kill_calls[0].args[1]["query_ids"])
+            self.assertGreater(call.kwargs["settings"]["max_execution_time"], 0)
+
+    @override_settings(QUERY_EXECUTOR_TIMEOUT_SECONDS=30)
+    @patch("posthog.queries.query_executor.sync_execute")
+    def test_single_query_runs_with_same_deadline(self, patch_sync_execute):
+        patch_sync_execute.return_value = [(1,)]
+
+        self.assertEqual(run_queries_in_parallel(1, [("query", {"param": 1})]), [[(1,)]])
+
+        patch_sync_execute.assert_called_once_with(
+            "query", {"param": 1}, settings={"max_execution_time": 30}, query_id=None
+        )
@@ -38,6 +38,13 @@ from posthog.settings.utils import get_from_env, str_to_bool
 
 USE_PRECALCULATED_CH_COHORT_PEOPLE = not TEST
 CALCULATE_X_COHORTS_PARALLEL = get_from_env("CALCULATE_X_COHORTS_PARALLEL", 2, type_cast=int)
+# Cohorts only re-evaluate persons that changed since their last calculation, and get fully rebuilt every so often
+COHORT_INCREMENTAL_RECALCULATION_ENABLED = get_from_env(
+    "COHORT_INCREMENTAL_RECALCULATION_ENABLED", not TEST, type_cast=str_to_bool
+)
+COHORT_FULL_RECALCULATION_INTERVAL_SECONDS = get_from_env(
+    "COHORT_FULL_RECALCULATION_INTERVAL_SECONDS", 24 * 60 * 60, type_cast=int
+)
 
 # Instance configuration preferences
 # https://posthog.com/docs/self-host/configure/environment-variables
@@ -67,6 +74,7 @@ PLUGINS_PREINSTALLED_URLS: List[str] = (
 PLUGINS_CELERY_QUEUE = os.getenv("PLUGINS_CELERY_QUEUE", "posthog-plugins")
 PLUGINS_RELOAD_PUBSUB_CHANNEL = os.getenv("PLUGINS_RELOAD_PUBSUB_CHANNEL", "reload-plugins")
 PLUGINS_ALERT_CHANNEL = "plugins-alert"
+TEAM_TOKEN_CACHE_PUBSUB_CHANNEL = os.getenv("TEAM_TOKEN_CACHE_PUBSUB_CHANNEL", "invalidate-team-token")
 
 # Tokens used when installing plugins, for example to get the latest commit SHA or to download private repositories.
 # Used mainly to get around API limits and only if no ?private_token=TOKEN found in the plugin URL.
@@ -86,8 +94,45 @@ UPDATE_CACHED_DASHBOARD_ITEMS_INTERVAL_SECONDS = get_from_env(
 )
 
 
+# In-process token -> team cache used by the capture endpoint
+INGESTION_CONTEXT_CACHE_ENABLED = get_from_env("INGESTION_CONTEXT_CACHE_ENABLED", not TEST, type_cast=str_to_bool)
+INGESTION_CONTEXT_CACHE_TTL_SECONDS = get_from_env("INGESTION_CONTEXT_CACHE_TTL_SECONDS", 300, type_cast=int)
+INGESTION_CONTEXT_CACHE_NEGATIVE_TTL_SECONDS = get_from_env(
+    "INGESTION_CONTEXT_CACHE_NEGATIVE_TTL_SECONDS", 30, type_cast=int
+)
+INGESTION_CONTEXT_CACHE_MAX_SIZE = get_from_env("INGESTION_CONTEXT_CACHE_MAX_SIZE", 10000, type_cast=int)
+
+# Whether the capture endpoint waits for Kafka to acknowledge all events of a request before responding
+CAPTURE_SYNCHRONOUS_ACKS = get_from_env("CAPTURE_SYNCHRONOUS_ACKS", False, type_cast=str_to_bool)
+CAPTURE_SYNCHRONOUS_ACKS_TIMEOUT_SECONDS = get_from_env("CAPTURE_SYNCHRONOUS_ACKS_TIMEOUT_SECONDS", 5, type_cast=int)
+
+# Format session recording snapshots get compressed with by the capture endpoint, see posthog/helpers/session_recording.py
+SESSION_RECORDING_COMPRESSION = get_from_env("SESSION_RECORDING_COMPRESSION", "zstd-utf8-base64")
+# Threads shared by capture requests for compressing the snapshots of different windows in parallel, 0 to disable
+SESSION_RECORDING_COMPRESSION_WORKERS = get_from_env("SESSION_RECORDING_COMPRESSION_WORKERS", 4, type_cast=int)
+
+# Versioned per-team snapshot of feature flag definitions used by /decide, held in redis and in process memory
+FEATURE_FLAG_DEFINITIONS_CACHE_ENABLED = get_from_env(
+    "FEATURE_FLAG_DEFINITIONS_CACHE_ENABLED", not TEST, type_cast=str_to_bool
+)
+# Upper bound on staleness for changes not made through Django, e.g. group types created by the plugin server
+FEATURE_FLAG_DEFINITIONS_CACHE_TTL_SECONDS = get_from_env(
+    "FEATURE_FLAG_DEFINITIONS_CACHE_TTL_SECONDS", 300, type_cast=int
+)
+FEATURE_FLAG_DEFINITIONS_CACHE_MAX_SIZE = get_from_env("FEATURE_FLAG_DEFINITIONS_CACHE_MAX_SIZE", 1000, type_cast=int)
+
+# Summaries of the persons shown next to events, cached by distinct_id. Plugin server changes show up after the TTL
+PERSON_SUMMARY_CACHE_ENABLED = get_from_env("PERSON_SUMMARY_CACHE_ENABLED", not TEST, type_cast=str_to_bool)
+PERSON_SUMMARY_CACHE_TTL_SECONDS = get_from_env("PERSON_SUMMARY_CACHE_TTL_SECONDS", 60, type_cast=int)
+
 # Whether to capture internal metrics
 CAPTURE_INTERNAL_METRICS = get_from_env("CAPTURE_INTERNAL_METRICS", False, type_cast=str_to_bool)
+# Internal metrics are aggregated in memory and flushed as one event per metric and tags every interval
+INTERNAL_METRICS_FLUSH_INTERVAL_SECONDS = get_from_env("INTERNAL_METRICS_FLUSH_INTERVAL_SECONDS", 10, type_cast=float)
+# Fraction of counter and timing observations that get recorded
+INTERNAL_METRICS_SAMPLE_RATE = get_from_env("INTERNAL_METRICS_SAMPLE_RATE", 1.0, type_cast=float)
+# Distinct tags of a metric within a flush interval beyond which observations are folded together
+INTERNAL_METRICS_MAX_TAG_SETS = get_from_env("INTERNAL_METRICS_MAX_TAG_SETS", 100, type_cast=int)
 
 HOOK_EVENTS: Dict[str, str] = {}
 
@@ -105,6 +150,29 @@ CACHED_RESULTS_TTL = 7 * 24 * 60 * 60  # how long to keep cached results for
 TEMP_CACHE_RESULTS_TTL = 24 * 60 * 60  # how long to keep non dashboard cached results for
 SESSION_RECORDING_TTL = 30  # how long to keep session recording cache. Relatively short because cached result is used throughout the duration a session recording loads.
 
+# Only one worker calculates a given insight result at a time, others serve the stale result or wait for it
+INSIGHT_CACHE_LOCK_TIMEOUT_SECONDS = get_from_env("INSIGHT_CACHE_LOCK_TIMEOUT_SECONDS", 180, type_cast=int)
+INSIGHT_CACHE_LOCK_WAIT_SECONDS = get_from_env("INSIGHT_CACHE_LOCK_WAIT_SECONDS", 60, type_cast=int)
+# Cached insight results read once they are this old get recalculated in the background
+INSIGHT_CACHE_REFRESH_AHEAD_AFTER_SECONDS = get_from_env(
+    "INSIGHT_CACHE_REFRESH_AHEAD_AFTER_SECONDS", 15 * 60, type_cast=int
+)
+
+# Trends reuse cached counts of time buckets that ended at least TRENDS_INCREMENTAL_SETTLED_AFTER_SECONDS ago
+TRENDS_INCREMENTAL_ENABLED = get_from_env("TRENDS_INCREMENTAL_ENABLED", False, type_cast=str_to_bool)
+TRENDS_INCREMENTAL_SETTLED_AFTER_SECONDS = get_from_env(
+    "TRENDS_INCREMENTAL_SETTLED_AFTER_SECONDS", 24 * 60 * 60, type_cast=int
+)
+# How long cached counts are reused before everything gets recounted, e.g. to pick up merged persons
+TRENDS_INCREMENTAL_FULL_RECALCULATION_SECONDS = get_from_env(
+    "TRENDS_INCREMENTAL_FULL_RECALCULATION_SECONDS", 24 * 60 * 60, type_cast=int
+)
+
+# Threads shared by all requests of a process for running the queries of an insight in parallel
+QUERY_EXECUTOR_MAX_WORKERS = get_from_env("QUERY_EXECUTOR_MAX_WORKERS", 20, type_cast=int)
+QUERY_EXECUTOR_MAX_WORKERS_PER_TEAM = get_from_env("QUERY_EXECUTOR_MAX_WORKERS_PER_TEAM", 5, type_cast=int)
+QUERY_EXECUTOR_TIMEOUT_SECONDS = get_from_env("QUERY_EXECUTOR_TIMEOUT_SECONDS", 180, type_cast=int)
+
 AUTO_LOGIN = get_from_env("AUTO_LOGIN", False, type_cast=str_to_bool)
 
 # Keep in sync with plugin-server
@@ -184,6 +184,11 @@ STATICFILES_DIRS = [
 ]
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Uploads that get processed by workers, e.g. static cohort CSVs. Web servers and workers have to share MEDIA_ROOT, or
+# DEFAULT_FILE_STORAGE has to point to object storage they can all reach
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
+DEFAULT_FILE_STORAGE = os.getenv("DEFAULT_FILE_STORAGE", "django.core.files.storage.FileSystemStorage")
+
 AUTH_USER_MODEL = "posthog.User"
 
 LOGIN_URL = "/login"
@@ -1,12 +1,18 @@
+import csv
 import time
-from typing import Any, Dict, List
+from collections import defaultdict
+from typing import Any, Dict, List, Set, Tuple
 
 import structlog
 from celery import shared_task
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.db.models import F
 from django.utils import timezone
+from sentry_sdk import capture_exception
+from statshog.defaults.django import statsd
 
 from posthog.models import Cohort
 from posthog.models.cohort import get_and_update_pending_version
@@ -14,11 +20,15 @@ from posthog.models.cohort import get_and_update_pending_version
 logger = structlog.get_logger(__name__)
 
 MAX_AGE_MINUTES = 15
+# Distinct ids or emails of a static cohort upload resolved and inserted by a single task
+STATIC_COHORT_IMPORT_CHUNK_SIZE = 10000
+STATIC_COHORT_UPLOAD_PATH = "static_cohort_uploads/{cohort_id}.csv"
 
 
 def calculate_cohorts() -> None:
     # This task will be run every minute
-    # Every minute, grab a few cohorts off the list and execute them
+    # Every minute, grab a few cohorts off the list and execute them, together with the due cohorts they depend on
+    cohorts_by_team_id: Dict[int, List[Cohort]] = defaultdict(list)
     for cohort in (
         Cohort.objects.filter(
             deleted=False,
@@ -29,9 +39,62 @@ def calculate_cohorts() -> None:
         .exclude(is_static=True)
         .order_by(F("last_calculation").asc(nulls_first=True))[0 : settings.CALCULATE_X_COHORTS_PARALLEL]
     ):
+        cohorts_by_team_id[cohort.team_id].append(cohort)
+
+    for team_id, cohorts in cohorts_by_team_id.items():
+        cohort_ids_and_versions = [
+            (cohort.pk, get_and_update_pending_version(cohort))
+            for cohort in get_cohorts_in_dependency_order(team_id, cohorts)
+        ]
+        calculate_cohorts_ch.delay(cohort_ids_and_versions)
+
+
+def get_cohort_dependencies(cohort: Cohort) -> Set[int]:
+    "Ids of the cohorts `cohort` filters on"
+    dependencies: Set[int] = set()
+    for prop in cohort.properties.flat:
+        if prop.type == "cohort":
+            try:
+                dependencies.add(int(prop.value))  # type: ignore
+            except (TypeError, ValueError):
+                continue
+    return dependencies
+
+
+def get_cohorts_in_dependency_order(team_id: int, cohorts: List[Cohort]) -> List[Cohort]:
+    """
+    Returns `cohorts` along with the cohorts they depend on that are due for a calculation too, ordered such that
+    cohorts come after the ones they depend on. Cyclic dependencies get ignored, these cohorts fail to calculate anyway.
+    """
+    due_before = timezone.now() - relativedelta(minutes=MAX_AGE_MINUTES)
+    team_cohorts = {
+        cohort.pk: cohort for cohort in Cohort.objects.filter(team_id=team_id, deleted=False).exclude(is_static=True)
+    }
+    requested_ids = {cohort.pk for cohort in cohorts}
+
+    def is_due(cohort: Cohort) -> bool:
+        return (
+            cohort.pk in requested_ids
+            or not cohort.is_calculating
+            and cohort.errors_calculating <= 20
+            and (cohort.last_calculation is None or cohort.last_calculation <= due_before)
+        )
+
+    ordered: List[Cohort] = []
+    visited: Set[int] = set()
 
-        cohort = Cohort.objects.filter(pk=cohort.pk).get()
-        update_cohort(cohort)
+    def visit(cohort: Cohort) -> None:
+        visited.add(cohort.pk)
+        for dependency_id in sorted(get_cohort_dependencies(cohort)):
+            dependency = team_cohorts.get(dependency_id)
+            if dependency is not None and dependency_id not in visited and is_due(dependency):
+                visit(dependency)
+        ordered.append(cohort)
+
+    for cohort in cohorts:
+        if cohort.pk not in visited:
+            visit(team_cohorts.get(cohort.pk, cohort))
+    return ordered
 
 
 def update_cohort(cohort: Cohort) -> None:
@@ -45,6 +108,104 @@ def calculate_cohort_ch(cohort_id: int, pending_version: int) -> None:
     cohort.calculate_people_ch(pending_version)
 
 
+@shared_task(ignore_result=True, max_retries=2)
+def calculate_cohorts_ch(cohort_ids_and_versions: List[Tuple[int, int]]) -> None:
+    """
+    Calculates cohorts of a team in the given order. Cohorts that only filter on events performed get recalculated
+    together in one scan over events, the rest one by one.
+    """
+    from ee.clickhouse.models.cohort import recalculate_cohortpeople_batch
+
+    cohorts = Cohort.objects.in_bulk([cohort_id for cohort_id, _ in cohort_ids_and_versions])
+    if not cohorts:
+        return
+    team_id = next(iter(cohorts.values())).team_id
+
+    counts: Dict[int, int] = {}
+    batch_duration = 0.0
+    if len(cohorts) > 1:
+        start_time = time.monotonic()
+        try:
+            counts = recalculate_cohortpeople_batch(team_id, list(cohorts.values()))
+        except Exception:
+            logger.warning("cohort_batch_calculation_failed", team_id=team_id, exc_info=True)
+        batch_duration = time.monotonic() - start_time
+        statsd.timing("cohort_batch_calculation_duration", batch_duration * 1000, tags={"team_id": team_id})
+
+    for cohort_id, pending_version in cohort_ids_and_versions:
+        cohort = cohorts.get(cohort_id)
+        if cohort is None:
+            continue
+        batched = cohort_id in counts
+        start_time = time.monotonic()
+        try:
+            cohort.calculate_people_ch(pending_version, recalculated_count=counts.get(cohort_id))
+        except Exception as e:
+            # Cohorts depending on it get calculated with its previous people
+            capture_exception(e)
+        duration = time.monotonic() - start_time
+        if batched:
+            # Share of the batch
+            duration += batch_duration / len(counts)
+        statsd.timing(
+            "cohort_calculation_duration",
+            duration * 1000,
+            tags={"team_id": team_id, "cohort_id": cohort_id, "batched": batched},
+        )
+
+
+def import_static_cohort_from_csv(cohort_id: int, file: File) -> None:
+    "Stores an upload of distinct_ids or emails, and queues its import by `import_static_cohort_csv_chunk`"
+    Cohort.objects.filter(pk=cohort_id).update(is_calculating=True, errors_calculating=0)
+    path = default_storage.save(STATIC_COHORT_UPLOAD_PATH.format(cohort_id=cohort_id), file)
+    import_static_cohort_csv_chunk.delay(cohort_id, path)
+
+
+@shared_task(ignore_result=True, max_retries=1)
+def import_static_cohort_csv_chunk(cohort_id: int, path: str, offset: int = 0) -> None:
+    """
+    Imports the next chunk of a stored upload, starting at byte `offset`, and then queues the chunk after it. Chunks
+    are imported one after another, so the cohort is done calculating once its last one is, with the errors of all.
+    """
+    start_time = time.time()
+    try:
+        cohort = Cohort.objects.get(pk=cohort_id)
+        items, offset = _read_static_cohort_csv_chunk(path, offset)
+    except Exception as err:
+        default_storage.delete(path)
+        Cohort.objects.filter(pk=cohort_id).update(is_calculating=False, errors_calculating=F("errors_calculating") + 1)
+        capture_exception(err)
+        return
+
+    if items:
+        cohort.insert_users_by_list(items, finish_calculation=False)
+        logger.info(
+            "Calculating cohort {} from CSV chunk took {:.2f} seconds".format(cohort.pk, (time.time() - start_time))
+        )
+
+    if len(items) < STATIC_COHORT_IMPORT_CHUNK_SIZE:
+        default_storage.delete(path)
+        Cohort.objects.filter(pk=cohort_id).update(is_calculating=False, last_calculation=timezone.now())
+    else:
+        import_static_cohort_csv_chunk.delay(cohort_id, path, offset)
+
+
+def _read_static_cohort_csv_chunk(path: str, offset: int) -> Tuple[List[str], int]:
+    "Returns the first column of up to STATIC_COHORT_IMPORT_CHUNK_SIZE rows, and the offset after them"
+    items: List[str] = []
+    with default_storage.open(path, "rb") as file:
+        file.seek(offset)
+        while len(items) < STATIC_COHORT_IMPORT_CHUNK_SIZE:
+            line = file.readline()
+            if not line:
+                break
+            offset += len(line)
+            row = next(csv.reader([line.decode("utf-8")]), None)
+            if row:
+                items.append(row[0])
+    return items, offset
+
+
 @shared_task(ignore_result=True, max_retries=1)
 def calculate_cohort_from_list(cohort_id: int, items: List[str]) -> None:
     start_time = time.time()
@@ -6,7 +6,11 @@ from freezegun import freeze_time
 from posthog.models.cohort import Cohort
 from posthog.models.feature_flag import FeatureFlag
 from posthog.models.person import Person
-from posthog.tasks.calculate_cohort import calculate_cohort_from_list, calculate_cohorts
+from posthog.tasks.calculate_cohort import (
+    calculate_cohort_from_list,
+    calculate_cohorts,
+    get_cohorts_in_dependency_order,
+)
 from posthog.test.base import APIBaseTest
 
 
@@ -97,4 +101,48 @@ def calculate_cohort_test_factory(event_factory: Callable, person_factory: Calla
 
             calculate_cohorts()
 
+        @patch("posthog.tasks.calculate_cohort.calculate_cohorts_ch.delay")
+        def test_calculate_cohorts_in_dependency_order(self, calculate_cohorts_ch: MagicMock) -> None:
+            with freeze_time("2021-01-01T12:00:00Z"):
+                base_cohort = Cohort.objects.create(
+                    team=self.team, groups=[{"properties": [{"key": "foo", "value": "bar", "type": "person"}]}],
+                )
+                # Recently calculated, so not calculated again
+                other_cohort = Cohort.objects.create(
+                    team=self.team,
+                    groups=[{"properties": [{"key": "foo", "value": "other", "type": "person"}]}],
+                    last_calculation="2021-01-01T11:55:00Z",
+                )
+                cohort = Cohort.objects.create(
+                    team=self.team,
+                    groups=[
+                        {
+                            "properties": [
+                                {"key": "id", "type": "cohort", "value": base_cohort.pk},
+                                {"key": "id", "type": "cohort", "value": str(other_cohort.pk)},
+                            ]
+                        }
+                    ],
+                    last_calculation="2021-01-01T10:00:00Z",
+                )
+                Cohort.objects.filter(pk=base_cohort.pk).update(last_calculation="2021-01-01T11:00:00Z")
+
+                with self.settings(CALCULATE_X_COHORTS_PARALLEL=1):
+                    calculate_cohorts()
+
+            calculate_cohorts_ch.assert_called_once_with([(base_cohort.pk, 1), (cohort.pk, 1)])
+
+        def test_get_cohorts_in_dependency_order_ignores_cycles(self) -> None:
+            cohort_a = Cohort.objects.create(team=self.team, groups=[])
+            cohort_b = Cohort.objects.create(
+                team=self.team, groups=[{"properties": [{"key": "id", "type": "cohort", "value": cohort_a.pk}]}]
+            )
+            cohort_a.groups = [{"properties": [{"key": "id", "type": "cohort", "value": cohort_b.pk}]}]
+            cohort_a.save()
+
+            self.assertEqual(
+                [cohort.pk for cohort in get_cohorts_in_dependency_order(self.team.pk, [cohort_a])],
+                [cohort_b.pk, cohort_a.pk],
+            )
+
     return TestCalculateCohort
@@ -231,7 +231,7 @@ class TestUpdateCache(APIBaseTest):
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk,},
         )
-        self.assertEqual(funnel_mock.call_count, 2)  # once for Insight check, once for dashboard tile check
+        self.assertEqual(funnel_mock.call_count, 1)  # the Insight's result is reused for the dashboard tile
 
         # trends funnel
         filter = base_filter.with_data({"funnel_viz_type": "trends"})
@@ -243,7 +243,7 @@ class TestUpdateCache(APIBaseTest):
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk,},
         )
-        self.assertEqual(funnel_trends_mock.call_count, 2)
+        self.assertEqual(funnel_trends_mock.call_count, 1)
 
         # time to convert funnel
         filter = base_filter.with_data({"funnel_viz_type": "time_to_convert", "funnel_order_type": "strict"})
@@ -255,7 +255,7 @@ class TestUpdateCache(APIBaseTest):
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk,},
         )
-        self.assertEqual(funnel_time_to_convert_mock.call_count, 2)
+        self.assertEqual(funnel_time_to_convert_mock.call_count, 1)
 
         # strict funnel
         filter = base_filter.with_data({"funnel_order_type": "strict"})
@@ -267,7 +267,7 @@ class TestUpdateCache(APIBaseTest):
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk,},
         )
-        self.assertEqual(funnel_strict_mock.call_count, 2)
+        self.assertEqual(funnel_strict_mock.call_count, 1)
 
         # unordered funnel
         filter = base_filter.with_data({"funnel_order_type": "unordered"})
@@ -279,7 +279,7 @@ class TestUpdateCache(APIBaseTest):
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk,},
         )
-        self.assertEqual(funnel_unordered_mock.call_count, 2)
+        self.assertEqual(funnel_unordered_mock.call_count, 1)
 
     def _test_refresh_dashboard_cache_types(
         self, filter: FilterType, cache_type: CacheType, patch_update_cache_item: MagicMock,
@@ -523,6 +523,28 @@ class TestUpdateCache(APIBaseTest):
             Insight.objects.all().order_by("id")[2].last_refresh.isoformat(), "2021-08-25T22:09:14.252000+00:00"
         )
 
+    @freeze_time("2021-08-25T22:09:14.252Z")
+    @patch("posthog.tasks.update_cache.calculate_with_single_flight")
+    def test_stale_result_does_not_mark_insights_or_tiles_refreshed(self, patch_single_flight: MagicMock) -> None:
+        # Another worker is calculating the result, so the one cached before it gets returned
+        patch_single_flight.return_value = {"result": [{"data": [1]}], "is_cached": True, "is_stale": True}
+        dashboard = Dashboard.objects.create(team=self.team, is_shared=True)
+        insight = Insight.objects.create(filters={"events": [{"id": "$pageview"}]}, team=self.team)
+        tile = DashboardTile.objects.create(insight=insight, dashboard=dashboard)
+        self.assertEqual(tile.filters_hash, insight.filters_hash)
+
+        result = update_cache_item(
+            insight.filters_hash,
+            CacheType.TRENDS,
+            {"filter": get_filter(data=insight.filters, team=self.team).toJSON(), "team_id": self.team.pk},
+        )
+
+        self.assertEqual(result, [{"data": [1]}])
+        insight.refresh_from_db()
+        tile.refresh_from_db()
+        self.assertEqual((insight.last_refresh, insight.refreshing), (None, False))
+        self.assertEqual((tile.last_refresh, tile.refreshing), (None, False))
+
     def _assert_number_of_days_in_results(self, dashboard_tile: DashboardTile, number_of_days_in_results: int) -> None:
         cache_result = get_safe_cache(dashboard_tile.filters_hash)
         number_of_results = len(cache_result["result"][0]["data"])
@@ -20,6 +20,7 @@ from ee.clickhouse.queries.paths import ClickhousePaths
 from ee.clickhouse.queries.retention.clickhouse_retention import ClickhouseRetention
 from ee.clickhouse.queries.stickiness.clickhouse_stickiness import ClickhouseStickiness
 from ee.clickhouse.queries.trends.clickhouse_trends import ClickhouseTrends
+from posthog.caching.insight_cache import calculate_with_single_flight
 from posthog.celery import update_cache_item_task
 from posthog.constants import (
     INSIGHT_FUNNELS,
@@ -62,8 +63,11 @@ def update_cache_item(key: str, cache_type: CacheType, payload: dict) -> List[Di
         dashboard_tiles_queryset = DashboardTile.objects.filter(insight__team_id=team_id, filters_hash=key)
 
         # at least one must return something, if they both return they will be identical
-        insight_result = _update_cache_for_queryset(cache_type, filter, key, team, insights_queryset)
-        tiles_result = _update_cache_for_queryset(cache_type, filter, key, team, dashboard_tiles_queryset)
+        insight_result, is_stale = _update_cache_for_queryset(cache_type, filter, key, team, insights_queryset)
+        # so the result calculated for the insights is reused for the tiles
+        tiles_result, _ = _update_cache_for_queryset(
+            cache_type, filter, key, team, dashboard_tiles_queryset, result=insight_result, is_stale=is_stale
+        )
 
         if tiles_result is not None:
             result = tiles_result
@@ -80,29 +84,53 @@ def update_cache_item(key: str, cache_type: CacheType, payload: dict) -> List[Di
 
 
 def _update_cache_for_queryset(
-    cache_type: CacheType, filter: Filter, key: str, team: Team, queryset: QuerySet
-) -> Optional[List[Dict[str, Any]]]:
+    cache_type: CacheType,
+    filter: Filter,
+    key: str,
+    team: Team,
+    queryset: QuerySet,
+    result: Optional[List[Dict[str, Any]]] = None,
+    is_stale: bool = False,
+) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+    "Returns the result for the queryset, and whether it is a stale one calculated before this update"
     if not queryset.exists():
-        return None
+        return None, False
+
+    if result is not None:
+        if is_stale:
+            # Another worker is calculating this very result and will update the queryset once done
+            queryset.update(refreshing=False)
+        else:
+            queryset.update(last_refresh=timezone.now(), refreshing=False, refresh_attempt=0)
+        return result, is_stale
 
     queryset.update(refreshing=True)
     try:
-        if cache_type == CacheType.FUNNEL:
-            result = _calculate_funnel(filter, key, team)
-        else:
-            result = _calculate_by_filter(filter, key, team, cache_type)
-        cache.set(
-            key, {"result": result, "type": cache_type, "last_refresh": timezone.now()}, settings.CACHED_RESULTS_TTL
-        )
+        result_package = calculate_with_single_flight(key, lambda: _calculate_and_cache(cache_type, filter, key, team))
     except Exception as e:
         statsd.incr("update_cache_item_error", tags={"team": team.id})
         queryset.filter(refresh_attempt=None).update(refresh_attempt=0)
         queryset.update(refreshing=False, refresh_attempt=F("refresh_attempt") + 1)
         raise e
 
+    if result_package.get("is_stale"):
+        # Another worker is calculating this very result and will update the queryset once done
+        queryset.update(refreshing=False)
+        return result_package["result"], True
+
     statsd.incr("update_cache_item_success", tags={"team": team.id})
     queryset.update(last_refresh=timezone.now(), refreshing=False, refresh_attempt=0)
-    return result
+    return result_package["result"], False
+
+
+def _calculate_and_cache(cache_type: CacheType, filter: Filter, key: str, team: Team) -> Dict[str, Any]:
+    if cache_type == CacheType.FUNNEL:
+        result = _calculate_funnel(filter, key, team)
+    else:
+        result = _calculate_by_filter(filter, key, team, cache_type)
+    result_package = {"result": result, "type": cache_type, "last_refresh": timezone.now()}
+    cache.set(key, result_package, settings.CACHED_RESULTS_TTL)
+    return result_package
 
 
 def update_insight_cache(insight: Insight, dashboard: Optional[Dashboard]) -> List[Dict[str, Any]]:
@@ -112,6 +140,10 @@ def update_insight_cache(insight: Insight, dashboard: Optional[Dashboard]) -> Li
     return result
 
 
+def schedule_insight_cache_refresh(insight: Insight, dashboard: Optional[Dashboard]) -> None:
+    update_cache_item_task.delay(*insight_update_task_params(insight, dashboard))
+
+
 def get_cache_type(filter: FilterType) -> CacheType:
     if filter.insight == INSIGHT_FUNNELS:
         return CacheType.FUNNEL
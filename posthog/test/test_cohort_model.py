@@ -21,6 +21,7 @@ class TestCohort(BaseTest):
         cohort.insert_users_by_list(["a header or something", "123", "000", "email@example.org"])
         cohort = Cohort.objects.get()
         self.assertEqual(cohort.people.count(), 2)
+        self.assertEqual(cohort.count, 2)
         self.assertEqual(cohort.is_calculating, False)
 
         #  If we accidentally call calculate_people it shouldn't erase people
@@ -31,6 +32,7 @@ class TestCohort(BaseTest):
         cohort.insert_users_by_list(["123"])
         cohort = Cohort.objects.get()
         self.assertEqual(cohort.people.count(), 2)
+        self.assertEqual(cohort.count, 2)
         self.assertEqual(cohort.is_calculating, False)
 
     @pytest.mark.ee
@@ -1,14 +1,31 @@
+from unittest.mock import MagicMock, patch
+
+import redis.exceptions
+from django.test import override_settings
+
 from posthog.models import Cohort, FeatureFlag, GroupTypeMapping, Person
 from posthog.models.feature_flag import (
+    FEATURE_FLAG_DEFINITIONS_VERSION_KEY,
+    FeatureFlagDefinitionsCache,
     FeatureFlagMatch,
     FeatureFlagMatcher,
     FeatureFlagOverride,
+    get_active_feature_flags,
+    get_feature_flag_definitions_version,
     get_overridden_feature_flags,
 )
 from posthog.models.group import Group
 from posthog.test.base import BaseTest, QueryMatchingTest, snapshot_postgres_queries
 
 
+class PostgresFeatureFlagMatcher(FeatureFlagMatcher):
+    "Evaluates all conditions in postgres"
+
+    @property
+    def condition_predicates(self):
+        return [None for _ in self.feature_flag.conditions]
+
+
 class TestFeatureFlagMatcher(BaseTest):
     def test_blank_flag(self):
         # Blank feature flags now default to be released for everyone
@@ -202,6 +219,84 @@ class TestFeatureFlagMatcher(BaseTest):
         self.assertEqual(FeatureFlagMatcher(feature_flag, "", {"organization": "foo"}).get_match(), FeatureFlagMatch())
         self.assertIsNone(FeatureFlagMatcher(feature_flag, "", {"organization": "bar"}).get_match())
 
+    def test_compiled_conditions_match_postgres(self):
+        Person.objects.create(
+            team=self.team,
+            distinct_ids=["example_id"],
+            properties={"email": "tim@posthog.com", "plan": "pro", "seats": 5, "beta": True, "nothing": None},
+        )
+        properties = [
+            {"key": "email", "value": "tim@posthog.com"},
+            {"key": "email", "value": ["x@y.com", "tim@posthog.com"], "operator": "exact"},
+            {"key": "email", "value": "tim@posthog.com", "operator": "is_not"},
+            {"key": "missing", "value": "tim@posthog.com", "operator": "is_not"},
+            {"key": "email", "value": "POSTHOG", "operator": "icontains"},
+            {"key": "email", "value": "posthog", "operator": "not_icontains"},
+            {"key": "missing", "value": "posthog", "operator": "not_icontains"},
+            {"key": "nothing", "value": "posthog", "operator": "not_icontains"},
+            {"key": "email", "value": "[", "operator": "regex"},
+            {"key": "seats", "value": "4", "operator": "gt"},
+            {"key": "seats", "value": "5", "operator": "lt"},
+            {"key": "plan", "value": "4", "operator": "gt"},
+            {"key": "seats", "value": "5"},
+            {"key": "seats", "value": 5},
+            {"key": "beta", "value": "true"},
+            {"key": "beta", "value": "1"},
+            {"key": "nothing", "value": "null"},
+            {"key": "nothing", "operator": "is_set", "value": "is_set"},
+            {"key": "missing", "operator": "is_not_set", "value": "is_not_set"},
+            {"key": "plan", "value": "plan", "operator": "icontains", "type": "person"},
+        ]
+
+        for property in properties:
+            feature_flag = self.create_feature_flag(
+                key=f"flag-{property['key']}", filters={"groups": [{"properties": [property]}]}
+            )
+            compiled_matcher = FeatureFlagMatcher(feature_flag, "example_id")
+
+            self.assertIsNotNone(compiled_matcher.condition_predicates[0], property)
+            self.assertEqual(
+                compiled_matcher.get_match(),
+                PostgresFeatureFlagMatcher(feature_flag, "example_id").get_match(),
+                property,
+            )
+            feature_flag.delete()
+
+    def test_regex_conditions_evaluated_in_postgres(self):
+        Person.objects.create(team=self.team, distinct_ids=["example_id"], properties={"email": "tim@posthog.com"})
+        # POSIX classes like [[:alpha:]] mean something else to python's re
+        for property in [
+            {"key": "email", "value": "^[[:alpha:]]+@", "operator": "regex"},
+            {"key": "email", "value": "^[[:alpha:]]+@", "operator": "not_regex"},
+        ]:
+            feature_flag = self.create_feature_flag(key="flag-regex", filters={"groups": [{"properties": [property]}]})
+            compiled_matcher = FeatureFlagMatcher(feature_flag, "example_id")
+
+            self.assertIsNone(compiled_matcher.condition_predicates[0], property)
+            self.assertEqual(
+                compiled_matcher.get_match(),
+                PostgresFeatureFlagMatcher(feature_flag, "example_id").get_match(),
+                property,
+            )
+            feature_flag.delete()
+
+    def test_compiled_conditions_query_person_once(self):
+        Person.objects.create(
+            team=self.team, distinct_ids=["example_id"], properties={"email": "tim@posthog.com"},
+        )
+        for index in range(10):
+            self.create_feature_flag(
+                key=f"flag-{index}",
+                filters={"groups": [{"properties": [{"key": "email", "value": "posthog", "operator": "icontains"}]}]},
+            )
+
+        # One query for the flags, one for the person
+        with self.assertNumQueries(2):
+            self.assertEqual(len(get_active_feature_flags(self.team.pk, "example_id")), 10)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(get_active_feature_flags(self.team.pk, "another_id"), {})
+
     def create_groups(self):
         GroupTypeMapping.objects.create(team=self.team, group_type="organization", group_type_index=0)
         GroupTypeMapping.objects.create(team=self.team, group_type="project", group_type_index=1)
@@ -212,10 +307,8 @@ class TestFeatureFlagMatcher(BaseTest):
             team=self.team, group_type_index=0, group_key="bar", group_properties={"name": "var.inc"}, version=1
         )
 
-    def create_feature_flag(self, **kwargs):
-        return FeatureFlag.objects.create(
-            team=self.team, name="Beta feature", key="beta-feature", created_by=self.user, **kwargs
-        )
+    def create_feature_flag(self, key="beta-feature", **kwargs):
+        return FeatureFlag.objects.create(team=self.team, name="Beta feature", key=key, created_by=self.user, **kwargs)
 
 
 # Integration + performance tests for get_overridden_feature_flags
@@ -330,3 +423,110 @@ class TestFeatureFlagsWithOverrides(BaseTest, QueryMatchingTest):
                 "feature-groups-all": True,
             },
         )
+
+
+@override_settings(FEATURE_FLAG_DEFINITIONS_CACHE_ENABLED=True)
+@patch(
+    "posthog.models.feature_flag.feature_flag_definitions_cache",
+    new_callable=lambda: FeatureFlagDefinitionsCache(max_size=100, ttl=300),
+)
+class TestFeatureFlagDefinitionsCache(BaseTest):
+    def setUp(self):
+        super().setUp()
+        GroupTypeMapping.objects.create(team=self.team, group_type="organization", group_type_index=0)
+        Group.objects.create(
+            team=self.team, group_type_index=0, group_key="PostHog", group_properties={"name": "foo.inc"}, version=1
+        )
+        self.feature_flag = FeatureFlag.objects.create(
+            team=self.team,
+            key="feature-groups",
+            created_by=self.user,
+            filters={"aggregation_group_type_index": 0, "groups": [{"rollout_percentage": 100}]},
+        )
+
+    def test_definitions_served_from_memory_while_version_unchanged(self, definitions_cache):
+        self.assertEqual(
+            get_active_feature_flags(self.team.pk, "distinct_id", {"organization": "PostHog"}), {"feature-groups": True}
+        )
+
+        with self.assertNumQueries(0):
+            flags = get_active_feature_flags(self.team.pk, "distinct_id", {"organization": "PostHog"})
+        self.assertEqual(flags, {"feature-groups": True})
+
+    def test_definitions_served_from_redis_in_other_processes(self, definitions_cache):
+        get_active_feature_flags(self.team.pk, "distinct_id", {"organization": "PostHog"})
+        definitions_cache.clear()
+
+        with self.assertNumQueries(0):
+            definitions = definitions_cache.get(self.team.pk)
+        self.assertEqual([feature_flag.key for feature_flag in definitions.feature_flags], ["feature-groups"])
+        self.assertEqual(definitions.group_types_to_indexes, {"organization": 0})
+
+    def test_saving_flags_cohorts_and_group_types_bumps_version(self, definitions_cache):
+        version = get_feature_flag_definitions_version(self.team.pk)
+
+        self.feature_flag.active = False
+        self.feature_flag.save()
+        self.assertGreater(get_feature_flag_definitions_version(self.team.pk), version)
+        self.assertEqual(get_active_feature_flags(self.team.pk, "distinct_id", {"organization": "PostHog"}), {})
+
+        version = get_feature_flag_definitions_version(self.team.pk)
+        Cohort.objects.create(team=self.team, groups=[{"properties": {"$some_prop": "something"}}])
+        self.assertGreater(get_feature_flag_definitions_version(self.team.pk), version)
+
+        version = get_feature_flag_definitions_version(self.team.pk)
+        GroupTypeMapping.objects.create(team=self.team, group_type="project", group_type_index=1)
+        self.assertGreater(get_feature_flag_definitions_version(self.team.pk), version)
+        self.assertEqual(definitions_cache.get(self.team.pk).group_types_to_indexes, {"organization": 0, "project": 1})
+
+    def test_recalculating_cohort_does_not_bump_version(self, definitions_cache):
+        cohort = Cohort.objects.create(team=self.team, groups=[{"properties": {"$some_prop": "something"}}])
+        version = get_feature_flag_definitions_version(self.team.pk)
+
+        cohort.is_calculating = True
+        cohort.save(update_fields=["is_calculating"])
+        cohort = Cohort.objects.get(pk=cohort.pk)
+        cohort.count = 5
+        cohort.save()
+        self.assertEqual(get_feature_flag_definitions_version(self.team.pk), version)
+
+        cohort.groups = [{"properties": {"$some_prop": "something else"}}]
+        cohort.save()
+        self.assertGreater(get_feature_flag_definitions_version(self.team.pk), version)
+
+        version = get_feature_flag_definitions_version(self.team.pk)
+        cohort.deleted = True
+        cohort.save(update_fields=["deleted"])
+        self.assertGreater(get_feature_flag_definitions_version(self.team.pk), version)
+
+    def test_saving_flag_when_redis_is_down(self, definitions_cache):
+        redis_client = MagicMock()
+        redis_client.incr.side_effect = redis.exceptions.ConnectionError("redis down")
+
+        with patch("posthog.models.feature_flag.get_client", return_value=redis_client), patch(
+            "posthog.models.feature_flag.capture_exception"
+        ) as capture_exception:
+            self.feature_flag.active = False
+            self.feature_flag.save()
+
+        capture_exception.assert_called()
+        self.assertFalse(FeatureFlag.objects.get(pk=self.feature_flag.pk).active)
+
+    def test_definitions_loaded_from_postgres_when_redis_is_down(self, definitions_cache):
+        with patch("posthog.models.feature_flag.get_client", side_effect=Exception("redis down")):
+            flags = get_active_feature_flags(self.team.pk, "distinct_id", {"organization": "PostHog"})
+        self.assertEqual(flags, {"feature-groups": True})
+
+    def test_definitions_loaded_from_postgres_when_redis_fails_after_version_lookup(self, definitions_cache):
+        def get(key):
+            if key == FEATURE_FLAG_DEFINITIONS_VERSION_KEY.format(team_id=self.team.pk):
+                return b"1"
+            raise Exception("redis down")
+
+        redis_client = MagicMock()
+        redis_client.get.side_effect = get
+        redis_client.set.side_effect = Exception("redis down")
+
+        with patch("posthog.models.feature_flag.get_client", return_value=redis_client):
+            flags = get_active_feature_flags(self.team.pk, "distinct_id", {"organization": "PostHog"})
+        self.assertEqual(flags, {"feature-groups": True})
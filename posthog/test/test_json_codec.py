@@ -0,0 +1,38 @@
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from posthog import json_codec
+from posthog.client import QueryStatus
+
+
+class TestJsonCodec(SimpleTestCase):
+    def test_roundtrip_matches_stdlib(self):
+        payload = {"event": "💻 clicked", "properties": {"nested": [1, 2.5, None, True]}, "count": 2 ** 40}
+
+        self.assertEqual(json_codec.loads(json_codec.dumps(payload)), payload)
+        self.assertEqual(json_codec.loads(json_codec.dumps_bytes(payload)), json.loads(json.dumps(payload)))
+
+    def test_falls_back_for_values_orjson_rejects(self):
+        self.assertEqual(json_codec.dumps({"text": "\ud800"}), json.dumps({"text": "\ud800"}))
+        self.assertEqual(json_codec.loads(json_codec.dumps({"big": 2 ** 70})), {"big": 2 ** 70})
+        self.assertEqual(json_codec.loads(json_codec.dumps({1: "a"})), {"1": "a"})
+
+    def test_datetimes_are_not_serialized_implicitly(self):
+        with self.assertRaises(TypeError):
+            json_codec.dumps({"timestamp": datetime(2021, 1, 1)})
+
+        self.assertEqual(json_codec.dumps(datetime(2021, 1, 1), default=str), '"2021-01-01 00:00:00"')
+
+    def test_without_orjson(self):
+        with patch.object(json_codec, "orjson", None):
+            self.assertEqual(json_codec.dumps({"a": [1, 2]}), '{"a": [1, 2]}')
+            self.assertEqual(json_codec.loads(b'{"a": [1, 2]}'), {"a": [1, 2]})
+
+    def test_query_status_roundtrip(self):
+        status = QueryStatus(team_id=2, complete=True, results=[[1, "a"]], start_time=1.0)
+
+        self.assertEqual(QueryStatus.from_json(status.to_json()), status)
+        self.assertEqual(json.loads(status.to_json()), json.loads(json.dumps(status.to_dict())))
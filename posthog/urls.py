@@ -120,6 +120,7 @@ urlpatterns = [
     re_path(r"^demo.*", login_required(demo)),
     # ingestion
     opt_slash_path("decide", decide.get_decide),
+    opt_slash_path("decide/bulk", decide.get_bulk_decide),
     opt_slash_path("e", capture.get_event),
     opt_slash_path("engage", capture.get_event),
     opt_slash_path("track", capture.get_event),